@@ -8,9 +8,9 @@ from typing import Optional, List
 
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Body, Query
 from fastapi.responses import FileResponse
-from sqlalchemy import or_, text as _sql_text, func
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy import or_, func
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.auth import (
     clear_stylist_session_cookie,
@@ -18,7 +18,7 @@ from app.core.auth import (
     get_current_stylist,
     set_stylist_session_cookie,
 )
-from app.db import get_session, engine
+from app.db import DBWriter, get_session, get_async_session, get_writer, is_overlap_violation
 from app.models import (
     ActionResult,
     StylistAuthOut,
@@ -53,15 +53,17 @@ from app.services.logic import (
     cancel_reservation,
     apply_reschedule,
     get_calendar_for_professional,
+    has_overlapping_reservation,
 )
-from app.services.calendar_queue import CalendarSyncAction, try_enqueue_calendar_job
+from app.services.calendar_queue import CalendarSyncAction, stage_calendar_job
+from app.services.availability_cache import clear_availability_cache, invalidate_availability
 from app.services import backup as backup_service
 
 
 from app.utils.date import now_tz, TZ, validate_target_dt
 from app.utils.security import needs_rehash, verify_password, hash_password
 from app.core.metrics import RESERVATIONS_CANCELLED, RESERVATIONS_RESCHEDULED, RESERVATIONS_CREATED
-from app.data import get_service_by_id
+from app.data import ensure_catalog_loaded, get_service_by_id
 
 logger = logging.getLogger("pelubot.api.pro_portal")
 router = APIRouter(prefix="/pros", tags=["pros"])
@@ -194,12 +196,13 @@ def stylist_me(
 
 
 @router.get("/reservations", response_model=StylistReservationsOut)
-def stylist_reservations(
+async def stylist_reservations(
     stylist: StylistDB = Depends(get_current_stylist),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     days_ahead: int = 30,
     include_past_minutes: int = 0,
 ) -> StylistReservationsOut:
+    await ensure_catalog_loaded()
     days_ahead = max(1, min(days_ahead, 180))
     include_past_minutes = max(0, min(include_past_minutes, 1440))
     now = now_tz()
@@ -213,7 +216,7 @@ def stylist_reservations(
         .where(ReservationDB.end >= start_boundary)
         .order_by(ReservationDB.start)
     )
-    rows = session.exec(stmt).all()
+    rows = (await session.exec(stmt)).all()
     reservations: list[StylistReservationOut] = []
     for row in rows:
         try:
@@ -326,21 +329,24 @@ def stylist_reservations_history(
 
 
 @router.get("/overview", response_model=StylistOverviewOut)
-def stylist_overview(
+async def stylist_overview(
     stylist: StylistDB = Depends(get_current_stylist),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> StylistOverviewOut:
+    await ensure_catalog_loaded()
     now = now_tz()
     start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
 
     rows = (
-        session.exec(
-            select(ReservationDB)
-            .where(ReservationDB.professional_id == stylist.id)
-            .where(ReservationDB.start >= start_of_day)
-            .where(ReservationDB.start < end_of_day)
-            .order_by(ReservationDB.start)
+        (
+            await session.exec(
+                select(ReservationDB)
+                .where(ReservationDB.professional_id == stylist.id)
+                .where(ReservationDB.start >= start_of_day)
+                .where(ReservationDB.start < end_of_day)
+                .order_by(ReservationDB.start)
+            )
         ).all()
         if session is not None
         else []
@@ -366,7 +372,7 @@ def stylist_overview(
                     .where(ReservationDB.customer_name.in_(customer_names))
                     .order_by(ReservationDB.customer_name, ReservationDB.start.desc())
                 )
-                previous_reservations = session.exec(stmt_last).all()
+                previous_reservations = (await session.exec(stmt_last)).all()
             except Exception:
                 previous_reservations = []
 
@@ -705,13 +711,14 @@ def stylist_stats(
 
 
 @router.post("/reservations", response_model=ReservationCreateOut)
-def stylist_create_reservation(
+async def stylist_create_reservation(
     payload: ReservationIn,
     stylist: StylistDB = Depends(get_current_stylist),
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ) -> ReservationCreateOut:
     """Permite a un profesional crear una reserva directamente desde su portal."""
     
+    await ensure_catalog_loaded()
     # Verificar que el profesional está creando la cita para sí mismo
     if payload.professional_id != stylist.id:
         raise HTTPException(
@@ -754,23 +761,10 @@ def stylist_create_reservation(
     res_id = str(uuid.uuid4())
     cal_id = get_calendar_for_professional(stylist.id)
 
-    # Bloquear la tabla para evitar condiciones de carrera en SQLite
-    try:
-        if str(engine.url).startswith("sqlite"):
-            try:
-                session.exec(_sql_text("BEGIN IMMEDIATE"))
-            except Exception:
-                pass
-        
-        # Verificar que no haya overlaps
-        q = select(ReservationDB).where(
-            ReservationDB.professional_id == stylist.id,
-            ReservationDB.start < end,
-            ReservationDB.end > start,
-            ReservationDB.status != "cancelada",
-        )
-        if session.exec(q).first():
-            session.rollback()
+    def _insert(session: Session) -> int:
+        # Corre en el escritor único, sin otra escritura intercalada; en Postgres la
+        # restricción de exclusión cubre además las escrituras de otros nodos.
+        if has_overlapping_reservation(session, stylist.id, start, end):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Ya tienes una cita en esa hora."
@@ -790,53 +784,39 @@ def stylist_create_reservation(
             notes=notes,
         )
         session.add(row)
-        session.commit()
-        
-        try:
-            RESERVATIONS_CREATED.inc()
-        except Exception:
-            pass
+        # Outbox: la reserva, su trabajo de sincronización y `sync_status` van en un solo commit.
+        job = stage_calendar_job(
+            session,
+            reservation_id=res_id,
+            action=CalendarSyncAction.CREATE,
+            payload={"calendar_id": cal_id} if cal_id else None,
+            reservation=row,
+        )
+        return job.id
+
+    try:
+        sync_job_id = await writer.run_async(_insert)
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        if is_overlap_violation(e):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya tienes una cita en esa hora.")
         logger.exception("Error creando reserva desde portal pro")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"No se pudo guardar la reserva: {e}"
         )
-    sync_status, sync_job_id = try_enqueue_calendar_job(
-        session,
-        reservation_id=res_id,
-        action=CalendarSyncAction.CREATE,
-        payload={"calendar_id": cal_id} if cal_id else None,
-    )
-
-    sync_error = None
-    if sync_status != "queued":
-        sync_error = "No se pudo encolar la sincronización en Google Calendar."
+    invalidate_availability(stylist.id, start, end)
     try:
-        session.refresh(row)
+        RESERVATIONS_CREATED.inc()
     except Exception:
         pass
-    try:
-        row.sync_status = sync_status
-        row.sync_job_id = sync_job_id
-        row.sync_last_error = sync_error
-        row.sync_updated_at = datetime.now(timezone.utc)
-        session.add(row)
-        session.commit()
-    except Exception:
-        session.rollback()
+    sync_status = "queued"
 
-    message = f"Reserva {res_id} creada. Cliente: {customer_name}, {service.name} el {start.strftime('%d/%m/%Y %H:%M')}."
-    if sync_status == "queued":
-        suffix = " Sincronización con Google Calendar encolada."
-        if sync_job_id is not None:
-            suffix = f"{suffix[:-1]} (job {sync_job_id})."
-        message = f"{message}{suffix}"
-    else:
-        message = f"{message} No se pudo encolar la sincronización con Google Calendar; revísalo manualmente."
+    message = (
+        f"Reserva {res_id} creada. Cliente: {customer_name}, {service.name} el {start.strftime('%d/%m/%Y %H:%M')}."
+        f" Sincronización con Google Calendar encolada (job {sync_job_id})."
+    )
 
     return ReservationCreateOut(
         ok=True,
@@ -849,80 +829,62 @@ def stylist_create_reservation(
 
 
 @router.post("/reservations/{reservation_id}/cancel", response_model=ActionResult)
-def stylist_cancel_reservation(
+async def stylist_cancel_reservation(
     reservation_id: str,
     stylist: StylistDB = Depends(get_current_stylist),
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ) -> ActionResult:
-    reservation = find_reservation(session, reservation_id)
-    if not reservation or reservation.professional_id != stylist.id:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada")
+    def _cancel(session: Session) -> int:
+        reservation = find_reservation(session, reservation_id)
+        if not reservation or reservation.professional_id != stylist.id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada")
+
+        payload = {"drop_calendar": False}
+        if getattr(reservation, "google_event_id", None):
+            payload["event_id"] = reservation.google_event_id
+        if getattr(reservation, "google_calendar_id", None):
+            payload["calendar_id"] = reservation.google_calendar_id
+        # Outbox: la cancelación, su trabajo de sincronización y `sync_status` van en un solo commit.
+        if not cancel_reservation(session, reservation_id, commit=False):
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo cancelar la reserva")
+        job = stage_calendar_job(
+            session,
+            reservation_id=reservation_id,
+            action=CalendarSyncAction.DELETE,
+            payload=payload,
+            reservation=reservation,
+        )
+        return job.id
 
-    ok = cancel_reservation(session, reservation_id)
-    if not ok:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo cancelar la reserva")
+    try:
+        sync_job_id = await writer.run_async(_cancel)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception("No se pudo cancelar la reserva %s", reservation_id)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo cancelar la reserva") from exc
     try:
         RESERVATIONS_CANCELLED.inc()
     except Exception:
         pass
-
-    payload = {"drop_calendar": False}
-    if getattr(reservation, "google_event_id", None):
-        payload["event_id"] = reservation.google_event_id
-    if getattr(reservation, "google_calendar_id", None):
-        payload["calendar_id"] = reservation.google_calendar_id
-    sync_status, sync_job_id = try_enqueue_calendar_job(
-        session,
-        reservation_id=reservation_id,
-        action=CalendarSyncAction.DELETE,
-        payload=payload,
+    return ActionResult(
+        ok=True,
+        message=f"Reserva {reservation_id} cancelada. Sincronización con Google Calendar encolada (job {sync_job_id}).",
     )
 
-    base_message = f"Reserva {reservation_id} cancelada."
-    if sync_status == "queued":
-        extra = " Sincronización con Google Calendar encolada."
-        if sync_job_id is not None:
-            extra = f"{extra[:-1]} (job {sync_job_id})."
-    else:
-        extra = " No se pudo encolar la sincronización con Google Calendar; revísalo manualmente."
-
-    sync_error = None if sync_status == "queued" else extra.strip()
-    try:
-        session.refresh(reservation)
-    except Exception:
-        pass
-    try:
-        reservation.sync_status = sync_status
-        reservation.sync_job_id = sync_job_id
-        reservation.sync_last_error = sync_error
-        reservation.sync_updated_at = datetime.now(timezone.utc)
-        session.add(reservation)
-        session.commit()
-    except Exception:
-        session.rollback()
-    return ActionResult(ok=True, message=f"{base_message}{extra}")
-
 
 @router.post("/reservations/{reservation_id}/reschedule", response_model=RescheduleOut)
-def stylist_reschedule_reservation(
+async def stylist_reschedule_reservation(
     reservation_id: str,
     payload: StylistRescheduleIn = Body(...),
     stylist: StylistDB = Depends(get_current_stylist),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
+    writer: DBWriter = Depends(get_writer),
 ) -> RescheduleOut:
-    reservation = find_reservation(session, reservation_id)
+    reservation = await session.get(ReservationDB, reservation_id)
     if not reservation or reservation.professional_id != stylist.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reserva no encontrada")
 
-    try:
-        if str(engine.url).startswith("sqlite"):
-            try:
-                session.exec(_sql_text("BEGIN IMMEDIATE"))
-            except Exception:
-                pass
-    except Exception:
-        pass
-
     if payload.new_start:
         try:
             new_start_dt = datetime.fromisoformat(str(payload.new_start).replace("Z", "+00:00"))
@@ -965,36 +927,31 @@ def stylist_reschedule_reservation(
         professional_id=stylist.id,
     )
 
-    ok, msg, updated = apply_reschedule(session, reschedule_payload)
-    if not ok or not updated:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+    def _reschedule(session: Session) -> tuple[str, ReservationDB, int]:
+        ok, msg, updated = apply_reschedule(session, reschedule_payload, commit=False)
+        if not ok or not updated:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
+        calendar_id = getattr(updated, "google_calendar_id", None) or get_calendar_for_professional(updated.professional_id)
+        if updated.google_event_id and calendar_id:
+            action = CalendarSyncAction.UPDATE
+            payload_sync = {"calendar_id": calendar_id, "event_id": updated.google_event_id}
+        else:
+            action = CalendarSyncAction.CREATE
+            payload_sync = {"calendar_id": calendar_id} if calendar_id else None
+        # Outbox: la reprogramación, su trabajo de sincronización y `sync_status` van en un solo commit.
+        job = stage_calendar_job(session, reservation_id=updated.id, action=action, payload=payload_sync, reservation=updated)
+        return msg, updated, job.id
 
-    calendar_id = getattr(updated, "google_calendar_id", None) or get_calendar_for_professional(updated.professional_id)
-    sync_status = "skipped"
-    sync_job_id: Optional[int] = None
-    if updated.google_event_id and calendar_id:
-        payload_sync = {"calendar_id": calendar_id, "event_id": updated.google_event_id}
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=updated.id,
-            action=CalendarSyncAction.UPDATE,
-            payload=payload_sync,
-        )
-    else:
-        payload_sync = {"calendar_id": calendar_id} if calendar_id else None
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=updated.id,
-            action=CalendarSyncAction.CREATE,
-            payload=payload_sync,
-        )
     try:
-        session.refresh(updated)
-    except InvalidRequestError:
-        refreshed = session.get(ReservationDB, reservation_id)
-        if refreshed is None:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="La reserva ya no existe tras reprogramar")
-        updated = refreshed
+        msg, updated, sync_job_id = await writer.run_async(_reschedule)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        if is_overlap_violation(exc):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ya tienes una cita en esa hora.")
+        logger.exception("No se pudo reprogramar la reserva %s", reservation_id)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo reprogramar la reserva") from exc
+    sync_status = "queued"
 
     try:
         RESERVATIONS_RESCHEDULED.inc()
@@ -1002,25 +959,7 @@ def stylist_reschedule_reservation(
         pass
 
     message_out = msg if isinstance(msg, str) else "Reserva reprogramada"
-    if sync_status == "queued":
-        message_out = f"{message_out} Sincronización con Google Calendar encolada."
-    elif sync_status == "skipped":
-        message_out = f"{message_out} No se pudo encolar la actualización en Google Calendar; revísalo manualmente."
-
-    sync_error = None if sync_status == "queued" else "No se pudo encolar la sincronización con Google Calendar; revísalo manualmente." if sync_status == "skipped" else None
-    try:
-        session.refresh(updated)
-    except Exception:
-        pass
-    try:
-        updated.sync_status = sync_status
-        updated.sync_job_id = sync_job_id
-        updated.sync_last_error = sync_error
-        updated.sync_updated_at = datetime.now(timezone.utc)
-        session.add(updated)
-        session.commit()
-    except Exception:
-        session.rollback()
+    message_out = f"{message_out} Sincronización con Google Calendar encolada."
     return RescheduleOut(
         ok=True,
         message=message_out,
@@ -1048,6 +987,7 @@ def stylist_mark_attended(
     reservation.status = "asistida"
     session.add(reservation)
     session.commit()
+    invalidate_availability(reservation.professional_id, reservation.start, reservation.end)
     
     return ActionResult(ok=True, message=f"Reserva {reservation_id} marcada como asistida.")
 
@@ -1076,6 +1016,7 @@ def stylist_mark_no_show(
     
     session.add(reservation)
     session.commit()
+    invalidate_availability(reservation.professional_id, reservation.start, reservation.end)
 
     message = f"Reserva {reservation_id} marcada como no asistida."
     if reason:
@@ -1117,9 +1058,11 @@ def stylist_delete_reservation(
     gcal_calendar_id = getattr(reservation, "google_calendar_id", None)
 
     sync_note = None
-    if gcal_event_id and gcal_calendar_id:
-        try:
-            sync_status, job_id = try_enqueue_calendar_job(
+    freed = (reservation.professional_id, reservation.start, reservation.end)
+    try:
+        # Outbox: el borrado y su trabajo de sincronización van en un solo commit.
+        if gcal_event_id and gcal_calendar_id:
+            job = stage_calendar_job(
                 session,
                 reservation_id=reservation_id,
                 action=CalendarSyncAction.DELETE,
@@ -1129,18 +1072,10 @@ def stylist_delete_reservation(
                     "drop_calendar": True,
                 },
             )
-            if sync_status == "queued" and job_id is not None:
-                sync_note = f" Se encoló la eliminación en Google Calendar (job {job_id})."
-            else:
-                sync_note = " No se pudo encolar la eliminación en Google Calendar; revísalo manualmente."
-        except Exception as exc:
-            session.rollback()
-            logger.warning("No se pudo encolar la eliminación del evento de Google Calendar %s: %s", gcal_event_id, exc)
-            sync_note = " No se pudo encolar la eliminación en Google Calendar; revísalo manualmente."
-
-    try:
+            sync_note = f" Se encoló la eliminación en Google Calendar (job {job.id})."
         session.delete(reservation)
         session.commit()
+        invalidate_availability(*freed)
     except Exception as exc:
         session.rollback()
         logger.exception("Error eliminando reserva %s", reservation_id)
@@ -1190,6 +1125,7 @@ def stylist_restore_backup(
     except Exception as exc:
         logger.exception("No se pudo restaurar el backup %s", backup_id)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo restaurar el backup") from exc
+    clear_availability_cache()
     return ActionResult(ok=True, message=f"Backup {info.filename} restaurado. Reinicia el portal si es necesario.")
 
 
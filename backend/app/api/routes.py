@@ -3,14 +3,17 @@ Rutas y endpoints de la API (estructura nueva).
 """
 from __future__ import annotations
 from datetime import datetime, date, timedelta, timezone
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Optional
 import os
+import json
 import uuid
 import logging
 
 from fastapi import APIRouter, HTTPException, Depends, Request, Body, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import delete as sa_delete, text as _sql_text, func, inspect as sa_inspect
 
 from app.data import (
@@ -19,6 +22,8 @@ from app.data import (
     get_active_professionals,
     get_professional_by_id,
     get_professional_calendars,
+    invalidate_catalog_cache,
+    ensure_catalog_loaded,
 )
 from app.models import (
     SlotsQuery, SlotsOut,
@@ -27,19 +32,36 @@ from app.models import (
     ReservationDB,
     DaysAvailabilityIn, DaysAvailabilityOut,
     CalendarSyncJobDB, CalendarJobOut, CalendarJobListOut, CalendarJobRetryIn,
+    CalendarWatchChannelDB,
     ReservationSyncStatusOut,
 )
 from app.services.logic import (
     find_available_slots,
+    find_available_days,
+    pros_using_gcal_busy,
+    collect_gcal_busy_for_range_async,
     find_reservation, cancel_reservation,
     apply_reschedule,
     get_calendar_for_professional,
+    has_overlapping_reservation,
+    sync_from_gcal_incremental,
     sync_from_gcal_range,
     reconcile_db_to_gcal_range,
     detect_conflicts_range,
 )
-from app.services.calendar_queue import CalendarSyncAction, try_enqueue_calendar_job, refresh_queue_metrics
-from app.db import get_session, engine
+from app.services.calendar_queue import (
+    CalendarSyncAction,
+    notify_queue,
+    refresh_queue_metrics,
+    track_queue_transition,
+    stage_calendar_job,
+)
+from app.services.calendar_watch import ensure_watch_channels, handle_notification, stop_watch_channel
+from app.services.admin_jobs import get_admin_jobs
+from app.services.availability_cache import clear_availability_cache, invalidate_availability
+from app.services.freebusy_cache import invalidate_freebusy
+from app.db import DBWriter, get_session, get_async_session, get_writer, engine, is_overlap_violation
+from app.services import db_maintenance
 from app.utils.date import validate_target_dt, TZ, now_tz, MAX_AHEAD_DAYS
 from app.core.metrics import RESERVATIONS_CREATED, RESERVATIONS_CANCELLED
 from datetime import timezone as _utc_tz
@@ -160,10 +182,52 @@ def list_professionals():
     """Devuelve el catálogo estático de profesionales."""
     return get_active_professionals()
 
+def _reservation_to_dict(r: ReservationDB) -> dict:
+    """Serializa una reserva para `GET /reservations`."""
+    created = r.created_at
+    updated = getattr(r, "updated_at", None)
+    start = r.start
+    end = r.end
+    # Normalizamos TZ por compatibilidad con datos antiguos/externos.
+    if start is not None and getattr(start, "tzinfo", None) is None:
+        try:
+            start = start.replace(tzinfo=TZ)
+        except Exception:
+            pass
+    if end is not None and getattr(end, "tzinfo", None) is None:
+        try:
+            end = end.replace(tzinfo=TZ)
+        except Exception:
+            pass
+    if created is not None and created.tzinfo is None:
+        created = created.replace(tzinfo=_utc_tz.utc)
+    if updated is not None and updated.tzinfo is None:
+        updated = updated.replace(tzinfo=_utc_tz.utc)
+    return {
+        "id": r.id,
+        "service_id": r.service_id,
+        "professional_id": r.professional_id,
+        "start": start.isoformat() if hasattr(start, "isoformat") else start,
+        "end": end.isoformat() if hasattr(end, "isoformat") else end,
+        "google_event_id": r.google_event_id,
+        "google_calendar_id": r.google_calendar_id,
+        "customer_name": getattr(r, "customer_name", None),
+        "customer_email": getattr(r, "customer_email", None),
+        "customer_phone": getattr(r, "customer_phone", None),
+        "notes": getattr(r, "notes", None),
+        "created_at": created.isoformat() if created else None,
+        "updated_at": updated.isoformat() if updated else None,
+        "sync_status": getattr(r, "sync_status", None),
+        "sync_job_id": getattr(r, "sync_job_id", None),
+        "sync_last_error": getattr(r, "sync_last_error", None),
+        "sync_updated_at": getattr(r, "sync_updated_at", None).isoformat() if getattr(r, "sync_updated_at", None) else None,
+    }
+
+
 @router.get("/reservations")
-def list_reservations(
+async def list_reservations(
     request: Request,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     professional_id: Optional[str] = Query(default=None, description="Filtra por profesional"),
     status: Optional[str] = Query(default=None, description="Filtra por estado"),
     start_from: Optional[str] = Query(default=None, description="ISO8601 desde (incluido)"),
@@ -199,49 +263,9 @@ def list_reservations(
         stmt = stmt.where(ReservationDB.start <= end_dt)
 
     stmt = stmt.order_by(ReservationDB.start).offset(offset).limit(limit)
-    rows = session.exec(stmt).all()
+    rows = (await session.exec(stmt)).all()
     logger.info("List reservations: %s rows", len(rows))
-    out = []
-    for r in rows:
-        created = r.created_at
-        updated = getattr(r, "updated_at", None)
-        start = r.start
-        end = r.end
-        # Normalizamos TZ por compatibilidad con datos antiguos/externos.
-        if start is not None and getattr(start, "tzinfo", None) is None:
-            try:
-                start = start.replace(tzinfo=TZ)
-            except Exception:
-                pass
-        if end is not None and getattr(end, "tzinfo", None) is None:
-            try:
-                end = end.replace(tzinfo=TZ)
-            except Exception:
-                pass
-        if created is not None and created.tzinfo is None:
-            created = created.replace(tzinfo=_utc_tz.utc)
-        if updated is not None and updated.tzinfo is None:
-            updated = updated.replace(tzinfo=_utc_tz.utc)
-        out.append({
-            "id": r.id,
-            "service_id": r.service_id,
-            "professional_id": r.professional_id,
-            "start": start.isoformat() if hasattr(start, "isoformat") else start,
-            "end": end.isoformat() if hasattr(end, "isoformat") else end,
-            "google_event_id": r.google_event_id,
-            "google_calendar_id": r.google_calendar_id,
-            "customer_name": getattr(r, "customer_name", None),
-            "customer_email": getattr(r, "customer_email", None),
-            "customer_phone": getattr(r, "customer_phone", None),
-            "notes": getattr(r, "notes", None),
-            "created_at": created.isoformat() if created else None,
-            "updated_at": updated.isoformat() if updated else None,
-            "sync_status": getattr(r, "sync_status", None),
-            "sync_job_id": getattr(r, "sync_job_id", None),
-            "sync_last_error": getattr(r, "sync_last_error", None),
-            "sync_updated_at": getattr(r, "sync_updated_at", None).isoformat() if getattr(r, "sync_updated_at", None) else None,
-        })
-    return out
+    return [_reservation_to_dict(r) for r in rows]
 
 
 @router.get("/reservations/{reservation_id}/sync", response_model=ReservationSyncStatusOut)
@@ -262,11 +286,50 @@ def get_reservation_sync_status(
         sync_updated_at=reservation.sync_updated_at,
     )
 
+async def _cancel_in_writer(writer: DBWriter, reservation_id: str) -> ActionResult:
+    """Cancela la reserva en el escritor único y encola el borrado del evento."""
+    logger.info("Cancel reservation requested: id=%s", reservation_id)
+
+    def _cancel(session: Session) -> int:
+        r = find_reservation(session, reservation_id)
+        if not r:
+            raise HTTPException(status_code=404, detail="La reserva no existe")
+        payload_sync = {"drop_calendar": False}
+        if getattr(r, "google_event_id", None):
+            payload_sync["event_id"] = r.google_event_id
+        if getattr(r, "google_calendar_id", None):
+            payload_sync["calendar_id"] = r.google_calendar_id
+        # Outbox: la cancelación, su trabajo de sincronización y `sync_status` van en un solo commit.
+        if not cancel_reservation(session, reservation_id, commit=False):
+            raise HTTPException(status_code=500, detail="No se pudo cancelar la reserva")
+        job = stage_calendar_job(
+            session,
+            reservation_id=reservation_id,
+            action=CalendarSyncAction.DELETE,
+            payload=payload_sync,
+            reservation=r,
+        )
+        return job.id
+
+    try:
+        sync_job_id = await writer.run_async(_cancel)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception("No se pudo cancelar la reserva %s", reservation_id)
+        raise HTTPException(status_code=500, detail="No se pudo cancelar la reserva") from exc
+    logger.info("Reservation cancelled: id=%s", reservation_id)
+    try:
+        RESERVATIONS_CANCELLED.inc()
+    except Exception:
+        pass
+    return ActionResult(ok=True, message=f"Reserva {reservation_id} cancelada. Sincronización con Google Calendar encolada (job {sync_job_id}).")
+
 @router.post("/cancel_reservation", response_model=ActionResult)
-def cancel_reservation_post(
+async def cancel_reservation_post(
     request: Request,
     payload: dict | None = Body(None),
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ):
     require_api_key(request)
     """Cancela una reserva existente a partir del identificador recibido en el cuerpo."""
@@ -277,123 +340,26 @@ def cancel_reservation_post(
         payload = CancelReservationIn(**payload)
     except Exception:
         raise HTTPException(status_code=422, detail="Payload inválido")
-    logger.info("Cancel reservation requested: id=%s", payload.reservation_id)
-    r = find_reservation(session, payload.reservation_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="La reserva no existe")
-    ok = cancel_reservation(session, payload.reservation_id)
-    if ok:
-        logger.info("Reservation cancelled: id=%s", payload.reservation_id)
-        try:
-            RESERVATIONS_CANCELLED.inc()
-        except Exception:
-            pass
-        payload_sync = {"drop_calendar": False}
-        if getattr(r, "google_event_id", None):
-            payload_sync["event_id"] = r.google_event_id
-        if getattr(r, "google_calendar_id", None):
-            payload_sync["calendar_id"] = r.google_calendar_id
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=payload.reservation_id,
-            action=CalendarSyncAction.DELETE,
-            payload=payload_sync,
-        )
-        base = f"Reserva {payload.reservation_id} cancelada."
-        if sync_status == "queued":
-            suffix = " Sincronización con Google Calendar encolada."
-            if sync_job_id is not None:
-                suffix = f"{suffix[:-1]} (job {sync_job_id})."
-        else:
-            suffix = " No se pudo encolar la sincronización con Google Calendar; revísalo manualmente."
-        sync_error = None if sync_status == "queued" else suffix.strip()
-        try:
-            session.refresh(r)
-        except Exception:
-            pass
-        try:
-            r.sync_status = sync_status
-            r.sync_job_id = sync_job_id
-            r.sync_last_error = sync_error
-            r.sync_updated_at = datetime.now(timezone.utc)
-            session.add(r)
-            session.commit()
-        except Exception:
-            session.rollback()
-        return ActionResult(ok=True, message=f"{base}{suffix}")
-    raise HTTPException(status_code=500, detail="No se pudo cancelar la reserva")
+    return await _cancel_in_writer(writer, payload.reservation_id)
 
 @router.delete("/reservations/{reservation_id}", response_model=ActionResult)
-def cancel_reservation_delete(
+async def cancel_reservation_delete(
     reservation_id: str,
     request: Request,
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ):
     require_api_key(request)
     """Cancela una reserva existente a partir del identificador en la URL."""
-    logger.info("Cancel reservation requested: id=%s", reservation_id)
-    r = find_reservation(session, reservation_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="La reserva no existe")
-    ok = cancel_reservation(session, reservation_id)
-    if ok:
-        logger.info("Reservation cancelled: id=%s", reservation_id)
-        try:
-            RESERVATIONS_CANCELLED.inc()
-        except Exception:
-            pass
-        payload_sync = {"drop_calendar": False}
-        if getattr(r, "google_event_id", None):
-            payload_sync["event_id"] = r.google_event_id
-        if getattr(r, "google_calendar_id", None):
-            payload_sync["calendar_id"] = r.google_calendar_id
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=reservation_id,
-            action=CalendarSyncAction.DELETE,
-            payload=payload_sync,
-        )
-        base = f"Reserva {reservation_id} cancelada."
-        if sync_status == "queued":
-            suffix = " Sincronización con Google Calendar encolada."
-            if sync_job_id is not None:
-                suffix = f"{suffix[:-1]} (job {sync_job_id})."
-        else:
-            suffix = " No se pudo encolar la sincronización con Google Calendar; revísalo manualmente."
-        sync_error = None if sync_status == "queued" else suffix.strip()
-        try:
-            session.refresh(r)
-        except Exception:
-            pass
-        try:
-            r.sync_status = sync_status
-            r.sync_job_id = sync_job_id
-            r.sync_last_error = sync_error
-            r.sync_updated_at = datetime.now(timezone.utc)
-            session.add(r)
-            session.commit()
-        except Exception:
-            session.rollback()
-        return ActionResult(ok=True, message=f"{base}{suffix}")
-    raise HTTPException(status_code=500, detail="No se pudo cancelar la reserva")
+    return await _cancel_in_writer(writer, reservation_id)
 
 @router.post("/reschedule", response_model=RescheduleOut)
-def reschedule_post(
+async def reschedule_post(
     request: Request,
     payload: dict | None = Body(None),
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ):
     require_api_key(request)
     """Reprograma una reserva validando horario, solapes y sincronización con Google Calendar."""
-    # Serializa escrituras en SQLite para evitar condiciones de carrera
-    try:
-        if str(engine.url).startswith("sqlite"):
-            try:
-                session.exec(_sql_text("BEGIN IMMEDIATE"))
-            except Exception:
-                pass
-    except Exception:
-        pass
     if payload is None:
         raise HTTPException(status_code=422, detail="Payload requerido")
     try:
@@ -401,9 +367,6 @@ def reschedule_post(
     except Exception:
         raise HTTPException(status_code=422, detail="Payload inválido")
     logger.info("Reschedule requested: id=%s new_date=%s new_time=%s new_pro=%s", payload.reservation_id, payload.new_date, payload.new_time, payload.professional_id)
-    r_prev = find_reservation(session, payload.reservation_id)
-    if not r_prev:
-        raise HTTPException(status_code=404, detail="La reserva no existe")
     if payload.new_start:
         try:
             new_start = datetime.fromisoformat(str(payload.new_start).replace("Z", "+00:00"))
@@ -424,52 +387,34 @@ def reschedule_post(
             raise HTTPException(status_code=400, detail="Fecha/hora inválidas (formato).")
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
-    ok, msg, r = apply_reschedule(session, payload)
-    if not ok or not r:
-        raise HTTPException(status_code=400, detail=msg)
-    calendar_id = getattr(r, "google_calendar_id", None) or get_calendar_for_professional(r.professional_id)
-    sync_status = "skipped"
-    sync_job_id: Optional[int] = None
-    if r.google_event_id and calendar_id:
-        payload_sync = {"calendar_id": calendar_id, "event_id": r.google_event_id}
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=r.id,
-            action=CalendarSyncAction.UPDATE,
-            payload=payload_sync,
-        )
-    else:
-        payload_sync = {"calendar_id": calendar_id} if calendar_id else None
-        sync_status, sync_job_id = try_enqueue_calendar_job(
-            session,
-            reservation_id=r.id,
-            action=CalendarSyncAction.CREATE,
-            payload=payload_sync,
-        )
-    session.refresh(r)
-    message_out = msg if (isinstance(msg, str) and "Reprogramada" in msg) else f"Reprogramada: {msg}"
-    if sync_status == "queued":
-        message_out = f"{message_out} Sincronización con Google Calendar encolada."
-    elif sync_status == "skipped":
-        message_out = f"{message_out} No se pudo encolar la actualización en Google Calendar; revísalo manualmente."
-    sync_error = None if sync_status == "queued" else (
-        "No se pudo encolar la sincronización con Google Calendar; revísalo manualmente."
-        if sync_status == "skipped"
-        else None
-    )
-    try:
-        session.refresh(r)
-    except Exception:
-        pass
+    def _reschedule(session: Session) -> tuple[str, ReservationDB, int]:
+        # Corre en el escritor único: la comprobación de solape y el UPDATE no se intercalan con otra escritura.
+        ok, msg, r = apply_reschedule(session, payload, commit=False)
+        if not ok or not r:
+            raise HTTPException(status_code=400, detail=msg)
+        calendar_id = getattr(r, "google_calendar_id", None) or get_calendar_for_professional(r.professional_id)
+        if r.google_event_id and calendar_id:
+            action = CalendarSyncAction.UPDATE
+            payload_sync = {"calendar_id": calendar_id, "event_id": r.google_event_id}
+        else:
+            action = CalendarSyncAction.CREATE
+            payload_sync = {"calendar_id": calendar_id} if calendar_id else None
+        # Outbox: la reprogramación, su trabajo de sincronización y `sync_status` van en un solo commit.
+        job = stage_calendar_job(session, reservation_id=r.id, action=action, payload=payload_sync, reservation=r)
+        return msg, r, job.id
+
     try:
-        r.sync_status = sync_status
-        r.sync_job_id = sync_job_id
-        r.sync_last_error = sync_error
-        r.sync_updated_at = datetime.now(timezone.utc)
-        session.add(r)
-        session.commit()
-    except Exception:
-        session.rollback()
+        msg, r, sync_job_id = await writer.run_async(_reschedule)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        if is_overlap_violation(exc):
+            raise HTTPException(status_code=400, detail="El profesional ya tiene esa hora ocupada.")
+        logger.exception("No se pudo reprogramar la reserva %s", payload.reservation_id)
+        raise HTTPException(status_code=500, detail="No se pudo reprogramar la reserva") from exc
+    sync_status = "queued"
+    message_out = msg if (isinstance(msg, str) and "Reprogramada" in msg) else f"Reprogramada: {msg}"
+    message_out = f"{message_out} Sincronización con Google Calendar encolada."
     logger.info("Reservation rescheduled: id=%s start=%s end=%s pro=%s", r.id, r.start.isoformat(), r.end.isoformat(), r.professional_id)
     return RescheduleOut(
         ok=True,
@@ -482,20 +427,41 @@ def reschedule_post(
     )
 
 @router.post("/reservations/reschedule", response_model=RescheduleOut)
-def reschedule_post_alias(
+async def reschedule_post_alias(
     request: Request,
     payload: dict | None = Body(None),
-    session: Session = Depends(get_session),
+    writer: DBWriter = Depends(get_writer),
 ):
     """Alias legada del endpoint de reprogramación."""
     if payload is None:
         raise HTTPException(status_code=422, detail="Payload requerido")
-    return reschedule_post(request, payload, session)
+    return await reschedule_post(request, payload, writer)
+
+async def _prefetch_gcal_busy(
+    service_id: str,
+    professional_id: Optional[str],
+    first_day: date,
+    last_day: date,
+    use_gcal_override: Optional[bool] = None,
+) -> Optional[Dict[str, Dict[date, list]]]:
+    """Ocupación de GCal para las rutas async; None si ningún profesional la usa.
+
+    freeBusy se pide con el cliente async (tras la caché de ventanas), sin
+    ocupar hilos; el cálculo de huecos recibe el resultado ya hecho.
+    """
+    pro_ids = pros_using_gcal_busy(service_id, professional_id, use_gcal_override)
+    if not pro_ids:
+        return None
+    busy = await collect_gcal_busy_for_range_async(pro_ids, first_day, last_day, use_gcal_override=use_gcal_override)
+    # Incluimos también a quien no tiene eventos para que nadie vuelva a consultarse.
+    return {pid: busy.get(pid, {}) for pid in pro_ids}
+
 
 @router.post("/slots", response_model=SlotsOut)
-def get_slots(q: SlotsQuery, session: Session = Depends(get_session)):
+async def get_slots(q: SlotsQuery, session: AsyncSession = Depends(get_async_session)):
     """Calcula los huecos disponibles para un servicio en una fecha concreta."""
     logger.info("Slots query: service=%s date=%s pro=%s", q.service_id, q.date_str, q.professional_id)
+    await ensure_catalog_loaded()
     try:
         d = datetime.strptime(q.date_str, "%Y-%m-%d").date()
     except ValueError:
@@ -513,7 +479,7 @@ def get_slots(q: SlotsQuery, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="service_id no existe")
     if q.professional_id and not get_professional_by_id(q.professional_id):
         raise HTTPException(status_code=404, detail="professional_id no existe")
-    avail = find_available_slots(session, q.service_id, d, q.professional_id, use_gcal_busy_override=False)
+    avail = await session.run_sync(find_available_slots, q.service_id, d, q.professional_id, use_gcal_busy_override=False)
     # Filtrar horas ya pasadas si es el día de hoy
     if d == today:
         now_local = now_tz().replace(tzinfo=None)
@@ -522,8 +488,9 @@ def get_slots(q: SlotsQuery, session: Session = Depends(get_session)):
 
 
 @router.post("/slots/days", response_model=DaysAvailabilityOut)
-def get_days_availability(body: DaysAvailabilityIn, session: Session = Depends(get_session)):
+async def get_days_availability(body: DaysAvailabilityIn, session: AsyncSession = Depends(get_async_session)):
     """Enumera los días del rango que aún tienen huecos disponibles."""
+    await ensure_catalog_loaded()
     try:
         get_service_by_id(body.service_id)
     except KeyError:
@@ -536,43 +503,22 @@ def get_days_availability(body: DaysAvailabilityIn, session: Session = Depends(g
     if (body.end - body.start).days > 62:
         raise HTTPException(status_code=400, detail="Rango demasiado grande (máx. 62 días)")
     today = now_tz().date()
-
-    if body.professional_id:
-        pro_ids_for_service = [body.professional_id]
-    else:
-        pro_ids_for_service = [
-            p.id for p in get_active_professionals() if body.service_id in (p.services or [])
-        ]
-    gcal_busy_range: Dict[str, Dict[date, List[Tuple[datetime, datetime]]]] = {}
-
-    available_days: list[str] = []
-    d = body.start
-    while d <= body.end:
-        if d >= today and d <= today + timedelta(days=MAX_AHEAD_DAYS):
-            precomputed_busy: Optional[Dict[str, List[Tuple[datetime, datetime]]]] = None
-            if gcal_busy_range:
-                busy_map: Dict[str, List[Tuple[datetime, datetime]]] = {}
-                for pid in pro_ids_for_service:
-                    intervals = gcal_busy_range.get(pid, {}).get(d, [])
-                    if intervals:
-                        busy_map[pid] = intervals
-                if busy_map:
-                    precomputed_busy = busy_map
-
-            slots = find_available_slots(
-                session,
-                body.service_id,
-                d,
-                body.professional_id,
-                use_gcal_busy_override=body.use_gcal,
-                precomputed_busy=precomputed_busy,
-            )
-            if d == today:
-                now_local = now_tz().replace(tzinfo=None)
-                slots = [dt for dt in slots if dt >= now_local]
-            if slots:
-                available_days.append(d.isoformat())
-        d += timedelta(days=1)
+    first_day = max(body.start, today)
+    last_day = min(body.end, today + timedelta(days=MAX_AHEAD_DAYS))
+    gcal_busy = None
+    if first_day <= last_day:
+        gcal_busy = await _prefetch_gcal_busy(body.service_id, body.professional_id, first_day, last_day, body.use_gcal)
+    days = await session.run_sync(
+        find_available_days,
+        body.service_id,
+        first_day,
+        last_day,
+        body.professional_id,
+        use_gcal_busy_override=body.use_gcal,
+        not_before=now_tz().replace(tzinfo=None),
+        gcal_busy=gcal_busy,
+    )
+    available_days = [d.isoformat() for d in days]
     return DaysAvailabilityOut(service_id=body.service_id, start=body.start, end=body.end, professional_id=body.professional_id, available_days=available_days)
 
 def _naive(dt: datetime) -> datetime:
@@ -581,10 +527,11 @@ def _naive(dt: datetime) -> datetime:
     return dt
 
 @router.post("/reservations", response_model=ReservationCreateOut)
-def create_reservation(
+async def create_reservation(
     request: Request,
     payload: dict | None = Body(None),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
+    writer: DBWriter = Depends(get_writer),
 ):
     if not PUBLIC_RESERVATIONS_ENABLED:
         require_api_key(request)
@@ -596,6 +543,7 @@ def create_reservation(
     except Exception:
         raise HTTPException(status_code=422, detail="Payload inválido")
     logger.info("Create reservation: service=%s pro=%s start=%s", payload.service_id, payload.professional_id, payload.start.isoformat())
+    await ensure_catalog_loaded()
     try:
         service = get_service_by_id(payload.service_id)
     except KeyError:
@@ -620,28 +568,19 @@ def create_reservation(
     if not customer_phone:
         raise HTTPException(status_code=422, detail="Se requiere un teléfono de contacto")
     # Recalcular disponibilidad garantiza que el slot sigue libre tras la validación inicial.
-    avail = find_available_slots(session, payload.service_id, start.date(), payload.professional_id)
+    gcal_busy = await _prefetch_gcal_busy(payload.service_id, payload.professional_id, start.date(), start.date())
+    precomputed = {pid: by_day.get(start.date(), []) for pid, by_day in gcal_busy.items()} if gcal_busy is not None else None
+    avail = await session.run_sync(find_available_slots, payload.service_id, start.date(), payload.professional_id, precomputed_busy=precomputed)
     avail_naive = [_naive(dt) for dt in avail]
     if _naive(start) not in avail_naive:
         raise HTTPException(status_code=400, detail="Ese inicio no está disponible (horario o solapado). Consulta /slots.")
     res_id = str(uuid.uuid4())
     cal_id = get_calendar_for_professional(payload.professional_id)
 
-    # NOTA: bloqueamos la tabla para evitar condiciones de carrera en SQLite.
-    try:
-        if str(engine.url).startswith("sqlite"):
-            try:
-                session.exec(_sql_text("BEGIN IMMEDIATE"))
-            except Exception:
-                pass
-        q = select(ReservationDB).where(
-            ReservationDB.professional_id == payload.professional_id,
-            ReservationDB.start < end,
-            ReservationDB.end > start,
-            ReservationDB.status != "cancelada",
-        )
-        if session.exec(q).first():
-            session.rollback()
+    def _insert(session: Session) -> int:
+        # Corre en el escritor único, sin otra escritura intercalada; en Postgres la
+        # restricción de exclusión cubre además las escrituras de otros nodos.
+        if has_overlapping_reservation(session, payload.professional_id, start, end):
             raise HTTPException(status_code=400, detail="El profesional ya tiene esa hora ocupada.")
         row = ReservationDB(
             id=res_id,
@@ -657,38 +596,30 @@ def create_reservation(
             notes=notes,
         )
         session.add(row)
-        session.commit()
-        try:
-            RESERVATIONS_CREATED.inc()
-        except Exception:
-            pass
+        # Outbox: la reserva, su trabajo de sincronización y `sync_status` van en un solo commit.
+        job = stage_calendar_job(
+            session,
+            reservation_id=res_id,
+            action=CalendarSyncAction.CREATE,
+            payload={"calendar_id": cal_id} if cal_id else None,
+            reservation=row,
+        )
+        return job.id
+
+    try:
+        sync_job_id = await writer.run_async(_insert)
     except HTTPException:
         raise
     except Exception as e:
-        session.rollback()
+        if is_overlap_violation(e):
+            raise HTTPException(status_code=400, detail="El profesional ya tiene esa hora ocupada.")
         raise HTTPException(status_code=500, detail=f"No se pudo guardar la reserva: {e}")
-
-    sync_status, sync_job_id = try_enqueue_calendar_job(
-        session,
-        reservation_id=res_id,
-        action=CalendarSyncAction.CREATE,
-        payload={"calendar_id": cal_id} if cal_id else None,
-    )
-
-    sync_error = None if sync_status == "queued" else "No se pudo encolar la sincronización en Google Calendar; revísalo manualmente."
+    invalidate_availability(payload.professional_id, start, end)
     try:
-        session.refresh(row)
+        RESERVATIONS_CREATED.inc()
     except Exception:
         pass
-    try:
-        row.sync_status = sync_status
-        row.sync_job_id = sync_job_id
-        row.sync_last_error = sync_error
-        row.sync_updated_at = datetime.now(timezone.utc)
-        session.add(row)
-        session.commit()
-    except Exception:
-        session.rollback()
+    sync_status = "queued"
 
     message = _build_public_create_message(res_id, sync_status, sync_job_id)
     payload_out = ReservationCreateOut(
@@ -791,6 +722,9 @@ def admin_sql_execute(
     except Exception as exc:  # noqa: BLE001
         logger.exception("Error ejecutando SQL administrativo")
         raise HTTPException(status_code=400, detail=f"Error al ejecutar la sentencia: {exc}") from exc
+    finally:
+        # NOTA: el SQL manual puede tocar reservas, estilistas u horarios; descartamos las cachés.
+        invalidate_catalog_cache()
 
 
 class AdminSyncIn(BaseModel):
@@ -802,6 +736,8 @@ class AdminSyncIn(BaseModel):
     calendar_id: str | None = None
     professional_id: str | None = None
     default_service: str | None = None
+    incremental: bool | None = False
+    background: bool | None = False
 
 
 @router.get("/admin/calendar-jobs", response_model=CalendarJobListOut)
@@ -862,6 +798,7 @@ def admin_calendar_job_retry(
     if payload and payload.delay_seconds is not None:
         delay_seconds = max(0, int(payload.delay_seconds))
     now_utc = datetime.now(timezone.utc)
+    previous_status = job.status
     job.status = "pending"
     job.locked_by = None
     job.locked_at = None
@@ -878,7 +815,8 @@ def admin_calendar_job_retry(
         reservation.sync_updated_at = now_utc
         session.add(reservation)
         session.commit()
-    refresh_queue_metrics()
+    track_queue_transition(previous_status, "pending")
+    notify_queue()
     if delay_seconds:
         return ActionResult(
             ok=True,
@@ -887,21 +825,53 @@ def admin_calendar_job_retry(
     return ActionResult(ok=True, message=f"Trabajo {job_id} reencolado y listo para ejecutar.")
 
 
-@router.post("/admin/sync")
-def admin_sync(body: AdminSyncIn | None = None, session: Session = Depends(get_session), _=Depends(require_api_key)):
-    """Sincroniza la BD con Google Calendar: importa, exporta o ambos según `mode`."""
-    from datetime import date, timedelta
-    body = body or AdminSyncIn()
+def _admin_range(start_s: str | None, end_s: str | None, days: int | None) -> tuple[date, date]:
+    start = date.fromisoformat(start_s) if start_s else date.today()
+    if end_s:
+        return start, date.fromisoformat(end_s)
+    days = days if days and days > 0 else 7
+    return start, start + timedelta(days=max(0, days - 1))
+
+
+def _run_in_background(kind: str, params: dict, bind, run) -> JSONResponse:
+    """Lanza `run(session, progress)` como trabajo de `/admin/jobs` y responde 202 con su id.
+
+    El trabajo abre su propia sesión sobre el mismo engine que la petición.
+    """
+    def _job(progress):
+        if bind is None:
+            return run(None, progress)
+        with Session(bind) as job_session:
+            return run(job_session, progress)
+
+    job = get_admin_jobs().submit(kind, _job, params=params)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "ok": True,
+            "job_id": job.id,
+            "kind": kind,
+            "status_url": f"/admin/jobs/{job.id}",
+            "events_url": f"/admin/jobs/{job.id}/events",
+        },
+    )
+
+
+def _admin_sync_payload(session: Session, body: AdminSyncIn, start: date, end: date, progress=None) -> dict:
     mode = (body.mode or "import").lower()
-    start = date.fromisoformat(body.start) if body.start else date.today()
-    if body.end:
-        end = date.fromisoformat(body.end)
-    else:
-        days = body.days if body.days and body.days > 0 else 7
-        end = start + timedelta(days=max(0, days - 1))
     by_prof = True if body.by_professional is None else bool(body.by_professional)
     results: dict[str, dict] = {}
-    if mode in ("import", "both"):
+    if mode in ("import", "both") and body.incremental:
+        results["import"] = sync_from_gcal_incremental(
+            session,
+            default_service=body.default_service or "corte_cabello",
+            by_professional=by_prof,
+            calendar_id=body.calendar_id,
+            professional_id=body.professional_id,
+            full_sync_from=start,
+            progress=progress,
+        )
+    elif mode in ("import", "both"):
         results["import"] = sync_from_gcal_range(
             session,
             start,
@@ -910,6 +880,7 @@ def admin_sync(body: AdminSyncIn | None = None, session: Session = Depends(get_s
             by_professional=by_prof,
             calendar_id=body.calendar_id,
             professional_id=body.professional_id,
+            progress=progress,
         )
     if mode in ("push", "both"):
         results["push"] = reconcile_db_to_gcal_range(
@@ -919,6 +890,7 @@ def admin_sync(body: AdminSyncIn | None = None, session: Session = Depends(get_s
             by_professional=by_prof,
             calendar_id=body.calendar_id,
             professional_id=body.professional_id,
+            progress=progress,
         )
 
     per_task_ok = {name: res.get("ok", True) for name, res in results.items()}
@@ -939,6 +911,24 @@ def admin_sync(body: AdminSyncIn | None = None, session: Session = Depends(get_s
         payload["errors"] = errors
     return payload
 
+
+@router.post("/admin/sync")
+def admin_sync(body: AdminSyncIn | None = None, session: Session = Depends(get_session), _=Depends(require_api_key)):
+    """Sincroniza la BD con Google Calendar: importa, exporta o ambos según `mode`.
+
+    Con `background: true` responde 202 con el id de un trabajo de `/admin/jobs`.
+    """
+    body = body or AdminSyncIn()
+    start, end = _admin_range(body.start, body.end, body.days)
+    if body.background:
+        return _run_in_background(
+            "sync",
+            body.model_dump(exclude={"background"}, exclude_none=True),
+            session.get_bind(),
+            lambda job_session, progress: _admin_sync_payload(job_session, body, start, end, progress),
+        )
+    return _admin_sync_payload(session, body, start, end)
+
 class AdminConflictsIn(BaseModel):
     start: str | None = None
     end: str | None = None
@@ -946,21 +936,86 @@ class AdminConflictsIn(BaseModel):
     by_professional: bool | None = True
     calendar_id: str | None = None
     professional_id: str | None = None
+    background: bool | None = False
 
 @router.post("/admin/conflicts")
 def admin_conflicts(body: AdminConflictsIn | None = None, session: Session = Depends(get_session), _=Depends(require_api_key)):
-    """Detecta discrepancias entre la BD y Google Calendar en el rango solicitado."""
-    from datetime import date, timedelta
+    """Detecta discrepancias entre la BD y Google Calendar en el rango solicitado.
+
+    Con `background: true` responde 202 con el id de un trabajo de `/admin/jobs`.
+    """
     body = body or AdminConflictsIn()
-    start = date.fromisoformat(body.start) if body.start else date.today()
-    if body.end:
-        end = date.fromisoformat(body.end)
-    else:
-        days = body.days if body.days and body.days > 0 else 7
-        end = start + timedelta(days=max(0, days - 1))
+    start, end = _admin_range(body.start, body.end, body.days)
     by_prof = True if body.by_professional is None else bool(body.by_professional)
-    summary = detect_conflicts_range(session, start, end, by_professional=by_prof, calendar_id=body.calendar_id, professional_id=body.professional_id)
-    return {"ok": bool(summary.get("ok")), "range": (start.isoformat(), end.isoformat()), **summary}
+
+    def _run(job_session: Session, progress=None) -> dict:
+        summary = detect_conflicts_range(job_session, start, end, by_professional=by_prof, calendar_id=body.calendar_id, professional_id=body.professional_id, progress=progress)
+        return {"ok": bool(summary.get("ok")), "range": (start.isoformat(), end.isoformat()), **summary}
+
+    if body.background:
+        return _run_in_background("conflicts", body.model_dump(exclude={"background"}, exclude_none=True), session.get_bind(), _run)
+    return _run(session)
+
+@router.post("/gcal/notifications")
+def gcal_notifications(request: Request, session: Session = Depends(get_session)):
+    """Webhook de los canales `events.watch` de Google; se autentica con el token del canal."""
+    result = handle_notification(session, request.headers)
+    if result is None:
+        raise HTTPException(status_code=403, detail="Canal de notificación desconocido")
+    return {"ok": True, "result": result}
+
+class AdminWatchIn(BaseModel):
+    address: str | None = None
+    calendar_ids: list[str] | None = None
+    ttl_seconds: int | None = None
+    renew_before_seconds: int | None = None
+
+@router.get("/admin/gcal/watch")
+def admin_list_watch_channels(session: Session = Depends(get_session), _=Depends(require_api_key)):
+    """Lista los canales de notificación vigentes (sin su token)."""
+    rows = session.exec(
+        select(CalendarWatchChannelDB)
+        .where(CalendarWatchChannelDB.stopped_at.is_(None))
+        .order_by(CalendarWatchChannelDB.calendar_id)
+    ).all()
+    return {
+        "ok": True,
+        "channels": [
+            {
+                "id": ch.id,
+                "calendar_id": ch.calendar_id,
+                "address": ch.address,
+                "expiration": ch.expiration.isoformat() if ch.expiration else None,
+                "created_at": ch.created_at.isoformat() if ch.created_at else None,
+            }
+            for ch in rows
+        ],
+    }
+
+@router.post("/admin/gcal/watch")
+def admin_ensure_watch_channels(body: AdminWatchIn | None = None, session: Session = Depends(get_session), _=Depends(require_api_key)):
+    """Abre o renueva los canales de notificación (por defecto hacia `GCAL_WATCH_ADDRESS`)."""
+    body = body or AdminWatchIn()
+    address = (body.address or os.getenv("GCAL_WATCH_ADDRESS") or "").strip()
+    if not address:
+        return {"ok": False, "error": "address requerida (o define GCAL_WATCH_ADDRESS)"}
+    renew_before = body.renew_before_seconds if body.renew_before_seconds is not None else int(os.getenv("GCAL_WATCH_RENEW_BEFORE_SECONDS", "86400"))
+    return ensure_watch_channels(
+        session,
+        address,
+        calendars=body.calendar_ids or None,
+        ttl_seconds=body.ttl_seconds,
+        renew_before=timedelta(seconds=max(0, renew_before)),
+    )
+
+@router.delete("/admin/gcal/watch")
+def admin_stop_watch_channels(session: Session = Depends(get_session), _=Depends(require_api_key)):
+    """Cierra todos los canales de notificación vigentes."""
+    rows = session.exec(select(CalendarWatchChannelDB).where(CalendarWatchChannelDB.stopped_at.is_(None))).all()
+    for ch in rows:
+        stop_watch_channel(session, ch)
+    session.commit()
+    return {"ok": True, "stopped": len(rows)}
 
 class AdminClearCalendarsIn(BaseModel):
     by_professional: bool | None = True
@@ -971,12 +1026,16 @@ class AdminClearCalendarsIn(BaseModel):
     only_pelubot: bool | None = False
     dry_run: bool | None = True
     confirm: str | None = None
+    background: bool | None = False
 
 from app.integrations.google_calendar import build_calendar, clear_calendar, list_events_allpages, delete_event
 
 @router.post("/admin/clear_calendars")
 def admin_clear_calendars(body: AdminClearCalendarsIn | None = None, _=Depends(require_api_key)):
-    """Limpia calendarios de Google con opciones de dry-run y filtro por eventos de PeluBot."""
+    """Limpia calendarios de Google con opciones de dry-run y filtro por eventos de PeluBot.
+
+    Con `background: true` responde 202 con el id de un trabajo de `/admin/jobs`.
+    """
     body = body or AdminClearCalendarsIn()
     if not (body.dry_run or (body.confirm and body.confirm.upper() == "DELETE")):
         return {"ok": False, "error": "Confirmación requerida: confirm='DELETE' o dry_run=true"}
@@ -996,12 +1055,95 @@ def admin_clear_calendars(body: AdminClearCalendarsIn | None = None, _=Depends(r
         svc = build_calendar()
     except Exception as e:
         return {"ok": False, "error": f"gcal client: {e}"}
-    results = {}; total_deleted = total_listed = total_skipped = 0
-    for cal in cals:
-        res = clear_calendar(svc, cal, time_min=tmin, time_max=tmax, only_pelubot=bool(body.only_pelubot), dry_run=bool(body.dry_run))
-        results[cal] = res
-        total_deleted += res.get("deleted", 0); total_listed += res.get("total_listed", 0); total_skipped += res.get("skipped", 0)
-    return {"ok": True, "dry_run": bool(body.dry_run), "only_pelubot": bool(body.only_pelubot), "calendars": cals, "range": (body.start, body.end), "totals": {"listed": total_listed, "deleted": total_deleted, "skipped": total_skipped}, "results": results}
+
+    def _run(_session, progress=None) -> dict:
+        results = {}; total_deleted = total_listed = total_skipped = 0
+        for done, cal in enumerate(cals, start=1):
+            res = clear_calendar(svc, cal, time_min=tmin, time_max=tmax, only_pelubot=bool(body.only_pelubot), dry_run=bool(body.dry_run))
+            if not body.dry_run:
+                invalidate_freebusy(cal)
+            results[cal] = res
+            total_deleted += res.get("deleted", 0); total_listed += res.get("total_listed", 0); total_skipped += res.get("skipped", 0)
+            if progress is not None:
+                progress({"stage": "clear", "calendar": cal, "done": done, "total": len(cals), "listed": res.get("total_listed", 0), "deleted": res.get("deleted", 0), "skipped": res.get("skipped", 0)})
+        return {"ok": True, "dry_run": bool(body.dry_run), "only_pelubot": bool(body.only_pelubot), "calendars": cals, "range": (body.start, body.end), "totals": {"listed": total_listed, "deleted": total_deleted, "skipped": total_skipped}, "results": results}
+
+    if body.background:
+        return _run_in_background("clear_calendars", body.model_dump(exclude={"background", "confirm"}, exclude_none=True), None, _run)
+    return _run(None)
+
+# --- Trabajos de administración en segundo plano ---
+ADMIN_JOBS_KEEPALIVE_SECONDS = float(os.getenv("ADMIN_JOBS_KEEPALIVE_SECONDS", "15"))
+
+
+def _admin_job_or_404(job_id: str):
+    job = get_admin_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+@router.get("/admin/jobs")
+def admin_jobs(_=Depends(require_api_key)):
+    """Lista los trabajos de administración recientes (más nuevos primero)."""
+    return {"ok": True, "jobs": [job.summary() for job in get_admin_jobs().list()]}
+
+@router.get("/admin/jobs/{job_id}")
+def admin_job_status(job_id: str, _=Depends(require_api_key)):
+    """Estado, contadores de progreso y resultado de un trabajo."""
+    return {"ok": True, "job": _admin_job_or_404(job_id).summary()}
+
+@router.get("/admin/jobs/{job_id}/events")
+def admin_job_events(
+    job_id: str,
+    request: Request,
+    format: Optional[str] = Query(default=None, pattern="^(ndjson|sse)$", description="ndjson (por defecto) o sse"),
+    after: int = Query(default=0, ge=0, description="Solo eventos con seq mayor que este"),
+    _=Depends(require_api_key),
+):
+    """Progreso en directo del trabajo; termina con una línea `result` al acabar.
+
+    NDJSON por defecto; SSE con `format=sse` o `Accept: text/event-stream`
+    (admite `Last-Event-ID` para reanudar).
+    """
+    _admin_job_or_404(job_id)
+    registry = get_admin_jobs()
+    sse = format == "sse" or (format is None and "text/event-stream" in request.headers.get("accept", ""))
+    last_event_id = request.headers.get("last-event-id", "")
+    if sse and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    def _line(event: dict) -> str:
+        data = json.dumps(event, default=str)
+        if not sse:
+            return data + "\n"
+        seq = f"id: {event['seq']}\n" if event.get("seq") else ""
+        return f"{seq}event: {event['type']}\ndata: {data}\n\n"
+
+    def _stream():
+        seq = after
+        while True:
+            events, finished = registry.wait_events(job_id, seq, ADMIN_JOBS_KEEPALIVE_SECONDS)
+            for event in events:
+                seq = event["seq"]
+                yield _line(event)
+            if finished:
+                job = registry.get(job_id)
+                yield _line({"type": "result", "job": job.summary() if job else None})
+                return
+            if not events:
+                yield ": keepalive\n\n" if sse else _line({"type": "keepalive"})
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(_stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.post("/admin/jobs/{job_id}/cancel")
+def admin_job_cancel(job_id: str, _=Depends(require_api_key)):
+    """Pide cancelar un trabajo; se detiene al terminar el calendario o lote en curso."""
+    job = _admin_job_or_404(job_id)
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"El trabajo ya terminó ({job.status})")
+    job = get_admin_jobs().cancel(job_id)
+    return {"ok": True, "job": job.summary()}
 
 # --- Wipe de reservas en BD (peligroso) ---
 class AdminWipeReservationsIn(BaseModel):
@@ -1066,6 +1208,7 @@ def admin_cleanup_orphans(body: AdminCleanupOrphansIn | None = None, session: Se
                 if not body.dry_run:
                     try:
                         delete_event(svc, cal, ev_id)
+                        invalidate_freebusy(cal)
                         deleted += 1
                     except Exception:
                         skipped += 1
@@ -1082,6 +1225,7 @@ def admin_wipe_reservations(body: AdminWipeReservationsIn | None = None, session
     try:
         session.exec(sa_delete(ReservationDB))
         session.commit()
+        clear_availability_cache()
         return {"ok": True, "message": "Todas las reservas eliminadas"}
     except Exception as e:
         session.rollback()
@@ -1114,17 +1258,11 @@ def admin_db_info(session: Session = Depends(get_session), _=Depends(require_api
     first = min((r.start for r in count), default=None)
     last = max((r.start for r in count), default=None)
     pragma = {}
-    if is_sqlite:
-        try:
-            with engine.connect() as conn:
-                res = conn.exec_driver_sql("PRAGMA journal_mode;").scalar()
-                pragma["journal_mode"] = res
-                res2 = conn.exec_driver_sql("PRAGMA synchronous;").scalar()
-                pragma["synchronous"] = res2
-                fk = conn.exec_driver_sql("PRAGMA foreign_keys;").scalar()
-                pragma["foreign_keys"] = fk
-        except Exception:
-            pass
+    try:
+        # PRAGMAs en SQLite; versión, tamaño y restricción de solapes en Postgres.
+        pragma = db_maintenance.settings(engine)
+    except Exception:
+        pass
     return {
         "ok": True,
         "engine_url": str(engine.url),
@@ -1139,17 +1277,13 @@ def admin_db_info(session: Session = Depends(get_session), _=Depends(require_api
 
 @router.get("/admin/db_integrity")
 def admin_db_integrity(_=Depends(require_api_key)):
-    """Ejecuta `PRAGMA integrity_check` en SQLite."""
-    """Ejecuta PRAGMA integrity_check y devuelve ok/detail.
-    Útil para verificar integridad tras operaciones o caídas.
+    """Comprueba la integridad de la BD y devuelve ok/detail.
+
+    En SQLite ejecuta `PRAGMA integrity_check`; en Postgres busca restricciones
+    sin validar e índices inválidos. Útil tras operaciones o caídas.
     """
-    is_sqlite = str(engine.url).startswith("sqlite")
-    if not is_sqlite:
-        return {"ok": False, "detail": "Solo soportado en SQLite"}
     try:
-        with engine.connect() as conn:
-            res = conn.exec_driver_sql("PRAGMA integrity_check;").scalar()
-        return {"ok": (res == "ok"), "detail": res}
+        return db_maintenance.integrity_check(engine)
     except Exception as e:
         return {"ok": False, "detail": str(e)}
 
@@ -1160,31 +1294,15 @@ class AdminDbOptimizeIn(BaseModel):
 
 @router.post("/admin/db_optimize")
 def admin_db_optimize(body: AdminDbOptimizeIn | None = None, _=Depends(require_api_key)):
-    """Lanza VACUUM/ANALYZE/PRAGMA optimize en SQLite según parámetros."""
+    """Lanza VACUUM/ANALYZE (y `PRAGMA optimize` en SQLite) según parámetros."""
     body = body or AdminDbOptimizeIn()
-    is_sqlite = str(engine.url).startswith("sqlite")
-    actions = {"vacuum": False, "analyze": False, "optimize": False}
-    if not is_sqlite:
-        return {"ok": False, "error": "Solo soportado en SQLite"}
     try:
-        with engine.connect() as conn:
-            if body.vacuum:
-                conn.exec_driver_sql("VACUUM")
-                actions["vacuum"] = True
-            if body.analyze:
-                conn.exec_driver_sql("ANALYZE")
-                actions["analyze"] = True
-            if body.optimize:
-                try:
-                    conn.exec_driver_sql("PRAGMA optimize;")
-                    actions["optimize"] = True
-                except Exception:
-                    pass
+        actions = db_maintenance.optimize(engine, vacuum=bool(body.vacuum), analyze=bool(body.analyze), optimize=bool(body.optimize))
         return {"ok": True, "actions": actions}
     except Exception as e:
-        return {"ok": False, "error": str(e), "actions": actions}
+        return {"ok": False, "error": str(e), "actions": {"vacuum": False, "analyze": False, "optimize": False}}
 
-# Checkpoint WAL (SQLite)
+# Checkpoint (WAL en SQLite, CHECKPOINT en Postgres)
 class AdminDbCheckpointOut(BaseModel):
     ok: bool
     result: list | None = None
@@ -1192,13 +1310,8 @@ class AdminDbCheckpointOut(BaseModel):
 
 @router.post("/admin/db_checkpoint", response_model=AdminDbCheckpointOut)
 def admin_db_checkpoint(_=Depends(require_api_key)):
-    """Fuerza un checkpoint WAL en SQLite."""
-    is_sqlite = str(engine.url).startswith("sqlite")
-    if not is_sqlite:
-        return AdminDbCheckpointOut(ok=False, error="Solo soportado en SQLite")
+    """Fuerza un checkpoint (WAL en SQLite; `CHECKPOINT` en Postgres)."""
     try:
-        with engine.connect() as conn:
-            res = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
-        return AdminDbCheckpointOut(ok=True, result=list(res) if res else [])
+        return AdminDbCheckpointOut(ok=True, result=db_maintenance.checkpoint(engine))
     except Exception as e:
         return AdminDbCheckpointOut(ok=False, error=str(e))
@@ -9,9 +9,9 @@ from typing import Any, Dict, Tuple
 
 import jwt
 from fastapi import Depends, HTTPException, Request, Response, status
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db import get_session
+from app.db import get_async_session
 from app.models import StylistDB
 
 logger = logging.getLogger("pelubot.auth")
@@ -108,7 +108,7 @@ def decode_stylist_session_token(token: str) -> Dict[str, Any]:
 
 async def get_current_stylist(
     request: Request,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> StylistDB:
     token = request.cookies.get(SESSION_COOKIE_NAME) or request.headers.get("X-Pro-Session")
     if not token:
@@ -119,7 +119,7 @@ async def get_current_stylist(
     stylist_id = data.get("sub")
     if not stylist_id:
         raise AuthError()
-    stylist = session.get(StylistDB, stylist_id)
+    stylist = await session.get(StylistDB, stylist_id)
     if not stylist or not stylist.is_active:
         raise AuthError()
     return stylist
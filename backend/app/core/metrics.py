@@ -5,7 +5,7 @@ from typing import Callable
 from fastapi import FastAPI, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from prometheus_client import Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
 
 
 # Métricas HTTP
@@ -27,6 +27,118 @@ RESERVATIONS_CREATED = Counter("pelubot_reservations_created_total", "Reservas c
 RESERVATIONS_RESCHEDULED = Counter("pelubot_reservations_rescheduled_total", "Reservas reprogramadas")
 RESERVATIONS_CANCELLED = Counter("pelubot_reservations_cancelled_total", "Reservas canceladas")
 
+# Caché de disponibilidad (/slots y /slots/days)
+AVAILABILITY_CACHE_HITS = Counter(
+    "pelubot_availability_cache_hits_total",
+    "Consultas de disponibilidad servidas desde la caché",
+    labelnames=("kind",),
+)
+AVAILABILITY_CACHE_MISSES = Counter(
+    "pelubot_availability_cache_misses_total",
+    "Consultas de disponibilidad que tuvieron que recalcularse",
+    labelnames=("kind",),
+)
+AVAILABILITY_CACHE_EVICTIONS = Counter(
+    "pelubot_availability_cache_evictions_total",
+    "Entradas expulsadas de la caché de disponibilidad",
+    labelnames=("reason",),
+)
+
+# Caché de free/busy de Google Calendar (por calendario consultado)
+GCAL_FREEBUSY_CACHE_HITS = Counter(
+    "pelubot_gcal_freebusy_cache_hits_total",
+    "Calendarios cuyo free/busy se sirvió desde la caché",
+)
+GCAL_FREEBUSY_CACHE_MISSES = Counter(
+    "pelubot_gcal_freebusy_cache_misses_total",
+    "Calendarios cuyo free/busy tuvo que pedirse a Google",
+)
+
+# Limitación de llamadas al API de Google Calendar (token buckets + concurrencia AIMD)
+GCAL_CONCURRENCY_LIMIT = Gauge(
+    "pelubot_gcal_concurrency_limit",
+    "Llamadas simultáneas a Google Calendar permitidas ahora por el control adaptativo",
+)
+GCAL_INFLIGHT = Gauge(
+    "pelubot_gcal_inflight_requests",
+    "Llamadas a Google Calendar en curso",
+)
+GCAL_THROTTLE_WAIT = Histogram(
+    "pelubot_gcal_throttle_wait_seconds",
+    "Espera impuesta por el limitador antes de llamar a Google Calendar",
+    labelnames=("scope",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+GCAL_RATE_LIMITED = Counter(
+    "pelubot_gcal_rate_limited_total",
+    "Respuestas de Google Calendar que indican saturación (429, 403 rateLimitExceeded, 5xx)",
+)
+
+# Notificaciones push de Google Calendar (canales events.watch)
+GCAL_WATCH_NOTIFICATIONS = Counter(
+    "pelubot_gcal_watch_notifications_total",
+    "Notificaciones push de Google Calendar recibidas",
+    labelnames=("result",),
+)
+GCAL_WATCH_PULLS = Counter(
+    "pelubot_gcal_watch_pulls_total",
+    "Importaciones incrementales lanzadas por notificaciones push",
+    labelnames=("result",),
+)
+GCAL_WATCH_PULL_DELAY = Histogram(
+    "pelubot_gcal_watch_pull_delay_seconds",
+    "Tiempo desde la primera notificación de un calendario hasta que termina su importación",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120),
+)
+
+# Trabajos de administración en segundo plano (/admin/jobs)
+ADMIN_JOBS = Counter(
+    "pelubot_admin_jobs_total",
+    "Trabajos de administración terminados por tipo y estado final",
+    labelnames=("kind", "status"),
+)
+ADMIN_JOB_DURATION = Histogram(
+    "pelubot_admin_job_duration_seconds",
+    "Duración de los trabajos de administración en segundo plano",
+    labelnames=("kind",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+)
+
+# Escritor único de SQLite (app/db.py): un commit por lote de transacciones
+DB_WRITE_COMMIT_SECONDS = Histogram(
+    "pelubot_db_write_commit_seconds",
+    "Duración de cada commit del escritor de la BD (uno por lote)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+DB_WRITE_BATCH_SIZE = Histogram(
+    "pelubot_db_write_batch_size",
+    "Transacciones confirmadas juntas en cada commit del escritor de la BD",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+DB_WRITE_QUEUE_WAIT = Histogram(
+    "pelubot_db_write_queue_wait_seconds",
+    "Espera de una transacción en la cola del escritor antes de ejecutarse",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+# Pools de conexiones (escritura, lectura y lectura async)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "pelubot_db_pool_wait_seconds",
+    "Tiempo hasta obtener una conexión del pool (incluye abrirla si hace falta)",
+    labelnames=("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "pelubot_db_pool_checked_out",
+    "Conexiones del pool en uso",
+    labelnames=("pool",),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "pelubot_db_pool_timeouts_total",
+    "Peticiones de conexión que agotaron `pool_timeout` esperando al pool",
+    labelnames=("pool",),
+)
+
 
 def _path_template(request: Request) -> str:
     try:
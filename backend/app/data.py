@@ -11,14 +11,25 @@ from __future__ import annotations
 import logging
 import os
 import time
+from array import array
 from contextlib import contextmanager
-from datetime import time as dt_time
-from typing import Dict, Iterable, List, Optional
+from datetime import date, time as dt_time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 
+import anyio.to_thread
 from sqlmodel import Session, select
 
 from app.db import engine
-from app.models import Professional, Service, ServiceCatalogDB, StylistDB
+from app.models import (
+    Professional,
+    Service,
+    ServiceCatalogDB,
+    StylistDB,
+    StylistScheduleDB,
+    StylistScheduleExceptionDB,
+)
+from app.services.availability_cache import clear_availability_cache
+from app.utils.date import now_tz
 
 logger = logging.getLogger("pelubot.data")
 
@@ -59,6 +70,9 @@ def invalidate_services_cache() -> None:
 
     _services_state["expires_at"] = 0.0
     _services_state["data"] = None
+    # La duración de los servicios determina las rejillas y los huecos cacheados.
+    invalidate_schedule_cache()
+    clear_availability_cache()
 
 
 def _services_from_rows(rows: List[ServiceCatalogDB]) -> Dict[str, object]:
@@ -176,6 +190,136 @@ WEEKLY_SCHEDULE = {
 }
 
 
+# ---------------------------------------------------------------------------
+# Horario compilado: rangos y rejillas de inicios en minutos desde medianoche
+# ---------------------------------------------------------------------------
+
+# Rangos de un día como pares (inicio, fin) en minutos desde medianoche.
+DayRanges = Tuple[Tuple[int, int], ...]
+
+# Combinaciones de horario x duración x paso; el límite protege frente a pasos arbitrarios.
+_MAX_SLOT_GRIDS = 512
+
+_schedule_state: Dict[str, object] = {
+    "ranges": None,
+    "grids": {},
+}
+
+
+class CompiledSchedule(NamedTuple):
+    """Horario de un profesional listo para consultas por día."""
+
+    weekly: Dict[int, DayRanges]
+    exceptions: Dict[date, DayRanges]
+
+    def ranges_for(self, on_date: date) -> DayRanges:
+        found = self.exceptions.get(on_date)
+        if found is not None:
+            return found
+        return self.weekly.get(on_date.weekday(), ())
+
+
+def invalidate_schedule_cache() -> None:
+    """Descarta el horario compilado; se recompila en la siguiente consulta."""
+
+    _schedule_state["ranges"] = None
+    _schedule_state["grids"] = {}
+
+
+def _minutes(value: dt_time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _compile_schedule(schedule: Dict[int, List[tuple]]) -> Dict[int, DayRanges]:
+    return {
+        weekday: tuple((_minutes(start), _minutes(end)) for start, end in ranges)
+        for weekday, ranges in schedule.items()
+    }
+
+
+def _default_weekly() -> Dict[int, DayRanges]:
+    compiled = _schedule_state["ranges"]
+    if compiled is None:
+        compiled = _compile_schedule(WEEKLY_SCHEDULE)
+        _schedule_state["ranges"] = compiled
+    return compiled  # type: ignore[return-value]
+
+
+def _default_schedule() -> CompiledSchedule:
+    return CompiledSchedule(weekly=_default_weekly(), exceptions={})
+
+
+def get_schedule_ranges(weekday: int) -> DayRanges:
+    """Rangos laborables del horario general (`WEEKLY_SCHEDULE`) para un día de la semana."""
+
+    return _default_weekly().get(weekday, ())
+
+
+def get_slot_grid(day_ranges: DayRanges, duration_min: int, step_min: int) -> array:
+    """Inicios candidatos (minutos desde medianoche) para unos rangos, duración y paso.
+
+    La rejilla se calcula una vez por combinación y se reutiliza hasta que cambie
+    el horario o el catálogo. No debe modificarse.
+    """
+
+    key = (day_ranges, duration_min, step_min)
+    grids: Dict[Tuple[DayRanges, int, int], array] = _schedule_state["grids"]  # type: ignore[assignment]
+    grid = grids.get(key)
+    if grid is not None:
+        return grid
+    grid = array("H")
+    for start, end in day_ranges:
+        grid.extend(range(start, end - duration_min + 1, max(1, step_min)))
+    if len(grids) >= _MAX_SLOT_GRIDS:
+        grids = {}
+        _schedule_state["grids"] = grids
+    grids[key] = grid
+    return grid
+
+
+def _load_schedules(session: Session, pro_ids: List[str]) -> Dict[str, CompiledSchedule]:
+    """Compila los horarios de BD; quien no tenga franjas semanales usa `WEEKLY_SCHEDULE`."""
+
+    default_weekly = _default_weekly()
+    if not pro_ids:
+        return {}
+    # Solo interesan excepciones vigentes; el margen de un día cubre desfases de zona horaria.
+    since = now_tz().date() - timedelta(days=1)
+    weekly_rows = session.exec(
+        select(StylistScheduleDB).where(StylistScheduleDB.professional_id.in_(pro_ids))
+    ).all()
+    exception_rows = session.exec(
+        select(StylistScheduleExceptionDB).where(
+            StylistScheduleExceptionDB.professional_id.in_(pro_ids),
+            StylistScheduleExceptionDB.on_date >= since,
+        )
+    ).all()
+
+    weekly: Dict[str, Dict[int, List[Tuple[int, int]]]] = {}
+    for row in weekly_rows:
+        weekly.setdefault(row.professional_id, {}).setdefault(row.weekday, []).append(
+            (_minutes(row.start_time), _minutes(row.end_time))
+        )
+    exceptions: Dict[str, Dict[date, List[Tuple[int, int]]]] = {}
+    for row in exception_rows:
+        day = exceptions.setdefault(row.professional_id, {}).setdefault(row.on_date, [])
+        if row.start_time is not None and row.end_time is not None:
+            day.append((_minutes(row.start_time), _minutes(row.end_time)))
+
+    schedules: Dict[str, CompiledSchedule] = {}
+    for pro_id in pro_ids:
+        own_weekly = weekly.get(pro_id)
+        schedules[pro_id] = CompiledSchedule(
+            weekly=(
+                {wd: tuple(sorted(ranges)) for wd, ranges in own_weekly.items()}
+                if own_weekly
+                else default_weekly
+            ),
+            exceptions={d: tuple(sorted(ranges)) for d, ranges in exceptions.get(pro_id, {}).items()},
+        )
+    return schedules
+
+
 # ---------------------------------------------------------------------------
 # Profesionales dinámicos con caché
 # ---------------------------------------------------------------------------
@@ -214,7 +358,7 @@ def _session_scope(session: Optional[Session]):
 
 
 def invalidate_catalog_cache() -> None:
-    """Invalida los cachés de servicios y profesionales."""
+    """Invalida los cachés de servicios y profesionales (y, con ellos, la disponibilidad)."""
 
     invalidate_services_cache()
     _catalog_state["expires_at"] = 0.0
@@ -259,11 +403,17 @@ def _build_catalog(session: Session) -> Dict[str, object]:
             use_gcal[row.id] = bool(row.use_gcal_busy)
 
     pro_by_id = {pro.id: pro for pro in pros}
+    try:
+        schedules = _load_schedules(session, list(pro_by_id))
+    except Exception:
+        logger.exception("No se pudieron cargar los horarios de estilistas; usando el horario general")
+        schedules = {}
     return {
         "pros": pros,
         "pro_by_id": pro_by_id,
         "calendars": calendars,
         "use_gcal": use_gcal,
+        "schedules": schedules,
     }
 
 
@@ -286,6 +436,29 @@ def _load_catalog(session: Optional[Session] = None, *, use_cache: bool = True)
     return data
 
 
+def _catalog_is_stale() -> bool:
+    now = _monotonic()
+    return any(
+        state.get("data") is None or now >= (state.get("expires_at", 0.0) or 0.0)
+        for state in (_services_state, _catalog_state)
+    )
+
+
+async def ensure_catalog_loaded() -> None:
+    """Recarga en el threadpool los cachés caducados de servicios y profesionales.
+
+    Los handlers `async def` lo llaman antes de usar el catálogo: así la
+    recarga (que usa el motor síncrono) nunca bloquea el event loop.
+    """
+    if _catalog_is_stale():
+
+        def _reload() -> None:
+            _load_services()
+            _load_catalog()
+
+        await anyio.to_thread.run_sync(_reload)
+
+
 def _build_catalog_from_defaults() -> Dict[str, object]:
     calendars = {p.id: _calendar_for(p.id, None) for p in _DEFAULT_PROFESSIONALS}
     use_gcal = {p.id: _DEFAULT_USES_GCAL for p in _DEFAULT_PROFESSIONALS}
@@ -295,6 +468,7 @@ def _build_catalog_from_defaults() -> Dict[str, object]:
         "pro_by_id": pro_by_id,
         "calendars": calendars,
         "use_gcal": use_gcal,
+        "schedules": {},
     }
 
 
@@ -358,3 +532,26 @@ def iter_professional_calendars(
 ) -> Iterable[tuple[str, str]]:
     calendars = get_professional_calendars(session=session, use_cache=use_cache)
     return calendars.items()
+
+
+def get_professional_schedule(
+    pro_id: Optional[str],
+    *, session: Optional[Session] = None, use_cache: bool = True
+) -> CompiledSchedule:
+    """Horario compilado del profesional (el general si no tiene uno propio)."""
+
+    if not pro_id:
+        return _default_schedule()
+    data = _load_catalog(session, use_cache=use_cache)
+    schedules: Dict[str, CompiledSchedule] = data.get("schedules") or {}  # type: ignore[assignment]
+    return schedules.get(pro_id) or _default_schedule()
+
+
+def get_professional_day_ranges(
+    pro_id: str,
+    on_date: date,
+    *, session: Optional[Session] = None, use_cache: bool = True
+) -> DayRanges:
+    """Rangos laborables del profesional en una fecha, con excepciones aplicadas."""
+
+    return get_professional_schedule(pro_id, session=session, use_cache=use_cache).ranges_for(on_date)
@@ -2,14 +2,45 @@
 Configuración y acceso a la base de datos.
 """
 from __future__ import annotations
+import asyncio
+import logging
 import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+from dataclasses import dataclass, field
 from pathlib import Path
+from time import monotonic, perf_counter
+from typing import AsyncIterator, Callable, List, Optional, TypeVar
+from urllib.parse import quote
+from sqlalchemy import event, inspect, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from starlette.requests import Request
+from sqlalchemy.orm import Session as OrmSession
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT_SECONDS,
+    DB_WRITE_BATCH_SIZE,
+    DB_WRITE_COMMIT_SECONDS,
+    DB_WRITE_QUEUE_WAIT,
+)
 
 # Nueva: conexión directa sqlite3 con PRAGMAs reforzados para utilidades/diagnóstico
 # Nota: La app sigue usando SQLAlchemy/SQLModel; esta función es auxiliar e idempotente.
 import sqlite3
 
+logger = logging.getLogger("pelubot.db")
+
+T = TypeVar("T")
+
 def connect(db_path: str) -> sqlite3.Connection:
     """Crea una conexión sqlite3 con PRAGMAs seguros por defecto.
     - WAL para concurrencia
@@ -35,12 +66,55 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_DB_PATH = BASE_DIR / "data" / "pelubot.db"
 DEFAULT_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+
+def timed_pool_class(base: type[Pool], name: str) -> type[Pool]:
+    """Subclase de `base` que mide la espera por conexión (`pelubot_db_pool_*{pool=name}`).
+
+    Es una clase y no un atributo del pool porque `engine.dispose()` recrea el
+    pool con `self.__class__`.
+    """
+
+    class _TimedPool(base):  # type: ignore[valid-type, misc]
+        def _do_get(self):
+            started = perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                DB_POOL_TIMEOUTS.labels(pool=name).inc()
+                raise
+            finally:
+                DB_POOL_WAIT_SECONDS.labels(pool=name).observe(perf_counter() - started)
+                DB_POOL_CHECKED_OUT.labels(pool=name).set(self.checkedout())
+
+        def _do_return_conn(self, record):
+            super()._do_return_conn(record)
+            DB_POOL_CHECKED_OUT.labels(pool=name).set(self.checkedout())
+
+    _TimedPool.__name__ = _TimedPool.__qualname__ = f"Timed{base.__name__}"
+    _TimedPool.__module__ = base.__module__  # mismo logger que el pool original
+    return _TimedPool
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_DB_PATH}")
+if DATABASE_URL.startswith("postgres://"):
+    # Alias heredado (Heroku y similares) que SQLAlchemy 2 no acepta.
+    DATABASE_URL = "postgresql://" + DATABASE_URL[len("postgres://"):]
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 # Aumentar timeout para evitar database is locked en SQLite
 if DATABASE_URL.startswith("sqlite"):
     connect_args = {**connect_args, "timeout": 30}
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    connect_args=connect_args,
+    # En memoria SQLAlchemy usa un pool de una conexión por hilo: sin métricas.
+    **({} if _is_memory_sqlite(DATABASE_URL) else {"poolclass": timed_pool_class(QueuePool, "primary")}),
+)
 
 # PRAGMAs para SQLite: mejoran consistencia y concurrencia
 try:
@@ -69,81 +143,529 @@ except Exception:
     # NOTA: los eventos son de mejor esfuerzo; si fallan, no bloqueamos el arranque.
     pass
 
-def create_db_and_tables() -> None:
-    """Crea la estructura de la base de datos y garantiza índices/trigger clave."""
-    SQLModel.metadata.create_all(engine)
-    # Crear índices/trigger en SQLite si faltan (para BDs ya existentes). Idempotente.
-    if str(engine.url).startswith("sqlite"):
+# Restricción de exclusión (Postgres): un profesional no puede tener dos reservas
+# activas que se solapen. La garantiza la BD aunque haya varios nodos escribiendo.
+# Las reservas importadas de Google (`gcal:*`) quedan fuera: reflejan el
+# calendario tal cual, con sus solapes (las nuevas reservas las comprueba
+# `logic.has_overlapping_reservation`).
+OVERLAP_CONSTRAINT = "ex_res_prof_no_overlap"
+
+# Resultado por motor: la revisión 0004 no crea la restricción si ya hay solapes,
+# así que no basta con mirar el dialecto. Se consulta una vez por motor y se
+# vuelve a consultar tras `create_db_and_tables`.
+_overlap_enforced: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+def enforces_no_overlap(bind: Engine) -> bool:
+    """True si la BD rechaza por sí misma reservas solapadas (Postgres con `OVERLAP_CONSTRAINT`)."""
+    if bind.dialect.name != "postgresql":
+        return False
+    cached = _overlap_enforced.get(bind)
+    if cached is not None:
+        return cached
+    try:
+        with bind.connect() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": OVERLAP_CONSTRAINT}
+            ).first() is not None
+    except Exception:
+        # Sin poder comprobarlo, la aplicación mantiene su propia comprobación.
+        logger.warning("No se pudo comprobar %s", OVERLAP_CONSTRAINT, exc_info=True)
+        return False
+    if not exists:
+        logger.warning("Falta %s: los solapes se comprueban en la aplicación", OVERLAP_CONSTRAINT)
+    _overlap_enforced[bind] = exists
+    return exists
+
+
+def is_overlap_violation(exc: BaseException) -> bool:
+    """True si `exc` es la violación de `OVERLAP_CONSTRAINT` (SQLSTATE 23P01)."""
+    orig = getattr(exc, "orig", exc)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    return code == "23P01" or OVERLAP_CONSTRAINT in str(exc)
+
+
+# Esquema versionado con Alembic (`backend/migrations`). Al arrancar basta con
+# leer `alembic_version`: si ya está en `SCHEMA_HEAD` no se toca nada más.
+# Al añadir una revisión hay que subir esta constante (lo vigila un test).
+SCHEMA_HEAD = "0004"
+MIGRATIONS_DIR = BASE_DIR / "migrations"
+# Con `PELUBOT_AUTO_MIGRATE=0` la app no migra al arrancar: exige haber
+# ejecutado antes `python scripts/migrate.py upgrade`.
+AUTO_MIGRATE = os.getenv("PELUBOT_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes", "si", "sí", "y")
+
+
+def current_schema_revision(bind: Optional[Engine] = None) -> Optional[str]:
+    """Revisión aplicada según `alembic_version` (None si la BD aún no está versionada)."""
+    bind = bind if bind is not None else engine
+    try:
+        with bind.connect() as conn:
+            return conn.exec_driver_sql("SELECT version_num FROM alembic_version").scalar()
+    except Exception:  # noqa: BLE001 - tabla inexistente: BD nueva o anterior a las migraciones
+        return None
+
+
+def alembic_config(bind: Optional[Engine] = None):
+    """Config de Alembic apuntando a `migrations/` y a la URL de `bind`."""
+    from alembic.config import Config
+
+    bind = bind if bind is not None else engine
+    cfg = Config(str(BASE_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(MIGRATIONS_DIR))
+    cfg.set_main_option("sqlalchemy.url", bind.url.render_as_string(hide_password=False).replace("%", "%%"))
+    return cfg
+
+
+def _adopt_legacy_schema(conn) -> None:
+    """Completa una BD creada con `create_all` antes de las migraciones.
+
+    Crea las tablas e índices del modelo que falten y añade las columnas que
+    falten (como NULL: `ALTER TABLE ... ADD COLUMN` no puede exigir NOT NULL
+    sin valor por defecto). Después se marca como revisión 0001; las
+    siguientes son idempotentes y se aplican encima.
+    """
+    from sqlalchemy.schema import CreateColumn
+
+    import app.models  # noqa: F401 - registra las tablas en SQLModel.metadata
+
+    SQLModel.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            ddl = str(ddl).replace(" NOT NULL", "")
+            logger.info("Migración: añadiendo columna %s.%s", table.name, column.name)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def upgrade_schema(bind: Optional[Engine] = None, revision: str = "head") -> None:
+    """Aplica las migraciones pendientes hasta `revision`.
+
+    Las BD sin `alembic_version` pero con tablas (anteriores a las
+    migraciones) se adoptan con `_adopt_legacy_schema` antes de seguir.
+    """
+    from alembic import command
+
+    bind = bind if bind is not None else engine
+    cfg = alembic_config(bind)
+    with bind.connect() as conn:
+        legacy = current_schema_revision(bind) is None and inspect(conn).has_table("reservationdb")
+        # Alembic gestiona sus transacciones si recibe la conexión sin ninguna abierta.
+        conn.rollback()
+        cfg.attributes["connection"] = conn
+        if legacy:
+            logger.info("Migración: adoptando BD existente sin versionar")
+            with conn.begin():
+                _adopt_legacy_schema(conn)
+            command.stamp(cfg, "0001")
+            conn.commit()
+        command.upgrade(cfg, revision)
+        conn.commit()
+
+
+def create_db_and_tables(bind: Optional[Engine] = None) -> None:
+    """Deja el esquema en `SCHEMA_HEAD`; si ya lo está, cuesta una sola consulta."""
+    bind = bind if bind is not None else engine
+    _overlap_enforced.pop(bind, None)
+    current = current_schema_revision(bind)
+    if current == SCHEMA_HEAD:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Esquema de BD en {current or 'ninguna revisión'}, se espera {SCHEMA_HEAD}: "
+            "ejecuta `python scripts/migrate.py upgrade`"
+        )
+    logger.info("Migrando esquema de BD: %s -> %s", current or "vacío", SCHEMA_HEAD)
+    upgrade_schema(bind)
+
+
+# Métodos HTTP que no escriben: su sesión sale del pool de lectura.
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def get_session(request: Request = None):  # type: ignore[assignment]
+    """Context manager de sesión SQLModel para usar con FastAPI.
+
+    En peticiones GET/HEAD/OPTIONS la sesión usa el motor de lectura
+    (`get_read_engine()`); en el resto, el motor principal.
+    """
+    bind = get_read_engine() if request is not None and request.method in READ_METHODS else engine
+    with Session(bind) as session:
+        yield session
+
+
+# --- Motor de lectura ---
+# Las lecturas (paneles del portal, estadísticas, disponibilidad) usan su propio
+# pool para no competir por conexiones con las reservas. Con SQLite en fichero
+# abre la misma BD con `mode=ro` y `query_only`; con Postgres puede apuntar a una
+# réplica (READ_DATABASE_URL). Una réplica va con retraso: lo que se lea justo
+# después de escribir puede no estar aún.
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def to_readonly_url(url: str) -> str:
+    """URL de solo lectura (`mode=ro`) para SQLite en fichero; el resto no cambia."""
+    parsed = make_url(url)
+    if _is_memory_sqlite(url) or parsed.get_backend_name() != "sqlite" or parsed.query.get("uri"):
+        return url
+    return f"{parsed.drivername}:///file:{quote(parsed.database)}?mode=ro&uri=true"
+
+
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL") or to_readonly_url(DATABASE_URL)
+_read_engine: Optional[Engine] = None
+_read_engine_lock = threading.Lock()
+
+
+def get_read_engine() -> Engine:
+    """Motor de solo lectura compartido; con SQLite en memoria es el principal."""
+    global _read_engine
+    with _read_engine_lock:
+        if _read_engine is None:
+            if _is_memory_sqlite(READ_DATABASE_URL):
+                _read_engine = engine
+                return _read_engine
+            url = make_url(READ_DATABASE_URL)
+            is_sqlite = url.get_backend_name() == "sqlite"
+            read_args = dict(connect_args) if is_sqlite else {}
+            if url.get_backend_name() == "postgresql" and url.get_driver_name() in ("psycopg2", "psycopg"):
+                read_args["options"] = "-c default_transaction_read_only=on"
+            _read_engine = create_engine(
+                url,
+                echo=False,
+                connect_args=read_args,
+                poolclass=timed_pool_class(QueuePool, "read"),
+                pool_size=_env_int("READ_DB_POOL_SIZE", 10),
+                max_overflow=_env_int("READ_DB_MAX_OVERFLOW", 10),
+                pool_timeout=_env_int("READ_DB_POOL_TIMEOUT", 10),
+            )
+            if is_sqlite:
+                if "_set_sqlite_pragma" in globals():
+                    event.listen(_read_engine, "connect", _set_sqlite_pragma)
+                event.listen(_read_engine, "connect", set_sqlite_query_only)
+        return _read_engine
+
+
+# --- Motor asíncrono ---
+# Los handlers `async def` usan este motor y no ocupan un hilo del threadpool
+# de Starlette mientras esperan a la BD. El driver se deduce de DATABASE_URL
+# (aiosqlite para SQLite, asyncpg para Postgres) o se fija con ASYNC_DATABASE_URL.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Traduce una URL síncrona a su driver async; deja igual las que no conoce."""
+    scheme, sep, rest = url.partition("://")
+    driver = _ASYNC_DRIVERS.get(scheme.split("+", 1)[0])
+    if not sep or driver is None:
+        return url
+    return f"{driver}://{rest}"
+
+
+# Solo se usa para leer (las escrituras van por `get_writer()`): parte de READ_DATABASE_URL.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(READ_DATABASE_URL)
+_async_engine: Optional[AsyncEngine] = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncEngine:
+    """Motor async compartido; se crea al primer uso para no importar el driver si no hace falta."""
+    global _async_engine
+    with _async_engine_lock:
+        if _async_engine is None:
+            url = make_url(ASYNC_DATABASE_URL)
+            is_sqlite = url.get_backend_name() == "sqlite"
+            pool_kwargs = {}
+            if not (is_sqlite and url.database in (None, "", ":memory:")):
+                # Pool más holgado que el síncrono: abrir una conexión aiosqlite arranca un hilo,
+                # y las que exceden `pool_size` se cierran al devolverse.
+                pool_kwargs = {
+                    "poolclass": timed_pool_class(AsyncAdaptedQueuePool, "read_async"),
+                    "pool_size": _env_int("ASYNC_DB_POOL_SIZE", 20),
+                    "max_overflow": _env_int("ASYNC_DB_MAX_OVERFLOW", 20),
+                }
+            async_args: dict = {"timeout": 30} if is_sqlite else {}
+            if url.get_driver_name() == "asyncpg":
+                async_args["server_settings"] = {"default_transaction_read_only": "on"}
+            _async_engine = create_async_engine(
+                url,
+                echo=False,
+                connect_args=async_args,
+                **pool_kwargs,
+            )
+            if is_sqlite and "_set_sqlite_pragma" in globals():
+                # Mismos PRAGMAs que el motor síncrono (WAL, busy_timeout...).
+                event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragma)
+            if is_sqlite:
+                # En SQLite el motor async es el pool de lectura: las escrituras van por `get_writer()`.
+                event.listen(_async_engine.sync_engine, "connect", set_sqlite_query_only)
+        return _async_engine
+
+
+def set_sqlite_query_only(dbapi_connection, connection_record=None) -> None:
+    """Listener `connect`: la conexión SQLite rechaza cualquier escritura."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON;")
+    cursor.close()
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Equivalente async de `get_session` para handlers `async def` de lectura.
+
+    Con SQLite sus conexiones son de solo lectura (`query_only`); para escribir
+    usa `get_writer()`.
+
+    `expire_on_commit=False`: tras el commit no se puede recargar un atributo
+    de forma implícita (sería E/S fuera de un `await`).
+    """
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    """Cierra las conexiones del motor async (al parar la app)."""
+    global _async_engine
+    with _async_engine_lock:
+        current, _async_engine = _async_engine, None
+    if current is not None:
+        await current.dispose()
+
+
+# --- Efectos tras el commit (outbox) ---
+# Las escrituras de reservas dejan en la misma transacción su trabajo de
+# sincronización; lo que no es BD (invalidar cachés, despertar al worker,
+# ajustar gauges) solo debe ocurrir si esa transacción se confirma.
+_AFTER_COMMIT_KEY = "pelubot_after_commit"
+
+
+def run_after_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Ejecuta `callback()` tras el próximo commit de `session`; se descarta si hay rollback."""
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _run_after_commit_callbacks(session: OrmSession) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, []):
         try:
-            with engine.connect() as conn:
-                # Asegurar foreign_keys on en la sesión de migración
-                conn.exec_driver_sql("PRAGMA foreign_keys = ON;")
-                # Asegurar columnas nuevas antes de crear índices que dependan de ellas
+            callback()
+        except Exception:  # noqa: BLE001 - la transacción ya está confirmada
+            logger.exception("Fallo en una acción posterior al commit")
+
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _drop_after_commit_callbacks(session: OrmSession, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_KEY, None)
+
+
+# --- Escritor único (SQLite) ---
+# SQLite admite un solo escritor a la vez: con cada petición abriendo su propia
+# transacción de escritura, las demás esperan en `busy_timeout` (o fallan con
+# "database is locked"). `DBWriter` canaliza las transacciones por un hilo y
+# una conexión, y confirma juntas las que se acumulan mientras se ejecuta el
+# lote anterior (group commit): un COMMIT, y un fsync, por lote.
+
+
+@dataclass
+class _WriteItem:
+    fn: Callable[[Session], object]
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=monotonic)
+
+
+class DBWriter:
+    """Hilo escritor: ejecuta `fn(session)` en lotes con un solo commit.
+
+    Cada transacción corre dentro de un SAVEPOINT: si lanza, se deshace solo
+    la suya (y sus acciones `run_after_commit`) y su future recibe la
+    excepción. `fn` no debe llamar a `commit()` ni a `rollback()`. Si el commit
+    del lote falla, se reintenta cada transacción por separado.
+    """
+
+    def __init__(self, bind: Engine, *, max_batch: int = 64, max_delay: float = 0.0, name: str = "db-writer"):
+        self._bind = bind
+        self._max_batch = max(1, max_batch)
+        self._max_delay = max(0.0, max_delay)
+        self._queue: "queue.Queue[Optional[_WriteItem]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[Session], T]) -> "Future[T]":
+        """Encola la transacción; el future resuelve con su resultado tras el commit."""
+        item = _WriteItem(fn)
+        self._queue.put(item)
+        return item.future
+
+    def run(self, fn: Callable[[Session], T]) -> T:
+        """Versión bloqueante de `submit` para código síncrono."""
+        return self.submit(fn).result()
+
+    async def run_async(self, fn: Callable[[Session], T]) -> T:
+        """Versión para handlers `async def`: espera el commit sin ocupar un hilo."""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Termina lo encolado y para el hilo."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> Optional[List[_WriteItem]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = monotonic() + self._max_delay
+        while len(batch) < self._max_batch:
+            try:
+                remaining = deadline - monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # se atiende tras este lote
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            live = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            now = monotonic()
+            for item in live:
+                DB_WRITE_QUEUE_WAIT.observe(now - item.queued_at)
+            try:
+                self._run_batch(live)
+            except Exception as exc:  # noqa: BLE001 - el hilo escritor no puede morir
+                logger.exception("Fallo en un lote del escritor de la BD")
+                for item in live:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+
+    def _run_batch(self, batch: List[_WriteItem]) -> None:
+        done: list[tuple[_WriteItem, object]] = []
+        with Session(self._bind, expire_on_commit=False) as session:
+            if self._bind.dialect.name == "sqlite":
+                # Tomamos el bloqueo de escritura al empezar (otros procesos pueden tenerlo).
+                session.exec(text("BEGIN IMMEDIATE"))
+            for item in batch:
+                callbacks = session.info.setdefault(_AFTER_COMMIT_KEY, [])
+                mark = len(callbacks)
                 try:
-                    cols = conn.exec_driver_sql("PRAGMA table_info('reservationdb');").fetchall()
-                    existing_cols = {row[1] for row in cols}
-                    for col, ddl in {
-                        "customer_name": "TEXT",
-                        "customer_email": "TEXT",
-                        "customer_phone": "TEXT",
-                        "notes": "TEXT",
-                        "sync_status": "TEXT",
-                        "sync_job_id": "INTEGER",
-                        "sync_last_error": "TEXT",
-                        "sync_updated_at": "TIMESTAMP",
-                    }.items():
-                        if col not in existing_cols:
-                            conn.exec_driver_sql(f"ALTER TABLE reservationdb ADD COLUMN {col} {ddl};")
-                except Exception:
-                    pass
-                # Índices para consultas por profesional/servicio y rango temporal
-                for statement in (
-                    "CREATE INDEX IF NOT EXISTS ix_res_prof_start_end ON reservationdb (professional_id, start, end);",
-                    "CREATE UNIQUE INDEX IF NOT EXISTS ux_res_prof_start ON reservationdb (professional_id, start);",
-                    "CREATE INDEX IF NOT EXISTS ix_res_service_start ON reservationdb (service_id, start);",
-                    "CREATE INDEX IF NOT EXISTS ix_res_sync_status ON reservationdb (sync_status);",
-                    "CREATE INDEX IF NOT EXISTS ix_res_sync_job ON reservationdb (sync_job_id);",
-                    "CREATE INDEX IF NOT EXISTS ix_stylist_active ON stylistdb (is_active);",
-                    "CREATE UNIQUE INDEX IF NOT EXISTS ux_stylist_email ON stylistdb (email);",
-                    "CREATE INDEX IF NOT EXISTS ix_calendar_jobs_status_available ON calendar_sync_jobs (status, available_at);",
-                    "CREATE INDEX IF NOT EXISTS ix_calendar_jobs_reservation ON calendar_sync_jobs (reservation_id);",
-                ):
+                    with session.begin_nested():
+                        result = item.fn(session)
+                except BaseException as exc:  # noqa: BLE001 - el error es de esa transacción
+                    del session.info.get(_AFTER_COMMIT_KEY, [])[mark:]
+                    item.future.set_exception(exc)
+                    continue
+                done.append((item, result))
+            if not done:
+                session.rollback()
+                return
+            started = perf_counter()
+            try:
+                session.commit()
+            except Exception:  # noqa: BLE001
+                session.rollback()
+                if len(done) == 1:
+                    raise
+                logger.warning("Falló el commit de un lote de %s escrituras; se reintentan una a una", len(done), exc_info=True)
+                for item, _ in done:
+                    # Cada reintento resuelve su propio future: el fallo de uno no arrastra al resto.
                     try:
-                        conn.exec_driver_sql(statement)
-                    except Exception:
-                        pass
-                # Trigger updated_at: actualiza solo si no lo ha actualizado ya la capa ORM
-                # Evita bucle usando condición sobre OLD/NEW
-                conn.exec_driver_sql(
-                    """
-                    CREATE TRIGGER IF NOT EXISTS trg_reservationdb_updated
-                    AFTER UPDATE ON reservationdb
-                    FOR EACH ROW
-                    WHEN NEW.updated_at <= OLD.updated_at
-                    BEGIN
-                      UPDATE reservationdb SET updated_at = CURRENT_TIMESTAMP
-                      WHERE id = NEW.id AND NEW.updated_at <= OLD.updated_at;
-                    END;
-                    """
+                        self._run_batch([item])
+                    except Exception as exc:  # noqa: BLE001
+                        if not item.future.done():
+                            item.future.set_exception(exc)
+                return
+            DB_WRITE_COMMIT_SECONDS.observe(perf_counter() - started)
+            DB_WRITE_BATCH_SIZE.observe(len(done))
+        for item, result in done:
+            item.future.set_result(result)
+
+
+class _DirectWriter:
+    """Misma interfaz que `DBWriter` para motores con escritores concurrentes (Postgres)."""
+
+    def __init__(self, bind: Engine):
+        self._bind = bind
+
+    def run(self, fn: Callable[[Session], T]) -> T:
+        with Session(self._bind, expire_on_commit=False) as session:
+            result = fn(session)
+            session.commit()
+            return result
+
+    def submit(self, fn: Callable[[Session], T]) -> "Future[T]":
+        future: Future = Future()
+        try:
+            future.set_result(self.run(fn))
+        except BaseException as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        return future
+
+    async def run_async(self, fn: Callable[[Session], T]) -> T:
+        return await asyncio.to_thread(self.run, fn)
+
+    def close(self, timeout: float = 5.0) -> None:
+        return None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Escritor compartido (dependencia de FastAPI); el hilo arranca con el primer uso.
+
+    Con SQLite usa su propia conexión (`pool_size=1`) y agrupa commits; con
+    otros motores ejecuta cada transacción directamente.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            if DATABASE_URL.startswith("sqlite"):
+                bind = create_engine(
+                    DATABASE_URL,
+                    echo=False,
+                    connect_args=connect_args,
+                    pool_size=1,
+                    max_overflow=0,
                 )
-                try:
-                    cols = conn.exec_driver_sql("PRAGMA table_info('calendar_sync_jobs');").fetchall()
-                    existing_cols = {row[1] for row in cols}
-                    for col, ddl in {
-                        "locked_by": "TEXT",
-                        "locked_at": "TIMESTAMP",
-                        "heartbeat_at": "TIMESTAMP",
-                    }.items():
-                        if col not in existing_cols:
-                            conn.exec_driver_sql(f"ALTER TABLE calendar_sync_jobs ADD COLUMN {col} {ddl};")
-                except Exception:
-                    pass
-        except Exception:
-            # No bloquear si falla (por compatibilidad)
-            pass
+                if "_set_sqlite_pragma" in globals():
+                    event.listen(bind, "connect", _set_sqlite_pragma)
+                _writer = DBWriter(
+                    bind,
+                    max_batch=_env_int("DB_WRITER_MAX_BATCH", 64),
+                    max_delay=_env_int("DB_WRITER_MAX_DELAY_MS", 0) / 1000,
+                )
+            else:
+                _writer = _DirectWriter(engine)
+        return _writer
 
 
-def get_session():
-    """Context manager de sesión SQLModel para usar con FastAPI."""
-    with Session(engine) as session:
-        yield session
+def shutdown_writer() -> None:
+    """Vacía la cola del escritor y lo para (al parar la app)."""
+    global _writer
+    with _writer_lock:
+        current, _writer = _writer, None
+    if current is not None:
+        current.close()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from pathlib import Path
 
@@ -24,6 +24,10 @@ import logging
 import threading
 import time
 import httplib2
+import re
+from urllib.parse import unquote
+
+from app.integrations.google_calendar_limits import GCAL_LIMITER, is_rate_limited
 
 try:
     from zoneinfo import ZoneInfo
@@ -49,6 +53,8 @@ def _set_cached_service(svc: Any | None) -> None:
 GCAL_HTTP_TIMEOUT = float(os.getenv("GCAL_HTTP_TIMEOUT", "8"))
 GCAL_HTTP_RETRIES = int(os.getenv("GCAL_HTTP_RETRIES", "1"))
 GCAL_HTTP_RETRY_WAIT = float(os.getenv("GCAL_HTTP_RETRY_WAIT", "0.6"))
+# Google admite como máximo 50 operaciones por petición batch de Calendar.
+GCAL_BATCH_MAX_OPS = max(1, min(50, int(os.getenv("GCAL_BATCH_MAX_OPS", "50"))))
 
 def iso_datetime(dt_or_str, tz: str = "Europe/Madrid") -> str:
     """
@@ -225,8 +231,17 @@ class _FakeEvents:
     def delete(self, calendarId: str, eventId: str):
         self._store.pop(eventId, None)
         return _FakeEventsOp({})
-    def list(self, calendarId: str, timeMin: str, timeMax: str, singleEvents: bool = True, orderBy: str = "startTime", pageToken: Optional[str] = None, timeZone: Optional[str] = None):
-        return _FakeEventsOp({"items": []})
+    def list(self, calendarId: str, timeMin: Optional[str] = None, timeMax: Optional[str] = None, singleEvents: bool = True, orderBy: str = "startTime", pageToken: Optional[str] = None, timeZone: Optional[str] = None, syncToken: Optional[str] = None, maxResults: Optional[int] = None):
+        return _FakeEventsOp({"items": [], "nextSyncToken": "fake-sync-token"})
+    def watch(self, calendarId: str, body: dict):
+        ttl = int((body.get("params") or {}).get("ttl") or 604800)
+        expiration = int((time.time() + ttl) * 1000)
+        return _FakeEventsOp({"kind": "api#channel", "id": body.get("id"), "resourceId": f"fake-resource-{calendarId}", "expiration": str(expiration)})
+
+class _FakeChannels:
+    """Simula `channels.stop`."""
+    def stop(self, body: dict):
+        return _FakeEventsOp({})
 
 class FakeCalendarService:
     """Cliente falso para tests y modo demo."""
@@ -236,6 +251,8 @@ class FakeCalendarService:
         return _FakeFreebusy()
     def events(self):
         return _FakeEvents(self._events_store)
+    def channels(self):
+        return _FakeChannels()
     def calendarList(self):
         class _CL:
             def list(self_inner):
@@ -250,19 +267,30 @@ def _reset_thread_client() -> None:
     """Elimina el cliente cacheado para forzar reconstrucción tras fallo."""
     _set_cached_service(None)
 
-def _call_with_retry(op: callable, action: str) -> Any:
-    """Ejecuta la llamada al API con retry ligero y reseteo de cliente."""
+def _call_with_retry(op: callable, action: str, calendar_ids: Tuple[Optional[str], ...] = (), cost: int = 1) -> Any:
+    """Ejecuta la llamada al API con retry ligero y reseteo de cliente.
+
+    Cada intento pasa por `GCAL_LIMITER` (buckets por calendario y global y
+    concurrencia adaptativa); si Google indica saturación la espera entre
+    intentos crece de forma exponencial.
+    """
     attempts = GCAL_HTTP_RETRIES + 1
     last_exc: Exception | None = None
     for attempt in range(1, attempts + 1):
         try:
-            return op()
+            with GCAL_LIMITER.slot(calendar_ids, cost):
+                return op()
         except Exception as exc:
             last_exc = exc
             logger.warning("Google Calendar %s falló (intento %s/%s): %s", action, attempt, attempts, exc)
             _reset_thread_client()
+            if _is_gone(exc):
+                break  # 410: el syncToken no volverá a valer, reintentar solo gasta cuota
             if attempt < attempts:
-                time.sleep(GCAL_HTTP_RETRY_WAIT)
+                wait = GCAL_HTTP_RETRY_WAIT
+                if is_rate_limited(exc):
+                    wait *= 2 ** attempt
+                time.sleep(wait)
                 continue
             break
     raise RuntimeError(f"Error {action}: {last_exc}") from last_exc
@@ -328,43 +356,122 @@ def list_calendars(service: Any) -> List[Dict[str, Any]]:
     except Exception as e:
         raise RuntimeError(f"Error listando calendarios: {e}")
 
-def create_event(service: Any, calendar_id: str, start_dt, end_dt, summary: str, private_props: Dict[str, str] = None, description: Optional[str] = None, color_id: Optional[str] = None, tz: str = "Europe/Madrid") -> Dict[str, Any]:
-    """Inserta un evento en Google Calendar incluyendo metadatos privados de PeluBot."""
-    if private_props is None:
-        private_props = {}
+def _event_body(start_dt, end_dt, summary: str, private_props: Optional[Dict[str, str]] = None, description: Optional[str] = None, color_id: Optional[str] = None, tz: str = "Europe/Madrid") -> Dict[str, Any]:
+    """Cuerpo de `events.insert` (compartido con el cliente asíncrono)."""
     body = {
         "summary": summary,
         "start": {"dateTime": iso_datetime(start_dt, tz), "timeZone": tz},
         "end": {"dateTime": iso_datetime(end_dt, tz), "timeZone": tz},
-        "extendedProperties": {"private": private_props},
+        "extendedProperties": {"private": private_props or {}},
     }
     if description:
         body["description"] = description
     if color_id:
         body["colorId"] = color_id
+    return body
+
+def _times_body(start_dt, end_dt, tz: str = "Europe/Madrid") -> Dict[str, Any]:
+    """Cuerpo de `events.patch` para mover un evento."""
+    return {
+        "start": {"dateTime": iso_datetime(start_dt, tz), "timeZone": tz},
+        "end": {"dateTime": iso_datetime(end_dt, tz), "timeZone": tz},
+    }
+
+def create_event(service: Any, calendar_id: str, start_dt, end_dt, summary: str, private_props: Dict[str, str] = None, description: Optional[str] = None, color_id: Optional[str] = None, tz: str = "Europe/Madrid") -> Dict[str, Any]:
+    """Inserta un evento en Google Calendar incluyendo metadatos privados de PeluBot."""
+    body = _event_body(start_dt, end_dt, summary, private_props, description, color_id, tz)
     try:
-        return _call_with_retry(lambda: service.events().insert(calendarId=calendar_id, body=body).execute(), "creando evento")
+        return _call_with_retry(lambda: service.events().insert(calendarId=calendar_id, body=body).execute(), "creando evento", (calendar_id,))
     except Exception as e:
         raise RuntimeError(f"Error creando evento: {e}")
 
 def patch_event(service: Any, calendar_id: str, event_id: str, start_dt, end_dt, tz: str = "Europe/Madrid") -> Dict[str, Any]:
     """Actualiza las franjas de inicio y fin de un evento existente."""
-    body = {
-        "start": {"dateTime": iso_datetime(start_dt, tz), "timeZone": tz},
-        "end": {"dateTime": iso_datetime(end_dt, tz), "timeZone": tz},
-    }
+    body = _times_body(start_dt, end_dt, tz)
     try:
-        return _call_with_retry(lambda: service.events().patch(calendarId=calendar_id, eventId=event_id, body=body).execute(), "modificando evento")
+        return _call_with_retry(lambda: service.events().patch(calendarId=calendar_id, eventId=event_id, body=body).execute(), "modificando evento", (calendar_id,))
     except Exception as e:
         raise RuntimeError(f"Error modificando evento: {e}")
 
 def delete_event(service: Any, calendar_id: str, event_id: str) -> None:
     """Elimina un evento concreto, propagando el error si ocurre."""
     try:
-        _call_with_retry(lambda: service.events().delete(calendarId=calendar_id, eventId=event_id).execute(), "eliminando evento")
+        _call_with_retry(lambda: service.events().delete(calendarId=calendar_id, eventId=event_id).execute(), "eliminando evento", (calendar_id,))
     except Exception as e:
         raise RuntimeError(f"Error eliminando evento: {e}")
 
+def insert_event_request(service: Any, calendar_id: str, body: Dict[str, Any]) -> Any:
+    """Petición `events.insert` sin ejecutar (para `execute_batch`)."""
+    return service.events().insert(calendarId=calendar_id, body=body)
+
+def patch_event_request(service: Any, calendar_id: str, event_id: str, start_dt, end_dt, tz: str = "Europe/Madrid") -> Any:
+    """Petición `events.patch` de horario sin ejecutar (para `execute_batch`)."""
+    return service.events().patch(calendarId=calendar_id, eventId=event_id, body=_times_body(start_dt, end_dt, tz))
+
+def delete_event_request(service: Any, calendar_id: str, event_id: str) -> Any:
+    """Petición `events.delete` sin ejecutar (para `execute_batch`)."""
+    return service.events().delete(calendarId=calendar_id, eventId=event_id)
+
+def supports_batch(service: Any) -> bool:
+    """True si el cliente admite peticiones batch (el cliente falso no)."""
+    return callable(getattr(service, "new_batch_http_request", None))
+
+BatchResult = Tuple[Optional[Dict[str, Any]], Optional[Exception]]
+
+_CALENDAR_IN_URI = re.compile(r"/calendars/([^/?]+)/")
+
+def _request_calendar_id(request: Any) -> Optional[str]:
+    """Calendario al que va una petición de googleapiclient (None si no se puede saber)."""
+    match = _CALENDAR_IN_URI.search(getattr(request, "uri", "") or "")
+    return unquote(match.group(1)) if match else None
+
+def execute_batch(service: Any, requests: List[Any], max_ops: int = GCAL_BATCH_MAX_OPS) -> List[BatchResult]:
+    """Ejecuta peticiones en lotes HTTP de hasta `max_ops` y devuelve (resultado, error) por petición.
+
+    Un fallo de una operación no afecta a las demás. Si falla el lote entero
+    (red, auth), se reintenta según `GCAL_HTTP_RETRIES` y, si persiste, todas
+    sus operaciones reciben ese error. Sin soporte batch se ejecutan una a una.
+    """
+    results: List[BatchResult] = [(None, None)] * len(requests)
+    if not requests:
+        return results
+    if not supports_batch(service):
+        for idx, req in enumerate(requests):
+            try:
+                results[idx] = (req.execute() or {}, None)
+            except Exception as exc:
+                results[idx] = (None, exc)
+        return results
+
+    size = max(1, min(int(max_ops), GCAL_BATCH_MAX_OPS))
+    for offset in range(0, len(requests), size):
+        chunk = requests[offset:offset + size]
+        chunk_results: Dict[int, BatchResult] = {}
+
+        def _callback(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+            chunk_results[int(request_id)] = (None, exception) if exception is not None else (response or {}, None)
+
+        def _run_chunk() -> None:
+            chunk_results.clear()
+            batch = service.new_batch_http_request(callback=_callback)
+            for idx, req in enumerate(chunk):
+                batch.add(req, request_id=str(offset + idx))
+            batch.execute()
+
+        calendar_ids = tuple(_request_calendar_id(req) for req in chunk)
+        try:
+            _call_with_retry(_run_chunk, f"ejecutando lote de {len(chunk)} operaciones", calendar_ids, len(chunk))
+        except Exception as exc:
+            for idx in range(offset, offset + len(chunk)):
+                results[idx] = (None, exc)
+            continue
+        # Un lote puede ir bien como petición HTTP y traer operaciones rechazadas por cuota.
+        if any(exc is not None and is_rate_limited(exc) for _, exc in chunk_results.values()):
+            GCAL_LIMITER.penalize()
+        for idx in range(offset, offset + len(chunk)):
+            results[idx] = chunk_results.get(idx, (None, RuntimeError("Operación sin respuesta en el lote")))
+    return results
+
 def list_events_range(service: Any, calendar_id: str, time_min_iso: str, time_max_iso: str, tz: str = "Europe/Madrid") -> List[Dict[str, Any]]:
     """Lista eventos de un calendario en el rango dado (una sola página)."""
     try:
@@ -375,7 +482,7 @@ def list_events_range(service: Any, calendar_id: str, time_min_iso: str, time_ma
 
 def list_events_allpages(service: Any, calendar_id: str, time_min: Optional[str] = None, time_max: Optional[str] = None, tz: str = "Europe/Madrid") -> List[Dict[str, Any]]:
     """Obtiene todos los eventos paginando hasta consumir el rango indicado."""
-    params = {"calendarId": calendar_id}
+    params = {"calendarId": calendar_id, "maxResults": 2500}
     if time_min or time_max:
         if time_min:
             params["timeMin"] = iso_datetime(time_min, tz)
@@ -390,7 +497,8 @@ def list_events_allpages(service: Any, calendar_id: str, time_min: Optional[str]
         while True:
             if page_token:
                 params["pageToken"] = page_token
-            resp = service.events().list(**params).execute()
+            # Cada página pasa por el limitador: una importación completa son muchas llamadas seguidas.
+            resp = _call_with_retry(lambda: service.events().list(**params).execute(), "listando eventos (paginado)", (calendar_id,))
             items.extend(resp.get("items", []))
             page_token = resp.get("nextPageToken")
             if not page_token:
@@ -399,10 +507,73 @@ def list_events_allpages(service: Any, calendar_id: str, time_min: Optional[str]
         raise RuntimeError(f"Error listando eventos (paginado): {e}")
     return items
 
+class SyncTokenExpired(RuntimeError):
+    """Google invalidó el syncToken (410 Gone): hay que repetir la sincronización completa."""
+
+def _is_gone(exc: Exception) -> bool:
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    return str(status) == "410" or "HttpError 410" in str(exc)
+
+def list_event_changes(service: Any, calendar_id: str, sync_token: Optional[str] = None, time_min: Optional[str] = None, tz: str = "Europe/Madrid") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Lista los eventos cambiados desde `sync_token` y devuelve (eventos, nuevo token).
+
+    Sin token hace la sincronización completa inicial (desde `time_min` si se
+    indica). Con token Google devuelve también los eventos borrados, con
+    `status == "cancelled"`. Los parámetros de ambas llamadas deben coincidir,
+    salvo los que Google prohíbe con syncToken (timeMin, orderBy...). Lanza
+    `SyncTokenExpired` si el token ya no vale.
+    """
+    params: Dict[str, Any] = {"calendarId": calendar_id, "singleEvents": True, "timeZone": tz, "maxResults": 2500}
+    if sync_token:
+        params["syncToken"] = sync_token
+    elif time_min:
+        params["timeMin"] = iso_datetime(time_min, tz)
+    items: List[Dict[str, Any]] = []
+    next_token: Optional[str] = None
+    page_token: Optional[str] = None
+    try:
+        while True:
+            if page_token:
+                params["pageToken"] = page_token
+            resp = _call_with_retry(lambda: service.events().list(**params).execute(), "listando cambios de eventos", (calendar_id,))
+            items.extend(resp.get("items", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                next_token = resp.get("nextSyncToken")
+                break
+    except Exception as e:
+        if sync_token and (_is_gone(e) or _is_gone(e.__cause__ or e)):
+            raise SyncTokenExpired(f"syncToken caducado para {calendar_id}") from e
+        raise RuntimeError(f"Error listando cambios de eventos: {e}")
+    return items, next_token
+
+def watch_events(service: Any, calendar_id: str, channel_id: str, address: str, token: Optional[str] = None, ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """Abre un canal `events.watch`: Google avisará en `address` de cada cambio del calendario.
+
+    Devuelve el canal creado (`resourceId`, `expiration` en milisegundos epoch).
+    """
+    body: Dict[str, Any] = {"id": channel_id, "type": "web_hook", "address": address}
+    if token:
+        body["token"] = token
+    if ttl_seconds:
+        body["params"] = {"ttl": str(int(ttl_seconds))}
+    try:
+        return _call_with_retry(lambda: service.events().watch(calendarId=calendar_id, body=body).execute(), "abriendo canal de notificaciones", (calendar_id,))
+    except Exception as e:
+        raise RuntimeError(f"Error abriendo canal de notificaciones: {e}")
+
+def stop_channel(service: Any, channel_id: str, resource_id: str) -> None:
+    """Cierra un canal de notificaciones (`channels.stop`)."""
+    try:
+        _call_with_retry(lambda: service.channels().stop(body={"id": channel_id, "resourceId": resource_id}).execute(), "cerrando canal de notificaciones")
+    except Exception as e:
+        raise RuntimeError(f"Error cerrando canal de notificaciones: {e}")
+
 def clear_calendar(service: Any, calendar_id: str, time_min: Optional[str] = None, time_max: Optional[str] = None, only_pelubot: bool = False, dry_run: bool = False, tz: str = "Europe/Madrid") -> Dict[str, Any]:
     """Elimina eventos de un calendario con filtros opcionales y modo simulación."""
     items = list_events_allpages(service, calendar_id, time_min, time_max, tz)
-    deleted = skipped = 0
+    skipped = 0
+    to_delete: List[str] = []
     for it in items:
         ev_id = it.get("id")
         if not ev_id:
@@ -412,11 +583,11 @@ def clear_calendar(service: Any, calendar_id: str, time_min: Optional[str] = Non
             if not priv.get("reservation_id"):
                 skipped += 1
                 continue
-        if not dry_run:
-            try:
-                service.events().delete(calendarId=calendar_id, eventId=ev_id).execute()
-            except Exception:
-                skipped += 1
-                continue
-        deleted += 1
+        to_delete.append(ev_id)
+    deleted = len(to_delete)
+    if not dry_run and to_delete:
+        results = execute_batch(service, [delete_event_request(service, calendar_id, ev_id) for ev_id in to_delete])
+        failures = sum(1 for _, exc in results if exc is not None)
+        deleted -= failures
+        skipped += failures
     return {"total_listed": len(items), "deleted": deleted, "skipped": skipped}
@@ -0,0 +1,415 @@
+"""Cliente asíncrono de Google Calendar sobre httpx.
+
+Ofrece las mismas operaciones que `google_calendar` (freebusy, insertar,
+parchear, borrar y listar con paginación) sin bloquear hilos: un único
+`httpx.AsyncClient` por event loop mantiene un pool de conexiones keep-alive
+(HTTP/2 si `h2` está instalado) y los reintentos esperan con `asyncio.sleep`.
+Cada intento pasa por `GCAL_LIMITER.aslot`, igual que el cliente síncrono.
+
+Lo usan el free/busy de las rutas async (`FreeBusyCache.busy_for_async`) y las
+llamadas individuales del worker de la cola (`logic.*_gcal_reservation_async`).
+
+`FakeCalendarBackend` emula la API REST en memoria a través de un
+`httpx.MockTransport`, de modo que el cliente se prueba sin red.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import weakref
+from datetime import datetime, timezone
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import httpx
+
+from app.integrations.google_calendar import (
+    GCAL_HTTP_RETRIES,
+    GCAL_HTTP_RETRY_WAIT,
+    GCAL_HTTP_TIMEOUT,
+    _event_body,
+    _load_sa_creds,
+    _load_user_creds,
+    _times_body,
+    iso_datetime,
+)
+from app.integrations.google_calendar_limits import GCAL_LIMITER, is_rate_limited
+
+try:  # HTTP/2 es opcional: sin `h2`, httpx trabaja en HTTP/1.1 con keep-alive.
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except Exception:  # pragma: no cover - depende del entorno
+    _HTTP2_AVAILABLE = False
+
+logger = logging.getLogger("pelubot.integrations.google_calendar_async")
+
+GCAL_API_BASE = "https://www.googleapis.com/calendar/v3"
+GCAL_ASYNC_MAX_CONNECTIONS = int(os.getenv("GCAL_ASYNC_MAX_CONNECTIONS", "20"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+TokenProvider = Callable[[], Awaitable[Optional[str]]]
+
+
+class AsyncCalendarError(RuntimeError):
+    """Error de la API de Calendar; `status_code` es None en fallos de red."""
+
+    def __init__(self, action: str, message: str, status_code: Optional[int] = None):
+        super().__init__(f"Error {action}: {message}")
+        self.action = action
+        self.status_code = status_code
+
+
+def _cal_path(calendar_id: str) -> str:
+    return f"/calendars/{quote(calendar_id, safe='')}/events"
+
+
+def _error_message(resp: httpx.Response) -> str:
+    try:
+        payload = resp.json()
+        return str((payload.get("error") or {}).get("message") or payload)
+    except Exception:
+        return f"HTTP {resp.status_code}"
+
+
+def credentials_token_provider(creds: Any) -> TokenProvider:
+    """Adapta credenciales de google-auth; el refresco (bloqueante) va a un hilo."""
+    from google.auth.transport.requests import Request
+
+    lock = asyncio.Lock()
+
+    async def _token() -> Optional[str]:
+        if not creds.valid:
+            async with lock:
+                if not creds.valid:
+                    await asyncio.to_thread(creds.refresh, Request())
+        return creds.token
+
+    return _token
+
+
+class AsyncCalendarClient:
+    """Cliente asíncrono con pool de conexiones compartido."""
+
+    def __init__(
+        self,
+        token_provider: Optional[TokenProvider] = None,
+        *,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        base_url: str = GCAL_API_BASE,
+        timeout: float = GCAL_HTTP_TIMEOUT,
+        retries: int = GCAL_HTTP_RETRIES,
+        retry_wait: float = GCAL_HTTP_RETRY_WAIT,
+        max_connections: int = GCAL_ASYNC_MAX_CONNECTIONS,
+        http2: bool = True,
+    ):
+        self._token_provider = token_provider
+        self.retries = max(0, retries)
+        self.retry_wait = max(0.0, retry_wait)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            transport=transport,
+            http2=bool(http2 and transport is None and _HTTP2_AVAILABLE),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncCalendarClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        action: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        calendar_ids: Tuple[Optional[str], ...] = (),
+    ) -> Dict[str, Any]:
+        attempts = self.retries + 1
+        last_exc: AsyncCalendarError | None = None
+        for attempt in range(1, attempts + 1):
+            headers: Dict[str, str] = {}
+            if self._token_provider is not None:
+                token = await self._token_provider()
+                if token:
+                    headers["Authorization"] = f"Bearer {token}"
+            try:
+                async with GCAL_LIMITER.aslot(calendar_ids):
+                    resp = await self._send(method, path, action, params=params, json=json, headers=headers)
+            except AsyncCalendarError as exc:
+                last_exc = exc
+                if exc.status_code is not None and exc.status_code not in _RETRY_STATUS:
+                    raise
+            else:
+                if resp.status_code == 204 or not resp.content:
+                    return {}
+                return resp.json()
+            logger.warning("Google Calendar %s falló (intento %s/%s): %s", action, attempt, attempts, last_exc)
+            if attempt < attempts:
+                wait = self.retry_wait * attempt
+                if is_rate_limited(last_exc):
+                    wait *= 2 ** attempt
+                await asyncio.sleep(wait)
+        assert last_exc is not None
+        raise last_exc
+
+    async def _send(self, method: str, path: str, action: str, **kwargs: Any) -> httpx.Response:
+        """Una petición; los errores salen como `AsyncCalendarError` para que el limitador los vea."""
+        try:
+            resp = await self._client.request(method, path, **kwargs)
+        except httpx.TransportError as exc:
+            raise AsyncCalendarError(action, str(exc) or exc.__class__.__name__) from exc
+        if resp.status_code >= 400:
+            raise AsyncCalendarError(action, _error_message(resp), resp.status_code)
+        return resp
+
+    async def freebusy(
+        self, calendar_ids: List[str], time_min_iso: str, time_max_iso: str, tz: str = "Europe/Madrid"
+    ) -> Dict[str, List[Dict[str, str]]]:
+        """Intervalos ocupados de varios calendarios en una sola llamada (cal_id -> busy[])."""
+        body = {
+            "timeMin": iso_datetime(time_min_iso, tz),
+            "timeMax": iso_datetime(time_max_iso, tz),
+            "timeZone": tz,
+            "items": [{"id": cid} for cid in calendar_ids],
+        }
+        resp = await self._request("POST", "/freeBusy", "consultando freebusy", json=body, calendar_ids=tuple(calendar_ids))
+        cals = resp.get("calendars", {})
+        return {cid: cals.get(cid, {}).get("busy", []) for cid in calendar_ids}
+
+    async def insert_event(self, calendar_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("POST", _cal_path(calendar_id), "creando evento", json=body, calendar_ids=(calendar_id,))
+
+    async def create_event(
+        self,
+        calendar_id: str,
+        start_dt,
+        end_dt,
+        summary: str,
+        private_props: Optional[Dict[str, str]] = None,
+        description: Optional[str] = None,
+        color_id: Optional[str] = None,
+        tz: str = "Europe/Madrid",
+    ) -> Dict[str, Any]:
+        """Equivalente asíncrono de `google_calendar.create_event`."""
+        body = _event_body(start_dt, end_dt, summary, private_props, description, color_id, tz)
+        return await self.insert_event(calendar_id, body)
+
+    async def patch_event(
+        self, calendar_id: str, event_id: str, start_dt, end_dt, tz: str = "Europe/Madrid"
+    ) -> Dict[str, Any]:
+        path = f"{_cal_path(calendar_id)}/{quote(event_id, safe='')}"
+        return await self._request("PATCH", path, "modificando evento", json=_times_body(start_dt, end_dt, tz), calendar_ids=(calendar_id,))
+
+    async def delete_event(self, calendar_id: str, event_id: str) -> None:
+        path = f"{_cal_path(calendar_id)}/{quote(event_id, safe='')}"
+        await self._request("DELETE", path, "eliminando evento", calendar_ids=(calendar_id,))
+
+    async def list_events(
+        self,
+        calendar_id: str,
+        time_min: Optional[str] = None,
+        time_max: Optional[str] = None,
+        tz: str = "Europe/Madrid",
+        *,
+        page_size: int = 250,
+        **extra: Any,
+    ) -> List[Dict[str, Any]]:
+        """Lista eventos recorriendo todas las páginas (`nextPageToken`)."""
+        params: Dict[str, Any] = {
+            "singleEvents": "true",
+            "orderBy": "startTime",
+            "timeZone": tz,
+            "maxResults": page_size,
+            "timeMin": iso_datetime(time_min, tz) if time_min else "1970-01-01T00:00:00+00:00",
+            "timeMax": iso_datetime(time_max, tz) if time_max else "2100-01-01T00:00:00+00:00",
+        }
+        params.update({k: v for k, v in extra.items() if v is not None})
+        items: List[Dict[str, Any]] = []
+        while True:
+            resp = await self._request("GET", _cal_path(calendar_id), "listando eventos", params=params, calendar_ids=(calendar_id,))
+            items.extend(resp.get("items", []))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return items
+            params["pageToken"] = page_token
+
+
+# ---------------------------------------------------------------------------
+# Backend falso (tests y modo demo)
+# ---------------------------------------------------------------------------
+
+def _parse_event_time(value: Dict[str, Any] | None) -> Optional[datetime]:
+    value = value or {}
+    raw = value.get("dateTime") or value.get("date")
+    if not raw:
+        return None
+    dt = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class FakeCalendarBackend:
+    """Emulación en memoria de la API REST de Calendar para `httpx.MockTransport`.
+
+    `latency` añade una espera por petición (útil para medir concurrencia) y
+    `fail_next` inyecta respuestas de error para probar reintentos.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.events: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.requests: List[httpx.Request] = []
+        self._ids = count(1)
+        self._failures: List[int] = []
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self._handle)
+
+    def fail_next(self, status_code: int, times: int = 1) -> None:
+        self._failures.extend([status_code] * times)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        self.requests.append(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._failures:
+            status = self._failures.pop(0)
+            return httpx.Response(status, json={"error": {"code": status, "message": "fallo simulado"}})
+        path = request.url.path
+        prefix = httpx.URL(GCAL_API_BASE).path
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        if parts == ["freeBusy"] and request.method == "POST":
+            return self._freebusy(_json(request))
+        if len(parts) >= 3 and parts[0] == "calendars" and parts[2] == "events":
+            calendar_id = parts[1]
+            event_id = parts[3] if len(parts) > 3 else None
+            return self._events(request, calendar_id, event_id)
+        return httpx.Response(404, json={"error": {"code": 404, "message": "ruta no emulada"}})
+
+    def _events(self, request: httpx.Request, calendar_id: str, event_id: Optional[str]) -> httpx.Response:
+        store = self.events.setdefault(calendar_id, {})
+        if event_id is None and request.method == "POST":
+            new_id = f"fake-{next(self._ids)}"
+            event = {**_json(request), "id": new_id}
+            store[new_id] = event
+            return httpx.Response(200, json=event)
+        if event_id is None and request.method == "GET":
+            return self._list(request, store)
+        if event_id is None or event_id not in store:
+            return httpx.Response(404, json={"error": {"code": 404, "message": "Not Found"}})
+        if request.method == "PATCH":
+            store[event_id].update(_json(request))
+            return httpx.Response(200, json=store[event_id])
+        if request.method == "DELETE":
+            store.pop(event_id, None)
+            return httpx.Response(204)
+        if request.method == "GET":
+            return httpx.Response(200, json=store[event_id])
+        return httpx.Response(405)
+
+    def _in_range(self, event: Dict[str, Any], time_min: Optional[datetime], time_max: Optional[datetime]) -> bool:
+        start = _parse_event_time(event.get("start"))
+        end = _parse_event_time(event.get("end"))
+        if start is None or end is None:
+            return False
+        return (time_max is None or start < time_max) and (time_min is None or end > time_min)
+
+    def _list(self, request: httpx.Request, store: Dict[str, Dict[str, Any]]) -> httpx.Response:
+        params = request.url.params
+        time_min = _parse_event_time({"dateTime": params["timeMin"]}) if "timeMin" in params else None
+        time_max = _parse_event_time({"dateTime": params["timeMax"]}) if "timeMax" in params else None
+        matching = sorted(
+            (ev for ev in store.values() if self._in_range(ev, time_min, time_max)),
+            key=lambda ev: _parse_event_time(ev.get("start")),
+        )
+        offset = int(params.get("pageToken") or 0)
+        page_size = int(params.get("maxResults") or 250)
+        page = matching[offset:offset + page_size]
+        body: Dict[str, Any] = {"items": page}
+        if offset + page_size < len(matching):
+            body["nextPageToken"] = str(offset + page_size)
+        return httpx.Response(200, json=body)
+
+    def _freebusy(self, body: Dict[str, Any]) -> httpx.Response:
+        time_min = _parse_event_time({"dateTime": body.get("timeMin")})
+        time_max = _parse_event_time({"dateTime": body.get("timeMax")})
+        calendars: Dict[str, Any] = {}
+        for item in body.get("items", []):
+            cid = item.get("id") or "primary"
+            busy = [
+                {"start": ev["start"].get("dateTime"), "end": ev["end"].get("dateTime")}
+                for ev in self.events.get(cid, {}).values()
+                if self._in_range(ev, time_min, time_max)
+            ]
+            calendars[cid] = {"busy": busy}
+        return httpx.Response(200, json={"calendars": calendars})
+
+
+def _json(request: httpx.Request) -> Dict[str, Any]:
+    raw = request.content
+    return json.loads(raw) if raw else {}
+
+
+# ---------------------------------------------------------------------------
+# Cliente compartido
+# ---------------------------------------------------------------------------
+
+# Un cliente por event loop: el pool de conexiones de httpx no se comparte entre loops.
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncCalendarClient]" = weakref.WeakKeyDictionary()
+
+
+def _use_fake() -> bool:
+    return bool(os.getenv("PYTEST_CURRENT_TEST")) or os.getenv("PELUBOT_FAKE_GCAL") == "1"
+
+
+def build_async_calendar() -> AsyncCalendarClient:
+    """Crea un cliente nuevo (falso en pytest o con PELUBOT_FAKE_GCAL=1)."""
+    if _use_fake():
+        return AsyncCalendarClient(transport=FakeCalendarBackend().transport())
+    creds = _load_sa_creds() or _load_user_creds()
+    if not creds:
+        raise RuntimeError("No hay credenciales. Exporta GOOGLE_SERVICE_ACCOUNT_JSON o GOOGLE_OAUTH_JSON")
+    return AsyncCalendarClient(credentials_token_provider(creds))
+
+
+def get_async_calendar() -> AsyncCalendarClient:
+    """Cliente compartido del event loop en curso (se crea la primera vez)."""
+    loop = asyncio.get_running_loop()
+    client = _shared_clients.get(loop)
+    if client is None or client.closed:
+        client = build_async_calendar()
+        _shared_clients[loop] = client
+    return client
+
+
+async def close_async_calendar() -> None:
+    """Cierra el cliente compartido del loop actual (apagado de la app)."""
+    loop = asyncio.get_running_loop()
+    client = _shared_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,289 @@
+"""Limitación de llamadas al API de Google Calendar.
+
+Cada llamada pasa por tres controles en este orden:
+
+1. Un token bucket por calendario (`GCAL_RATE_CALENDAR_QPS` / `_BURST`).
+2. Un token bucket global del proceso (`GCAL_RATE_GLOBAL_QPS` / `_BURST`).
+3. Un límite de llamadas simultáneas adaptativo tipo AIMD: sube de forma
+   aditiva con cada respuesta correcta y se reduce a la mitad cuando Google
+   señala saturación (429, 403 rateLimitExceeded, 5xx o conexiones cortadas).
+   El límite va de `GCAL_MIN_CONCURRENCY` a `GCAL_MAX_CONCURRENCY`.
+
+Un lote HTTP consume un token por operación. Con el cliente falso (pytest o
+`PELUBOT_FAKE_GCAL=1`) no hay cuota que proteger y el limitador no actúa.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.metrics import GCAL_CONCURRENCY_LIMIT, GCAL_INFLIGHT, GCAL_RATE_LIMITED, GCAL_THROTTLE_WAIT
+
+logger = logging.getLogger("pelubot.integrations.google_calendar_limits")
+
+_HTTP_STATUS = re.compile(r"HttpError (\d{3})")
+_SATURATION_HINTS = ("ratelimitexceeded", "quotaexceeded", "too many requests", "record layer failure")
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True si el error indica que Google (o la red hacia él) está saturado."""
+    status = getattr(getattr(exc, "resp", None), "status", None) or getattr(exc, "status_code", None)
+    text = str(exc).lower()
+    if status is None:
+        match = _HTTP_STATUS.search(str(exc))
+        status = match.group(1) if match else None
+    try:
+        code = int(status) if status is not None else None
+    except (TypeError, ValueError):
+        code = None
+    if code == 429 or (code is not None and 500 <= code < 600):
+        return True
+    if code == 403:
+        return "ratelimitexceeded" in text
+    return any(hint in text for hint in _SATURATION_HINTS)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """Token bucket con reserva: quien llega sin tokens deja saldo negativo y espera a que se repongan.
+
+    Así un lote que cuesta más que la ráfaga no se bloquea para siempre y las
+    esperas se reparten en orden de llegada. `rate <= 0` desactiva el límite.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """Descuenta `cost` tokens y devuelve los segundos que hay que esperar."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, cost: float = 1.0) -> float:
+        wait = self.reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrency:
+    """Límite de llamadas simultáneas con incremento aditivo y reducción multiplicativa (AIMD)."""
+
+    def __init__(
+        self,
+        initial: float,
+        minimum: float = 1,
+        maximum: float = 16,
+        *,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = max(1.0, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.limit = min(max(float(initial), self.minimum), self.maximum)
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+        self._publish()
+
+    def acquire(self) -> float:
+        """Espera a que haya hueco y devuelve los segundos esperados."""
+        started = time.monotonic()
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+            self._publish()
+        return time.monotonic() - started
+
+    def try_acquire(self) -> bool:
+        """Ocupa un hueco si lo hay, sin esperar (para llamadores async)."""
+        with self._cond:
+            if self.inflight >= int(self.limit):
+                return False
+            self.inflight += 1
+            self._publish()
+            return True
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.inflight = max(0, self.inflight - 1)
+            if throttled:
+                self._decrease()
+            else:
+                # +1 por cada "ventana" completa de `limit` respuestas correctas.
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._publish()
+            self._cond.notify_all()
+
+    def penalize(self) -> None:
+        """Registra saturación sin liberar hueco (p. ej. operaciones rechazadas dentro de un lote)."""
+        with self._cond:
+            self._decrease()
+            self._publish()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Varias respuestas 429 de la misma ráfaga cuentan como una sola señal.
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        logger.warning("Google Calendar saturado: concurrencia %.1f -> %.1f", previous, self.limit)
+
+    def _publish(self) -> None:
+        try:
+            GCAL_CONCURRENCY_LIMIT.set(int(self.limit))
+            GCAL_INFLIGHT.set(self.inflight)
+        except Exception:
+            pass
+
+
+class GoogleRateLimiter:
+    """Buckets por calendario y global más concurrencia adaptativa, compartidos por todo el proceso."""
+
+    def __init__(
+        self,
+        *,
+        global_rate: float,
+        global_burst: float,
+        calendar_rate: float,
+        calendar_burst: float,
+        concurrency: AdaptiveConcurrency,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.calendar_rate = calendar_rate
+        self.calendar_burst = calendar_burst
+        self.concurrency = concurrency
+        self._calendars: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "GoogleRateLimiter":
+        maximum = _env_float("GCAL_MAX_CONCURRENCY", 8)
+        return cls(
+            global_rate=_env_float("GCAL_RATE_GLOBAL_QPS", 20),
+            global_burst=_env_float("GCAL_RATE_GLOBAL_BURST", 40),
+            calendar_rate=_env_float("GCAL_RATE_CALENDAR_QPS", 5),
+            calendar_burst=_env_float("GCAL_RATE_CALENDAR_BURST", 10),
+            concurrency=AdaptiveConcurrency(
+                initial=_env_float("GCAL_INITIAL_CONCURRENCY", max(1.0, maximum / 2)),
+                minimum=_env_float("GCAL_MIN_CONCURRENCY", 1),
+                maximum=maximum,
+            ),
+        )
+
+    def _calendar_bucket(self, calendar_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._calendars.get(calendar_id)
+            if bucket is None:
+                bucket = self._calendars[calendar_id] = TokenBucket(self.calendar_rate, self.calendar_burst)
+            return bucket
+
+    def _reserve(self, calendar_ids: Iterable[Optional[str]], cost: int) -> Tuple[float, float]:
+        """Descuenta los tokens de la llamada; devuelve las esperas (por calendario, global)."""
+        per_calendar = Counter(cid for cid in calendar_ids if cid)
+        calendar_wait = max(
+            (self._calendar_bucket(cid).reserve(count) for cid, count in per_calendar.items()),
+            default=0.0,
+        )
+        global_wait = self.global_bucket.reserve(max(cost, 1))
+        _observe_wait("calendar", calendar_wait)
+        _observe_wait("global", global_wait)
+        return calendar_wait, global_wait
+
+    @contextmanager
+    def slot(self, calendar_ids: Iterable[Optional[str]] = (), cost: int = 1) -> Iterator[None]:
+        """Reserva tokens y un hueco de concurrencia para una llamada HTTP de `cost` operaciones."""
+        if _limiter_disabled():
+            yield
+            return
+        # Las reservas ya están hechas: basta con esperar la mayor.
+        wait = max(self._reserve(calendar_ids, cost))
+        if wait > 0:
+            time.sleep(wait)
+        _observe_wait("concurrency", self.concurrency.acquire())
+        with self._feedback():
+            yield
+
+    @asynccontextmanager
+    async def aslot(self, calendar_ids: Iterable[Optional[str]] = (), cost: int = 1) -> AsyncIterator[None]:
+        """Como `slot`, pero espera con `asyncio.sleep` en vez de bloquear el hilo del event loop."""
+        if _limiter_disabled():
+            yield
+            return
+        wait = max(self._reserve(calendar_ids, cost))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        started = time.monotonic()
+        while not self.concurrency.try_acquire():
+            await asyncio.sleep(0.01)
+        _observe_wait("concurrency", time.monotonic() - started)
+        with self._feedback():
+            yield
+
+    @contextmanager
+    def _feedback(self) -> Iterator[None]:
+        """Libera el hueco de concurrencia e informa al AIMD de si Google se quejó de saturación."""
+        throttled = False
+        try:
+            yield
+        except BaseException as exc:
+            throttled = is_rate_limited(exc)
+            if throttled:
+                _count_rate_limited()
+            raise
+        finally:
+            self.concurrency.release(throttled=throttled)
+
+    def penalize(self) -> None:
+        _count_rate_limited()
+        self.concurrency.penalize()
+
+
+def _limiter_disabled() -> bool:
+    return bool(os.getenv("PYTEST_CURRENT_TEST")) or os.getenv("PELUBOT_FAKE_GCAL") == "1"
+
+
+def _observe_wait(scope: str, seconds: float) -> None:
+    try:
+        GCAL_THROTTLE_WAIT.labels(scope=scope).observe(seconds)
+    except Exception:
+        pass
+
+
+def _count_rate_limited() -> None:
+    try:
+        GCAL_RATE_LIMITED.inc()
+    except Exception:
+        pass
+
+
+GCAL_LIMITER = GoogleRateLimiter.from_env()
@@ -26,10 +26,13 @@ from app.api.pro_portal import router as pros_router
 from app.db import create_db_and_tables
 from sqlmodel import Session
 from datetime import date, timedelta
-from app.db import engine
-from app.services.logic import sync_from_gcal_range
+from app.db import dispose_async_engine, engine, shutdown_writer
+from app.services.logic import sync_from_gcal_incremental, sync_from_gcal_range
 from app.services.calendar_queue import start_worker, stop_worker
+from app.services.calendar_watch import start_watch_manager, stop_watch_manager
+from app.services.admin_jobs import shutdown_admin_jobs
 from app.services import backup as backup_service
+from app.integrations.google_calendar_async import close_async_calendar
 
 logger = logging.getLogger("pelubot.main")
 
@@ -57,9 +60,14 @@ async def lifespan(app: FastAPI):
         default_service = os.getenv("DEFAULT_SERVICE_FOR_SYNC", "corte_cabello")
         start_date = date.today()
         end_date = start_date + timedelta(days=max(0, days - 1))
+        # incremental (por defecto): solo cambios desde el último syncToken; range: re-lista día a día.
+        sync_mode = os.getenv("AUTO_SYNC_FROM_GCAL_MODE", "incremental").lower()
         try:
             with Session(engine) as s:
-                sync_from_gcal_range(s, start_date, end_date, default_service=default_service, by_professional=True)
+                if sync_mode == "range":
+                    sync_from_gcal_range(s, start_date, end_date, default_service=default_service, by_professional=True)
+                else:
+                    sync_from_gcal_incremental(s, default_service=default_service, by_professional=True)
         except Exception as exc:  # noqa: BLE001 - queremos hacer visible el fallo de arranque
             logger.exception("Error sincronizando con Google Calendar al iniciar")
             raise
@@ -73,6 +81,14 @@ async def lifespan(app: FastAPI):
             logger.exception("No se pudo iniciar el worker de Google Calendar")
             raise
 
+    watch_started = False
+    if not os.getenv("PYTEST_CURRENT_TEST"):
+        try:
+            # Solo con GCAL_WATCH_ADDRESS: abre y renueva los canales de notificaciones push.
+            watch_started = start_watch_manager()
+        except Exception:  # noqa: BLE001 - sin canales se sigue sincronizando con /admin/sync
+            logger.exception("No se pudieron iniciar las notificaciones push de Google Calendar")
+
     enable_auto_backups = os.getenv("PELUBOT_AUTO_BACKUPS", "true").lower() in ("1","true","yes","si","sí","y")
     if enable_auto_backups and not os.getenv("PYTEST_CURRENT_TEST"):
         try:
@@ -102,12 +118,34 @@ async def lifespan(app: FastAPI):
             stop_worker()
         except Exception as exc:  # noqa: BLE001 - registramos el fallo pero no impide la finalización
             logger.exception("No se pudo detener el worker de Google Calendar correctamente: %s", exc)
+    if watch_started:
+        try:
+            stop_watch_manager()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("No se pudieron detener las notificaciones push de Google Calendar: %s", exc)
+    try:
+        shutdown_admin_jobs()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("No se pudieron detener los trabajos de administración: %s", exc)
     if backup_task:
         backup_task.cancel()
         try:
             await backup_task
         except asyncio.CancelledError:
             pass
+    try:
+        await close_async_calendar()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("No se pudo cerrar el cliente asíncrono de Google Calendar: %s", exc)
+    try:
+        await dispose_async_engine()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("No se pudo cerrar el motor async de la BD: %s", exc)
+    try:
+        # Tras parar las peticiones: confirma lo que quede en la cola del escritor.
+        await asyncio.to_thread(shutdown_writer)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("No se pudo parar el escritor de la BD: %s", exc)
 
 
 def create_app() -> FastAPI:
@@ -4,7 +4,7 @@ Incluye servicios, profesionales, reservas y estructuras de consulta.
 """
 from pydantic import BaseModel, Field, field_validator, EmailStr, model_validator
 from typing import Dict, List, Optional, Literal
-from datetime import datetime, date, timezone
+from datetime import datetime, date, time, timezone
 from sqlmodel import SQLModel, Field as SQLField
 from sqlalchemy.types import DateTime
 from sqlalchemy import Index, UniqueConstraint, CheckConstraint, event, Column, String, JSON
@@ -124,6 +124,47 @@ class StylistDB(StylistBase, table=True):
     )
 
 
+class StylistScheduleDB(SQLModel, table=True):
+    """Franja semanal de trabajo de un estilista (sin filas, aplica `WEEKLY_SCHEDULE`)."""
+
+    __tablename__ = "stylist_schedule"
+    __table_args__ = (
+        Index("ix_stylist_schedule_pro_weekday", "professional_id", "weekday"),
+        CheckConstraint("weekday >= 0 AND weekday <= 6", name="ck_schedule_weekday"),
+        CheckConstraint("end_time > start_time", name="ck_schedule_end_after_start"),
+        {"extend_existing": True},
+    )
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    professional_id: str = SQLField(index=True, nullable=False)
+    weekday: int = SQLField(nullable=False, description="0 = lunes ... 6 = domingo")
+    start_time: time = SQLField(nullable=False)
+    end_time: time = SQLField(nullable=False)
+
+
+class StylistScheduleExceptionDB(SQLModel, table=True):
+    """Excepción de horario en una fecha concreta (festivo, vacaciones o jornada especial).
+
+    Las filas de una fecha sustituyen por completo a las franjas semanales de ese
+    día; una fila sin horas marca el día como cerrado.
+    """
+
+    __tablename__ = "stylist_schedule_exceptions"
+    __table_args__ = (
+        Index("ix_stylist_schedule_exc_pro_date", "professional_id", "on_date"),
+        CheckConstraint(
+            "(start_time IS NULL AND end_time IS NULL) OR (end_time > start_time)",
+            name="ck_schedule_exc_range",
+        ),
+        {"extend_existing": True},
+    )
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    professional_id: str = SQLField(index=True, nullable=False)
+    on_date: date = SQLField(index=True, nullable=False)
+    start_time: Optional[time] = SQLField(default=None, nullable=True)
+    end_time: Optional[time] = SQLField(default=None, nullable=True)
+    note: Optional[str] = SQLField(default=None, nullable=True)
+
+
 class StylistPublic(BaseModel):
     """Representación pública segura del estilista."""
 
@@ -413,7 +454,8 @@ class ReservationDB(SQLModel, table=True):
         Index('ix_res_prof_start_end', 'professional_id', 'start', 'end'),
         Index('ix_res_status', 'status'),
         UniqueConstraint('google_calendar_id', 'google_event_id', name='uq_gcal_event_per_calendar'),
-        CheckConstraint('end > start', name='ck_end_after_start'),
+        # `end` entre comillas: es palabra reservada en Postgres.
+        CheckConstraint('"end" > start', name='ck_end_after_start'),
         {"extend_existing": True},
     )
     id: str = SQLField(primary_key=True)
@@ -459,7 +501,7 @@ class CalendarSyncJobDB(SQLModel, table=True):
     id: Optional[int] = SQLField(default=None, primary_key=True)
     reservation_id: str = SQLField(index=True, nullable=False)
     action: str = SQLField(index=True, description="Acción a ejecutar: create/update/delete")
-    status: str = SQLField(default="pending", index=True, description="pending, processing, completed, failed")
+    status: str = SQLField(default="pending", index=True, description="pending, processing, completed, failed, coalesced")
     payload: dict = SQLField(
         default_factory=dict,
         sa_column=Column(JSON, nullable=False, default=dict),
@@ -500,6 +542,56 @@ class CalendarSyncJobDB(SQLModel, table=True):
     )
 
 
+class CalendarSyncStateDB(SQLModel, table=True):
+    """Estado de la importación incremental desde Google Calendar (una fila por calendario)."""
+
+    __tablename__ = "calendar_sync_state"
+    calendar_id: str = SQLField(primary_key=True)
+    sync_token: Optional[str] = SQLField(default=None, sa_column=Column(String, nullable=True))
+    full_sync_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    synced_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+
+
+class CalendarWatchChannelDB(SQLModel, table=True):
+    """Canal de notificaciones push (`events.watch`) abierto sobre un calendario de Google."""
+
+    __tablename__ = "calendar_watch_channels"
+    id: str = SQLField(primary_key=True, description="Identificador del canal (X-Goog-Channel-ID)")
+    calendar_id: str = SQLField(index=True, nullable=False)
+    resource_id: Optional[str] = SQLField(default=None, sa_column=Column(String, nullable=True))
+    token: str = SQLField(nullable=False, description="Secreto que Google reenvía en X-Goog-Channel-Token")
+    address: str = SQLField(nullable=False)
+    expiration: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    created_at: datetime = SQLField(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        nullable=False,
+    )
+    stopped_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    last_message_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+
+
+class CalendarSyncJobArchiveDB(SQLModel, table=True):
+    """Trabajo de Google Calendar terminado, movido fuera de la tabla caliente por retención."""
+
+    __tablename__ = "calendar_sync_jobs_archive"
+    id: int = SQLField(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    reservation_id: str = SQLField(index=True, nullable=False)
+    action: str
+    status: str
+    payload: dict = SQLField(default_factory=dict, sa_column=Column(JSON, nullable=False, default=dict))
+    attempts: int = SQLField(default=0, nullable=False)
+    last_error: Optional[str] = SQLField(default=None, sa_column=Column(String, nullable=True))
+    locked_by: Optional[str] = None
+    locked_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    heartbeat_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    available_at: datetime = SQLField(sa_type=DateTime(timezone=True))
+    created_at: datetime = SQLField(sa_type=DateTime(timezone=True), nullable=False)
+    updated_at: datetime = SQLField(sa_type=DateTime(timezone=True), nullable=False)
+    completed_at: Optional[datetime] = SQLField(default=None, sa_type=DateTime(timezone=True), nullable=True)
+    archived_at: datetime = SQLField(sa_type=DateTime(timezone=True), nullable=False)
+
+
 @event.listens_for(CalendarSyncJobDB, 'before_update', propagate=True)
 def _set_calendar_job_updated(mapper, connection, target):  # type: ignore[override]
     try:
@@ -0,0 +1,232 @@
+"""Trabajos de administración en segundo plano (sincronización, conflictos, limpieza).
+
+`/admin/sync`, `/admin/conflicts` y `/admin/clear_calendars` pueden tardar
+minutos con rangos largos. Con `background: true` se ejecutan aquí, en un
+pool de hilos del proceso, y la petición devuelve al momento el id del
+trabajo. El trabajo publica eventos de progreso (uno por calendario) que se
+leen con `GET /admin/jobs/{id}` o en directo con
+`GET /admin/jobs/{id}/events` (NDJSON o SSE).
+
+La cancelación es cooperativa: `cancel()` marca el trabajo y la siguiente
+llamada a `progress` lanza `JobCancelled`. Las funciones de sincronización
+confirman cada calendario antes de informar de él, así que lo ya escrito se
+conserva. El registro vive en memoria y solo guarda los últimos
+`ADMIN_JOBS_KEEP` trabajos terminados.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.metrics import ADMIN_JOB_DURATION, ADMIN_JOBS
+
+logger = logging.getLogger("pelubot.admin_jobs")
+
+Progress = Callable[[Dict[str, Any]], None]
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Se lanza desde `progress` cuando se pidió cancelar el trabajo."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class AdminJob:
+    id: str
+    kind: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = "pending"
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Contadores acumulados por fase: {"import": {"done": 2, "total": 3, "inserted": 10, ...}}
+    progress: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: threading.Event = field(default_factory=threading.Event)
+    future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "cancel_requested": self.cancel_requested.is_set(),
+            "progress": self.progress,
+            "events": len(self.events),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class AdminJobRegistry:
+    """Registro en memoria de trabajos; un pool pequeño para no saturar la cuota de Google."""
+
+    def __init__(self, max_workers: int = 2, keep: int = 50):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="admin-job")
+        self._keep = max(1, keep)
+        self._jobs: Dict[str, AdminJob] = {}
+        self._cond = threading.Condition()
+
+    def submit(self, kind: str, run: Callable[[Progress], Dict[str, Any]], params: Optional[Dict[str, Any]] = None) -> AdminJob:
+        """Encola `run(progress)`; su valor de retorno queda como resultado del trabajo."""
+        job = AdminJob(id=uuid.uuid4().hex, kind=kind, params=dict(params or {}))
+        with self._cond:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._pool.submit(self._execute, job, run)
+        return job
+
+    def get(self, job_id: str) -> Optional[AdminJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[AdminJob]:
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[AdminJob]:
+        """Pide cancelar el trabajo; si aún no había empezado, no llega a ejecutarse."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested.set()
+            if job.status == "pending" and job.future is not None and job.future.cancel():
+                self._finish(job, "cancelled")
+            return job
+
+    def wait_events(self, job_id: str, after: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Eventos con `seq > after`, esperando hasta `timeout` si no hay ninguno; y si el trabajo terminó."""
+        deadline = monotonic() + max(0.0, timeout)
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return [], True
+                fresh = job.events[after:]
+                if fresh or job.finished:
+                    return list(fresh), job.finished
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return [], False
+                self._cond.wait(remaining)
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._cond:
+            for job in self._jobs.values():
+                if not job.finished:
+                    job.cancel_requested.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _reporter(self, job: AdminJob) -> Progress:
+        def _progress(event: Dict[str, Any]) -> None:
+            if job.cancel_requested.is_set():
+                raise JobCancelled(job.id)
+            with self._cond:
+                self._publish(job, {"type": "progress", **event})
+                stage = event.get("stage") or job.kind
+                counters = job.progress.setdefault(stage, {})
+                for key, value in event.items():
+                    if key in ("done", "total") or not isinstance(value, int) or isinstance(value, bool):
+                        continue
+                    counters[key] = counters.get(key, 0) + value
+                for key in ("done", "total"):
+                    if isinstance(event.get(key), int):
+                        counters[key] = event[key]
+
+        return _progress
+
+    def _execute(self, job: AdminJob, run: Callable[[Progress], Dict[str, Any]]) -> None:
+        with self._cond:
+            if job.cancel_requested.is_set():
+                self._finish(job, "cancelled")
+                return
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+            self._publish(job, {"type": "status", "status": "running"})
+        started = monotonic()
+        try:
+            result = run(self._reporter(job))
+        except JobCancelled:
+            status, result = "cancelled", None
+        except Exception as exc:  # noqa: BLE001 - el fallo queda en el trabajo
+            logger.exception("Fallo en el trabajo %s (%s)", job.id, job.kind)
+            with self._cond:
+                job.error = str(exc) or exc.__class__.__name__
+            status, result = "failed", None
+        else:
+            status = "completed"
+        ADMIN_JOB_DURATION.labels(kind=job.kind).observe(monotonic() - started)
+        with self._cond:
+            job.result = result
+            self._finish(job, status)
+
+    def _finish(self, job: AdminJob, status: str) -> None:
+        # Requiere `self._cond`.
+        job.status = status
+        job.finished_at = datetime.now(timezone.utc)
+        self._publish(job, {"type": "status", "status": status})
+        ADMIN_JOBS.labels(kind=job.kind, status=status).inc()
+        self._prune()
+
+    def _publish(self, job: AdminJob, event: Dict[str, Any]) -> None:
+        # Requiere `self._cond`.
+        job.events.append({"seq": len(job.events) + 1, "at": datetime.now(timezone.utc).isoformat(), **event})
+        self._cond.notify_all()
+
+    def _prune(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished]
+        if len(finished) <= self._keep:
+            return
+        finished.sort(key=lambda job: job.created_at)
+        for job in finished[: len(finished) - self._keep]:
+            self._jobs.pop(job.id, None)
+
+
+_registry: Optional[AdminJobRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_admin_jobs() -> AdminJobRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AdminJobRegistry(
+                max_workers=_env_int("ADMIN_JOBS_MAX_WORKERS", 2),
+                keep=_env_int("ADMIN_JOBS_KEEP", 50),
+            )
+        return _registry
+
+
+def shutdown_admin_jobs() -> None:
+    """Pide cancelar los trabajos en curso y libera el pool (al parar la app)."""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        registry.shutdown()
@@ -0,0 +1,159 @@
+"""Caché en proceso de disponibilidad con invalidación por escritura.
+
+Cada par (profesional, día) tiene un número de versión que se incrementa cuando
+una escritura toca una reserva de ese profesional en ese día. Las entradas
+guardan la foto de versiones de los profesionales que evaluaron; si alguna ha
+cambiado, la entrada se descarta al leerla. La foto se toma *antes* de leer la
+BD, de modo que una escritura concurrente nunca deja un resultado obsoleto
+marcado como vigente.
+
+El TTL cubre los cambios que no pasan por este proceso (otros workers, scripts
+o SQL manual).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from app.core.metrics import (
+    AVAILABILITY_CACHE_EVICTIONS,
+    AVAILABILITY_CACHE_HITS,
+    AVAILABILITY_CACHE_MISSES,
+)
+from app.utils.date import TZ
+
+logger = logging.getLogger("pelubot.availability_cache")
+
+Snapshot = Tuple[int, Tuple[Tuple[str, int], ...]]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _local_date(dt: datetime) -> date:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(TZ)
+    return dt.date()
+
+
+def _inc(counter, label: str, value: str) -> None:
+    try:
+        counter.labels(**{label: value}).inc()
+    except Exception:
+        pass
+
+
+class AvailabilityCache:
+    """LRU acotado con versionado por (profesional, día)."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 60.0):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._entries: "OrderedDict[Hashable, Tuple[float, Snapshot, Any]]" = OrderedDict()
+        self._versions: Dict[Tuple[str, date], int] = {}
+        # El epoch nunca retrocede: tras un vaciado, ninguna foto previa vuelve a ser válida.
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def snapshot(self, pro_ids: Iterable[str], on_date: date) -> Snapshot:
+        """Versiones actuales de los profesionales para el día (tomar antes de leer la BD)."""
+        with self._lock:
+            return self._epoch, tuple((pid, self._versions.get((pid, on_date), 0)) for pid in pro_ids)
+
+    def get(self, kind: str, key: Hashable, snapshot: Snapshot) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                _inc(AVAILABILITY_CACHE_MISSES, "kind", kind)
+                return None
+            expires_at, stored_snapshot, value = entry
+            if stored_snapshot != snapshot:
+                del self._entries[key]
+                _inc(AVAILABILITY_CACHE_EVICTIONS, "reason", "stale")
+                _inc(AVAILABILITY_CACHE_MISSES, "kind", kind)
+                return None
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                _inc(AVAILABILITY_CACHE_EVICTIONS, "reason", "expired")
+                _inc(AVAILABILITY_CACHE_MISSES, "kind", kind)
+                return None
+            self._entries.move_to_end(key)
+            _inc(AVAILABILITY_CACHE_HITS, "kind", kind)
+            return value
+
+    def put(self, key: Hashable, snapshot: Snapshot, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                _inc(AVAILABILITY_CACHE_EVICTIONS, "reason", "capacity")
+
+    def invalidate(self, professional_id: Optional[str], on_date: date) -> None:
+        """Marca como obsoletas las entradas que dependen de (profesional, día)."""
+        if not professional_id:
+            return
+        with self._lock:
+            key = (str(professional_id), on_date)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            # Las versiones solo crecen con escrituras; si se disparan, reiniciamos todo.
+            if len(self._versions) > max(4 * self.max_entries, 1024):
+                self._clear_locked()
+
+    def invalidate_window(self, professional_id: Optional[str], start: Optional[datetime], end: Optional[datetime] = None) -> None:
+        """Invalida todos los días locales que toca el intervalo [start, end]."""
+        if not professional_id or start is None:
+            return
+        current = _local_date(start)
+        last = _local_date(end) if end is not None else current
+        while current <= last:
+            self.invalidate(professional_id, current)
+            current += timedelta(days=1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear_locked()
+
+    def _clear_locked(self) -> None:
+        if self._entries:
+            logger.debug("Vaciando caché de disponibilidad (%s entradas)", len(self._entries))
+        self._entries.clear()
+        self._versions.clear()
+        self._epoch += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+availability_cache = AvailabilityCache(
+    max_entries=_env_int("AVAILABILITY_CACHE_SIZE", 2048),
+    ttl_seconds=_env_int("AVAILABILITY_CACHE_SECONDS", 60),
+)
+
+
+def invalidate_availability(professional_id: Optional[str], start: Optional[datetime], end: Optional[datetime] = None) -> None:
+    """Atajo para invalidar la disponibilidad afectada por una reserva."""
+    availability_cache.invalidate_window(professional_id, start, end)
+
+
+def clear_availability_cache() -> None:
+    """Vacía la caché (cambios masivos: wipe, SQL manual, restauración de backup)."""
+    availability_cache.clear()
@@ -0,0 +1,263 @@
+"""Comparación entre las reservas de la BD y los eventos de Google Calendar.
+
+Lo comparten la reconciliación (`reconcile_db_to_gcal_range`) y la detección
+de conflictos (`detect_conflicts_range`). Cada calendario se lista una sola vez
+para todo el rango, y los calendarios se piden en paralelo. Las reservas se
+cargan con una sola consulta. Los eventos se indexan por id, y los solapes con
+eventos externos se buscan con un barrido sobre ambos lados ordenados por hora,
+en lugar de comparar cada evento con cada reserva.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlmodel import Session, select
+
+from app.integrations.google_calendar import iso_datetime, list_events_allpages
+from app.models import ReservationDB
+
+logger = logging.getLogger("pelubot.calendar_diff")
+
+
+def parse_gcal_datetime(s: str) -> datetime:
+    """Normaliza fechas ISO de Google Calendar a `datetime` aware."""
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except Exception:
+        return datetime.fromisoformat(s + "T00:00:00+00:00")
+
+
+def _naive_local(dt: datetime, tz: str) -> datetime:
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(ZoneInfo(tz)).replace(tzinfo=None)
+
+
+def _event_times(item: dict) -> Optional[Tuple[datetime, datetime]]:
+    start_v = (item.get("start") or {}).get("dateTime") or (item.get("start") or {}).get("date")
+    end_v = (item.get("end") or {}).get("dateTime") or (item.get("end") or {}).get("date")
+    if not start_v or not end_v:
+        return None
+    return parse_gcal_datetime(start_v), parse_gcal_datetime(end_v)
+
+
+def _private(item: dict) -> dict:
+    return (item.get("extendedProperties") or {}).get("private") or {}
+
+
+def fetch_calendar_events(
+    build: Callable[[], Any],
+    calendar_ids: Iterable[str],
+    time_min: str,
+    time_max: str,
+    tz: str,
+    max_workers: Optional[int] = None,
+) -> Dict[str, List[dict] | Exception]:
+    """Lista el rango completo de cada calendario, en paralelo; un error solo afecta a su calendario.
+
+    Cada hilo pide su propio cliente con `build()` (los clientes de Google no
+    son seguros entre hilos); el limitador de llamadas se sigue aplicando.
+    """
+    calendar_ids = list(dict.fromkeys(calendar_ids))
+    if not calendar_ids:
+        return {}
+    if max_workers is None:
+        try:
+            max_workers = int(os.getenv("GCAL_DIFF_CONCURRENCY", "4"))
+        except ValueError:
+            max_workers = 4
+
+    def _fetch(calendar_id: str) -> List[dict] | Exception:
+        try:
+            return list_events_allpages(build(), calendar_id, time_min, time_max, tz)
+        except Exception as exc:
+            logger.warning("No se pudieron listar los eventos de %s: %s", calendar_id, exc)
+            return exc
+
+    workers = max(1, min(int(max_workers), len(calendar_ids)))
+    if workers == 1:
+        return {cid: _fetch(cid) for cid in calendar_ids}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcal-diff") as pool:
+        return dict(zip(calendar_ids, pool.map(_fetch, calendar_ids)))
+
+
+@dataclass
+class MissingEvent:
+    """Reserva sin evento en su calendario; `previous_calendar` si el evento está en otro calendario."""
+
+    row: ReservationDB
+    target_calendar: str
+    previous_calendar: Optional[str] = None
+
+
+@dataclass
+class CalendarDiff:
+    calendars: int
+    missing: List[MissingEvent] = field(default_factory=list)
+    # (reserva, evento enlazado por google_event_id) con horas distintas
+    mismatched: List[Tuple[ReservationDB, dict]] = field(default_factory=list)
+    # (evento, reservation_id, calendario) de eventos de PeluBot sin reserva en la BD
+    orphaned: List[Tuple[str, str, str]] = field(default_factory=list)
+    # (evento externo, reserva solapada, calendario)
+    overlaps: List[Tuple[str, str, str]] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def _overlapping_rows(
+    events: List[Tuple[datetime, datetime, str]],
+    rows: List[Tuple[datetime, datetime, ReservationDB]],
+) -> Dict[str, ReservationDB]:
+    """Para cada evento externo, la primera reserva que se solapa con él y no es la suya.
+
+    Barrido por hora de inicio: los eventos y las reservas van ordenados, y un
+    montículo por hora de fin guarda solo las reservas que siguen abiertas.
+    """
+    rows = sorted(rows, key=lambda item: item[0])
+    starts = [item[0] for item in rows]
+    found: Dict[str, ReservationDB] = {}
+    active: List[Tuple[datetime, int]] = []
+    nxt = 0
+    for ev_start, ev_end, ev_id in sorted(events, key=lambda item: item[0]):
+        # Las reservas que empiezan antes que este evento pasan al montículo.
+        while nxt < len(rows) and rows[nxt][0] < ev_start:
+            heapq.heappush(active, (rows[nxt][1], nxt))
+            nxt += 1
+        # Las que terminan antes de que empiece no se solapan ni con este evento ni con los siguientes.
+        while active and active[0][0] <= ev_start:
+            heapq.heappop(active)
+        candidates = [idx for _, idx in active]
+        candidates.extend(range(nxt, bisect_left(starts, ev_end, lo=nxt)))
+        for idx in sorted(candidates):
+            row = rows[idx][2]
+            if row.google_event_id != ev_id:
+                found[ev_id] = row
+                break
+    return found
+
+
+def compute_calendar_diff(
+    session: Session,
+    pairs: List[Tuple[str, Optional[str]]],
+    start_date: date,
+    end_date: date,
+    *,
+    build: Callable[[], Any],
+    target_calendar: Callable[[str], str],
+    tz: str,
+    max_workers: Optional[int] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> CalendarDiff:
+    """Compara las reservas de `pairs` (calendario, profesional) con sus eventos en [start_date, end_date].
+
+    Un calendario que no se puede listar queda en `errors` y sus reservas no
+    se evalúan, para no confundir un fallo de red con eventos borrados.
+    `progress` recibe los contadores de cada calendario al terminar de compararlo.
+    """
+    diff = CalendarDiff(calendars=len(pairs))
+    range_start = datetime.combine(start_date, time(0, 0))
+    range_end = datetime.combine(end_date, time(23, 59, 59))
+
+    t0 = perf_counter()
+    remote = fetch_calendar_events(
+        build,
+        [cal for cal, _ in pairs],
+        iso_datetime(range_start, tz),
+        iso_datetime(range_end, tz),
+        tz,
+        max_workers,
+    )
+    t1 = perf_counter()
+
+    q = select(ReservationDB).where(ReservationDB.start < range_end, ReservationDB.end > range_start)
+    pros = {pro for _, pro in pairs}
+    if None not in pros:
+        q = q.where(ReservationDB.professional_id.in_(pros))
+    rows = list(session.exec(q))
+    rows_by_pro: Dict[str, List[ReservationDB]] = {}
+    for row in rows:
+        rows_by_pro.setdefault(row.professional_id, []).append(row)
+    # Reservas citadas por eventos de PeluBot que no están en el rango cargado: una sola consulta IN.
+    known = {row.id for row in rows}
+    cited = {
+        _private(item).get("reservation_id")
+        for items in remote.values() if not isinstance(items, Exception)
+        for item in items
+    }
+    cited = {rid for rid in cited if rid and rid not in known}
+    if cited:
+        known.update(session.exec(select(ReservationDB.id).where(ReservationDB.id.in_(cited))).all())
+    t2 = perf_counter()
+
+    for done, (cal_id, pro_id) in enumerate(pairs, start=1):
+        items = remote.get(cal_id, [])
+        if isinstance(items, Exception):
+            diff.errors[cal_id] = str(items)
+            if progress is not None:
+                progress({"stage": "diff", "calendar": cal_id, "done": done, "total": len(pairs), "errors": 1})
+            continue
+        before = (len(diff.missing), len(diff.mismatched), len(diff.orphaned), len(diff.overlaps))
+        by_id = {item.get("id"): item for item in items if item.get("id")}
+        local = rows if pro_id is None else rows_by_pro.get(pro_id, [])
+        for row in local:
+            target = target_calendar(row.professional_id)
+            if row.google_event_id and row.google_calendar_id and row.google_calendar_id != target:
+                diff.missing.append(MissingEvent(row, target, row.google_calendar_id))
+                continue
+            item = by_id.get(row.google_event_id) if row.google_event_id else None
+            if item is None:
+                diff.missing.append(MissingEvent(row, target))
+                continue
+            times = _event_times(item)
+            if times and (
+                _naive_local(times[0], tz) != _naive_local(row.start, tz)
+                or _naive_local(times[1], tz) != _naive_local(row.end, tz)
+            ):
+                diff.mismatched.append((row, item))
+
+        external: List[Tuple[datetime, datetime, str]] = []
+        for ev_id, item in by_id.items():
+            rid = _private(item).get("reservation_id")
+            if rid:
+                if rid not in known:
+                    diff.orphaned.append((ev_id, rid, cal_id))
+                continue
+            times = _event_times(item)
+            if times:
+                external.append((_naive_local(times[0], tz), _naive_local(times[1], tz), ev_id))
+        if external and local:
+            spans = [(_naive_local(r.start, tz), _naive_local(r.end, tz), r) for r in local]
+            for ev_id, row in _overlapping_rows(external, spans).items():
+                diff.overlaps.append((ev_id, row.id, cal_id))
+        if progress is not None:
+            days: Dict[str, int] = {}
+            for miss in diff.missing[before[0]:]:
+                key = miss.row.start.date().isoformat()
+                days[key] = days.get(key, 0) + 1
+            progress({
+                "stage": "diff",
+                "calendar": cal_id,
+                "done": done,
+                "total": len(pairs),
+                "events": len(by_id),
+                "missing": len(diff.missing) - before[0],
+                "mismatched": len(diff.mismatched) - before[1],
+                "orphaned": len(diff.orphaned) - before[2],
+                "overlaps": len(diff.overlaps) - before[3],
+                "missing_by_day": days,
+            })
+    diff.timings = {
+        "fetch": round(t1 - t0, 4),
+        "load": round(t2 - t1, 4),
+        "diff": round(perf_counter() - t2, 4),
+    }
+    return diff
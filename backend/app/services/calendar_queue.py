@@ -1,26 +1,44 @@
 """Cola interna para sincronizar reservas con Google Calendar."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+import socket
 import threading
 import time
-from contextlib import suppress
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
-from sqlalchemy import func
+from sqlalchemy import DateTime, delete, func, insert, literal, update
 from sqlmodel import Session, select
 
 from prometheus_client import Counter, Gauge, Histogram
 
-from app.db import engine
-from app.models import CalendarSyncJobDB, Reservation, ReservationDB
+from app.db import engine, run_after_commit
+from app.integrations.google_calendar import (
+    GCAL_BATCH_MAX_OPS,
+    delete_event_request,
+    execute_batch,
+    insert_event_request,
+    patch_event_request,
+    supports_batch,
+)
+from app.models import CalendarSyncJobArchiveDB, CalendarSyncJobDB, Reservation, ReservationDB
+from app.services.freebusy_cache import invalidate_freebusy
+from app.integrations.google_calendar_async import close_async_calendar
 from app.services.logic import (
-    create_gcal_reservation,
-    delete_gcal_reservation,
-    patch_gcal_reservation,
+    build_calendar,
+    create_gcal_reservation_async,
+    delete_gcal_reservation_async,
+    patch_gcal_reservation_async,
+    reservation_event_body,
 )
 from app.utils.date import TZ
 
@@ -41,6 +59,21 @@ QUEUE_JOB_DURATION = Histogram(
     labelnames=("action", "result"),
     buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
 )
+QUEUE_BATCH_SIZE = Histogram(
+    "pelubot_calendar_batch_size",
+    "Trabajos reclamados por cada lote del worker de Google Calendar",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+QUEUE_JOB_START_LATENCY = Histogram(
+    "pelubot_calendar_job_start_latency_seconds",
+    "Espera hasta que el worker reclama un trabajo: desde que se encola en el primer intento, desde el fin del backoff en los reintentos",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+QUEUE_JOB_COALESCED = Counter(
+    "pelubot_calendar_jobs_coalesced_total",
+    "Trabajos de Google Calendar fusionados con otros de la misma reserva (no ejecutados)",
+    labelnames=("stage",),
+)
 QUEUE_JOB_TOTAL = Counter(
     "pelubot_calendar_jobs_processed_total",
     "Trabajos procesados por el worker de Google Calendar",
@@ -59,30 +92,153 @@ def _set_queue_gauges(pending: int, processing: int) -> None:
         logger.warning("No se pudo actualizar la métrica de trabajos en proceso: %s", exc)
 
 
-def refresh_queue_metrics(engine_override=None) -> tuple[int, int]:
-    """Recalcula y expone métricas agregadas de la cola."""
+@dataclass
+class _QueueCounts:
+    """Contadores en memoria de trabajos `pending`/`processing` de la cola.
+
+    Se ajustan en cada transición confirmada de este proceso y se reconcilian
+    con la BD cada `GCAL_QUEUE_RECONCILE_SECONDS` (cubre otros procesos y
+    ajustes perdidos). `engine` es el motor con el que se reconciliaron.
+    """
+
+    pending: int = 0
+    processing: int = 0
+    reconciled_at: Optional[float] = None
+    engine: object = None
+
+
+_queue_counts = _QueueCounts()
+_queue_counts_lock = threading.Lock()
+_TRACKED_STATUSES = ("pending", "processing")
+
+
+def _reconcile_interval() -> float:
+    try:
+        return float(os.getenv("GCAL_QUEUE_RECONCILE_SECONDS", "300"))
+    except ValueError:
+        return 300.0
+
+
+def track_queue_transition(from_status: Optional[str], to_status: Optional[str], count: int = 1) -> None:
+    """Ajusta las métricas de la cola tras confirmar `count` cambios de estado.
+
+    Llamar después del commit; los estados distintos de pending/processing
+    (o None para altas y bajas) no cuentan.
+    """
+
+    if count <= 0 or from_status == to_status:
+        return
+    with _queue_counts_lock:
+        if from_status == "pending":
+            _queue_counts.pending -= count
+        elif from_status == "processing":
+            _queue_counts.processing -= count
+        if to_status == "pending":
+            _queue_counts.pending += count
+        elif to_status == "processing":
+            _queue_counts.processing += count
+        pending, processing = _queue_counts.pending, _queue_counts.processing
+    _set_queue_gauges(pending, processing)
+
+
+def refresh_queue_metrics(engine_override=None, *, force: bool = False) -> tuple[int, int]:
+    """Devuelve (pending, processing) y reconcilia con la BD si toca.
+
+    Sin `force` se sirven los contadores en memoria mientras la última
+    reconciliación con ese motor tenga menos de `GCAL_QUEUE_RECONCILE_SECONDS`;
+    así `/ready` y los endpoints de admin no recorren la tabla en cada llamada.
+    """
 
     eng = engine_override or engine
+    with _queue_counts_lock:
+        fresh = (
+            not force
+            and _queue_counts.engine is eng
+            and _queue_counts.reconciled_at is not None
+            and time.monotonic() - _queue_counts.reconciled_at < _reconcile_interval()
+        )
+        if fresh:
+            return max(_queue_counts.pending, 0), max(_queue_counts.processing, 0)
     try:
         with Session(eng) as session:
-            pending = session.scalar(
-                select(func.count())
-                .select_from(CalendarSyncJobDB)
-                .where(CalendarSyncJobDB.status == "pending")
-            ) or 0
-            processing = session.scalar(
-                select(func.count())
-                .select_from(CalendarSyncJobDB)
-                .where(CalendarSyncJobDB.status == "processing")
-            ) or 0
+            rows = session.exec(
+                select(CalendarSyncJobDB.status, func.count())
+                .where(CalendarSyncJobDB.status.in_(_TRACKED_STATUSES))
+                .group_by(CalendarSyncJobDB.status)
+            ).all()
     except Exception as exc:
         logger.exception("No se pudieron refrescar las métricas de la cola de Google Calendar")
         _set_queue_gauges(0, 0)
         raise
+    counts = {status: int(total or 0) for status, total in rows}
+    pending, processing = counts.get("pending", 0), counts.get("processing", 0)
+    # NOTA: una transición confirmada durante la consulta puede contarse dos
+    # veces o ninguna; la siguiente reconciliación lo corrige.
+    with _queue_counts_lock:
+        _queue_counts.pending = pending
+        _queue_counts.processing = processing
+        _queue_counts.reconciled_at = time.monotonic()
+        _queue_counts.engine = eng
     _set_queue_gauges(pending, processing)
     return pending, processing
 
 
+# Estados finales que la retención puede sacar de la tabla caliente.
+_ARCHIVABLE_STATUSES = ("completed", "coalesced")
+
+
+def archive_calendar_jobs(
+    engine_override=None,
+    *,
+    older_than_days: float,
+    batch_size: int = 500,
+    now: Optional[datetime] = None,
+) -> int:
+    """Mueve a `calendar_sync_jobs_archive` los trabajos terminados hace más de N días.
+
+    Cada lote se copia y se borra en la misma transacción. Los `failed` se
+    quedan en la tabla para poder reintentarlos desde admin. Devuelve el número
+    de trabajos archivados.
+    """
+
+    eng = engine_override or engine
+    now = now or _utcnow()
+    cutoff = now - timedelta(days=older_than_days)
+    jobs = CalendarSyncJobDB.__table__
+    archive = CalendarSyncJobArchiveDB.__table__
+    columns = [column.name for column in jobs.columns]
+    archived = 0
+    with Session(eng) as session:
+        while True:
+            ids = session.exec(
+                select(CalendarSyncJobDB.id)
+                .where(
+                    CalendarSyncJobDB.status.in_(_ARCHIVABLE_STATUSES),
+                    CalendarSyncJobDB.completed_at < cutoff,
+                )
+                .order_by(CalendarSyncJobDB.id)
+                .limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            session.execute(
+                insert(archive).from_select(
+                    [*columns, "archived_at"],
+                    select(*[jobs.c[name] for name in columns], literal(now, DateTime(timezone=True))).where(
+                        jobs.c.id.in_(ids)
+                    ),
+                )
+            )
+            session.execute(delete(jobs).where(jobs.c.id.in_(ids)))
+            session.commit()
+            archived += len(ids)
+            if len(ids) < batch_size:
+                break
+    if archived:
+        logger.info("Archivados %s trabajos de Google Calendar anteriores a %s", archived, cutoff.isoformat())
+    return archived
+
+
 class CalendarSyncAction(str, Enum):
     """Tipos de trabajo soportados para Google Calendar."""
 
@@ -91,10 +247,24 @@ class CalendarSyncAction(str, Enum):
     DELETE = "delete"
 
 
+# Ambas acciones empujan el estado actual de la reserva: basta con ejecutar una.
+_UPSERT_ACTIONS = (CalendarSyncAction.CREATE.value, CalendarSyncAction.UPDATE.value)
+
+
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve fechas naive aunque se guarden en UTC.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _new_worker_id() -> str:
+    """Identificador de lease único entre hilos, procesos y nodos (el pid se repite entre contenedores)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
 def _ensure_payload(payload: Optional[dict]) -> dict:
     if not payload:
         return {}
@@ -144,397 +314,944 @@ def set_reservation_sync_state(
     session.add(reservation)
     
 
-def enqueue_calendar_job(
+# Workers arrancados en este proceso; `notify_queue` los despierta al encolar.
+_active_workers: "weakref.WeakSet[CalendarSyncWorker]" = weakref.WeakSet()
+
+
+def notify_queue() -> None:
+    """Avisa a los workers de este proceso de que hay trabajo nuevo (tras el commit)."""
+    for worker in list(_active_workers):
+        worker.wake()
+
+
+def _inc_coalesced(stage: str, amount: int) -> None:
+    if amount <= 0:
+        return
+    try:
+        QUEUE_JOB_COALESCED.labels(stage=stage).inc(amount)
+    except Exception as exc:
+        logger.warning("No se pudo actualizar la métrica de trabajos fusionados: %s", exc)
+
+
+def _coalesce_on_enqueue(
+    session: Session,
+    reservation_id: str,
+    action: str,
+    payload: dict,
+) -> Tuple[Optional[CalendarSyncJobDB], int]:
+    """Fusiona un trabajo nuevo con los pendientes de la misma reserva.
+
+    - Un delete deja sin efecto los create/update pendientes (pasan a `coalesced`).
+    - Un create/update sobre un create/update pendiente se fusiona en él (el
+      payload nuevo gana; si alguno es create, el resultado es create).
+    - Un delete sobre un delete pendiente se fusiona igual.
+
+    Devuelve el trabajo que absorbe al nuevo (o None si hay que insertarlo) y
+    cuántos pendientes pasaron a `coalesced`. Solo se tocan filas `pending` con
+    UPDATE condicional: si el worker reclama una entretanto, el nuevo trabajo se
+    inserta sin más. No confirma: los cambios van en la transacción del llamante.
+    """
+    now = _utcnow()
+    superseded_count = 0
+    if action == CalendarSyncAction.DELETE.value:
+        superseded = session.execute(
+            update(CalendarSyncJobDB)
+            .where(
+                CalendarSyncJobDB.reservation_id == reservation_id,
+                CalendarSyncJobDB.status == "pending",
+                CalendarSyncJobDB.action.in_(_UPSERT_ACTIONS),
+            )
+            .values(status="coalesced", completed_at=now, updated_at=now, last_error=None)
+        )
+        superseded_count = superseded.rowcount or 0
+    tail = session.exec(
+        select(CalendarSyncJobDB)
+        .where(
+            CalendarSyncJobDB.reservation_id == reservation_id,
+            CalendarSyncJobDB.status == "pending",
+        )
+        .order_by(CalendarSyncJobDB.id.desc())
+        .limit(1)
+    ).first()
+    if tail is None:
+        return None, superseded_count
+    if action == CalendarSyncAction.DELETE.value:
+        if tail.action != action:
+            return None, superseded_count
+        merged_action = action
+    else:
+        if tail.action not in _UPSERT_ACTIONS:
+            return None, superseded_count
+        create = CalendarSyncAction.CREATE.value
+        merged_action = create if create in (tail.action, action) else CalendarSyncAction.UPDATE.value
+    merged = session.execute(
+        update(CalendarSyncJobDB)
+        .where(CalendarSyncJobDB.id == tail.id, CalendarSyncJobDB.status == "pending")
+        .values(action=merged_action, payload={**_ensure_payload(tail.payload), **payload}, updated_at=now)
+    )
+    if not merged.rowcount:
+        return None, superseded_count
+    session.refresh(tail)
+    return tail, superseded_count
+
+
+def stage_calendar_job(
     session: Session,
     *,
     reservation_id: str,
     action: CalendarSyncAction | str,
     payload: Optional[dict] = None,
     available_at: Optional[datetime] = None,
+    reservation: Optional[ReservationDB] = None,
 ) -> CalendarSyncJobDB:
-    """Inserta un trabajo en la cola local de sincronización."""
+    """Añade el trabajo de sincronización a la transacción en curso, sin confirmarla (outbox).
 
-    job = CalendarSyncJobDB(
-        reservation_id=reservation_id,
-        action=(action.value if isinstance(action, CalendarSyncAction) else str(action)),
-        payload=_ensure_payload(payload),
-        available_at=available_at or _utcnow(),
-    )
-    session.add(job)
-    session.commit()
-    session.refresh(job)
-    logger.info(
-        "Encolado trabajo GCal id=%s reservation=%s action=%s available_at=%s",
-        job.id,
-        reservation_id,
-        job.action,
-        job.available_at.isoformat(),
-    )
-    refresh_queue_metrics()
+    La reserva, su trabajo y su `sync_status` se guardan con el mismo commit
+    del llamante: o se guardan los tres o ninguno. Si se pasa `reservation`,
+    queda marcada como `queued` con el id del trabajo. Métricas y aviso al
+    worker se aplican solo tras el commit. Si la reserva ya tiene trabajos
+    pendientes, el nuevo se fusiona con ellos (ver `_coalesce_on_enqueue`).
+    """
+
+    action_value = action.value if isinstance(action, CalendarSyncAction) else str(action)
+    payload_value = _ensure_payload(payload)
+    job, superseded = _coalesce_on_enqueue(session, reservation_id, action_value, payload_value)
+    merged = job is not None
+    if job is None:
+        job = CalendarSyncJobDB(
+            reservation_id=reservation_id,
+            action=action_value,
+            payload=payload_value,
+            available_at=available_at or _utcnow(),
+        )
+        session.add(job)
+        session.flush()
+    if reservation is not None:
+        reservation.sync_status = "queued"
+        reservation.sync_job_id = job.id
+        reservation.sync_last_error = None
+        reservation.sync_updated_at = _utcnow()
+        session.add(reservation)
+    job_id, job_action = job.id, job.action
+
+    def _committed() -> None:
+        if merged:
+            logger.info(
+                "Trabajo GCal fusionado en id=%s reservation=%s action=%s->%s",
+                job_id,
+                reservation_id,
+                action_value,
+                job_action,
+            )
+        else:
+            logger.info("Encolado trabajo GCal id=%s reservation=%s action=%s", job_id, reservation_id, job_action)
+            track_queue_transition(None, "pending")
+        _inc_coalesced("enqueue", superseded + int(merged))
+        track_queue_transition("pending", "coalesced", superseded)
+        notify_queue()
+
+    run_after_commit(session, _committed)
     return job
 
 
-def try_enqueue_calendar_job(
+def enqueue_calendar_job(
     session: Session,
     *,
     reservation_id: str,
     action: CalendarSyncAction | str,
     payload: Optional[dict] = None,
     available_at: Optional[datetime] = None,
-) -> tuple[str, Optional[int]]:
-    """Encola un trabajo y devuelve el estado de sincronización y el id asignado."""
+) -> CalendarSyncJobDB:
+    """Inserta un trabajo en la cola local de sincronización y lo confirma.
 
-    try:
-        job = enqueue_calendar_job(
-            session,
-            reservation_id=reservation_id,
-            action=action,
-            payload=payload,
-            available_at=available_at,
-        )
-    except Exception as exc:  # noqa: BLE001 - queremos registrar el fallo sin propagarlo
-        logger.warning(
-            "No se pudo encolar trabajo de Google Calendar: reservation=%s action=%s error=%s",
-            reservation_id,
-            action,
-            exc,
-        )
-        with suppress(Exception):
-            session.rollback()
-        return "skipped", None
-    return "queued", job.id
+    Para escribir una reserva junto con su trabajo en un solo commit usa
+    `stage_calendar_job`.
+    """
+
+    job = stage_calendar_job(
+        session,
+        reservation_id=reservation_id,
+        action=action,
+        payload=payload,
+        available_at=available_at,
+    )
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+@dataclass
+class _ClaimedJob:
+    """Copia en memoria de un trabajo reclamado (los hilos no comparten sesiones)."""
+
+    id: int
+    reservation_id: str
+    action: str
+    payload: dict
+    attempts: int
+    success: bool = False
+    error: Optional[str] = None
+    coalesced: bool = False
+
+
+def _coalesce_chain(chain: List[_ClaimedJob]) -> List[_ClaimedJob]:
+    """Marca como fusionados los trabajos de una reserva que no hace falta ejecutar.
+
+    Los create/update leen el estado actual de la reserva, así que de una racha
+    consecutiva solo se ejecuta el último (con los payloads acumulados), y
+    ninguno si después llega un delete. Devuelve los trabajos a ejecutar.
+    """
+    run: List[_ClaimedJob] = []
+    for job in chain:
+        if job.action in _UPSERT_ACTIONS:
+            run.append(job)
+            continue
+        for superseded in run:
+            superseded.coalesced = True
+        run = []
+    if len(run) > 1:
+        merged: dict = {}
+        for job in run[:-1]:
+            merged.update(job.payload)
+            job.coalesced = True
+        run[-1].payload = {**merged, **run[-1].payload}
+    for job in chain:
+        if job.coalesced:
+            job.success = True
+    return [job for job in chain if not job.coalesced]
+
+
+@dataclass
+class _CalendarOp:
+    """Llamada a Google que requiere un trabajo: insert, patch o delete."""
+
+    kind: str
+    calendar_id: str
+    event_id: Optional[str] = None
+    tz: str = "Europe/Madrid"
 
 
 class CalendarSyncWorker:
-    """Hilo en segundo plano que procesa trabajos pendientes."""
+    """Hilo en segundo plano que procesa trabajos pendientes.
+
+    En cada vuelta reclama hasta `batch_size` trabajos vencidos en una sola
+    transacción, ejecuta hasta `concurrency` llamadas a Google a la vez y
+    guarda todos los resultados en otra transacción. Los trabajos de una misma
+    reserva se ejecutan siempre en orden. Las llamadas individuales van por el
+    cliente async (`google_calendar_async`) en un event loop propio del worker,
+    sin un hilo por llamada.
 
-    def __init__(self, poll_interval: float = 2.0, *, max_attempts: int = 5):
+    Con `use_batch` (y un cliente real) las operaciones se agrupan en peticiones
+    batch de Google de hasta 50 operaciones; cada operación conserva su propio
+    resultado, error y reintento.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 2.0,
+        *,
+        max_idle_interval: float = 30.0,
+        max_attempts: int = 5,
+        batch_size: int = 1,
+        concurrency: int = 1,
+        use_batch: bool = False,
+    ):
         self.poll_interval = poll_interval
+        self.max_idle_interval = max(poll_interval, max_idle_interval)
         self.max_attempts = max_attempts
+        self.batch_size = max(1, int(batch_size))
+        self.concurrency = max(1, int(concurrency))
+        self.use_batch = use_batch
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._next_available_at: Optional[datetime] = None
+        # Sondeo en reposo: empieza en `poll_interval` y se duplica hasta `max_idle_interval`.
+        self._idle_interval = poll_interval
         self._engine = engine
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # Event loop propio para las llamadas individuales (cliente async compartido entre lotes).
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self.worker_id: Optional[str] = None
         try:
             stale_env = os.getenv("GCAL_QUEUE_STALE_SECONDS")
             self._stale_seconds = float(stale_env) if stale_env else 0.0
         except ValueError:
             self._stale_seconds = 0.0
+        self._reconcile_seconds = _reconcile_interval()
+        try:
+            self._retention_days = float(os.getenv("GCAL_QUEUE_RETENTION_DAYS", "30"))
+        except ValueError:
+            self._retention_days = 30.0
+        self._last_maintenance: Optional[float] = None
+        self._last_recovery: Optional[float] = None
+        try:
+            heartbeat_env = os.getenv("GCAL_QUEUE_HEARTBEAT_SECONDS")
+            self._heartbeat_seconds = float(heartbeat_env) if heartbeat_env else self._stale_window() / 4
+        except ValueError:
+            self._heartbeat_seconds = self._stale_window() / 4
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
             return
         self._stop_event.clear()
+        _active_workers.add(self)
         self._thread = threading.Thread(target=self._run_loop, name="gcal-sync-worker", daemon=True)
         self._thread.start()
-        logger.info("Worker de sincronización Google Calendar iniciado.")
+        logger.info(
+            "Worker de sincronización Google Calendar iniciado (lote=%s, concurrencia=%s).",
+            self.batch_size,
+            self.concurrency,
+        )
 
     def stop(self, timeout: float = 5.0) -> None:
+        _active_workers.discard(self)
+        if self._thread:
+            self._stop_event.set()
+            self._wake_event.set()
+            try:
+                self._thread.join(timeout=timeout)
+            except Exception as exc:  # noqa: BLE001 - registramos errores de parada
+                logger.warning("Error al detener el worker de Google Calendar: %s", exc)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if not (self._thread and self._thread.is_alive()):
+            self._close_loop()
         if not self._thread:
             return
-        self._stop_event.set()
-        try:
-            self._thread.join(timeout=timeout)
-        except Exception as exc:  # noqa: BLE001 - registramos errores de parada
-            logger.warning("Error al detener el worker de Google Calendar: %s", exc)
         self.worker_id = None
         logger.info("Worker de sincronización Google Calendar detenido.")
 
     def _run_loop(self) -> None:
-        self.worker_id = f"{os.getpid()}:{threading.current_thread().name}"
-        try:
-            self._recover_stuck_jobs()
-        except Exception:
-            logger.exception("Error recuperando trabajos atascados de Google Calendar")
-        refresh_queue_metrics(self._engine)
-        backoff = self.poll_interval
+        self.worker_id = _new_worker_id()
         while not self._stop_event.is_set():
+            self._run_periodic()
             try:
                 processed = self._process_once()
             except Exception:
                 logger.exception("Error procesando trabajos de Google Calendar")
                 processed = False
+                self._next_available_at = None
             if processed:
-                backoff = self.poll_interval
+                self._idle_interval = self.poll_interval
                 continue
-            # Nada que hacer; esperar con backoff simple para no saturar la CPU
-            self._stop_event.wait(backoff)
-            backoff = min(backoff * 2, 30)
+            # Nada vencido: dormir hasta el próximo `available_at` o hasta que
+            # `notify_queue()` avise de un trabajo nuevo. El sondeo periódico solo
+            # cubre trabajos encolados por otros procesos y se espacia mientras
+            # la cola siga vacía.
+            woken = self._wake_event.wait(self._idle_timeout())
+            self._wake_event.clear()
+            if woken:
+                self._idle_interval = self.poll_interval
+            else:
+                self._idle_interval = min(self._idle_interval * 2, self.max_idle_interval)
+
+    def _run_periodic(self) -> None:
+        """Recupera leases caducados de cualquier proceso y lanza el mantenimiento cuando toca."""
+        now = time.monotonic()
+        if self._last_recovery is None or now - self._last_recovery >= self._stale_window():
+            self._last_recovery = now
+            try:
+                self._recover_stuck_jobs()
+            except Exception:
+                logger.exception("Error recuperando trabajos atascados de Google Calendar")
+        if self._last_maintenance is None or now - self._last_maintenance >= self._reconcile_seconds:
+            self._maintenance()
+
+    def _maintenance(self) -> None:
+        """Archiva trabajos antiguos y reconcilia los contadores de la cola con la BD."""
+        self._last_maintenance = time.monotonic()
+        if self._retention_days > 0:
+            try:
+                archive_calendar_jobs(self._engine, older_than_days=self._retention_days)
+            except Exception:
+                logger.exception("Error archivando trabajos antiguos de Google Calendar")
+        try:
+            refresh_queue_metrics(self._engine, force=True)
+        except Exception:
+            logger.exception("Error reconciliando métricas de la cola de Google Calendar")
+
+    def wake(self) -> None:
+        """Despierta el bucle del worker (hay trabajo nuevo o reencolado)."""
+        self._wake_event.set()
+
+    def _idle_timeout(self) -> float:
+        next_at = self._next_available_at
+        if next_at is None:
+            return self._idle_interval
+        remaining = (_as_utc(next_at) - _utcnow()).total_seconds()
+        return min(max(remaining, 0.0), self._idle_interval)
+
+    def _stale_window(self) -> float:
+        return self._stale_seconds if self._stale_seconds > 0 else max(self.poll_interval * 2, 60.0)
+
+    def _owner(self) -> str:
+        if not self.worker_id:
+            self.worker_id = _new_worker_id()
+        return self.worker_id
+
+    def _returning_supported(self) -> bool:
+        return bool(getattr(self._engine.dialect, "update_returning", False))
 
     def _recover_stuck_jobs(self) -> None:
-        stale_seconds = self._stale_seconds if self._stale_seconds > 0 else max(self.poll_interval * 2, 60.0)
-        threshold = _utcnow() - timedelta(seconds=stale_seconds)
-        recovered = 0
+        """Devuelve a `pending` los trabajos cuyo lease no se renueva desde hace `_stale_window()`.
+
+        El UPDATE lleva la condición de caducidad, así que un worker vivo que
+        renueva su heartbeat a la vez no pierde sus trabajos.
+        """
+        now = _utcnow()
+        threshold = now - timedelta(seconds=self._stale_window())
+        stale_expr = func.coalesce(
+            CalendarSyncJobDB.heartbeat_at,
+            CalendarSyncJobDB.locked_at,
+            CalendarSyncJobDB.updated_at,
+            CalendarSyncJobDB.created_at,
+        )
+        stale = (CalendarSyncJobDB.status == "processing", stale_expr <= threshold)
+        release = dict(status="pending", locked_by=None, locked_at=None, heartbeat_at=None, updated_at=now, available_at=now)
+        columns = (CalendarSyncJobDB.id, CalendarSyncJobDB.reservation_id, CalendarSyncJobDB.last_error)
         with Session(self._engine) as session:
-            stale_expr = func.coalesce(
-                CalendarSyncJobDB.heartbeat_at,
-                CalendarSyncJobDB.locked_at,
-                CalendarSyncJobDB.updated_at,
-                CalendarSyncJobDB.created_at,
-            )
-            jobs = (
-                session.exec(
-                    select(CalendarSyncJobDB).where(
-                        CalendarSyncJobDB.status == "processing",
-                        stale_expr <= threshold,
+            if self._returning_supported():
+                rows = session.execute(update(CalendarSyncJobDB).where(*stale).values(**release).returning(*columns)).all()
+            else:
+                rows = session.execute(select(*columns).where(*stale)).all()
+                if rows:
+                    session.execute(
+                        update(CalendarSyncJobDB)
+                        .where(CalendarSyncJobDB.id.in_([row.id for row in rows]), *stale)
+                        .values(**release)
                     )
-                ).all()
-            )
-            if not jobs:
-                self._update_queue_gauges(session)
+            if not rows:
                 return
-            now = _utcnow()
-            for job in jobs:
-                logger.warning(
-                    "Reactivando trabajo atascado id=%s action=%s locked_by=%s",
-                    job.id,
-                    job.action,
-                    job.locked_by,
-                )
-                job.status = "pending"
-                job.locked_by = None
-                job.locked_at = None
-                job.heartbeat_at = None
-                job.updated_at = now
-                if job.available_at is not None and job.available_at.tzinfo is None:
-                    job.available_at = job.available_at.replace(tzinfo=timezone.utc)
-                if job.available_at is None or job.available_at > now:
-                    job.available_at = now
+            for row in rows:
                 set_reservation_sync_state(
                     session,
-                    job.reservation_id,
+                    row.reservation_id,
                     status="queued",
-                    job_id=job.id,
-                    error=job.last_error,
+                    job_id=row.id,
+                    error=row.last_error,
                 )
-                session.add(job)
-                recovered += 1
             session.commit()
-            self._update_queue_gauges(session)
-        if recovered:
-            logger.warning("Worker %s reactivó %s trabajos encolados", self.worker_id, recovered)
+        track_queue_transition("processing", "pending", len(rows))
+        # El próximo `available_at` lo recalcula la primera vuelta sin trabajo.
+        self._next_available_at = None
+        logger.warning(
+            "Worker %s reactivó %s trabajos con lease caducado: %s",
+            self.worker_id,
+            len(rows),
+            [row.id for row in rows],
+        )
+
+    def _renew_leases(self, session: Session, job_ids: List[int], now: datetime) -> Set[int]:
+        """Renueva `heartbeat_at` de los trabajos que siguen siendo de este worker y devuelve sus ids."""
+        owned = (
+            CalendarSyncJobDB.id.in_(job_ids),
+            CalendarSyncJobDB.status == "processing",
+            CalendarSyncJobDB.locked_by == self._owner(),
+        )
+        renew = update(CalendarSyncJobDB).where(*owned).values(heartbeat_at=now)
+        if self._returning_supported():
+            return set(session.execute(renew.returning(CalendarSyncJobDB.id)).scalars().all())
+        session.execute(renew)
+        return set(session.exec(select(CalendarSyncJobDB.id).where(*owned)).all())
+
+    @contextmanager
+    def _heartbeat(self, job_ids: List[int]) -> Iterator[None]:
+        """Renueva el lease de `job_ids` en un hilo aparte mientras duran las llamadas a Google."""
+        interval = self._heartbeat_seconds
+        if interval <= 0 or not job_ids:
+            yield
+            return
+        done = threading.Event()
+
+        def _beat() -> None:
+            while not done.wait(interval):
+                try:
+                    with Session(self._engine) as session:
+                        self._renew_leases(session, job_ids, _utcnow())
+                        session.commit()
+                except Exception as exc:  # noqa: BLE001 - el siguiente latido lo reintenta
+                    logger.warning("No se pudo renovar el lease de %s trabajos: %s", len(job_ids), exc)
 
-    def _update_queue_gauges(self, session: Session) -> None:
+        beat = threading.Thread(target=_beat, name="gcal-sync-heartbeat", daemon=True)
+        beat.start()
         try:
-            pending = session.scalar(
-                select(func.count())
-                .select_from(CalendarSyncJobDB)
-                .where(CalendarSyncJobDB.status == "pending")
-            ) or 0
-            processing = session.scalar(
-                select(func.count())
-                .select_from(CalendarSyncJobDB)
-                .where(CalendarSyncJobDB.status == "processing")
-            ) or 0
+            yield
+        finally:
+            done.set()
+            beat.join(timeout=interval + 5)
+
+    def _load_next_available_at(self, session: Session) -> None:
+        """Guarda el `available_at` pendiente más próximo (búsqueda por índice, sin recorrer la tabla)."""
+        try:
+            self._next_available_at = session.scalar(
+                select(func.min(CalendarSyncJobDB.available_at)).where(CalendarSyncJobDB.status == "pending")
+            )
         except Exception as exc:
-            logger.warning("No se pudieron obtener métricas de la cola desde la sesión actual: %s", exc)
-            return
-        _set_queue_gauges(int(pending), int(processing))
+            logger.warning("No se pudo obtener el próximo trabajo pendiente de la cola: %s", exc)
+            self._next_available_at = None
 
     def _process_once(self) -> bool:
+        """Procesa un lote de trabajos vencidos; devuelve False si no había ninguno."""
         now = _utcnow()
-        job_id: Optional[int] = None
-        reservation_id: Optional[str] = None
-        action: Optional[str] = None
-        payload: dict = {}
-        attempts = 0
-
         with Session(self._engine) as session:
-            stmt = (
-                select(CalendarSyncJobDB)
-                .where(
-                    CalendarSyncJobDB.status == "pending",
-                    CalendarSyncJobDB.available_at <= now,
-                )
-                .order_by(CalendarSyncJobDB.available_at, CalendarSyncJobDB.id)
-                .limit(1)
-            )
-            job = session.exec(stmt).first()
-            if not job:
-                self._update_queue_gauges(session)
+            # Primero una lectura: sin trabajo vencido no se abre la transacción de
+            # escritura del reclamo (en SQLite competiría por el bloqueo con `DBWriter`).
+            self._load_next_available_at(session)
+            session.rollback()
+            next_at = self._next_available_at
+            if next_at is None or _as_utc(next_at) > now:
                 return False
-            job.status = "processing"
-            job.attempts += 1
-            job.locked_by = self.worker_id or f"{os.getpid()}:{threading.current_thread().name}"
-            job.locked_at = now
-            job.heartbeat_at = now
-            job.updated_at = now
-            session.add(job)
-            session.commit()
-            session.refresh(job)
-            job_id = job.id
-            reservation_id = job.reservation_id
-            action = job.action
-            payload = _ensure_payload(job.payload)
-            attempts = job.attempts
-            self._update_queue_gauges(session)
-
-        if not job_id or not reservation_id or not action:
-            refresh_queue_metrics(self._engine)
+            jobs = self._claim_jobs(session, now)
+            if not jobs:
+                self._load_next_available_at(session)
+                return False
+            snapshots = self._load_snapshots(session, {job.reservation_id for job in jobs})
+
+        try:
+            QUEUE_BATCH_SIZE.observe(len(jobs))
+        except Exception:
+            pass
+
+        # Una cadena por reserva: así un create y su update posterior no se adelantan.
+        chains: Dict[str, List[_ClaimedJob]] = {}
+        for job in jobs:
+            chains.setdefault(job.reservation_id, []).append(job)
+        chains = {rid: _coalesce_chain(chain) for rid, chain in chains.items()}
+        _inc_coalesced("claim", sum(1 for job in jobs if job.coalesced))
+        chains = {rid: chain for rid, chain in chains.items() if chain}
+        dirty: Set[str] = set()
+
+        with self._heartbeat([job.id for job in jobs]):
+            if self._batch_supported():
+                self._run_batched(list(chains.values()), snapshots, dirty)
+            else:
+                self._run_chains(list(chains.values()), snapshots, dirty)
+
+        self._store_results(jobs, snapshots, dirty)
+        return True
+
+    def _batch_supported(self) -> bool:
+        if not self.use_batch:
+            return False
+        try:
+            return supports_batch(build_calendar())
+        except Exception as exc:  # noqa: BLE001 - cada trabajo registrará el fallo por su cuenta
+            logger.warning("No se pudo crear el cliente de Google Calendar para lotes: %s", exc)
             return False
 
-        success = False
-        error_message: Optional[str] = None
-        start_time = time.perf_counter()
+    def _run_chains(
+        self,
+        chains: List[List[_ClaimedJob]],
+        snapshots: Dict[str, Reservation],
+        dirty: Set[str],
+    ) -> None:
+        """Llamadas individuales con el cliente async: hasta `concurrency` cadenas a la vez sin ocupar hilos."""
+
+        async def _run_all() -> None:
+            limit = asyncio.Semaphore(self.concurrency)
+
+            async def _run_chain(chain: List[_ClaimedJob]) -> None:
+                async with limit:
+                    for job in chain:
+                        await self._run_job(job, snapshots.get(job.reservation_id), dirty)
+
+            await asyncio.gather(*(_run_chain(chain) for chain in chains))
+
+        self._event_loop().run_until_complete(_run_all())
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def _close_loop(self) -> None:
+        loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
         try:
-            success = self._execute_action(reservation_id, action, payload)
-        except Exception as exc:  # noqa: BLE001 - registramos y reintentamos
-            error_message = str(exc)
-            logger.exception(
-                "Fallo ejecutando trabajo GCal id=%s reservation=%s action=%s", job_id, reservation_id, action
+            loop.run_until_complete(close_async_calendar())
+        except Exception as exc:  # noqa: BLE001 - solo estamos cerrando conexiones
+            logger.warning("No se pudo cerrar el cliente async de Google Calendar: %s", exc)
+        finally:
+            loop.close()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="gcal-sync")
+        return self._pool
+
+    def _claim_jobs(self, session: Session, now: datetime) -> List[_ClaimedJob]:
+        """Marca como `processing` hasta `batch_size` trabajos vencidos con un único UPDATE.
+
+        La selección va en una subconsulta del propio UPDATE (con `FOR UPDATE
+        SKIP LOCKED` en motores que lo soportan) y la condición `status='pending'`
+        hace de compare-and-set: dos workers, en el mismo proceso o en nodos
+        distintos, nunca reclaman el mismo trabajo. Con RETURNING las filas
+        reclamadas salen del mismo UPDATE; sin él se leen por el lease único.
+        """
+        owner = self._owner()
+        due = (
+            select(CalendarSyncJobDB.id)
+            .where(
+                CalendarSyncJobDB.status == "pending",
+                CalendarSyncJobDB.available_at <= now,
             )
+            .order_by(CalendarSyncJobDB.available_at, CalendarSyncJobDB.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        claim = (
+            update(CalendarSyncJobDB)
+            .where(CalendarSyncJobDB.id.in_(due), CalendarSyncJobDB.status == "pending")
+            .values(
+                status="processing",
+                attempts=CalendarSyncJobDB.attempts + 1,
+                locked_by=owner,
+                locked_at=now,
+                heartbeat_at=now,
+                updated_at=now,
+            )
+        )
+        columns = (
+            CalendarSyncJobDB.id,
+            CalendarSyncJobDB.reservation_id,
+            CalendarSyncJobDB.action,
+            CalendarSyncJobDB.payload,
+            CalendarSyncJobDB.attempts,
+            CalendarSyncJobDB.available_at,
+            CalendarSyncJobDB.created_at,
+        )
+        if self._returning_supported():
+            rows = session.execute(claim.returning(*columns)).all()
         else:
-            error_message = None
-        duration = time.perf_counter() - start_time
+            session.execute(claim)
+            rows = session.execute(
+                select(*columns).where(
+                    CalendarSyncJobDB.status == "processing",
+                    CalendarSyncJobDB.locked_by == owner,
+                    CalendarSyncJobDB.locked_at == now,
+                )
+            ).all()
+        session.commit()
+        if not rows:
+            return []
+        rows = sorted(rows, key=lambda row: (_as_utc(row.available_at), row.id))
+        for row in rows:
+            # Primer intento: desde que se encoló; en los reintentos, desde el fin del backoff.
+            since = row.created_at if row.attempts == 1 and row.created_at is not None else row.available_at
+            try:
+                QUEUE_JOB_START_LATENCY.observe(max((now - _as_utc(since)).total_seconds(), 0.0))
+            except Exception:
+                pass
+        track_queue_transition("pending", "processing", len(rows))
+        return [
+            _ClaimedJob(
+                id=row.id,
+                reservation_id=row.reservation_id,
+                action=row.action,
+                payload=_ensure_payload(row.payload),
+                attempts=row.attempts,
+            )
+            for row in rows
+        ]
+
+    def _load_snapshots(self, session: Session, reservation_ids: Set[str]) -> Dict[str, Reservation]:
+        rows = session.exec(select(ReservationDB).where(ReservationDB.id.in_(reservation_ids))).all()
+        return {row.id: _reservation_from_row(row) for row in rows}
+
+    async def _run_job(self, job: _ClaimedJob, reservation: Optional[Reservation], dirty: Set[str]) -> None:
+        """Ejecuta un trabajo con una llamada individual a Google."""
+        start_time = time.perf_counter()
+        try:
+            op = self._plan(job, reservation)
+            result = await self._call(op, reservation) if op is not None else None
+            self._apply(job, reservation, op, result, dirty)
+            job.success = True
+            job.error = None
+        except Exception as exc:  # noqa: BLE001 - registramos y reintentamos
+            self._fail(job, exc)
+        self._record_job(job, time.perf_counter() - start_time)
+
+    def _run_batched(
+        self,
+        chains: List[List[_ClaimedJob]],
+        snapshots: Dict[str, Reservation],
+        dirty: Set[str],
+    ) -> None:
+        """Ejecuta los trabajos en peticiones batch de Google (hasta 50 operaciones cada una).
+
+        Se avanza por oleadas: la oleada k contiene el k-ésimo trabajo de cada
+        reserva, de modo que un update ve el evento creado por el create previo.
+        """
+        queues = [list(chain) for chain in chains]
+        while queues:
+            wave = [queue.pop(0) for queue in queues]
+            queues = [queue for queue in queues if queue]
+            started = time.perf_counter()
+            planned: List[Tuple[_ClaimedJob, _CalendarOp]] = []
+            for job in wave:
+                reservation = snapshots.get(job.reservation_id)
+                try:
+                    op = self._plan(job, reservation)
+                    if op is None:
+                        self._apply(job, reservation, None, None, dirty)
+                        job.success = True
+                    else:
+                        planned.append((job, op))
+                except Exception as exc:  # noqa: BLE001
+                    self._fail(job, exc)
+
+            chunks = [planned[i:i + GCAL_BATCH_MAX_OPS] for i in range(0, len(planned), GCAL_BATCH_MAX_OPS)]
+
+            def _send(chunk: List[Tuple[_ClaimedJob, _CalendarOp]]) -> List[Tuple[Optional[dict], Optional[Exception]]]:
+                # Cliente por hilo: las peticiones de un lote comparten su conexión HTTP.
+                service = build_calendar()
+                requests = [self._request(service, op, snapshots.get(job.reservation_id)) for job, op in chunk]
+                return execute_batch(service, requests)
+
+            if self.concurrency <= 1 or len(chunks) <= 1:
+                chunk_results = [_send(chunk) for chunk in chunks]
+            else:
+                chunk_results = list(self._executor().map(_send, chunks))
 
-        result_label = "success" if success else "failure"
+            for chunk, results in zip(chunks, chunk_results):
+                for (job, op), (result, exc) in zip(chunk, results):
+                    invalidate_freebusy(op.calendar_id)
+                    if exc is not None:
+                        self._fail(job, exc)
+                        continue
+                    try:
+                        self._apply(job, snapshots.get(job.reservation_id), op, result, dirty)
+                        job.success = True
+                        job.error = None
+                    except Exception as apply_exc:  # noqa: BLE001
+                        self._fail(job, apply_exc)
+            duration = time.perf_counter() - started
+            for job in wave:
+                self._record_job(job, duration)
+
+    def _fail(self, job: _ClaimedJob, exc: Exception) -> None:
+        job.success = False
+        job.error = str(exc)
+        logger.error(
+            "Fallo ejecutando trabajo GCal id=%s reservation=%s action=%s: %s",
+            job.id,
+            job.reservation_id,
+            job.action,
+            exc,
+            exc_info=exc,
+        )
+
+    def _record_job(self, job: _ClaimedJob, duration: float) -> None:
+        result_label = "success" if job.success else "failure"
         try:
-            QUEUE_JOB_TOTAL.labels(action=action, result=result_label).inc()
-            QUEUE_JOB_DURATION.labels(action=action, result=result_label).observe(duration)
+            QUEUE_JOB_TOTAL.labels(action=job.action, result=result_label).inc()
+            QUEUE_JOB_DURATION.labels(action=job.action, result=result_label).observe(duration)
         except Exception as exc:
             logger.warning("No se pudieron actualizar métricas de trabajos de Google Calendar: %s", exc)
 
+    def _store_results(self, jobs: List[_ClaimedJob], snapshots: Dict[str, Reservation], dirty: Set[str]) -> None:
+        """Guarda estados de trabajos, ids de evento y estado de sync en un único commit.
+
+        Si el commit conjunto falla (p. ej. un evento duplicado viola una
+        restricción única), se reintenta reserva a reserva para no perder el
+        resultado de las demás.
+        """
         with Session(self._engine) as session:
-            job = session.get(CalendarSyncJobDB, job_id)
-            if not job:
-                refresh_queue_metrics(self._engine)
-                return True
-            now_update = _utcnow()
+            try:
+                stored, retried = self._apply_results(session, jobs, snapshots, dirty)
+                session.commit()
+                self._track_stored(stored, retried)
+            except Exception:
+                session.rollback()
+                logger.exception("Fallo guardando el lote de %s trabajos; se guardan por separado", len(jobs))
+                chains: Dict[str, List[_ClaimedJob]] = {}
+                for job in jobs:
+                    chains.setdefault(job.reservation_id, []).append(job)
+                for reservation_id, chain in chains.items():
+                    try:
+                        stored, retried = self._apply_results(session, chain, snapshots, dirty)
+                        session.commit()
+                        self._track_stored(stored, retried)
+                    except Exception:
+                        session.rollback()
+                        logger.exception(
+                            "No se pudo guardar el resultado de la reserva %s (trabajos %s)",
+                            reservation_id,
+                            [job.id for job in chain],
+                        )
+
+    @staticmethod
+    def _track_stored(stored: int, retried: int) -> None:
+        # Los que no se guardan siguen en `processing` hasta que los recupere `_recover_stuck_jobs`.
+        track_queue_transition("processing", "pending", retried)
+        track_queue_transition("processing", "completed", stored - retried)
+
+    def _apply_results(
+        self,
+        session: Session,
+        jobs: List[_ClaimedJob],
+        snapshots: Dict[str, Reservation],
+        dirty: Set[str],
+    ) -> Tuple[int, int]:
+        """Vuelca los resultados en la sesión; devuelve (trabajos guardados, vueltos a `pending`).
+
+        Antes se renueva el lease con un UPDATE condicional: si otro worker
+        recuperó un trabajo (lease caducado), su resultado se descarta en vez
+        de pisar el estado que ese worker ya gestiona.
+        """
+        retry_delay = int(os.getenv("GCAL_QUEUE_RETRY_SECONDS", "60"))
+        retried = 0
+        owned = self._renew_leases(session, [job.id for job in jobs], _utcnow())
+        lost = [job.id for job in jobs if job.id not in owned]
+        if lost:
+            logger.warning("Worker %s perdió el lease de los trabajos %s; no se guardan", self.worker_id, lost)
+            jobs = [job for job in jobs if job.id in owned]
+        reservation_ids = {job.reservation_id for job in jobs}
+        rows = {
+            row.id: row
+            for row in session.exec(select(CalendarSyncJobDB).where(CalendarSyncJobDB.id.in_(list(owned)))).all()
+        }
+        # Precarga las reservas en el identity map: los `session.get` siguientes no consultan.
+        reservations = {
+            row.id: row
+            for row in session.exec(select(ReservationDB).where(ReservationDB.id.in_(reservation_ids))).all()
+        }
+        for reservation_id in dirty & reservation_ids:
+            row = reservations.get(reservation_id)
+            snapshot = snapshots.get(reservation_id)
+            if row is None or snapshot is None:
+                continue
+            # Solo los campos de Google: el resto pudo cambiar mientras tanto vía API.
+            row.google_event_id = snapshot.google_event_id
+            row.google_calendar_id = snapshot.google_calendar_id
+            session.add(row)
+
+        now_update = _utcnow()
+        for claimed in jobs:
+            job = rows.get(claimed.id)
+            if job is None:
+                continue
             job.updated_at = now_update
-            if success:
+            if claimed.coalesced:
+                # Su efecto lo cubre otro trabajo del lote: no toca el estado de sync.
+                job.status = "coalesced"
+                job.last_error = None
+                job.completed_at = now_update
+                job.locked_by = None
+                job.locked_at = None
+                job.heartbeat_at = None
+                session.add(job)
+                continue
+            if claimed.success:
                 job.status = "completed"
                 job.last_error = None
                 job.completed_at = now_update
-                set_reservation_sync_state(
-                    session,
-                    reservation_id,
-                    status="synced",
-                    job_id=job_id,
-                    error=None,
-                )
+                sync_status = "synced"
             else:
-                job.last_error = error_message
+                job.last_error = claimed.error
                 job.completed_at = None
-                if attempts >= self.max_attempts:
+                if claimed.attempts >= self.max_attempts:
                     job.status = "failed"
-                    set_reservation_sync_state(
-                        session,
-                        reservation_id,
-                        status="failed",
-                        job_id=job_id,
-                        error=error_message,
-                    )
+                    sync_status = "failed"
                 else:
                     job.status = "pending"
-                    delay = int(os.getenv("GCAL_QUEUE_RETRY_SECONDS", "60"))
-                    job.available_at = _utcnow() + timedelta(seconds=delay * attempts)
-                    set_reservation_sync_state(
-                        session,
-                        reservation_id,
-                        status="queued",
-                        job_id=job_id,
-                        error=error_message,
-                    )
+                    job.available_at = now_update + timedelta(seconds=retry_delay * claimed.attempts)
+                    sync_status = "queued"
+                    retried += 1
             job.locked_by = None
             job.locked_at = None
             job.heartbeat_at = None
             session.add(job)
-            session.commit()
-            self._update_queue_gauges(session)
-        return True
-
-    def _execute_action(self, reservation_id: str, action: str, payload: dict) -> bool:
-        action_value = CalendarSyncAction(action)
-        if action_value is CalendarSyncAction.CREATE:
-            return self._handle_create(reservation_id, payload)
-        if action_value is CalendarSyncAction.UPDATE:
-            return self._handle_update(reservation_id, payload)
-        if action_value is CalendarSyncAction.DELETE:
-            return self._handle_delete(reservation_id, payload)
-        raise ValueError(f"Acción de sincronización no soportada: {action}")
-
-    def _handle_create(self, reservation_id: str, payload: dict) -> bool:
-        with Session(self._engine) as session:
-            reservation = session.get(ReservationDB, reservation_id)
-            if reservation is None:
-                logger.info("Reserva %s no existe. Marcamos trabajo como completado.", reservation_id)
-                return True
-            calendar_id = payload.get("calendar_id") or reservation.google_calendar_id
-            if not calendar_id:
-                logger.info("Reserva %s sin calendar_id, nada que sincronizar", reservation_id)
-                return True
-            res_model = _reservation_from_row(reservation)
-            event = create_gcal_reservation(res_model, calendar_id=calendar_id)
-            event_id = event.get("id") if isinstance(event, dict) else None
-            reservation.google_event_id = event_id
-            reservation.google_calendar_id = calendar_id
-            session.add(reservation)
-            session.commit()
-            logger.info(
-                "Reserva %s sincronizada en Google Calendar (evento %s)", reservation_id, event_id
+            set_reservation_sync_state(
+                session,
+                claimed.reservation_id,
+                status=sync_status,
+                job_id=claimed.id,
+                error=None if claimed.success else claimed.error,
             )
-            return True
+        return len(jobs), retried
 
-    def _handle_update(self, reservation_id: str, payload: dict) -> bool:
-        with Session(self._engine) as session:
-            reservation = session.get(ReservationDB, reservation_id)
-            if reservation is None:
-                logger.info("Reserva %s no existe al actualizar; asumimos completado.", reservation_id)
-                return True
-            calendar_id = payload.get("calendar_id") or reservation.google_calendar_id
-            if not calendar_id:
-                logger.info("Reserva %s sin calendar_id al actualizar", reservation_id)
-                return True
-            event_id = reservation.google_event_id or payload.get("event_id")
-            tz_name = payload.get("tz") or getattr(TZ, "key", str(TZ))
-            if not event_id:
-                res_model = _reservation_from_row(reservation)
-                event = create_gcal_reservation(res_model, calendar_id=calendar_id, tz=tz_name)
-                event_id = event.get("id") if isinstance(event, dict) else None
-                reservation.google_event_id = event_id
-            else:
-                patch_gcal_reservation(event_id, reservation.start, reservation.end, calendar_id, tz=tz_name)
-            reservation.google_calendar_id = calendar_id
-            session.add(reservation)
-            session.commit()
-            logger.info(
-                "Reserva %s actualizada en Google Calendar (evento %s)", reservation_id, event_id
-            )
-            return True
-
-    def _handle_delete(self, reservation_id: str, payload: dict) -> bool:
-        calendar_id = payload.get("calendar_id")
-        event_id = payload.get("event_id")
-        drop_calendar = payload.get("drop_calendar", True)
-        if not calendar_id or not event_id:
-            with Session(self._engine) as session:
-                reservation = session.get(ReservationDB, reservation_id)
-                if reservation is None:
-                    logger.info(
-                        "Trabajo delete para reserva %s sin datos y sin fila en BD. Marcamos completado.",
-                        reservation_id,
-                    )
-                    return True
+    def _plan(self, job: _ClaimedJob, reservation: Optional[Reservation]) -> Optional[_CalendarOp]:
+        """Decide qué llamada a Google necesita el trabajo (None si no hay nada que hacer)."""
+        action_value = CalendarSyncAction(job.action)
+        reservation_id = job.reservation_id
+        tz_name = job.payload.get("tz") or getattr(TZ, "key", str(TZ))
+        if action_value is CalendarSyncAction.DELETE:
+            calendar_id = job.payload.get("calendar_id")
+            event_id = job.payload.get("event_id")
+            if reservation is not None:
                 calendar_id = calendar_id or reservation.google_calendar_id
                 event_id = event_id or reservation.google_event_id
-        if calendar_id and event_id:
-            delete_gcal_reservation(event_id, calendar_id)
-            logger.info("Evento %s eliminado de calendario %s", event_id, calendar_id)
-        else:
+            if calendar_id and event_id:
+                return _CalendarOp("delete", calendar_id, event_id=event_id, tz=tz_name)
             logger.info(
                 "Trabajo delete para reserva %s sin calendar/event id. No hay nada que borrar.",
                 reservation_id,
             )
-        with Session(self._engine) as session:
-            reservation = session.get(ReservationDB, reservation_id)
-            if reservation is None:
-                return True
+            return None
+        if reservation is None:
+            logger.info("Reserva %s no existe. Marcamos trabajo %s como completado.", reservation_id, job.action)
+            return None
+        calendar_id = job.payload.get("calendar_id") or reservation.google_calendar_id
+        if not calendar_id:
+            logger.info("Reserva %s sin calendar_id, nada que sincronizar", reservation_id)
+            return None
+        if action_value is CalendarSyncAction.UPDATE:
+            event_id = reservation.google_event_id or job.payload.get("event_id")
+            if event_id:
+                return _CalendarOp("patch", calendar_id, event_id=event_id, tz=tz_name)
+        return _CalendarOp("insert", calendar_id, tz=tz_name)
+
+    async def _call(self, op: _CalendarOp, reservation: Optional[Reservation]) -> Optional[dict]:
+        if op.kind == "insert":
+            return await create_gcal_reservation_async(reservation, calendar_id=op.calendar_id, tz=op.tz)
+        if op.kind == "patch":
+            return await patch_gcal_reservation_async(op.event_id, reservation.start, reservation.end, op.calendar_id, tz=op.tz)
+        await delete_gcal_reservation_async(op.event_id, op.calendar_id)
+        return None
+
+    def _request(self, service, op: _CalendarOp, reservation: Optional[Reservation]):
+        if op.kind == "insert":
+            return insert_event_request(service, op.calendar_id, reservation_event_body(reservation, op.tz))
+        if op.kind == "patch":
+            return patch_event_request(service, op.calendar_id, op.event_id, reservation.start, reservation.end, op.tz)
+        return delete_event_request(service, op.calendar_id, op.event_id)
+
+    def _apply(
+        self,
+        job: _ClaimedJob,
+        reservation: Optional[Reservation],
+        op: Optional[_CalendarOp],
+        result: Optional[dict],
+        dirty: Set[str],
+    ) -> None:
+        """Refleja en la copia de la reserva el resultado de la llamada a Google."""
+        if reservation is None:
+            return
+        reservation_id = job.reservation_id
+        if job.action == CalendarSyncAction.DELETE.value:
+            if op is not None:
+                logger.info("Evento %s eliminado de calendario %s", op.event_id, op.calendar_id)
             reservation.google_event_id = None
-            if drop_calendar:
+            if job.payload.get("drop_calendar", True):
                 reservation.google_calendar_id = None
-            session.add(reservation)
-            session.commit()
-        return True
+            dirty.add(reservation_id)
+            return
+        if op is None:
+            return
+        if op.kind == "insert":
+            reservation.google_event_id = result.get("id") if isinstance(result, dict) else None
+        reservation.google_calendar_id = op.calendar_id
+        dirty.add(reservation_id)
+        logger.info(
+            "Reserva %s sincronizada en Google Calendar (%s, evento %s)",
+            reservation_id,
+            job.action,
+            reservation.google_event_id,
+        )
 
 
 _worker: Optional[CalendarSyncWorker] = None
@@ -547,8 +1264,19 @@ def start_worker() -> None:
         return
     if _worker is None:
         poll_interval = float(os.getenv("GCAL_QUEUE_POLL_SECONDS", "2"))
+        max_idle_interval = float(os.getenv("GCAL_QUEUE_MAX_IDLE_SECONDS", "30"))
         max_attempts = int(os.getenv("GCAL_QUEUE_MAX_ATTEMPTS", "5"))
-        _worker = CalendarSyncWorker(poll_interval=poll_interval, max_attempts=max_attempts)
+        batch_size = int(os.getenv("GCAL_QUEUE_BATCH_SIZE", "20"))
+        concurrency = int(os.getenv("GCAL_QUEUE_CONCURRENCY", "4"))
+        use_batch = os.getenv("GCAL_QUEUE_USE_BATCH", "true").lower() in {"1", "true", "yes", "si", "sí"}
+        _worker = CalendarSyncWorker(
+            poll_interval=poll_interval,
+            max_idle_interval=max_idle_interval,
+            max_attempts=max_attempts,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            use_batch=use_batch,
+        )
     _worker.start()
 
 
@@ -0,0 +1,458 @@
+"""Notificaciones push de Google Calendar (canales `events.watch`).
+
+Google avisa en `POST /gcal/notifications` cada vez que cambia un calendario
+vigilado, pero el aviso no incluye los cambios. Por eso los avisos se agrupan
+por calendario durante `GCAL_WATCH_DEBOUNCE_SECONDS` y después se lanza una sola
+importación incremental (`sync_from_gcal_incremental`). Si llegan avisos
+mientras esa importación está en marcha, se programa otra al terminar.
+
+Los canales caducan (Google los cierra como mucho a la semana). Por eso
+`CalendarWatchManager` abre uno nuevo antes de que caduque el anterior
+(`GCAL_WATCH_RENEW_BEFORE_SECONDS`) y después cierra el viejo, así que no
+quedan huecos sin aviso.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional
+
+from sqlmodel import Session, select
+
+from app.core.metrics import GCAL_WATCH_NOTIFICATIONS, GCAL_WATCH_PULL_DELAY, GCAL_WATCH_PULLS
+from app.data import iter_professional_calendars
+from app.db import engine
+from app.integrations.google_calendar import stop_channel, watch_events
+from app.models import CalendarWatchChannelDB
+from app.services.freebusy_cache import invalidate_freebusy
+from app.services.logic import build_calendar, sync_from_gcal_incremental
+
+logger = logging.getLogger("pelubot.calendar_watch")
+
+# Cabeceras que Google añade a cada notificación.
+HEADER_CHANNEL_ID = "X-Goog-Channel-ID"
+HEADER_CHANNEL_TOKEN = "X-Goog-Channel-Token"
+HEADER_RESOURCE_ID = "X-Goog-Resource-ID"
+HEADER_RESOURCE_STATE = "X-Goog-Resource-State"
+HEADER_MESSAGE_NUMBER = "X-Goog-Message-Number"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _inc(counter, label: str) -> None:
+    try:
+        counter.labels(result=label).inc()
+    except Exception:
+        pass
+
+
+class CalendarChangeDebouncer:
+    """Agrupa los avisos de cada calendario y lanza una sola importación por ráfaga.
+
+    El primer aviso programa `pull(calendar_id)` al cabo de `delay` segundos y los
+    siguientes se fusionan con él. Un aviso que llega durante la importación
+    programa otra al terminar, porque esa importación pudo leer antes del cambio.
+    """
+
+    def __init__(self, pull: Callable[[str], Any], delay: float = 5.0):
+        self._pull = pull
+        self.delay = max(0.0, float(delay))
+        self._lock = threading.Lock()
+        self._timers: Dict[str, threading.Timer] = {}
+        self._first_seen: Dict[str, float] = {}
+        self._running: set[str] = set()
+        self._rerun: set[str] = set()
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+
+    def notify(self, calendar_id: str) -> bool:
+        """Registra un cambio; True si programa una importación nueva, False si se fusiona."""
+        with self._lock:
+            if self._closed:
+                return False
+            if calendar_id in self._timers:
+                return False
+            if calendar_id in self._running:
+                self._rerun.add(calendar_id)
+                return False
+            self._first_seen.setdefault(calendar_id, time.monotonic())
+            self._schedule(calendar_id)
+            return True
+
+    def pending(self) -> set[str]:
+        with self._lock:
+            return set(self._timers) | self._running | self._rerun
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no quede ninguna importación programada ni en curso."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._timers or self._running or self._rerun:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+
+    def close(self) -> None:
+        """Cancela las importaciones programadas (al apagar la app)."""
+        with self._lock:
+            self._closed = True
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._rerun.clear()
+            self._idle.notify_all()
+
+    def _schedule(self, calendar_id: str) -> None:
+        timer = threading.Timer(self.delay, self._fire, args=(calendar_id,))
+        timer.daemon = True
+        timer.name = f"gcal-watch-{calendar_id}"
+        self._timers[calendar_id] = timer
+        timer.start()
+
+    def _fire(self, calendar_id: str) -> None:
+        with self._lock:
+            if self._timers.pop(calendar_id, None) is None:
+                return
+            self._running.add(calendar_id)
+        ok = True
+        try:
+            self._pull(calendar_id)
+        except Exception:
+            ok = False
+            logger.exception("Error importando cambios notificados de %s", calendar_id)
+        _inc(GCAL_WATCH_PULLS, "ok" if ok else "error")
+        with self._lock:
+            self._running.discard(calendar_id)
+            if calendar_id in self._rerun and not self._closed:
+                self._rerun.discard(calendar_id)
+                self._schedule(calendar_id)
+            else:
+                started = self._first_seen.pop(calendar_id, None)
+                if started is not None:
+                    try:
+                        GCAL_WATCH_PULL_DELAY.observe(time.monotonic() - started)
+                    except Exception:
+                        pass
+            self._idle.notify_all()
+
+
+def _professional_for_calendar(calendar_id: str) -> Optional[str]:
+    for pro_id, cal in iter_professional_calendars():
+        if cal == calendar_id:
+            return pro_id
+    return None
+
+
+def pull_calendar_changes(calendar_id: str, engine_override=None) -> dict:
+    """Importa los cambios de un calendario desde su último syncToken."""
+    invalidate_freebusy(calendar_id)
+    with Session(engine_override or engine) as session:
+        result = sync_from_gcal_incremental(
+            session,
+            default_service=os.getenv("DEFAULT_SERVICE_FOR_SYNC", "corte_cabello"),
+            by_professional=False,
+            calendar_id=calendar_id,
+            professional_id=_professional_for_calendar(calendar_id),
+        )
+    if not result.get("ok") or result.get("errors"):
+        raise RuntimeError(f"Importación incompleta de {calendar_id}: {result}")
+    logger.info("Cambios de %s importados por notificación push: %s", calendar_id, result)
+    return result
+
+
+_debouncer: Optional[CalendarChangeDebouncer] = None
+_debouncer_lock = threading.Lock()
+
+
+def get_change_debouncer() -> CalendarChangeDebouncer:
+    global _debouncer
+    with _debouncer_lock:
+        if _debouncer is None:
+            _debouncer = CalendarChangeDebouncer(
+                lambda calendar_id: pull_calendar_changes(calendar_id),
+                delay=_env_float("GCAL_WATCH_DEBOUNCE_SECONDS", 5.0),
+            )
+        return _debouncer
+
+
+def handle_notification(session: Session, headers: Mapping[str, str]) -> Optional[str]:
+    """Valida una notificación push y programa la importación de su calendario.
+
+    Devuelve `"sync"` (mensaje inicial del canal, no hay cambios), `"scheduled"`,
+    `"coalesced"` (ya había una importación programada) o None si el canal no
+    existe, está cerrado o el token no coincide.
+    """
+    lowered = {key.lower(): value for key, value in headers.items()}
+    channel_id = lowered.get(HEADER_CHANNEL_ID.lower()) or ""
+    token = lowered.get(HEADER_CHANNEL_TOKEN.lower()) or ""
+    resource_id = lowered.get(HEADER_RESOURCE_ID.lower())
+    state = (lowered.get(HEADER_RESOURCE_STATE.lower()) or "").lower()
+
+    channel = session.get(CalendarWatchChannelDB, channel_id) if channel_id else None
+    if (
+        channel is None
+        or channel.stopped_at is not None
+        or not secrets.compare_digest(channel.token, token)
+        or (channel.resource_id and resource_id and channel.resource_id != resource_id)
+    ):
+        _inc(GCAL_WATCH_NOTIFICATIONS, "rejected")
+        logger.warning("Notificación push rechazada (canal %r)", channel_id)
+        return None
+    if state == "sync":
+        _inc(GCAL_WATCH_NOTIFICATIONS, "sync")
+        return "sync"
+    result = "scheduled" if get_change_debouncer().notify(channel.calendar_id) else "coalesced"
+    _inc(GCAL_WATCH_NOTIFICATIONS, result)
+    return result
+
+
+def _parse_expiration(raw: Any) -> Optional[datetime]:
+    """`expiration` de Google viene en milisegundos desde epoch (como texto)."""
+    try:
+        return datetime.fromtimestamp(int(raw) / 1000, tz=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def start_watch_channel(
+    session: Session,
+    calendar_id: str,
+    address: str,
+    *,
+    ttl_seconds: Optional[int] = None,
+    service: Any = None,
+) -> CalendarWatchChannelDB:
+    """Abre un canal nuevo sobre `calendar_id` y lo guarda (sin hacer commit)."""
+    svc = service or build_calendar()
+    channel_id = str(uuid.uuid4())
+    token = secrets.token_urlsafe(24)
+    created = watch_events(svc, calendar_id, channel_id, address, token=token, ttl_seconds=ttl_seconds)
+    channel = CalendarWatchChannelDB(
+        id=channel_id,
+        calendar_id=calendar_id,
+        resource_id=created.get("resourceId"),
+        token=token,
+        address=address,
+        expiration=_parse_expiration(created.get("expiration")),
+    )
+    session.add(channel)
+    return channel
+
+
+def stop_watch_channel(session: Session, channel: CalendarWatchChannelDB, *, service: Any = None) -> None:
+    """Cierra el canal en Google y lo marca como cerrado (sin hacer commit).
+
+    Si Google no responde se marca igualmente: un canal olvidado caduca solo
+    y sus avisos se rechazan porque ya no está activo.
+    """
+    if channel.resource_id:
+        try:
+            stop_channel(service or build_calendar(), channel.id, channel.resource_id)
+        except Exception as exc:
+            logger.warning("No se pudo cerrar el canal %s en Google: %s", channel.id, exc)
+    channel.stopped_at = _utcnow()
+    session.add(channel)
+
+
+def ensure_watch_channels(
+    session: Session,
+    address: str,
+    *,
+    calendars: Optional[Iterable[str]] = None,
+    ttl_seconds: Optional[int] = None,
+    renew_before: timedelta = timedelta(days=1),
+    now: Optional[datetime] = None,
+    catch_up: bool = True,
+) -> dict:
+    """Deja exactamente un canal vigente por calendario apuntando a `address`.
+
+    Abre los que faltan, renueva los que caducan en menos de `renew_before`
+    (primero abre el nuevo y luego cierra el viejo) y cierra los de calendarios
+    que ya no se usan o que apuntan a otra dirección. Con `catch_up`, los
+    calendarios que estaban sin canal vigente se importan, por si cambiaron
+    mientras no llegaban avisos.
+    """
+    now = now or _utcnow()
+    wanted = sorted(set(calendars) if calendars is not None else {cal for _, cal in iter_professional_calendars()})
+    active = session.exec(
+        select(CalendarWatchChannelDB)
+        .where(CalendarWatchChannelDB.stopped_at.is_(None))
+        .order_by(CalendarWatchChannelDB.created_at.desc())
+    ).all()
+    by_calendar: Dict[str, List[CalendarWatchChannelDB]] = {}
+    for channel in active:
+        by_calendar.setdefault(channel.calendar_id, []).append(channel)
+
+    started = renewed = stopped = errors = 0
+    catch_up_calendars: List[str] = []
+    for calendar_id in wanted:
+        current = by_calendar.pop(calendar_id, [])
+        fresh = [
+            ch for ch in current
+            if ch.address == address and (ch.expiration is None or _as_utc(ch.expiration) - now > renew_before)
+        ]
+        if fresh:
+            keep = fresh[0]
+        else:
+            try:
+                keep = start_watch_channel(session, calendar_id, address, ttl_seconds=ttl_seconds)
+            except Exception as exc:
+                logger.warning("No se pudo abrir el canal de notificaciones de %s: %s", calendar_id, exc)
+                errors += 1
+                continue
+            if current:
+                renewed += 1
+            else:
+                started += 1
+            live = [ch for ch in current if ch.expiration is None or _as_utc(ch.expiration) > now]
+            if not live:
+                catch_up_calendars.append(calendar_id)
+        for channel in current:
+            if channel is not keep:
+                stop_watch_channel(session, channel)
+                stopped += 1
+    for leftovers in by_calendar.values():
+        for channel in leftovers:
+            stop_watch_channel(session, channel)
+            stopped += 1
+    session.commit()
+
+    if catch_up:
+        debouncer = get_change_debouncer()
+        for calendar_id in catch_up_calendars:
+            debouncer.notify(calendar_id)
+    out = {"ok": errors == 0, "started": started, "renewed": renewed, "stopped": stopped, "calendars": len(wanted)}
+    if errors:
+        out["errors"] = errors
+    return out
+
+
+def next_renewal_at(session: Session, renew_before: timedelta) -> Optional[datetime]:
+    """Momento en que habrá que renovar el primer canal vigente (None si no hay canales)."""
+    expirations = session.exec(
+        select(CalendarWatchChannelDB.expiration).where(
+            CalendarWatchChannelDB.stopped_at.is_(None),
+            CalendarWatchChannelDB.expiration.is_not(None),
+        )
+    ).all()
+    if not expirations:
+        return None
+    return min(_as_utc(exp) for exp in expirations) - renew_before
+
+
+class CalendarWatchManager:
+    """Hilo que mantiene abiertos los canales de notificación y los renueva antes de que caduquen.
+
+    Duerme hasta la próxima renovación, y como mucho `check_interval` segundos,
+    para detectar también calendarios nuevos.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        *,
+        ttl_seconds: Optional[int] = None,
+        renew_before: float = 86400.0,
+        check_interval: float = 3600.0,
+    ):
+        self.address = address
+        self.ttl_seconds = ttl_seconds
+        self.renew_before = timedelta(seconds=max(0.0, renew_before))
+        self.check_interval = max(1.0, check_interval)
+        self._engine = engine
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="gcal-watch-manager", daemon=True)
+        self._thread.start()
+        logger.info("Canales de notificación de Google Calendar activos hacia %s", self.address)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def run_once(self) -> float:
+        """Revisa los canales y devuelve los segundos hasta la próxima revisión."""
+        with Session(self._engine) as session:
+            result = ensure_watch_channels(
+                session,
+                self.address,
+                ttl_seconds=self.ttl_seconds,
+                renew_before=self.renew_before,
+            )
+            if result["started"] or result["renewed"] or result["stopped"]:
+                logger.info("Canales de notificación revisados: %s", result)
+            due = next_renewal_at(session, self.renew_before)
+        if result.get("errors"):
+            return min(self.check_interval, 60.0)
+        if due is None:
+            return self.check_interval
+        return min(max((due - _utcnow()).total_seconds(), 1.0), self.check_interval)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                wait = self.run_once()
+            except Exception:
+                logger.exception("Error revisando los canales de notificación de Google Calendar")
+                wait = min(self.check_interval, 60.0)
+            self._stop_event.wait(wait)
+
+
+_manager: Optional[CalendarWatchManager] = None
+
+
+def start_watch_manager() -> bool:
+    """Arranca la renovación de canales si `GCAL_WATCH_ADDRESS` está definida."""
+    global _manager
+    address = (os.getenv("GCAL_WATCH_ADDRESS") or "").strip()
+    if not address:
+        return False
+    if _manager is None:
+        ttl = _env_float("GCAL_WATCH_TTL_SECONDS", 604800)
+        _manager = CalendarWatchManager(
+            address,
+            ttl_seconds=int(ttl) if ttl > 0 else None,
+            renew_before=_env_float("GCAL_WATCH_RENEW_BEFORE_SECONDS", 86400),
+            check_interval=_env_float("GCAL_WATCH_CHECK_SECONDS", 3600),
+        )
+    _manager.start()
+    return True
+
+
+def stop_watch_manager() -> None:
+    """Detiene la renovación y cancela las importaciones pendientes; los canales siguen abiertos."""
+    global _debouncer
+    if _manager:
+        _manager.stop()
+    with _debouncer_lock:
+        debouncer, _debouncer = _debouncer, None
+    # Uno cerrado descarta los avisos: el próximo `get_change_debouncer()` crea otro.
+    if debouncer:
+        debouncer.close()
@@ -0,0 +1,118 @@
+"""Mantenimiento de la BD independiente del motor (SQLite o Postgres).
+
+Los endpoints `/admin/db_integrity`, `/admin/db_optimize`,
+`/admin/db_checkpoint` y `/admin/db_info` llaman a estas funciones, que eligen
+las sentencias según el dialecto del engine:
+
+- Integridad: `PRAGMA integrity_check` en SQLite; en Postgres, restricciones
+  sin validar, índices inválidos y que exista la restricción de solapes.
+- Optimizar: `VACUUM`/`ANALYZE`/`PRAGMA optimize` en SQLite; `VACUUM`/`ANALYZE`
+  (en autocommit) en Postgres, donde `optimize` no aplica.
+- Checkpoint: `PRAGMA wal_checkpoint(TRUNCATE)` en SQLite; `CHECKPOINT` en
+  Postgres (requiere superusuario o el rol `pg_checkpoint`).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+from sqlalchemy.engine import Engine
+
+from app.db import OVERLAP_CONSTRAINT
+
+
+def _dialect(bind: Engine) -> str:
+    return bind.dialect.name
+
+
+def integrity_check(bind: Engine) -> Dict[str, Any]:
+    """Devuelve `{"ok": bool, "detail": str}`."""
+    dialect = _dialect(bind)
+    if dialect == "sqlite":
+        with bind.connect() as conn:
+            res = conn.exec_driver_sql("PRAGMA integrity_check;").scalar()
+        return {"ok": res == "ok", "detail": res}
+    if dialect == "postgresql":
+        problems: List[str] = []
+        with bind.connect() as conn:
+            for table, name in conn.exec_driver_sql(
+                "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE NOT convalidated"
+            ).fetchall():
+                problems.append(f"restricción sin validar: {table}.{name}")
+            for (index,) in conn.exec_driver_sql(
+                "SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid OR NOT indisready"
+            ).fetchall():
+                problems.append(f"índice inválido: {index}")
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM pg_constraint WHERE conname = %(name)s", {"name": OVERLAP_CONSTRAINT}
+            ).first()
+            if not exists:
+                problems.append(f"falta la restricción {OVERLAP_CONSTRAINT}")
+        return {"ok": not problems, "detail": "; ".join(problems) or "ok"}
+    return {"ok": False, "detail": f"Motor no soportado: {dialect}"}
+
+
+def optimize(bind: Engine, *, vacuum: bool = True, analyze: bool = True, optimize: bool = True) -> Dict[str, bool]:
+    """Ejecuta lo pedido y devuelve qué acciones se hicieron."""
+    actions = {"vacuum": False, "analyze": False, "optimize": False}
+    dialect = _dialect(bind)
+    if dialect == "sqlite":
+        with bind.connect() as conn:
+            if vacuum:
+                conn.exec_driver_sql("VACUUM")
+                actions["vacuum"] = True
+            if analyze:
+                conn.exec_driver_sql("ANALYZE")
+                actions["analyze"] = True
+            if optimize:
+                try:
+                    conn.exec_driver_sql("PRAGMA optimize;")
+                    actions["optimize"] = True
+                except Exception:
+                    pass
+        return actions
+    if dialect == "postgresql":
+        # VACUUM no puede ir dentro de una transacción.
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if vacuum:
+                conn.exec_driver_sql("VACUUM (ANALYZE)" if analyze else "VACUUM")
+                actions["vacuum"] = True
+                actions["analyze"] = bool(analyze)
+            elif analyze:
+                conn.exec_driver_sql("ANALYZE")
+                actions["analyze"] = True
+        return actions
+    raise RuntimeError(f"Motor no soportado: {dialect}")
+
+
+def checkpoint(bind: Engine) -> list:
+    """Fuerza un checkpoint; devuelve la fila de SQLite (vacía en Postgres)."""
+    dialect = _dialect(bind)
+    if dialect == "sqlite":
+        with bind.connect() as conn:
+            res = conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+        return list(res) if res else []
+    if dialect == "postgresql":
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("CHECKPOINT")
+        return []
+    raise RuntimeError(f"Motor no soportado: {dialect}")
+
+
+def settings(bind: Engine) -> Dict[str, Any]:
+    """Ajustes relevantes del motor para `/admin/db_info` (PRAGMAs o versión/tamaño en Postgres)."""
+    dialect = _dialect(bind)
+    out: Dict[str, Any] = {}
+    with bind.connect() as conn:
+        if dialect == "sqlite":
+            out["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode;").scalar()
+            out["synchronous"] = conn.exec_driver_sql("PRAGMA synchronous;").scalar()
+            out["foreign_keys"] = conn.exec_driver_sql("PRAGMA foreign_keys;").scalar()
+        elif dialect == "postgresql":
+            out["server_version"] = conn.exec_driver_sql("SHOW server_version").scalar()
+            out["database_size"] = conn.exec_driver_sql("SELECT pg_database_size(current_database())").scalar()
+            out["overlap_constraint"] = bool(
+                conn.exec_driver_sql(
+                    "SELECT 1 FROM pg_constraint WHERE conname = %(name)s", {"name": OVERLAP_CONSTRAINT}
+                ).first()
+            )
+    return out
@@ -0,0 +1,324 @@
+"""Caché compartida de free/busy de Google Calendar.
+
+En lugar de una llamada `freebusy` por día consultado, se pide de una vez una
+ventana de varios días (`GCAL_FREEBUSY_WINDOW_DAYS`, 14 por defecto) para todos
+los calendarios que faltan, y se guardan los intervalos ocupados por calendario
+durante `GCAL_FREEBUSY_CACHE_SECONDS` (60 s). Las consultas posteriores de días
+dentro de la ventana se resuelven en memoria.
+
+Cuando PeluBot escribe en un calendario (cola de sincronización, reconciliación
+o limpieza) se invalida ese calendario; los cambios hechos por terceros
+directamente en Google se ven al expirar el TTL.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.core.metrics import GCAL_FREEBUSY_CACHE_HITS, GCAL_FREEBUSY_CACHE_MISSES
+from app.integrations.google_calendar import freebusy_multi, iso_datetime
+
+logger = logging.getLogger("pelubot.freebusy_cache")
+
+BusyInterval = Tuple[datetime, datetime]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _inc(counter, amount: int) -> None:
+    if amount <= 0:
+        return
+    try:
+        counter.inc(amount)
+    except Exception:
+        pass
+
+
+def _parse_busy(entries: Iterable[Dict[str, str]], tz: str) -> List[BusyInterval]:
+    """Convierte la respuesta de freebusy a intervalos en hora local naive ordenados."""
+    zone = ZoneInfo(tz)
+    out: List[BusyInterval] = []
+    for b in entries or []:
+        try:
+            bs = datetime.fromisoformat((b.get("start") or "").replace("Z", "+00:00"))
+            be = datetime.fromisoformat((b.get("end") or "").replace("Z", "+00:00"))
+        except Exception:
+            continue
+        if bs.tzinfo is not None:
+            bs = bs.astimezone(zone).replace(tzinfo=None)
+        if be.tzinfo is not None:
+            be = be.astimezone(zone).replace(tzinfo=None)
+        if be > bs:
+            out.append((bs, be))
+    out.sort()
+    return out
+
+
+def _slice(busy: List[BusyInterval], start_date: date, end_date: date) -> List[BusyInterval]:
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    return [(s, e) for s, e in busy if s < range_end and e > range_start]
+
+
+class _Entry(NamedTuple):
+    window_start: date
+    window_end: date
+    expires_at: float
+    version: Tuple[int, int]
+    busy: List[BusyInterval]
+
+
+class FreeBusyCache:
+    """Intervalos ocupados por calendario, precargados por ventanas de días."""
+
+    def __init__(self, window_days: int = 14, ttl_seconds: float = 60.0, max_calendars: int = 256):
+        self.window_days = max(1, int(window_days))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.max_calendars = max(1, int(max_calendars))
+        self._entries: Dict[str, _Entry] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        # Descargas en curso por calendario: quien falla en un calendario que ya
+        # se está descargando espera esa llamada en vez de repetirla. Los demás
+        # calendarios no esperan (no hay bloqueo global durante la llamada HTTP).
+        self._inflight: Dict[str, Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _version(self, calendar_id: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(calendar_id, 0)
+
+    def _lookup(
+        self, calendar_ids: List[str], start_date: date, end_date: date
+    ) -> Tuple[Dict[str, List[BusyInterval]], List[str]]:
+        now = time.monotonic()
+        found: Dict[str, List[BusyInterval]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for cid in calendar_ids:
+                entry = self._entries.get(cid)
+                if (
+                    entry is not None
+                    and entry.expires_at > now
+                    and entry.version == self._version(cid)
+                    and entry.window_start <= start_date
+                    and end_date <= entry.window_end
+                ):
+                    found[cid] = _slice(entry.busy, start_date, end_date)
+                else:
+                    missing.append(cid)
+        return found, missing
+
+    def busy_for(
+        self,
+        service: Any,
+        calendar_ids: List[str],
+        start_date: date,
+        end_date: date,
+        tz: str = "Europe/Madrid",
+    ) -> Dict[str, List[BusyInterval]]:
+        """Intervalos ocupados (hora local naive) de cada calendario en [start_date, end_date].
+
+        Propaga el error de Google si la descarga falla; no se cachean fallos.
+        """
+        calendar_ids = list(dict.fromkeys(cid for cid in calendar_ids if cid))
+        if not calendar_ids:
+            return {}
+        if not self.enabled:
+            raw = self._fetch(service, calendar_ids, start_date, end_date, tz)
+            return {cid: _slice(busy, start_date, end_date) for cid, busy in raw.items()}
+
+        found, missing = self._lookup(calendar_ids, start_date, end_date)
+        _inc(GCAL_FREEBUSY_CACHE_HITS, len(found))
+        _inc(GCAL_FREEBUSY_CACHE_MISSES, len(missing))
+        if not missing:
+            return found
+
+        window_end = max(end_date, start_date + timedelta(days=self.window_days - 1))
+        mine, versions, flight, waits = self._claim(missing)
+        try:
+            if mine:
+                raw = self._fetch(service, mine, start_date, window_end, tz)
+                self._store(raw, versions, start_date, end_date, window_end, found)
+        finally:
+            self._release(mine, flight)
+        if waits:
+            for other in waits:
+                other.result()
+            # Tras la descarga ajena, lo que siga faltando (otra ventana, fallo) se pide aquí.
+            others = [cid for cid in missing if cid not in versions]
+            refreshed, still = self._lookup(others, start_date, end_date)
+            found.update(refreshed)
+            if still:
+                versions = self._versions(still)
+                raw = self._fetch(service, still, start_date, window_end, tz)
+                self._store(raw, versions, start_date, end_date, window_end, found)
+        return found
+
+    async def busy_for_async(
+        self,
+        client: Any,
+        calendar_ids: List[str],
+        start_date: date,
+        end_date: date,
+        tz: str = "Europe/Madrid",
+    ) -> Dict[str, List[BusyInterval]]:
+        """Como `busy_for`, pero descarga con el cliente async (`AsyncCalendarClient`).
+
+        Comparte entradas y descargas en curso con `busy_for`: si un hilo ya está
+        pidiendo un calendario, se espera su resultado sin bloquear el event loop.
+        """
+        calendar_ids = list(dict.fromkeys(cid for cid in calendar_ids if cid))
+        if not calendar_ids:
+            return {}
+        if not self.enabled:
+            raw = await self._fetch_async(client, calendar_ids, start_date, end_date, tz)
+            return {cid: _slice(busy, start_date, end_date) for cid, busy in raw.items()}
+
+        found, missing = self._lookup(calendar_ids, start_date, end_date)
+        _inc(GCAL_FREEBUSY_CACHE_HITS, len(found))
+        _inc(GCAL_FREEBUSY_CACHE_MISSES, len(missing))
+        if not missing:
+            return found
+
+        window_end = max(end_date, start_date + timedelta(days=self.window_days - 1))
+        mine, versions, flight, waits = self._claim(missing)
+        try:
+            if mine:
+                raw = await self._fetch_async(client, mine, start_date, window_end, tz)
+                self._store(raw, versions, start_date, end_date, window_end, found)
+        finally:
+            self._release(mine, flight)
+        if waits:
+            await asyncio.gather(*(asyncio.wrap_future(other) for other in waits))
+            others = [cid for cid in missing if cid not in versions]
+            refreshed, still = self._lookup(others, start_date, end_date)
+            found.update(refreshed)
+            if still:
+                versions = self._versions(still)
+                raw = await self._fetch_async(client, still, start_date, window_end, tz)
+                self._store(raw, versions, start_date, end_date, window_end, found)
+        return found
+
+    def _versions(self, calendar_ids: List[str]) -> Dict[str, Tuple[int, int]]:
+        with self._lock:
+            return {cid: self._version(cid) for cid in calendar_ids}
+
+    def _claim(
+        self, calendar_ids: List[str]
+    ) -> Tuple[List[str], Dict[str, Tuple[int, int]], Optional[Future], List[Future]]:
+        """Reparte los calendarios que faltan entre los que descarga este hilo y los que ya están en curso."""
+        mine: List[str] = []
+        waits: Dict[int, Future] = {}
+        with self._lock:
+            for cid in calendar_ids:
+                other = self._inflight.get(cid)
+                if other is None:
+                    mine.append(cid)
+                else:
+                    waits[id(other)] = other
+            flight: Optional[Future] = Future() if mine else None
+            for cid in mine:
+                self._inflight[cid] = flight  # type: ignore[assignment]
+            versions = {cid: self._version(cid) for cid in mine}
+        return mine, versions, flight, list(waits.values())
+
+    def _release(self, calendar_ids: List[str], flight: Optional[Future]) -> None:
+        if flight is None:
+            return
+        with self._lock:
+            for cid in calendar_ids:
+                if self._inflight.get(cid) is flight:
+                    del self._inflight[cid]
+        flight.set_result(None)
+
+    def _store(
+        self,
+        raw: Dict[str, List[BusyInterval]],
+        versions: Dict[str, Tuple[int, int]],
+        start_date: date,
+        end_date: date,
+        window_end: date,
+        found: Dict[str, List[BusyInterval]],
+    ) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for cid, version in versions.items():
+                busy = raw.get(cid, [])
+                found[cid] = _slice(busy, start_date, end_date)
+                # Si alguien escribió en el calendario durante la descarga, no guardamos.
+                if self._version(cid) != version:
+                    continue
+                self._entries.pop(cid, None)
+                self._entries[cid] = _Entry(start_date, window_end, expires_at, version, busy)
+            while len(self._entries) > self.max_calendars:
+                self._entries.pop(next(iter(self._entries)))
+
+    def _fetch(
+        self, service: Any, calendar_ids: List[str], start_date: date, end_date: date, tz: str
+    ) -> Dict[str, List[BusyInterval]]:
+        time_min = datetime.combine(start_date, datetime.min.time())
+        time_max = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        t0 = time.perf_counter()
+        raw = freebusy_multi(service, calendar_ids, iso_datetime(time_min, tz), iso_datetime(time_max, tz), tz)
+        logger.debug(
+            "freebusy %s calendarios [%s, %s] en %.1f ms",
+            len(calendar_ids),
+            start_date.isoformat(),
+            end_date.isoformat(),
+            (time.perf_counter() - t0) * 1000,
+        )
+        return {cid: _parse_busy(raw.get(cid, []), tz) for cid in calendar_ids}
+
+    async def _fetch_async(
+        self, client: Any, calendar_ids: List[str], start_date: date, end_date: date, tz: str
+    ) -> Dict[str, List[BusyInterval]]:
+        time_min = datetime.combine(start_date, datetime.min.time()).isoformat()
+        time_max = datetime.combine(end_date + timedelta(days=1), datetime.min.time()).isoformat()
+        raw = await client.freebusy(calendar_ids, time_min, time_max, tz)
+        return {cid: _parse_busy(raw.get(cid, []), tz) for cid in calendar_ids}
+
+    def invalidate(self, calendar_id: Optional[str]) -> None:
+        """Descarta la ventana cacheada de un calendario tras escribir en él."""
+        if not calendar_id:
+            return
+        with self._lock:
+            self._generations[calendar_id] = self._generations.get(calendar_id, 0) + 1
+            self._entries.pop(calendar_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+
+freebusy_cache = FreeBusyCache(
+    window_days=_env_int("GCAL_FREEBUSY_WINDOW_DAYS", 14),
+    ttl_seconds=_env_int("GCAL_FREEBUSY_CACHE_SECONDS", 60),
+)
+
+
+def invalidate_freebusy(calendar_id: Optional[str]) -> None:
+    """Atajo para invalidar el free/busy de un calendario en el que acabamos de escribir."""
+    freebusy_cache.invalidate(calendar_id)
+
+
+def clear_freebusy_cache() -> None:
+    """Vacía la caché (operaciones masivas sobre calendarios)."""
+    freebusy_cache.clear()
@@ -1,18 +1,45 @@
 from __future__ import annotations
-from typing import Optional, List, Tuple, Dict
+from typing import Any, Callable, Optional, List, Tuple, Dict, TypeVar
 from datetime import datetime, date, time, timedelta
+from bisect import bisect_left, bisect_right
+import logging
+import math
 import os
+from time import perf_counter
+from sqlalchemy import insert as sa_insert, update as sa_update
 from sqlmodel import Session, select
-from app.models import Service, RescheduleIn, Reservation, ReservationDB
+from app.db import enforces_no_overlap, run_after_commit
+from app.models import CalendarSyncStateDB, Service, RescheduleIn, Reservation, ReservationDB
 from app.data import (
-    WEEKLY_SCHEDULE,
     calendar_for_professional as catalog_calendar_for_professional,
+    CompiledSchedule,
+    DayRanges,
     get_active_professionals,
+    get_professional_schedule,
     get_service_by_id,
+    get_slot_grid,
     iter_professional_calendars,
     professionals_using_gcal,
 )
-from app.integrations.google_calendar import build_calendar, freebusy_multi, create_event, patch_event, delete_event, iso_datetime, list_events_range
+from app.integrations.google_calendar import (
+    _event_body,
+    build_calendar,
+    create_event,
+    delete_event,
+    delete_event_request,
+    execute_batch,
+    GCAL_BATCH_MAX_OPS,
+    insert_event_request,
+    SyncTokenExpired,
+    list_event_changes,
+    list_events_allpages,
+    patch_event,
+    patch_event_request,
+)
+from app.integrations.google_calendar_async import get_async_calendar
+from app.services.availability_cache import availability_cache, invalidate_availability
+from app.services.calendar_diff import compute_calendar_diff, parse_gcal_datetime
+from app.services.freebusy_cache import clear_freebusy_cache, freebusy_cache, invalidate_freebusy
 from zoneinfo import ZoneInfo
 from datetime import timezone as _utc_tz
 
@@ -20,11 +47,19 @@ from datetime import timezone as _utc_tz
 # Lógica de negocio con persistencia
 # ---------------------------------------------
 
+logger = logging.getLogger("pelubot.logic")
+
 USE_GCAL_BUSY = os.getenv("USE_GCAL_BUSY", "false").lower() in ("1", "true", "yes", "y", "si", "sí")
 DEFAULT_CALENDAR_ID = os.getenv("GCAL_CALENDAR_ID", os.getenv("GCAL_TEST_CALENDAR_ID", "pelubot.test@gmail.com"))
 
 TZ = os.getenv("TZ", "Europe/Madrid")
 
+# Instantes comparables: datetimes o minutos desde medianoche.
+_T = TypeVar("_T")
+
+# Callback de progreso de los trabajos de administración (ver app.services.admin_jobs).
+Progress = Callable[[Dict[str, Any]], None]
+
 def _to_naive_local(dt: datetime) -> datetime:
     """Convierte a la TZ local y devuelve datetime naive para comparaciones internas."""
     if dt.tzinfo is None:
@@ -35,32 +70,146 @@ def get_calendar_for_professional(pro_id: str) -> str:
     """Calendar destino para el profesional; fallback al calendar general."""
     return catalog_calendar_for_professional(pro_id) or DEFAULT_CALENDAR_ID
 
-def _reservations_for_prof_on_date(session: Session, pro_id: str, on_date: date) -> List[ReservationDB]:
-    """Reservas activas del profesional que solapan el día (excluye canceladas)."""
-    day_start = datetime.combine(on_date, time(0, 0))
-    day_end = datetime.combine(on_date, time(23, 59, 59))
-    stmt = select(ReservationDB).where(
-        ReservationDB.professional_id == pro_id,
-        ReservationDB.start < day_end,
-        ReservationDB.end > day_start,
-        ReservationDB.status != "cancelada"
+def _reservations_by_prof_in_range(
+    session: Session, pro_ids: List[str], start_date: date, end_date: date
+) -> Dict[Tuple[str, date], List[Tuple[datetime, datetime]]]:
+    """Intervalos ocupados por (profesional, día) en [start_date, end_date] con una sola consulta.
+
+    Una reserva que cruza medianoche se asigna a cada día que toca.
+    """
+    out: Dict[Tuple[str, date], List[Tuple[datetime, datetime]]] = {}
+    if not pro_ids:
+        return out
+    range_start = datetime.combine(start_date, time(0, 0))
+    range_end = datetime.combine(end_date, time(23, 59, 59))
+    stmt = select(ReservationDB.professional_id, ReservationDB.start, ReservationDB.end).where(
+        ReservationDB.professional_id.in_(pro_ids),
+        ReservationDB.start < range_end,
+        ReservationDB.end > range_start,
+        ReservationDB.status != "cancelada",
     )
-    return list(session.exec(stmt))
+    for pro_id, start_raw, end_raw in session.exec(stmt):
+        start_dt = _to_naive_local(start_raw)
+        end_dt = _to_naive_local(end_raw)
+        current = max(start_dt.date(), start_date)
+        last = min(end_dt.date(), end_date)
+        while current <= last:
+            if start_dt < datetime.combine(current, time(23, 59, 59)) and end_dt > datetime.combine(current, time(0, 0)):
+                out.setdefault((pro_id, current), []).append((start_dt, end_dt))
+            current += timedelta(days=1)
+    return out
+
+def _reservations_by_prof_on_date(
+    session: Session, pro_ids: List[str], on_date: date
+) -> Dict[str, List[Tuple[datetime, datetime]]]:
+    """Intervalos ocupados del día para varios profesionales en una sola consulta."""
+    by_key = _reservations_by_prof_in_range(session, pro_ids, on_date, on_date)
+    return {pid: by_key.get((pid, on_date), []) for pid in pro_ids}
+
+def _build_busy_index(intervals: List[Tuple[_T, _T]]) -> Tuple[List[_T], List[_T]]:
+    """Fusiona intervalos solapados y devuelve listas paralelas (inicios, fines) ordenadas.
+
+    Al ser disjuntos tras la fusión, los fines quedan ordenados y basta una
+    búsqueda binaria por candidato para saber si choca con algún intervalo.
+    """
+    merged_starts: List[_T] = []
+    merged_ends: List[_T] = []
+    for s, e in sorted(intervals):
+        if e <= s:
+            continue
+        if merged_ends and s <= merged_ends[-1]:
+            if e > merged_ends[-1]:
+                merged_ends[-1] = e
+            continue
+        merged_starts.append(s)
+        merged_ends.append(e)
+    return merged_starts, merged_ends
+
+def _is_busy(index: Tuple[List[_T], List[_T]], start: _T, end: _T) -> bool:
+    """Indica si [start, end) se solapa con algún intervalo del índice."""
+    starts, ends = index
+    pos = bisect_right(ends, start)
+    return pos < len(starts) and starts[pos] < end
 
 def find_reservation(session: Session, reservation_id: str) -> Optional[ReservationDB]:
     """Obtiene la reserva desde BD si existe."""
     return session.get(ReservationDB, reservation_id)
 
-def cancel_reservation(session: Session, reservation_id: str) -> bool:
-    """Marca la reserva como cancelada en lugar de eliminarla (para mantener historial)."""
+def cancel_reservation(session: Session, reservation_id: str, commit: bool = True) -> bool:
+    """Marca la reserva como cancelada en lugar de eliminarla (para mantener historial).
+
+    Con `commit=False` el cambio queda en la transacción del llamante (que
+    añade su trabajo de sincronización) y la caché se invalida tras su commit.
+    """
     r = session.get(ReservationDB, reservation_id)
     if not r:
         return False
     r.status = "cancelada"
     session.add(r)
+    freed = (r.professional_id, r.start, r.end)
+    if not commit:
+        run_after_commit(session, lambda: invalidate_availability(*freed))
+        return True
     session.commit()
+    invalidate_availability(*freed)
     return True
 
+def _pro_ids_for_service(service_id: str, professional_id: Optional[str]) -> List[str]:
+    """Profesionales a evaluar: el indicado o todos los activos que prestan el servicio."""
+    if professional_id:
+        return [professional_id]
+    return [p.id for p in get_active_professionals() if service_id in (p.services or [])]
+
+def pros_using_gcal_busy(service_id: str, professional_id: Optional[str] = None, use_gcal_busy_override: Optional[bool] = None) -> List[str]:
+    """Profesionales cuya disponibilidad consultaría Google Calendar (freeBusy).
+
+    Las rutas async lo usan para pedir ese freeBusy con el cliente async
+    (`collect_gcal_busy_for_range_async`, tras la caché de ventanas) y pasar
+    el resultado precalculado al cálculo de huecos.
+    """
+    use_gcal_map = professionals_using_gcal()
+    return [
+        pid
+        for pid in _pro_ids_for_service(service_id, professional_id)
+        if (bool(use_gcal_busy_override) if use_gcal_busy_override is not None else use_gcal_map.get(pid, USE_GCAL_BUSY))
+    ]
+
+def _minutes_since(day_start: datetime, dt: datetime) -> float:
+    return (dt - day_start).total_seconds() / 60
+
+def _busy_index_minutes(intervals: List[Tuple[datetime, datetime]], day_start: datetime) -> Tuple[List[int], List[int]]:
+    """Índice de ocupación en minutos desde `day_start`, comparable con las rejillas de horario.
+
+    Los inicios se redondean hacia abajo y los finales hacia arriba: con candidatos
+    en minutos enteros, el resultado del solape es el mismo que con datetimes.
+    """
+    return _build_busy_index([
+        (math.floor(_minutes_since(day_start, s)), math.ceil(_minutes_since(day_start, e)))
+        for s, e in intervals
+    ])
+
+def _fits_in_ranges(day_ranges: Tuple[Tuple[int, int], ...], start_dt: datetime, duration_min: int) -> bool:
+    start_min = _minutes_since(datetime.combine(start_dt.date(), time(0, 0)), start_dt)
+    end_min = start_min + duration_min
+    return any(start_min >= r_start and end_min <= r_end for r_start, r_end in day_ranges)
+
+def _schedule_groups(schedules: Dict[str, CompiledSchedule], on_date: date) -> Dict[DayRanges, List[str]]:
+    """Agrupa profesionales con el mismo horario ese día (omite a quien no trabaja)."""
+    groups: Dict[DayRanges, List[str]] = {}
+    for pid, schedule in schedules.items():
+        ranges = schedule.ranges_for(on_date)
+        if ranges:
+            groups.setdefault(ranges, []).append(pid)
+    return groups
+
+def _schedule_key(groups: Dict[DayRanges, List[str]]) -> Tuple[Tuple[str, DayRanges], ...]:
+    """Horario de cada profesional ese día, para las claves de la caché de disponibilidad.
+
+    Con solo los rangos agrupados, dos profesionales que intercambian horario
+    darían la misma clave y se servirían huecos del otro.
+    """
+    return tuple(sorted((pid, ranges) for ranges, group in groups.items() for pid in group))
+
 def find_available_slots(
     session: Session,
     service_id: str,
@@ -75,24 +224,11 @@ def find_available_slots(
         service: Service = get_service_by_id(service_id)
     except KeyError:
         return []
-    day_ranges = WEEKLY_SCHEDULE.get(on_date.weekday(), [])
-    if not day_ranges:
+    pro_ids = _pro_ids_for_service(service_id, professional_id)
+    groups = _schedule_groups({pid: get_professional_schedule(pid) for pid in pro_ids}, on_date)
+    if not groups:
         return []
-
-    active_pros = get_active_professionals()
-    if professional_id:
-        pro_ids = [professional_id]
-    else:
-        pro_ids = [p.id for p in active_pros if service_id in (p.services or [])]
-
-    starts: List[datetime] = []
-    for start_t, end_t in day_ranges:
-        cursor = datetime.combine(on_date, start_t)
-        end_range = datetime.combine(on_date, end_t)
-        while cursor + timedelta(minutes=service.duration_min) <= end_range:
-            starts.append(cursor)
-            cursor += timedelta(minutes=step_min)
-
+    pro_ids = [pid for group in groups.values() for pid in group]
     use_gcal_map = professionals_using_gcal()
 
     def pro_uses_gcal(pid: str) -> bool:
@@ -100,6 +236,17 @@ def find_available_slots(
             return bool(use_gcal_busy_override)
         return use_gcal_map.get(pid, USE_GCAL_BUSY)
 
+    # Solo cacheamos resultados que dependen exclusivamente de la BD local.
+    cacheable = precomputed_busy is None and not any(pro_uses_gcal(pid) for pid in pro_ids)
+    # El horario de cada profesional forma parte de la clave: un cambio de horario,
+    # aunque sea un intercambio entre profesionales, nunca sirve huecos antiguos.
+    cache_key = ("slots", service_id, professional_id, on_date, step_min, _schedule_key(groups))
+    snapshot = availability_cache.snapshot(pro_ids, on_date)
+    if cacheable:
+        cached = availability_cache.get("slots", cache_key, snapshot)
+        if cached is not None:
+            return list(cached)
+
     gcal_busy_map: dict[str, List[Tuple[datetime, datetime]]] = {}
     if precomputed_busy:
         gcal_busy_map.update(precomputed_busy)
@@ -112,52 +259,70 @@ def find_available_slots(
         except Exception:
             svc = None
         if svc:
-            day_start = datetime.combine(on_date, time(0, 0))
-            day_end = datetime.combine(on_date, time(23, 59))
-            # Consulta freebusy en una sola llamada para todos los calendarios implicados
+            # La caché compartida trae una ventana de días para todos los calendarios en una llamada.
             cal_map: dict[str, str] = {pid: get_calendar_for_professional(pid) for pid in pros_needing_gcal}
             cal_ids = list({cid for cid in cal_map.values() if cid})
             try:
-                busy_map = freebusy_multi(svc, cal_ids, iso_datetime(day_start), iso_datetime(day_end)) if cal_ids else {}
+                busy_by_cal = freebusy_cache.busy_for(svc, cal_ids, on_date, on_date, tz=TZ) if cal_ids else {}
             except Exception:
-                busy_map = {}
+                busy_by_cal = {}
             for pid, cid in cal_map.items():
-                try:
-                    entries = busy_map.get(cid, [])
-                except Exception:
-                    entries = []
-                intervals: List[Tuple[datetime, datetime]] = []
-                for b in entries:
-                    try:
-                        bs = _to_naive_local(datetime.fromisoformat((b.get("start") or "").replace("Z", "+00:00")))
-                        be = _to_naive_local(datetime.fromisoformat((b.get("end") or "").replace("Z", "+00:00")))
-                        intervals.append((bs, be))
-                    except Exception:
-                        continue
-                gcal_busy_map[pid] = intervals
-
-    def overlaps_local(pro_id: str, start_dt: datetime, end_dt: datetime) -> bool:
-        for r in _reservations_for_prof_on_date(session, pro_id, start_dt.date()):
-            if not (end_dt <= r.start or start_dt >= r.end):
-                return True
-        return False
+                gcal_busy_map[pid] = list(busy_by_cal.get(cid, []))
 
-    def overlaps_intervals(start_dt: datetime, end_dt: datetime, intervals: List[Tuple[datetime, datetime]]) -> bool:
-        return any(not (end_dt <= s or start_dt >= e) for s, e in intervals)
+    local_busy = _reservations_by_prof_on_date(session, pro_ids, on_date)
+    day_start = datetime.combine(on_date, time(0, 0))
+    busy_index: Dict[str, Tuple[List[int], List[int]]] = {}
+    for pro_id in pro_ids:
+        intervals = list(local_busy.get(pro_id, []))
+        if pro_uses_gcal(pro_id):
+            intervals.extend(gcal_busy_map.get(pro_id, []))
+        busy_index[pro_id] = _busy_index_minutes(intervals, day_start)
 
-    free: List[datetime] = []
-    for start_dt in starts:
-        end_dt = start_dt + timedelta(minutes=service.duration_min)
-        for pro_id in pro_ids:
-            if overlaps_local(pro_id, start_dt, end_dt):
-                continue
-            intervals = gcal_busy_map.get(pro_id, []) if pro_uses_gcal(pro_id) else []
-            if overlaps_intervals(start_dt, end_dt, intervals):
+    duration = service.duration_min
+    free_offsets: set[int] = set()
+    for ranges, group in groups.items():
+        for offset in get_slot_grid(ranges, duration, step_min):
+            if offset in free_offsets:
                 continue
-            free.append(start_dt)
-            break
+            if any(not _is_busy(busy_index[pro_id], offset, offset + duration) for pro_id in group):
+                free_offsets.add(offset)
+    # Solo se materializan datetimes para los inicios libres.
+    free: List[datetime] = [day_start + timedelta(minutes=offset) for offset in sorted(free_offsets)]
+    if cacheable:
+        availability_cache.put(cache_key, snapshot, tuple(free))
     return free
 
+def _gcal_calendars_for(pro_ids: List[str], use_gcal_override: Optional[bool]) -> Dict[str, str]:
+    """Profesional -> calendario para quienes usan la ocupación de GCal."""
+    use_gcal_map = professionals_using_gcal()
+
+    def pro_uses_gcal(pid: str) -> bool:
+        if use_gcal_override is not None:
+            return bool(use_gcal_override)
+        return use_gcal_map.get(pid, USE_GCAL_BUSY)
+
+    cal_map = {pid: get_calendar_for_professional(pid) for pid in pro_ids if pro_uses_gcal(pid)}
+    return {pid: cid for pid, cid in cal_map.items() if cid}
+
+def _group_gcal_busy_by_day(
+    cal_map: Dict[str, str], busy_by_cal: Dict[str, List[Tuple[datetime, datetime]]]
+) -> Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]:
+    out: Dict[str, Dict[date, List[Tuple[datetime, datetime]]]] = {}
+    for pid, cid in cal_map.items():
+        entries = busy_by_cal.get(cid, [])
+        if not entries:
+            continue
+        by_day: Dict[date, List[Tuple[datetime, datetime]]] = {}
+        for bs, be in entries:
+            current = bs.date()
+            last = be.date()
+            while current <= last:
+                by_day.setdefault(current, []).append((bs, be))
+                current = current + timedelta(days=1)
+        if by_day:
+            out[pid] = by_day
+    return out
+
 def collect_gcal_busy_for_range(
     pro_ids: List[str],
     start_date: date,
@@ -170,73 +335,164 @@ def collect_gcal_busy_for_range(
     Retorna un mapa profesional -> (fecha -> intervalos ocupados en hora local naive).
     Cuando no hay integración o ocurre un error, devuelve diccionario vacío.
     """
-
-    use_gcal_map = professionals_using_gcal()
-
-    def pro_uses_gcal(pid: str) -> bool:
-        if use_gcal_override is not None:
-            return bool(use_gcal_override)
-        return use_gcal_map.get(pid, USE_GCAL_BUSY)
-
-    pros_needing_gcal = [pid for pid in pro_ids if pro_uses_gcal(pid)]
-    if not pros_needing_gcal:
+    cal_map = _gcal_calendars_for(pro_ids, use_gcal_override)
+    if not cal_map:
         return {}
-
     try:
         svc = build_calendar()
     except Exception:
         return {}
+    try:
+        busy_by_cal = freebusy_cache.busy_for(svc, list(set(cal_map.values())), start_date, end_date, tz=tz)
+    except Exception:
+        busy_by_cal = {}
+    return _group_gcal_busy_by_day(cal_map, busy_by_cal)
 
-    cal_map: Dict[str, str] = {pid: get_calendar_for_professional(pid) for pid in pros_needing_gcal}
-    cal_ids = [cid for cid in {v for v in cal_map.values() if v}]
-    if not cal_ids:
+async def collect_gcal_busy_for_range_async(
+    pro_ids: List[str],
+    start_date: date,
+    end_date: date,
+    use_gcal_override: Optional[bool] = None,
+    tz: str = TZ,
+) -> Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]:
+    """Versión async de `collect_gcal_busy_for_range` con el cliente httpx compartido.
+
+    Pasa por la misma caché de ventanas, así que solo los calendarios que
+    faltan generan una llamada freeBusy, sin ocupar hilos del threadpool.
+    """
+    cal_map = _gcal_calendars_for(pro_ids, use_gcal_override)
+    if not cal_map:
         return {}
+    try:
+        client = get_async_calendar()
+    except Exception:
+        return {}
+    try:
+        busy_by_cal = await freebusy_cache.busy_for_async(client, list(set(cal_map.values())), start_date, end_date, tz=tz)
+    except Exception:
+        busy_by_cal = {}
+    return _group_gcal_busy_by_day(cal_map, busy_by_cal)
 
-    start_dt = datetime.combine(start_date, time(0, 0))
-    end_dt = datetime.combine(end_date, time(23, 59, 59))
+def find_available_days(
+    session: Session,
+    service_id: str,
+    start_date: date,
+    end_date: date,
+    professional_id: Optional[str] = None,
+    step_min: int = 15,
+    use_gcal_busy_override: Optional[bool] = None,
+    not_before: Optional[datetime] = None,
+    gcal_busy: Optional[Dict[str, Dict[date, List[Tuple[datetime, datetime]]]]] = None,
+) -> List[date]:
+    """Devuelve los días de [start_date, end_date] con al menos un hueco libre.
 
+    Carga las reservas de todo el rango en una consulta (y GCal en una llamada
+    cuando aplica) y corta la evaluación de cada día en el primer hueco libre.
+    `not_before` (hora local naive) descarta candidatos anteriores, p.ej. ahora.
+    `gcal_busy` (ver `collect_gcal_busy_for_range`) evita consultar GCal aquí.
+    """
+    if end_date < start_date:
+        return []
     try:
-        busy_raw = freebusy_multi(svc, cal_ids, iso_datetime(start_dt, tz), iso_datetime(end_dt, tz))
-    except Exception:
-        busy_raw = {}
+        service: Service = get_service_by_id(service_id)
+    except KeyError:
+        return []
+    pro_ids = _pro_ids_for_service(service_id, professional_id)
+    if not pro_ids:
+        return []
 
-    out: Dict[str, Dict[date, List[Tuple[datetime, datetime]]]] = {}
-    for pid, cid in cal_map.items():
-        entries = busy_raw.get(cid, [])
-        if not entries:
+    schedules = {pid: get_professional_schedule(pid) for pid in pro_ids}
+    use_gcal_map = professionals_using_gcal()
+    uses_gcal = any(
+        bool(use_gcal_busy_override) if use_gcal_busy_override is not None else use_gcal_map.get(pid, USE_GCAL_BUSY)
+        for pid in pro_ids
+    )
+
+    # Primero resolvemos desde la caché; las fotos de versión se toman antes de leer la BD.
+    resolved: Dict[date, bool] = {}
+    pending: Dict[date, Tuple[Dict[DayRanges, List[str]], Tuple[object, ...], object]] = {}
+    d = start_date
+    while d <= end_date:
+        groups = _schedule_groups(schedules, d)
+        if not groups:
+            resolved[d] = False
+            d += timedelta(days=1)
             continue
-        by_day: Dict[date, List[Tuple[datetime, datetime]]] = {}
-        for b in entries:
-            try:
-                bs = _to_naive_local(datetime.fromisoformat((b.get("start") or "").replace("Z", "+00:00")))
-                be = _to_naive_local(datetime.fromisoformat((b.get("end") or "").replace("Z", "+00:00")))
-            except Exception:
-                continue
-            if be <= bs:
+        key = ("day", service_id, professional_id, d, step_min, _schedule_key(groups))
+        snapshot = availability_cache.snapshot(pro_ids, d)
+        cacheable = not uses_gcal and (not_before is None or d > not_before.date())
+        cached = availability_cache.get("day", key, snapshot) if cacheable else None
+        if cached is not None:
+            resolved[d] = bool(cached)
+        else:
+            pending[d] = (groups, key, snapshot if cacheable else None)
+        d += timedelta(days=1)
+
+    if pending:
+        first_pending, last_pending = min(pending), max(pending)
+        local_busy = _reservations_by_prof_in_range(session, pro_ids, first_pending, last_pending)
+        if gcal_busy is None:
+            gcal_busy = collect_gcal_busy_for_range(pro_ids, first_pending, last_pending, use_gcal_override=use_gcal_busy_override)
+        duration = service.duration_min
+        for d, (groups, key, snapshot) in pending.items():
+            day_start = datetime.combine(d, time(0, 0))
+            if not_before is not None and d < not_before.date():
+                resolved[d] = False
                 continue
-            current = bs.date()
-            last = be.date()
-            while current <= last:
-                by_day.setdefault(current, []).append((bs, be))
-                current = current + timedelta(days=1)
-        if by_day:
-            out[pid] = by_day
-    return out
+            min_offset = 0
+            if not_before is not None and d == not_before.date():
+                min_offset = math.ceil(_minutes_since(day_start, not_before))
+            has_free = False
+            for ranges, group in groups.items():
+                grid = get_slot_grid(ranges, duration, step_min)
+                first = bisect_left(grid, min_offset)
+                if first >= len(grid):
+                    continue
+                busy_index = {
+                    pid: _busy_index_minutes(local_busy.get((pid, d), []) + gcal_busy.get(pid, {}).get(d, []), day_start)
+                    for pid in group
+                }
+                for idx in range(first, len(grid)):
+                    offset = grid[idx]
+                    if any(not _is_busy(busy_index[pid], offset, offset + duration) for pid in group):
+                        has_free = True
+                        break
+                if has_free:
+                    break
+            resolved[d] = has_free
+            if snapshot is not None:
+                availability_cache.put(key, snapshot, has_free)
 
-def _fits_in_schedule(start_dt: datetime, duration_min: int) -> bool:
-    day_ranges = WEEKLY_SCHEDULE.get(start_dt.weekday(), [])
-    if not day_ranges:
-        return False
-    end_dt = start_dt + timedelta(minutes=duration_min)
-    for start_t, end_t in day_ranges:
-        start_range = datetime.combine(start_dt.date(), start_t)
-        end_range = datetime.combine(start_dt.date(), end_t)
-        if start_dt >= start_range and end_dt <= end_range:
-            return True
-    return False
-
-def apply_reschedule(session: Session, payload: RescheduleIn) -> Tuple[bool, str, Optional[ReservationDB]]:
-    """Reprograma una reserva, validando agenda/solapes. Soporta new_start o (new_date,new_time)."""
+    return sorted(d for d, has_free in resolved.items() if has_free)
+
+def _fits_in_schedule(start_dt: datetime, duration_min: int, professional_id: Optional[str] = None) -> bool:
+    """Comprueba si [start_dt, start_dt + duración) cae dentro del horario del profesional."""
+    ranges = get_professional_schedule(professional_id).ranges_for(start_dt.date())
+    return _fits_in_ranges(ranges, start_dt, duration_min)
+
+def has_overlapping_reservation(session: Session, professional_id: str, start: datetime, end: datetime) -> bool:
+    """True si el profesional ya tiene una reserva activa que se solapa con [start, end).
+
+    Con `OVERLAP_CONSTRAINT` activa la BD ya rechaza los solapes entre reservas
+    propias y solo se miran las importadas de Google (`gcal:*`), que la
+    restricción deja fuera; así ambos motores rechazan lo mismo.
+    """
+    q = select(ReservationDB.id).where(
+        ReservationDB.professional_id == professional_id,
+        ReservationDB.start < end,
+        ReservationDB.end > start,
+        ReservationDB.status != "cancelada",
+    )
+    if enforces_no_overlap(session.get_bind()):
+        q = q.where(ReservationDB.id.startswith("gcal:"))
+    return session.exec(q.limit(1)).first() is not None
+
+def apply_reschedule(session: Session, payload: RescheduleIn, commit: bool = True) -> Tuple[bool, str, Optional[ReservationDB]]:
+    """Reprograma una reserva, validando agenda/solapes. Soporta new_start o (new_date,new_time).
+
+    Con `commit=False` el cambio queda en la transacción del llamante, como en
+    `cancel_reservation`.
+    """
     r = session.get(ReservationDB, payload.reservation_id)
     if not r:
         return False, "La reserva no existe.", None
@@ -290,15 +546,7 @@ def apply_reschedule(session: Session, payload: RescheduleIn) -> Tuple[bool, str
     end_dt = start_dt + timedelta(minutes=service.duration_min)
 
     # Verifica ajuste al horario laboral
-    day_ranges = WEEKLY_SCHEDULE.get(start_dt.weekday(), [])
-    ok_in_sched = False
-    for start_t, end_t in day_ranges:
-        r_start = datetime.combine(start_dt.date(), start_t)
-        r_end = datetime.combine(start_dt.date(), end_t)
-        if start_dt >= r_start and end_dt <= r_end:
-            ok_in_sched = True
-            break
-    if not ok_in_sched:
+    if not _fits_in_schedule(start_dt, service.duration_min, new_pro):
         return False, "La nueva hora no encaja en el horario.", None
 
     # Validación rápida local en el día
@@ -337,12 +585,23 @@ def apply_reschedule(session: Session, payload: RescheduleIn) -> Tuple[bool, str
         return False, f"El profesional {pro_name} ya tiene esa hora ocupada.", None
 
     # Persistencia
+    old_pro, old_start, old_end = r.professional_id, r.start, r.end
     r.professional_id = new_pro
     r.start = start_aw
     r.end = end_aw
     r.updated_at = datetime.now(_utc_tz.utc)
     session.add(r)
+
+    def _invalidate() -> None:
+        invalidate_availability(old_pro, old_start, old_end)
+        invalidate_availability(new_pro, start_aw, end_aw)
+
+    if not commit:
+        session.flush()
+        run_after_commit(session, _invalidate)
+        return True, "Reserva reprogramada.", r
     session.commit()
+    _invalidate()
     session.refresh(r)
     return True, "Reserva reprogramada.", r
 
@@ -390,39 +649,87 @@ def _apply_private_customer_metadata(row: ReservationDB, private_props: dict[str
     return changed
 
 
+def reservation_event_body(reservation: Reservation, tz: str = "Europe/Madrid") -> dict:
+    """Cuerpo de `events.insert` de una reserva (usado por las peticiones batch)."""
+    description, private_props = _build_customer_description(reservation)
+    return _event_body(
+        reservation.start,
+        reservation.end,
+        f"Reserva: {reservation.service_id} - {reservation.professional_id}",
+        private_props,
+        description,
+        tz=tz,
+    )
+
 def create_gcal_reservation(reservation: Reservation, calendar_id: str = None, tz: str = "Europe/Madrid") -> dict:
     """Crea el evento correspondiente en Google Calendar con metadata del cliente."""
     service = build_calendar()
     if not calendar_id:
         calendar_id = get_calendar_for_professional(reservation.professional_id)
     description, private_props = _build_customer_description(reservation)
-    return create_event(
-        service,
-        calendar_id,
-        reservation.start,
-        reservation.end,
-        summary=f"Reserva: {reservation.service_id} - {reservation.professional_id}",
-        private_props=private_props,
-        description=description,
-        tz=tz,
-    )
+    try:
+        return create_event(
+            service,
+            calendar_id,
+            reservation.start,
+            reservation.end,
+            summary=f"Reserva: {reservation.service_id} - {reservation.professional_id}",
+            private_props=private_props,
+            description=description,
+            tz=tz,
+        )
+    finally:
+        invalidate_freebusy(calendar_id)
 
 def patch_gcal_reservation(event_id: str, new_start: datetime, new_end: datetime, calendar_id: str, tz: str = "Europe/Madrid") -> dict:
     """Actualiza fechas del evento en Google Calendar."""
     service = build_calendar()
-    return patch_event(service, calendar_id, event_id, new_start, new_end, tz)
+    try:
+        return patch_event(service, calendar_id, event_id, new_start, new_end, tz)
+    finally:
+        invalidate_freebusy(calendar_id)
 
 def delete_gcal_reservation(event_id: str, calendar_id: str) -> None:
     """Elimina el evento asociado en Google Calendar."""
     service = build_calendar()
-    delete_event(service, calendar_id, event_id)
+    try:
+        delete_event(service, calendar_id, event_id)
+    finally:
+        invalidate_freebusy(calendar_id)
 
-def _parse_gcal_dt(s: str) -> datetime:
-    """Normaliza fechas ISO de Google Calendar a `datetime` aware."""
+async def create_gcal_reservation_async(reservation: Reservation, calendar_id: str = None, tz: str = "Europe/Madrid") -> dict:
+    """Como `create_gcal_reservation`, con el cliente async: la espera a Google no ocupa un hilo."""
+    if not calendar_id:
+        calendar_id = get_calendar_for_professional(reservation.professional_id)
+    description, private_props = _build_customer_description(reservation)
     try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
-    except Exception:
-        return datetime.fromisoformat(s + "T00:00:00+00:00")
+        return await get_async_calendar().create_event(
+            calendar_id,
+            reservation.start,
+            reservation.end,
+            summary=f"Reserva: {reservation.service_id} - {reservation.professional_id}",
+            private_props=private_props,
+            description=description,
+            tz=tz,
+        )
+    finally:
+        invalidate_freebusy(calendar_id)
+
+async def patch_gcal_reservation_async(event_id: str, new_start: datetime, new_end: datetime, calendar_id: str, tz: str = "Europe/Madrid") -> dict:
+    """Como `patch_gcal_reservation`, con el cliente async."""
+    try:
+        return await get_async_calendar().patch_event(calendar_id, event_id, new_start, new_end, tz)
+    finally:
+        invalidate_freebusy(calendar_id)
+
+async def delete_gcal_reservation_async(event_id: str, calendar_id: str) -> None:
+    """Como `delete_gcal_reservation`, con el cliente async."""
+    try:
+        await get_async_calendar().delete_event(calendar_id, event_id)
+    finally:
+        invalidate_freebusy(calendar_id)
+
+_parse_gcal_dt = parse_gcal_datetime
 
 def _detect_service_from_summary(summary: str, default_sid: str) -> str:
     """Heurística para inferir el servicio a partir del resumen de GCal."""
@@ -437,232 +744,389 @@ def _detect_service_from_summary(summary: str, default_sid: str) -> str:
         return "arreglo_barba"
     return default_sid
 
-def sync_from_gcal_range(session: Session, start_date: date, end_date: date, default_service: str = "corte_cabello", by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid")) -> dict:
-    """Importa eventos de GCal a la BD (upsert) en [start_date, end_date]."""
+def _sync_pairs(by_professional: bool, calendar_id: str | None, professional_id: str | None) -> list[tuple[str, str | None]] | None:
+    """Pares (calendario, profesional) a importar o comparar; None si falta `calendar_id`."""
+    if by_professional:
+        return [(cal, pro_id) for pro_id, cal in iter_professional_calendars()]
+    if not calendar_id:
+        return None
+    return [(calendar_id, professional_id)]
+
+def _same_instant(a: datetime | None, b: datetime | None) -> bool:
+    """Compara fechas de la BD (SQLite las devuelve sin zona) con las de GCal (con zona)."""
+    if a is None or b is None:
+        return a is b
+    if a.tzinfo is None or b.tzinfo is None:
+        return a.replace(tzinfo=None) == b.replace(tzinfo=None)
+    return a == b
+
+_GCAL_UPSERT_FIELDS = (
+    "service_id", "professional_id", "start", "end", "google_event_id", "google_calendar_id",
+    "customer_name", "customer_email", "customer_phone", "notes",
+)
+
+def _upsert_gcal_items(session: Session, items: list[dict], cal_id: str, pro_id: str | None, default_service: str, touched: list[tuple[str, datetime, datetime]], timings: dict[str, float] | None = None) -> tuple[int, int]:
+    """Inserta o actualiza las reservas de `items`; devuelve (insertadas, actualizadas).
+
+    Las reservas existentes se precargan con una sola consulta IN y los cambios
+    se escriben con un INSERT y un UPDATE masivos (por clave primaria), sin
+    cargar objetos ORM por evento. Si se pasa `timings`, acumula ahí los
+    segundos de `prefetch` y `write`.
+    """
+    parsed = []
+    for it in items:
+        start_v = (it.get("start") or {}).get("dateTime") or (it.get("start") or {}).get("date")
+        end_v = (it.get("end") or {}).get("dateTime") or (it.get("end") or {}).get("date")
+        if not start_v or not end_v:
+            continue
+        priv = (it.get("extendedProperties") or {}).get("private") or {}
+        pro = priv.get("professional_id") or pro_id
+        if not pro:
+            continue
+        # NOTA: usamos un identificador sintético cuando el evento no tiene metadata privada.
+        rid = priv.get("reservation_id") or f"gcal:{it.get('id')}"
+        parsed.append((it, priv, rid, str(pro), _parse_gcal_dt(start_v), _parse_gcal_dt(end_v)))
+    if not parsed:
+        return 0, 0
+    t0 = perf_counter()
+    rids = list({rid for _, _, rid, _, _, _ in parsed})
+    existing = {
+        row.id: row
+        for row in session.exec(
+            select(*(getattr(ReservationDB, f) for f in ("id",) + _GCAL_UPSERT_FIELDS)).where(ReservationDB.id.in_(rids))
+        )
+    }
+    t1 = perf_counter()
+    inserts: dict[str, dict] = {}
+    updates: dict[str, dict] = {}
+    for it, priv, rid, pro, start_dt, end_dt in parsed:
+        target = {
+            "service_id": priv.get("service_id") or _detect_service_from_summary(it.get("summary"), default_service),
+            "professional_id": pro,
+            "start": start_dt,
+            "end": end_dt,
+            "google_event_id": it.get("id"),
+            "google_calendar_id": cal_id,
+        }
+        for field in ("customer_name", "customer_email", "customer_phone", "notes"):
+            if field in priv:
+                target[field] = _normalize_private_value(priv.get(field))
+        if rid in inserts:
+            # El mismo reservation_id en dos eventos: gana el último, como antes.
+            inserts[rid].update(target)
+            continue
+        current = existing.get(rid)
+        if current is None:
+            # NOTA: se crea la reserva local para reflejar eventos creados directamente en GCal.
+            inserts[rid] = ReservationDB(id=rid, **target).model_dump()
+            touched.append((pro, start_dt, end_dt))
+            continue
+        touched.append((current.professional_id, current.start, current.end))
+        touched.append((pro, start_dt, end_dt))
+        base = updates.get(rid) or {f: getattr(current, f) for f in _GCAL_UPSERT_FIELDS}
+        changed = any(
+            not _same_instant(base[f], v) if f in ("start", "end") else base[f] != v
+            for f, v in target.items()
+        )
+        if changed or rid in updates:
+            updates[rid] = {**base, **target, "id": rid}
+    now = datetime.now(_utc_tz.utc)
+    if inserts:
+        session.execute(sa_insert(ReservationDB), list(inserts.values()))
+    if updates:
+        session.execute(sa_update(ReservationDB), [{**row, "updated_at": now} for row in updates.values()])
+    if timings is not None:
+        timings["prefetch"] = timings.get("prefetch", 0.0) + (t1 - t0)
+        timings["write"] = timings.get("write", 0.0) + (perf_counter() - t1)
+    return len(inserts), len(updates)
+
+def _items_per_day(items: list[dict]) -> dict[str, int]:
+    days: dict[str, int] = {}
+    for it in items:
+        start_v = (it.get("start") or {}).get("dateTime") or (it.get("start") or {}).get("date")
+        if start_v:
+            days[start_v[:10]] = days.get(start_v[:10], 0) + 1
+    return days
+
+def sync_from_gcal_range(session: Session, start_date: date, end_date: date, default_service: str = "corte_cabello", by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid"), progress: Progress | None = None) -> dict:
+    """Importa eventos de GCal a la BD (upsert) en [start_date, end_date].
+
+    Cada calendario se lista con una sola consulta paginada para todo el rango
+    y se guarda con un commit. `timings` desglosa los segundos de cada fase:
+    listado en Google, precarga de reservas, escritura y commit. `progress`
+    recibe los contadores de cada calendario después de su commit.
+    """
     try:
         svc = build_calendar()
     except Exception:
         return {"inserted": 0, "updated": 0, "calendars": 0, "ok": False, "error": "gcal client"}
-    pairs: list[tuple[str, str | None]] = []
-    if by_professional:
-        for pro_id, cal in iter_professional_calendars():
-            pairs.append((cal, pro_id))
-    else:
-        if not calendar_id:
-            return {"inserted": 0, "updated": 0, "calendars": 0, "ok": False, "error": "calendar_id requerido"}
-        pairs.append((calendar_id, professional_id))
-    total_ins = total_upd = 0
-    for cal_id, pro_id in pairs:
-        d = start_date
-        while d <= end_date:
-            start_iso = f"{d.isoformat()}T00:00:00"; end_iso = f"{d.isoformat()}T23:59:59"
+    pairs = _sync_pairs(by_professional, calendar_id, professional_id)
+    if pairs is None:
+        return {"inserted": 0, "updated": 0, "calendars": 0, "ok": False, "error": "calendar_id requerido"}
+    start_iso = f"{start_date.isoformat()}T00:00:00"; end_iso = f"{end_date.isoformat()}T23:59:59"
+    timings = {"list": 0.0, "prefetch": 0.0, "write": 0.0, "commit": 0.0}
+    total_ins = total_upd = listed = errors = 0
+    for done, (cal_id, pro_id) in enumerate(pairs, start=1):
+        touched: list[tuple[str, datetime, datetime]] = []
+        t0 = perf_counter()
+        try:
+            items = list_events_allpages(svc, cal_id, start_iso, end_iso, tz)
+        except Exception as exc:
+            logger.warning("No se pudieron listar los eventos de %s: %s", cal_id, exc)
+            errors += 1
+            if progress is not None:
+                progress({"stage": "import", "calendar": cal_id, "done": done, "total": len(pairs), "errors": 1})
+            continue
+        finally:
+            timings["list"] += perf_counter() - t0
+        listed += len(items)
+        active = [it for it in items if it.get("status") != "cancelled"]
+        ins, upd = _upsert_gcal_items(session, active, cal_id, pro_id, default_service, touched, timings)
+        total_ins += ins; total_upd += upd
+        t0 = perf_counter()
+        session.commit()
+        timings["commit"] += perf_counter() - t0
+        for t_pro, t_start, t_end in touched:
+            invalidate_availability(t_pro, t_start, t_end)
+        if progress is not None:
+            progress({
+                "stage": "import",
+                "calendar": cal_id,
+                "done": done,
+                "total": len(pairs),
+                "listed": len(items),
+                "inserted": ins,
+                "updated": upd,
+                "events_by_day": _items_per_day(active),
+            })
+    out = {
+        "ok": True,
+        "inserted": total_ins,
+        "updated": total_upd,
+        "calendars": len(pairs),
+        "listed": listed,
+        "timings": {phase: round(seconds, 4) for phase, seconds in timings.items()},
+    }
+    if errors:
+        out["errors"] = errors
+    return out
+
+def _drop_cancelled_gcal_items(session: Session, items: list[dict], cal_id: str, touched: list[tuple[str, datetime, datetime]]) -> int:
+    """Borra las reservas importadas de GCal (`gcal:*`) cuyos eventos se cancelaron allí.
+
+    Las reservas creadas por PeluBot se cancelan por la API; un evento borrado
+    a mano en Google no las elimina (lo recrea la reconciliación).
+    """
+    event_ids = [it.get("id") for it in items if it.get("id")]
+    if not event_ids:
+        return 0
+    rows = session.exec(
+        select(ReservationDB).where(
+            ReservationDB.google_calendar_id == cal_id,
+            ReservationDB.google_event_id.in_(event_ids),
+        )
+    ).all()
+    deleted = 0
+    for r in rows:
+        if not r.id.startswith("gcal:"):
+            continue
+        touched.append((r.professional_id, r.start, r.end))
+        session.delete(r)
+        deleted += 1
+    return deleted
+
+def sync_from_gcal_incremental(session: Session, default_service: str = "corte_cabello", by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid"), full_sync_from: date | None = None, progress: Progress | None = None) -> dict:
+    """Importa de GCal solo los eventos cambiados desde la última importación de cada calendario.
+
+    El `nextSyncToken` de cada calendario se guarda en `calendar_sync_state`
+    en la misma transacción que los cambios. Sin token (primera vez o tras
+    un 410 Gone) se hace una importación completa desde `full_sync_from`
+    (hoy por defecto) que deja guardado el token para la siguiente.
+    """
+    try:
+        svc = build_calendar()
+    except Exception:
+        return {"inserted": 0, "updated": 0, "deleted": 0, "calendars": 0, "ok": False, "error": "gcal client"}
+    pairs = _sync_pairs(by_professional, calendar_id, professional_id)
+    if pairs is None:
+        return {"inserted": 0, "updated": 0, "deleted": 0, "calendars": 0, "ok": False, "error": "calendar_id requerido"}
+    full_from = (full_sync_from or date.today()).isoformat() + "T00:00:00"
+    total_ins = total_upd = total_del = full_syncs = errors = 0
+    for done, (cal_id, pro_id) in enumerate(pairs, start=1):
+        state = session.get(CalendarSyncStateDB, cal_id) or CalendarSyncStateDB(calendar_id=cal_id)
+        full = not state.sync_token
+        try:
             try:
-                items = list_events_range(svc, cal_id, start_iso, end_iso, tz)
-            except Exception:
-                items = []
-            # NOTA: usamos un identificador sintético cuando el evento no tiene metadata privada.
-            for it in items:
-                start_v = (it.get("start") or {}).get("dateTime") or (it.get("start") or {}).get("date")
-                end_v = (it.get("end") or {}).get("dateTime") or (it.get("end") or {}).get("date")
-                if not start_v or not end_v:
-                    continue
-                start_dt = _parse_gcal_dt(start_v); end_dt = _parse_gcal_dt(end_v)
-                priv = (it.get("extendedProperties") or {}).get("private") or {}
-                rid = priv.get("reservation_id") or f"gcal:{it.get('id')}"
-                srv_id = priv.get("service_id") or _detect_service_from_summary(it.get("summary"), default_service)
-                pro = priv.get("professional_id") or pro_id
-                if not pro:
-                    continue
-                r = session.get(ReservationDB, rid)
-                if r is None:
-                    # NOTA: se crea la reserva local para reflejar eventos creados directamente en GCal.
-                    r = ReservationDB(
-                        id=rid,
-                        service_id=srv_id,
-                        professional_id=str(pro),
-                        start=start_dt,
-                        end=end_dt,
-                        google_event_id=it.get("id"),
-                        google_calendar_id=cal_id,
-                    )
-                    _apply_private_customer_metadata(r, priv)
-                    session.add(r); total_ins += 1
-                else:
-                    changed = False
-                    if r.start != start_dt: r.start = start_dt; changed = True
-                    if r.end != end_dt: r.end = end_dt; changed = True
-                    if r.professional_id != pro: r.professional_id = str(pro); changed = True
-                    if r.service_id != srv_id: r.service_id = srv_id; changed = True
-                    if r.google_event_id != it.get("id"): r.google_event_id = it.get("id"); changed = True
-                    if r.google_calendar_id != cal_id: r.google_calendar_id = cal_id; changed = True
-                    if _apply_private_customer_metadata(r, priv): changed = True
-                    if changed: session.add(r); total_upd += 1
-            d += timedelta(days=1)
+                items, token = list_event_changes(svc, cal_id, sync_token=state.sync_token, time_min=full_from, tz=tz)
+            except SyncTokenExpired:
+                logger.warning("syncToken de %s caducado (410); se repite la importación completa", cal_id)
+                full = True
+                items, token = list_event_changes(svc, cal_id, time_min=full_from, tz=tz)
+        except Exception as exc:
+            logger.warning("No se pudieron leer los cambios de %s: %s", cal_id, exc)
+            errors += 1
+            if progress is not None:
+                progress({"stage": "import", "calendar": cal_id, "done": done, "total": len(pairs), "errors": 1})
+            continue
+        touched: list[tuple[str, datetime, datetime]] = []
+        active = [it for it in items if it.get("status") != "cancelled"]
+        ins, upd = _upsert_gcal_items(session, active, cal_id, pro_id, default_service, touched)
+        dropped = _drop_cancelled_gcal_items(session, [it for it in items if it.get("status") == "cancelled"], cal_id, touched)
+        total_ins += ins; total_upd += upd; total_del += dropped
+        now = datetime.now(_utc_tz.utc)
+        state.sync_token = token
+        state.synced_at = now
+        if full:
+            state.full_sync_at = now
+            full_syncs += 1
+        session.add(state)
         session.commit()
-    return {"ok": True, "inserted": total_ins, "updated": total_upd, "calendars": len(pairs)}
+        for t_pro, t_start, t_end in touched:
+            invalidate_availability(t_pro, t_start, t_end)
+        if progress is not None:
+            progress({
+                "stage": "import",
+                "calendar": cal_id,
+                "done": done,
+                "total": len(pairs),
+                "full_sync": int(full),
+                "listed": len(items),
+                "inserted": ins,
+                "updated": upd,
+                "deleted": dropped,
+                "events_by_day": _items_per_day(active),
+            })
+    out = {
+        "ok": True,
+        "inserted": total_ins,
+        "updated": total_upd,
+        "deleted": total_del,
+        "calendars": len(pairs),
+        "full_syncs": full_syncs,
+    }
+    if errors:
+        out["errors"] = errors
+    return out
+
+def reconcile_db_to_gcal_range(session: Session, start_date: date, end_date: date, by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid"), progress: Progress | None = None) -> dict:
+    """Alinea eventos de GCal con la BD local: crea, parchea o mueve entre calendarios.
 
-def reconcile_db_to_gcal_range(session: Session, start_date: date, end_date: date, by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid")) -> dict:
-    """Alinea eventos de GCal con la BD local: crea, parchea o mueve entre calendarios."""
+    Las diferencias salen de `compute_calendar_diff` (un listado por calendario
+    para todo el rango, en paralelo) y las escrituras se envían juntas en
+    peticiones batch de Google. Cada lote se confirma en la BD antes de
+    informar a `progress`, así que una cancelación conserva los eventos ya
+    creados.
+    """
     try:
         svc = build_calendar()
     except Exception:
         return {"ok": False, "created": 0, "patched": 0, "calendars": 0, "error": "gcal client"}
-    pairs: list[tuple[str, str | None]] = []
-    if by_professional:
-        for pid, cal in iter_professional_calendars():
-            pairs.append((cal, pid))
-    else:
-        if not calendar_id:
-            return {"ok": False, "created": 0, "patched": 0, "calendars": 0, "error": "calendar_id requerido"}
-        pairs.append((calendar_id, professional_id))
+    pairs = _sync_pairs(by_professional, calendar_id, professional_id)
+    if pairs is None:
+        return {"ok": False, "created": 0, "patched": 0, "calendars": 0, "error": "calendar_id requerido"}
+    diff = compute_calendar_diff(session, pairs, start_date, end_date, build=build_calendar, target_calendar=get_calendar_for_professional, tz=tz, progress=progress)
     created = patched = 0
-    def _day_bounds(d: date):
-        return datetime.combine(d, time(0, 0)), datetime.combine(d, time(23, 59, 59))
-    for cal_id, pro_id in pairs:
-        d = start_date
-        while d <= end_date:
-            day_start, day_end = _day_bounds(d)
-            try:
-                gitems = list_events_range(svc, cal_id, iso_datetime(day_start, tz), iso_datetime(day_end, tz), tz)
-            except Exception:
-                gitems = []
-            gmap = {it.get("id"): it for it in gitems if it.get("id")}
-            q = select(ReservationDB).where(ReservationDB.start < day_end, ReservationDB.end > day_start)
-            if pro_id:
-                q = q.where(ReservationDB.professional_id == pro_id)
-            rows = list(session.exec(q))
-            for r in rows:
-                target_cal = get_calendar_for_professional(r.professional_id)
-                if r.google_event_id and r.google_calendar_id and r.google_calendar_id != target_cal:
-                    try:
-                        delete_event(svc, r.google_calendar_id, r.google_event_id)
-                    except Exception:
-                        pass
-                    # NOTA: se recrea el evento en el calendario correcto para mantener la asignación por profesional.
-                    res_model = Reservation(
-                        id=r.id,
-                        service_id=r.service_id,
-                        professional_id=r.professional_id,
-                        start=r.start,
-                        end=r.end,
-                        customer_name=getattr(r, "customer_name", None),
-                        customer_email=getattr(r, "customer_email", None),
-                        customer_phone=getattr(r, "customer_phone", None),
-                        notes=getattr(r, "notes", None),
-                    )
-                    desc, priv = _build_customer_description(res_model)
-                    ev = create_event(
-                        svc,
-                        target_cal,
-                        r.start,
-                        r.end,
-                        summary=f"Reserva: {r.service_id} - {r.professional_id}",
-                        private_props=priv,
-                        description=desc,
-                        tz=tz,
-                    )
-                    r.google_event_id = ev.get("id"); r.google_calendar_id = target_cal
-                    session.add(r); created += 1
+    errors = len(diff.errors)
+    requests: list = []
+    on_done: list = []
+
+    def _created_in(r: ReservationDB, target_cal: str):
+        def _created(ev: dict) -> None:
+            nonlocal created
+            r.google_event_id = ev.get("id"); r.google_calendar_id = target_cal
+            session.add(r); created += 1
+        return _created
+
+    def _patched(_ev: dict) -> None:
+        nonlocal patched
+        patched += 1
+
+    seen: set[str] = set()
+    for miss in diff.missing:
+        r = miss.row
+        if r.id in seen:
+            continue
+        seen.add(r.id)
+        if miss.previous_calendar:
+            # El borrado en el calendario antiguo es best-effort: sus errores no cuentan.
+            requests.append(delete_event_request(svc, miss.previous_calendar, r.google_event_id))
+            on_done.append(None)
+        # NOTA: si falta el evento (o está en otro calendario) se recrea en el del profesional.
+        res_model = Reservation(
+            id=r.id,
+            service_id=r.service_id,
+            professional_id=r.professional_id,
+            start=r.start,
+            end=r.end,
+            customer_name=getattr(r, "customer_name", None),
+            customer_email=getattr(r, "customer_email", None),
+            customer_phone=getattr(r, "customer_phone", None),
+            notes=getattr(r, "notes", None),
+        )
+        requests.append(insert_event_request(svc, miss.target_calendar, reservation_event_body(res_model, tz)))
+        on_done.append(_created_in(r, miss.target_calendar))
+    for r, _item in diff.mismatched:
+        if r.id in seen:
+            continue
+        seen.add(r.id)
+        requests.append(patch_event_request(svc, get_calendar_for_professional(r.professional_id), r.google_event_id, r.start, r.end, tz))
+        on_done.append(_patched)
+    try:
+        for offset in range(0, len(requests), GCAL_BATCH_MAX_OPS):
+            chunk = requests[offset:offset + GCAL_BATCH_MAX_OPS]
+            before = (created, patched, errors)
+            for callback, (result, exc) in zip(on_done[offset:offset + len(chunk)], execute_batch(svc, chunk)):
+                if callback is None:
                     continue
-                if not r.google_event_id or r.google_event_id not in gmap:
-                    # NOTA: si falta evento en GCal, lo recreamos para restablecer la sincronización.
-                    res_model = Reservation(
-                        id=r.id,
-                        service_id=r.service_id,
-                        professional_id=r.professional_id,
-                        start=r.start,
-                        end=r.end,
-                        customer_name=getattr(r, "customer_name", None),
-                        customer_email=getattr(r, "customer_email", None),
-                        customer_phone=getattr(r, "customer_phone", None),
-                        notes=getattr(r, "notes", None),
-                    )
-                    desc, priv = _build_customer_description(res_model)
-                    ev = create_event(
-                        svc,
-                        target_cal,
-                        r.start,
-                        r.end,
-                        summary=f"Reserva: {r.service_id} - {r.professional_id}",
-                        private_props=priv,
-                        description=desc,
-                        tz=tz,
-                    )
-                    r.google_event_id = ev.get("id"); r.google_calendar_id = target_cal
-                    session.add(r); created += 1
+                if exc is not None:
+                    errors += 1
                     continue
-                it = gmap.get(r.google_event_id)
-                gs = (it.get("start") or {}).get("dateTime") or (it.get("start") or {}).get("date")
-                ge = (it.get("end") or {}).get("dateTime") or (it.get("end") or {}).get("date")
-                if gs and ge:
-                    gs_dt = _parse_gcal_dt(gs); ge_dt = _parse_gcal_dt(ge)
-                    if gs_dt != r.start or ge_dt != r.end:
-                        patch_event(svc, target_cal, r.google_event_id, r.start, r.end, tz); patched += 1
-            d += timedelta(days=1)
+                callback(result or {})
+            session.commit()
+            if progress is not None:
+                progress({
+                    "stage": "push",
+                    "done": offset + len(chunk),
+                    "total": len(requests),
+                    "created": created - before[0],
+                    "patched": patched - before[1],
+                    "errors": errors - before[2],
+                })
+    finally:
         session.commit()
-    return {"ok": True, "created": created, "patched": patched, "calendars": len(pairs)}
+        if requests:
+            clear_freebusy_cache()
+    out = {"ok": True, "created": created, "patched": patched, "calendars": len(pairs), "timings": diff.timings}
+    if errors:
+        out["errors"] = errors
+    return out
 
-def detect_conflicts_range(session: Session, start_date: date, end_date: date, by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid")) -> dict:
+def detect_conflicts_range(session: Session, start_date: date, end_date: date, by_professional: bool = True, calendar_id: str | None = None, professional_id: str | None = None, tz: str = os.getenv("TZ", "Europe/Madrid"), progress: Progress | None = None) -> dict:
     """Detecta inconsistencias BD ↔ GCal: faltantes, huérfanos, desajustes y solapes externos."""
     try:
-        svc = build_calendar()
+        build_calendar()
     except Exception as e:
         return {"ok": False, "error": f"gcal client: {e}"}
-    pairs: list[tuple[str, str | None]] = []
-    if by_professional:
-        for pid, cal in iter_professional_calendars():
-            pairs.append((cal, pid))
-    else:
-        if not calendar_id:
-            return {"ok": False, "error": "calendar_id requerido"}
-        pairs.append((calendar_id, professional_id))
-    summary = {"ok": True, "calendars": len(pairs), "missing_in_gcal": 0, "orphaned_in_gcal": 0, "time_mismatch": 0, "overlaps_external": 0, "samples": {"missing_in_gcal": [], "orphaned_in_gcal": [], "time_mismatch": [], "overlaps_external": []}}
-    def _add_sample(kind: str, item: dict):
-        arr = summary["samples"][kind]
-        if len(arr) < 10: arr.append(item)
-    d = start_date
-    while d <= end_date:
-        day_start = datetime.combine(d, time(0, 0)); day_end = datetime.combine(d, time(23, 59, 59))
-        for cal_id, pro_id in pairs:
-            try:
-                items = list_events_range(svc, cal_id, iso_datetime(day_start, tz), iso_datetime(day_end, tz), tz)
-            except Exception:
-                items = []
-            gmap = {it.get("id"): it for it in items if it.get("id")}
-            q = select(ReservationDB).where(ReservationDB.start < day_end, ReservationDB.end > day_start)
-            if pro_id:
-                q = q.where(ReservationDB.professional_id == pro_id)
-            locals_rows = list(session.exec(q))
-            for r in locals_rows:
-                tgt_cal = get_calendar_for_professional(r.professional_id)
-                if not r.google_event_id or r.google_event_id not in gmap or (r.google_calendar_id and r.google_calendar_id != tgt_cal):
-                    summary["missing_in_gcal"] += 1
-                    _add_sample("missing_in_gcal", {"id": r.id, "cal": tgt_cal, "start": r.start.isoformat()})
-            for it in items:
-                ev_id = it.get("id")
-                start_v = (it.get("start") or {}).get("dateTime") or (it.get("start") or {}).get("date")
-                end_v = (it.get("end") or {}).get("dateTime") or (it.get("end") or {}).get("date")
-                if not start_v or not end_v:
-                    continue
-                sdt = _parse_gcal_dt(start_v); edt = _parse_gcal_dt(end_v)
-                priv = (it.get("extendedProperties") or {}).get("private") or {}
-                rid = priv.get("reservation_id")
-                if rid:
-                    r = session.get(ReservationDB, rid)
-                    if not r:
-                        summary["orphaned_in_gcal"] += 1
-                        _add_sample("orphaned_in_gcal", {"event_id": ev_id, "rid": rid, "cal": cal_id})
-                    else:
-                        if _to_naive_local(r.start) != _to_naive_local(sdt) or _to_naive_local(r.end) != _to_naive_local(edt):
-                            summary["time_mismatch"] += 1
-                            _add_sample("time_mismatch", {"rid": r.id, "event_id": ev_id})
-                    continue
-                for r in locals_rows:
-                    if r.google_event_id == ev_id:
-                        continue
-                    if not (edt <= r.start or sdt >= r.end):
-                        summary["overlaps_external"] += 1
-                        _add_sample("overlaps_external", {"event_id": ev_id, "rid": r.id})
-                        break
-        d += timedelta(days=1)
+    pairs = _sync_pairs(by_professional, calendar_id, professional_id)
+    if pairs is None:
+        return {"ok": False, "error": "calendar_id requerido"}
+    diff = compute_calendar_diff(session, pairs, start_date, end_date, build=build_calendar, target_calendar=get_calendar_for_professional, tz=tz, progress=progress)
+    samples = {
+        "missing_in_gcal": [{"id": m.row.id, "cal": m.target_calendar, "start": m.row.start.isoformat()} for m in diff.missing[:10]],
+        "orphaned_in_gcal": [{"event_id": ev_id, "rid": rid, "cal": cal} for ev_id, rid, cal in diff.orphaned[:10]],
+        "time_mismatch": [{"rid": r.id, "event_id": item.get("id")} for r, item in diff.mismatched[:10]],
+        "overlaps_external": [{"event_id": ev_id, "rid": rid} for ev_id, rid, _cal in diff.overlaps[:10]],
+    }
+    summary = {
+        "ok": True,
+        "calendars": len(pairs),
+        "missing_in_gcal": len(diff.missing),
+        "orphaned_in_gcal": len(diff.orphaned),
+        "time_mismatch": len(diff.mismatched),
+        "overlaps_external": len(diff.overlaps),
+        "samples": samples,
+        "timings": diff.timings,
+    }
+    if diff.errors:
+        summary["errors"] = diff.errors
     return summary
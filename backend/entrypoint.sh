@@ -13,5 +13,9 @@ fi
 
 cd /app/backend
 
+# Migrar antes de levantar los workers: la app solo comprueba la versión del esquema.
+echo "[migrate] applying schema migrations…"
+python scripts/migrate.py upgrade
+
 echo "[run] starting app…"
 exec uvicorn app.main:app --host 0.0.0.0 --port 8776 --workers "${UVICORN_WORKERS:-2}" --log-level "${UVICORN_LOG_LEVEL:-info}"
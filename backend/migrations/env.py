@@ -0,0 +1,67 @@
+"""Entorno de Alembic para PeluBot.
+
+La URL es `app.db.DATABASE_URL` (o `-x url=...`) y los metadatos, los de los
+modelos SQLModel. `app.db.upgrade_schema` pasa su propia conexión en
+`config.attributes["connection"]`.
+"""
+from __future__ import annotations
+
+from alembic import context
+from sqlmodel import SQLModel, create_engine
+
+import app.models  # noqa: F401 - registra las tablas en SQLModel.metadata
+from app.db import DATABASE_URL, engine
+
+config = context.config
+target_metadata = SQLModel.metadata
+
+
+def _x_url() -> str | None:
+    return context.get_x_argument(as_dictionary=True).get("url")
+
+
+def _configure(**kwargs) -> None:
+    context.configure(
+        target_metadata=target_metadata,
+        # SQLite no admite la mayoría de ALTER TABLE: Alembic recrea la tabla.
+        render_as_batch=True,
+        compare_type=True,
+        # Una transacción por revisión: las que usan `autocommit_block`
+        # (índices CONCURRENTLY en Postgres) no arrastran a las demás.
+        transaction_per_migration=True,
+        **kwargs,
+    )
+
+
+def _run(connection) -> None:
+    _configure(connection=connection)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL sin conectarse (`python scripts/migrate.py sql`)."""
+    _configure(url=_x_url() or DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    url = _x_url()
+    bind = create_engine(url) if url else engine
+    try:
+        with bind.connect() as connection:
+            _run(connection)
+    finally:
+        if url:
+            bind.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,252 @@
+"""Esquema inicial: las tablas e índices declarados en `app.models`.
+
+Las BD anteriores a las migraciones (creadas con `create_all`) se marcan con
+esta revisión tras completar sus columnas (`app.db._adopt_legacy_schema`).
+
+Revisión: 0001
+Anterior: ninguna
+Fecha: 2026-10-17 00:38:08.590660
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('calendar_sync_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('reservation_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('action', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('locked_by', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('calendar_sync_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_action'), ['action'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_available_at'), ['available_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_locked_by'), ['locked_by'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_reservation_id'), ['reservation_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_status'), ['status'], unique=False)
+
+    op.create_table('calendar_sync_jobs_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('reservation_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('action', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('locked_by', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('available_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('calendar_sync_jobs_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_sync_jobs_archive_reservation_id'), ['reservation_id'], unique=False)
+
+    op.create_table('calendar_sync_state',
+    sa.Column('calendar_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sync_token', sa.String(), nullable=True),
+    sa.Column('full_sync_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('synced_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('calendar_id')
+    )
+    op.create_table('calendar_watch_channels',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('calendar_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('resource_id', sa.String(), nullable=True),
+    sa.Column('token', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('address', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('expiration', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('stopped_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('calendar_watch_channels', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_calendar_watch_channels_calendar_id'), ['calendar_id'], unique=False)
+
+    op.create_table('reservationdb',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('service_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('professional_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('end', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('google_event_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('google_calendar_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('customer_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('customer_email', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('customer_phone', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('sync_status', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('sync_job_id', sa.Integer(), nullable=True),
+    sa.Column('sync_last_error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('sync_updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.CheckConstraint('"end" > start', name='ck_end_after_start'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('google_calendar_id', 'google_event_id', name='uq_gcal_event_per_calendar')
+    )
+    with op.batch_alter_table('reservationdb', schema=None) as batch_op:
+        batch_op.create_index('ix_res_prof_start_end', ['professional_id', 'start', 'end'], unique=False)
+        batch_op.create_index('ix_res_status', ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_google_calendar_id'), ['google_calendar_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_google_event_id'), ['google_event_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_professional_id'), ['professional_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_service_id'), ['service_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_start'), ['start'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_sync_job_id'), ['sync_job_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_reservationdb_sync_status'), ['sync_status'], unique=False)
+
+    op.create_table('service_catalog',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('duration_min', sa.Integer(), nullable=False),
+    sa.Column('price_eur', sa.Float(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('sort_order', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('service_catalog', schema=None) as batch_op:
+        batch_op.create_index('ix_service_catalog_active', ['is_active'], unique=False)
+        batch_op.create_index(batch_op.f('ix_service_catalog_is_active'), ['is_active'], unique=False)
+        batch_op.create_index(batch_op.f('ix_service_catalog_name'), ['name'], unique=False)
+
+    op.create_table('stylist_schedule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('professional_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.CheckConstraint('end_time > start_time', name='ck_schedule_end_after_start'),
+    sa.CheckConstraint('weekday >= 0 AND weekday <= 6', name='ck_schedule_weekday'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stylist_schedule', schema=None) as batch_op:
+        batch_op.create_index('ix_stylist_schedule_pro_weekday', ['professional_id', 'weekday'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stylist_schedule_professional_id'), ['professional_id'], unique=False)
+
+    op.create_table('stylist_schedule_exceptions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('professional_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('on_date', sa.Date(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=True),
+    sa.Column('end_time', sa.Time(), nullable=True),
+    sa.Column('note', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.CheckConstraint('(start_time IS NULL AND end_time IS NULL) OR (end_time > start_time)', name='ck_schedule_exc_range'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stylist_schedule_exceptions', schema=None) as batch_op:
+        batch_op.create_index('ix_stylist_schedule_exc_pro_date', ['professional_id', 'on_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stylist_schedule_exceptions_on_date'), ['on_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stylist_schedule_exceptions_professional_id'), ['professional_id'], unique=False)
+
+    op.create_table('stylistdb',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('display_name', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('phone', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('password_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('services', sa.JSON(), nullable=False),
+    sa.Column('calendar_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('use_gcal_busy', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_login_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('mfa_secret', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('notes', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('email', name='uq_stylist_email')
+    )
+    with op.batch_alter_table('stylistdb', schema=None) as batch_op:
+        batch_op.create_index('ix_stylist_active', ['is_active'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stylistdb_is_active'), ['is_active'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stylistdb_name'), ['name'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('stylistdb', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stylistdb_name'))
+        batch_op.drop_index(batch_op.f('ix_stylistdb_is_active'))
+        batch_op.drop_index('ix_stylist_active')
+
+    op.drop_table('stylistdb')
+    with op.batch_alter_table('stylist_schedule_exceptions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stylist_schedule_exceptions_professional_id'))
+        batch_op.drop_index(batch_op.f('ix_stylist_schedule_exceptions_on_date'))
+        batch_op.drop_index('ix_stylist_schedule_exc_pro_date')
+
+    op.drop_table('stylist_schedule_exceptions')
+    with op.batch_alter_table('stylist_schedule', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stylist_schedule_professional_id'))
+        batch_op.drop_index('ix_stylist_schedule_pro_weekday')
+
+    op.drop_table('stylist_schedule')
+    with op.batch_alter_table('service_catalog', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_service_catalog_name'))
+        batch_op.drop_index(batch_op.f('ix_service_catalog_is_active'))
+        batch_op.drop_index('ix_service_catalog_active')
+
+    op.drop_table('service_catalog')
+    with op.batch_alter_table('reservationdb', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reservationdb_sync_status'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_sync_job_id'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_status'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_start'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_service_id'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_professional_id'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_google_event_id'))
+        batch_op.drop_index(batch_op.f('ix_reservationdb_google_calendar_id'))
+        batch_op.drop_index('ix_res_status')
+        batch_op.drop_index('ix_res_prof_start_end')
+
+    op.drop_table('reservationdb')
+    with op.batch_alter_table('calendar_watch_channels', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_calendar_watch_channels_calendar_id'))
+
+    op.drop_table('calendar_watch_channels')
+    op.drop_table('calendar_sync_state')
+    with op.batch_alter_table('calendar_sync_jobs_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_archive_reservation_id'))
+
+    op.drop_table('calendar_sync_jobs_archive')
+    with op.batch_alter_table('calendar_sync_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_reservation_id'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_locked_by'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_available_at'))
+        batch_op.drop_index(batch_op.f('ix_calendar_sync_jobs_action'))
+
+    op.drop_table('calendar_sync_jobs')
@@ -0,0 +1,61 @@
+"""Índices de consulta que antes creaba `create_db_and_tables` en cada arranque.
+
+En Postgres se construyen con `CREATE INDEX CONCURRENTLY` fuera de la
+transacción, así que no bloquean las escrituras aunque la tabla sea grande.
+SQLite no tiene equivalente: el índice bloquea escrituras mientras se crea,
+por eso conviene aplicar esta revisión con `python scripts/migrate.py upgrade`
+antes de arrancar la app y no durante el arranque. `if_not_exists` deja
+adoptar BD antiguas que ya tenían parte de estos índices.
+
+Revisión: 0002
+Anterior: 0001
+Fecha: 2026-10-17 01:10:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nombre, tabla, columnas, único)
+INDEXES = (
+    ("ix_res_service_start", "reservationdb", ["service_id", "start"], False),
+    ("ix_res_sync_status", "reservationdb", ["sync_status"], False),
+    ("ix_res_sync_job", "reservationdb", ["sync_job_id"], False),
+    ("ux_stylist_email", "stylistdb", ["email"], True),
+    ("ix_calendar_jobs_status_available", "calendar_sync_jobs", ["status", "available_at"], False),
+    ("ix_calendar_jobs_reservation", "calendar_sync_jobs", ["reservation_id"], False),
+    ("ix_calendar_jobs_status_completed", "calendar_sync_jobs", ["status", "completed_at"], False),
+)
+# Solo SQLite: en Postgres la restricción de exclusión (revisión 0004) cubre los solapes.
+SQLITE_INDEXES = (
+    ("ux_res_prof_start", "reservationdb", ["professional_id", "start"], True),
+)
+
+
+def _indexes():
+    if op.get_bind().dialect.name == "sqlite":
+        return INDEXES + SQLITE_INDEXES
+    return INDEXES
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        # CONCURRENTLY no puede ir dentro de una transacción.
+        with op.get_context().autocommit_block():
+            for name, table, columns, unique in INDEXES:
+                op.create_index(name, table, columns, unique=unique, if_not_exists=True, postgresql_concurrently=True)
+        return
+    for name, table, columns, unique in _indexes():
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _columns, _unique in reversed(_indexes()):
+        op.drop_index(name, table_name=table, if_exists=True)
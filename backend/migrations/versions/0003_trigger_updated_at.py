@@ -0,0 +1,63 @@
+"""Trigger que mantiene `reservationdb.updated_at` en cambios hechos fuera del ORM.
+
+Solo actualiza si la capa ORM no lo ha hecho ya (condición sobre OLD/NEW),
+así no entra en bucle.
+
+Revisión: 0003
+Anterior: 0002
+Fecha: 2026-10-17 01:12:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(
+            """
+            CREATE OR REPLACE FUNCTION pelubot_touch_updated_at() RETURNS trigger AS $$
+            BEGIN
+              IF NEW.updated_at <= OLD.updated_at THEN
+                NEW.updated_at := now();
+              END IF;
+              RETURN NEW;
+            END $$ LANGUAGE plpgsql
+            """
+        )
+        op.execute("DROP TRIGGER IF EXISTS trg_reservationdb_updated ON reservationdb")
+        op.execute(
+            """
+            CREATE TRIGGER trg_reservationdb_updated BEFORE UPDATE ON reservationdb
+              FOR EACH ROW EXECUTE FUNCTION pelubot_touch_updated_at()
+            """
+        )
+        return
+    op.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_reservationdb_updated
+        AFTER UPDATE ON reservationdb
+        FOR EACH ROW
+        WHEN NEW.updated_at <= OLD.updated_at
+        BEGIN
+          UPDATE reservationdb SET updated_at = CURRENT_TIMESTAMP
+          WHERE id = NEW.id AND NEW.updated_at <= OLD.updated_at;
+        END
+        """
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TRIGGER IF EXISTS trg_reservationdb_updated ON reservationdb")
+        op.execute("DROP FUNCTION IF EXISTS pelubot_touch_updated_at()")
+        return
+    op.execute("DROP TRIGGER IF EXISTS trg_reservationdb_updated")
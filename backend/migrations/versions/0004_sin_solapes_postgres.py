@@ -0,0 +1,55 @@
+"""Postgres: restricción de exclusión que impide reservas solapadas.
+
+Un profesional no puede tener dos reservas activas que se solapen; lo
+garantiza la BD aunque escriban varios nodos. Quedan fuera las canceladas y
+las importadas de Google (`gcal:*`), que reflejan el calendario con sus
+solapes. Requiere la extensión `btree_gist`. Si ya hay solapes, la revisión
+termina con un aviso sin crear la restricción; `app.db.enforces_no_overlap`
+consulta `pg_constraint`, así que la aplicación mantiene su comprobación
+mientras falte. En SQLite no hace nada: allí la comprobación está siempre en la
+aplicación.
+
+Revisión: 0004
+Anterior: 0003
+Fecha: 2026-10-17 01:14:00
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.db import OVERLAP_CONSTRAINT
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute(
+        f"""
+        DO $$
+        BEGIN
+          IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{OVERLAP_CONSTRAINT}') THEN
+            ALTER TABLE reservationdb ADD CONSTRAINT {OVERLAP_CONSTRAINT}
+              EXCLUDE USING gist (professional_id WITH =, tstzrange(start, "end", '[)') WITH &&)
+              WHERE (status <> 'cancelada' AND left(id, 5) <> 'gcal:');
+          END IF;
+        EXCEPTION WHEN exclusion_violation THEN
+          -- Ya hay reservas solapadas: se avisa y `/admin/db_integrity` lo señala.
+          RAISE WARNING 'No se crea {OVERLAP_CONSTRAINT}: hay reservas solapadas';
+        END $$
+        """
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(f"ALTER TABLE reservationdb DROP CONSTRAINT IF EXISTS {OVERLAP_CONSTRAINT}")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Benchmark de carga: saturación del threadpool con handlers síncronos frente a async.
+
+Cada handler `def` ocupa un hilo del threadpool de Starlette (40 por defecto)
+mientras espera a la BD. Si una ráfaga de escrituras se queda esperando el
+bloqueo de SQLite (`busy_timeout`), esos hilos se agotan y las lecturas hacen
+cola aunque no tengan nada que esperar. Las rutas calientes (`/slots`,
+`GET /reservations`) ya son `async def` sobre el motor async y no usan hilos.
+
+El script monta en la app, solo para la prueba, las versiones síncronas
+anteriores de esas lecturas (`/bench/sync/...`) y un endpoint síncrono de
+escritura que bloquea su hilo `--hold-ms` milisegundos antes de escribir. En cada
+modo lanza `--writers` escritores y `--readers` lectores concurrentes durante
+`--seconds` segundos en proceso (httpx + ASGI, sin red) y muestra latencias de
+lectura, lecturas/s, y el pico de hilos ocupados y de tareas esperando hilo.
+
+Uso:
+    python scripts/bench_async_load.py [--readers 10] [--writers 60] [--threads 40] [--hold-ms 500] [--seconds 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ.setdefault("API_KEY", "bench-key")
+os.environ["PELUBOT_FAKE_GCAL"] = "1"
+os.environ["PELUBOT_DISABLE_GCAL_WORKER"] = "1"
+os.environ.setdefault("RATE_LIMIT_OPS_PER_MIN", "1000000")
+os.environ.setdefault("RATE_LIMIT_ADMIN_PER_MIN", "1000000")
+# Medimos la BD, no la caché de disponibilidad.
+os.environ["AVAILABILITY_CACHE_SIZE"] = "0"
+
+import anyio.to_thread
+import httpx
+from fastapi import APIRouter, Depends
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.data import get_services
+from app.db import create_db_and_tables, dispose_async_engine, engine, get_session
+from app.api.routes import _reservation_to_dict
+from app.main import app
+from app.models import ReservationDB, SlotsOut, SlotsQuery
+from app.services.logic import find_available_slots
+
+DAY = date.today() + timedelta(days=14)
+while DAY.weekday() >= 5:
+    DAY += timedelta(days=1)
+HEADERS = {"X-API-Key": os.environ["API_KEY"]}
+SLOTS_BODY = {"service_id": "corte_cabello", "date_str": DAY.isoformat(), "professional_id": "deinis"}
+
+
+def _legacy_router(hold_ms: float) -> APIRouter:
+    """Versiones síncronas de las lecturas (como eran antes) y un escritor lento."""
+    router = APIRouter(prefix="/bench")
+
+    @router.post("/sync/slots", response_model=SlotsOut)
+    def sync_slots(q: SlotsQuery, session: Session = Depends(get_session)):
+        d = datetime.strptime(q.date_str, "%Y-%m-%d").date()
+        avail = find_available_slots(session, q.service_id, d, q.professional_id, use_gcal_busy_override=False)
+        return SlotsOut(service_id=q.service_id, date=d, professional_id=q.professional_id, slots=[dt.isoformat() for dt in avail])
+
+    @router.get("/sync/reservations")
+    def sync_reservations(session: Session = Depends(get_session)):
+        rows = session.exec(select(ReservationDB).order_by(ReservationDB.start).limit(100)).all()
+        return [_reservation_to_dict(r) for r in rows]
+
+    @router.post("/write")
+    def slow_write():
+        # El hilo queda bloqueado como una escritura esperando en busy_timeout; luego escribe.
+        time.sleep(hold_ms / 1000)
+        with Session(engine) as session:
+            session.exec(text("BEGIN IMMEDIATE"))
+            session.commit()
+        return {"ok": True}
+
+    return router
+
+
+def _seed(rows: int) -> None:
+    get_services()  # siembra el catálogo antes de la carga concurrente
+    with Session(engine) as session:
+        base = datetime.combine(DAY + timedelta(days=1), datetime.min.time()).replace(hour=9)
+        for idx in range(rows):
+            start = base + timedelta(days=idx // 16, minutes=30 * (idx % 16))
+            session.add(ReservationDB(id=f"bench-{idx:05d}", service_id="corte_cabello", professional_id="deinis", start=start, end=start + timedelta(minutes=30)))
+        session.commit()
+
+
+async def _run_mode(client: httpx.AsyncClient, mode: str, args: argparse.Namespace) -> dict:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = args.threads
+    latencies: list[float] = []
+    errors = 0
+    peak = {"borrowed": 0, "waiting": 0}
+    prefix = "/bench/sync" if mode == "sync" else ""
+
+    async def _reader(idx: int) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            if idx % 2:
+                resp = await client.post(f"{prefix}/slots", json=SLOTS_BODY)
+            else:
+                resp = await client.get(f"{prefix}/reservations", headers=HEADERS, params={"limit": 100} if not prefix else None)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                errors += 1
+
+    async def _writer() -> None:
+        while time.perf_counter() < deadline:
+            await client.post("/bench/write")
+
+    async def _sampler() -> None:
+        while time.perf_counter() < deadline:
+            stats = limiter.statistics()
+            peak["borrowed"] = max(peak["borrowed"], stats.borrowed_tokens)
+            peak["waiting"] = max(peak["waiting"], stats.tasks_waiting)
+            await asyncio.sleep(0.005)
+
+    # Calentamiento sin medir: conexiones del pool, catálogo e importaciones perezosas.
+    await asyncio.gather(*(client.post(f"{prefix}/slots", json=SLOTS_BODY) for _ in range(args.readers)))
+    deadline = time.perf_counter() + args.seconds
+    t0 = time.perf_counter()
+    await asyncio.gather(_sampler(), *(_writer() for _ in range(args.writers)), *(_reader(i) for i in range(args.readers)))
+    elapsed = time.perf_counter() - t0
+    ordered = sorted(latencies) or [0.0]
+
+    def _pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "reads": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(ordered) * 1000,
+        "p95": _pct(0.95),
+        "p99": _pct(0.99),
+        "errors": errors,
+        **peak,
+    }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        results: dict[str, Optional[dict]] = {}
+        for mode in args.modes:
+            results[mode] = await _run_mode(client, mode, args)
+    # Sin lifespan (ASGITransport no lo ejecuta): cerramos a mano las conexiones aiosqlite.
+    await dispose_async_engine()
+
+    print(
+        f"Lectores: {args.readers} | escritores: {args.writers} (bloquean {args.hold_ms:.0f} ms) | "
+        f"hilos: {args.threads} | {args.seconds:.0f} s por modo | BD: {_TMP_DIR}/bench.db"
+    )
+    print(f"{'modo':>6} {'lecturas':>9} {'lect/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hilos':>6} {'en cola':>8} {'errores':>8}")
+    for mode, r in results.items():
+        print(
+            f"{mode:>6} {r['reads']:>9} {r['rps']:>8.1f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} "
+            f"{r['borrowed']:>6} {r['waiting']:>8} {r['errors']:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=10)
+    parser.add_argument("--writers", type=int, default=60, help="Escritores síncronos concurrentes (ocupan hilos)")
+    parser.add_argument("--threads", type=int, default=40, help="Tamaño del threadpool (40 = valor por defecto de AnyIO)")
+    parser.add_argument("--hold-ms", type=float, default=500, help="Tiempo que cada escritor bloquea su hilo")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=300, help="Reservas de partida")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    _seed(args.seed)
+    app.include_router(_legacy_router(args.hold_ms))
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Benchmark de commits por reserva: flujo anterior frente al outbox.
+
+Antes, cada reserva se guardaba con tres commits: la reserva, su trabajo de
+sincronización (`enqueue_calendar_job`) y su `sync_status`. Con el outbox
+(`stage_calendar_job`) los tres van en un solo commit. El script crea N
+reservas con cada flujo sobre una BD SQLite temporal en disco y cuenta
+commits, sentencias SQL y tiempo por reserva. Con `--api` mide también
+`POST /reservations` de punta a punta (incluye el cálculo de disponibilidad).
+
+Uso:
+    python scripts/bench_booking_commits.py [--bookings 300] [--synchronous NORMAL|FULL] [--api]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ.setdefault("API_KEY", "bench-key")
+os.environ["PELUBOT_FAKE_GCAL"] = "1"
+os.environ["PELUBOT_DISABLE_GCAL_WORKER"] = "1"
+os.environ.setdefault("RATE_LIMIT_OPS_PER_MIN", "1000000")
+
+from sqlalchemy import delete, event
+from sqlmodel import Session
+
+from app.db import create_db_and_tables, engine
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services.calendar_queue import _coalesce_on_enqueue, stage_calendar_job
+
+CALENDAR_ID = "bench@group.calendar.google.com"
+BASE = datetime.combine(date.today() + timedelta(days=14), datetime.min.time()).replace(hour=9)
+
+
+def _row(idx: int, prefix: str) -> ReservationDB:
+    start = BASE + timedelta(minutes=30 * idx)
+    return ReservationDB(
+        id=f"{prefix}-{idx:05d}",
+        service_id="corte_cabello",
+        professional_id="deinis",
+        start=start,
+        end=start + timedelta(minutes=30),
+        google_calendar_id=CALENDAR_ID,
+        customer_name="Bench",
+        customer_phone="+34600000000",
+    )
+
+
+def legacy_booking(session: Session, idx: int) -> None:
+    """Secuencia anterior de `create_reservation`: reserva, trabajo y estado en commits separados."""
+    row = _row(idx, "legacy")
+    session.add(row)
+    session.commit()
+    payload = {"calendar_id": CALENDAR_ID}
+    _coalesce_on_enqueue(session, row.id, "create", payload)
+    job = CalendarSyncJobDB(reservation_id=row.id, action="create", payload=payload)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    session.refresh(row)
+    row.sync_status = "queued"
+    row.sync_job_id = job.id
+    row.sync_updated_at = datetime.now()
+    session.add(row)
+    session.commit()
+
+
+def outbox_booking(session: Session, idx: int) -> None:
+    """Secuencia actual: la reserva, su trabajo y su estado en un solo commit."""
+    row = _row(idx, "outbox")
+    session.add(row)
+    stage_calendar_job(session, reservation_id=row.id, action="create", payload={"calendar_id": CALENDAR_ID}, reservation=row)
+    session.commit()
+
+
+def _reset() -> None:
+    with Session(engine) as session:
+        session.exec(delete(CalendarSyncJobDB))
+        session.exec(delete(ReservationDB))
+        session.commit()
+
+
+def _measure(bookings: int, run: Callable[[int], None]) -> tuple[int, int, float]:
+    counts = {"commit": 0, "sql": 0}
+
+    def _commit(_conn) -> None:
+        counts["commit"] += 1
+
+    def _sql(*_args) -> None:
+        counts["sql"] += 1
+
+    _reset()
+    event.listen(engine, "commit", _commit)
+    event.listen(engine, "before_cursor_execute", _sql)
+    t0 = time.perf_counter()
+    try:
+        for idx in range(bookings):
+            run(idx)
+    finally:
+        elapsed = time.perf_counter() - t0
+        event.remove(engine, "commit", _commit)
+        event.remove(engine, "before_cursor_execute", _sql)
+    return counts["commit"], counts["sql"], elapsed
+
+
+def _direct(flow: Callable[[Session, int], None]) -> Callable[[int], None]:
+    def _run(idx: int) -> None:
+        with Session(engine) as session:
+            flow(session, idx)
+
+    return _run
+
+
+def _api_runner(bookings: int) -> Callable[[int], None]:
+    from fastapi.testclient import TestClient
+
+    from app.data import get_service_by_id
+    from app.main import app
+
+    client = TestClient(app)
+    headers = {"X-API-Key": os.environ["API_KEY"]}
+    duration = timedelta(minutes=get_service_by_id("corte_cabello").duration_min)
+    starts: list[str] = []
+    day = date.today() + timedelta(days=7)
+    while len(starts) < bookings:
+        resp = client.post("/slots", json={"service_id": "corte_cabello", "date_str": day.isoformat(), "professional_id": "deinis"})
+        free_until = None
+        # Huecos que no se solapan entre sí: todos se pueden reservar seguidos.
+        for slot in resp.json().get("slots", []):
+            slot_start = datetime.fromisoformat(slot)
+            if free_until is None or slot_start >= free_until:
+                starts.append(slot)
+                free_until = slot_start + duration
+        day += timedelta(days=1)
+
+    def _run(idx: int) -> None:
+        payload = {"service_id": "corte_cabello", "professional_id": "deinis", "start": starts[idx], "customer_name": "Bench", "customer_phone": "+34600000000"}
+        resp = client.post("/reservations", headers=headers, json=payload)
+        if resp.status_code != 200:
+            raise SystemExit(f"POST /reservations falló ({starts[idx]}): {resp.status_code} {resp.text}")
+
+    return _run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=300)
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"], help="PRAGMA synchronous de SQLite")
+    parser.add_argument("--api", action="store_true", help="Medir también POST /reservations de punta a punta")
+    args = parser.parse_args()
+
+    @event.listens_for(engine, "connect")
+    def _pragma(dbapi_connection, _record) -> None:
+        dbapi_connection.execute(f"PRAGMA synchronous={args.synchronous};")
+
+    create_db_and_tables()
+    flows = [("anterior", _direct(legacy_booking)), ("outbox", _direct(outbox_booking))]
+    if args.api:
+        flows.append(("api", _api_runner(args.bookings)))
+
+    print(f"Reservas: {args.bookings} | synchronous={args.synchronous} | BD: {_TMP_DIR}/bench.db")
+    print(f"{'flujo':>9} {'commits/res':>12} {'sql/res':>8} {'ms/res':>8} {'res/s':>8}")
+    for name, run in flows:
+        commits, statements, elapsed = _measure(args.bookings, run)
+        print(
+            f"{name:>9} {commits / args.bookings:>12.2f} {statements / args.bookings:>8.1f} "
+            f"{elapsed * 1000 / args.bookings:>8.2f} {args.bookings / elapsed:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Benchmark de rendimiento del worker de Google Calendar.
+
+Encola N trabajos `create` y los drena con distintas combinaciones de tamaño de
+lote y concurrencia, contra `FakeCalendarService` con una latencia simulada por
+llamada (por defecto 50 ms, del orden de un round-trip real a Google). Las
+configuraciones con sufijo `b` usan peticiones batch de Google: cada lote HTTP
+de hasta 50 operaciones paga una sola latencia. Usa una BD SQLite temporal.
+
+Uso:
+    python scripts/bench_calendar_queue.py [--jobs 200] [--latency-ms 50]
+        [--configs 1x1 20x1 20x4 50x8 100x1b 200x4b]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ.setdefault("API_KEY", "bench-key")
+os.environ["PELUBOT_FAKE_GCAL"] = "1"
+
+from sqlalchemy import delete, event
+from sqlmodel import Session
+
+import app.services.calendar_queue as calendar_queue
+import app.services.logic as logic
+from app.db import create_db_and_tables, engine
+from app.integrations.google_calendar import FakeCalendarService, _FakeEvents, _FakeEventsOp
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services.calendar_queue import CalendarSyncWorker
+
+CALENDAR_ID = "bench@group.calendar.google.com"
+
+
+_event_ids = itertools.count(1)
+
+
+class _SlowEvents(_FakeEvents):
+    def __init__(self, store: dict, latency: float):
+        super().__init__(store)
+        self._latency = latency
+
+    def insert(self, calendarId: str, body: dict):
+        time.sleep(self._latency)
+        # Ids únicos entre hilos: cada hilo tiene su propio cliente y su propio almacén.
+        event_id = f"bench-evt-{next(_event_ids)}"
+        self._store[event_id] = {**body, "id": event_id, "calendarId": calendarId}
+        return _FakeEventsOp({"id": event_id})
+
+
+class SlowCalendarService(FakeCalendarService):
+    """`FakeCalendarService` que tarda `latency` segundos por inserción."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self._latency = latency
+
+    def events(self):
+        return _SlowEvents(self._events_store, self._latency)
+
+
+class _SlowBatch:
+    def __init__(self, latency: float, callback):
+        self._latency = latency
+        self._callback = callback
+        self._ops: list = []
+
+    def add(self, request, request_id=None):
+        self._ops.append((request_id, request))
+
+    def execute(self):
+        time.sleep(self._latency)
+        for request_id, op in self._ops:
+            try:
+                self._callback(request_id, op.execute(), None)
+            except Exception as exc:  # noqa: BLE001
+                self._callback(request_id, None, exc)
+
+
+class SlowBatchCalendarService(FakeCalendarService):
+    """Variante con `new_batch_http_request`: una latencia por lote HTTP, no por operación."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self._latency = latency
+
+    def events(self):
+        return _SlowEvents(self._events_store, 0.0)
+
+    def new_batch_http_request(self, callback=None):
+        return _SlowBatch(self._latency, callback)
+
+
+def _seed(n_jobs: int) -> None:
+    start = datetime.now(timezone.utc) + timedelta(days=7)
+    with Session(engine) as session:
+        session.exec(delete(CalendarSyncJobDB))
+        session.exec(delete(ReservationDB))
+        for idx in range(n_jobs):
+            rid = f"bench-{idx:05d}"
+            session.add(
+                ReservationDB(
+                    id=rid,
+                    service_id="corte_cabello",
+                    professional_id="deinis",
+                    start=start + timedelta(minutes=30 * idx),
+                    end=start + timedelta(minutes=30 * idx + 30),
+                )
+            )
+            session.add(CalendarSyncJobDB(reservation_id=rid, action="create", payload={"calendar_id": CALENDAR_ID}))
+        session.commit()
+
+
+def _drain(batch_size: int, concurrency: int, use_batch: bool) -> tuple[float, int, int]:
+    worker = CalendarSyncWorker(
+        poll_interval=0.1, batch_size=batch_size, concurrency=concurrency, use_batch=use_batch
+    )
+    worker.worker_id = "bench"
+    commits = [0]
+
+    def _count(conn) -> None:
+        commits[0] += 1
+
+    event.listen(engine, "commit", _count)
+    t0 = time.perf_counter()
+    rounds = 0
+    try:
+        while worker._process_once():
+            rounds += 1
+    finally:
+        event.remove(engine, "commit", _count)
+        worker.stop()
+    return time.perf_counter() - t0, rounds, commits[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument(
+        "--configs",
+        nargs="+",
+        default=["1x1", "20x1", "20x4", "50x8", "100x1b", "200x4b"],
+        help="lote x concurrencia (sufijo b: peticiones batch)",
+    )
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    latency = args.latency_ms / 1000
+
+    print(f"Trabajos: {args.jobs} | latencia simulada: {args.latency_ms:.0f} ms")
+    print(f"{'lote':>5} {'conc':>5} {'batch':>6} {'vueltas':>8} {'commits':>8} {'seg':>8} {'jobs/s':>9}")
+    for config in args.configs:
+        config = config.lower()
+        use_batch = config.endswith("b")
+        batch_size, concurrency = (int(part) for part in config.rstrip("b").split("x"))
+        factory = SlowBatchCalendarService if use_batch else SlowCalendarService
+        build = lambda: factory(latency)  # noqa: E731
+        logic.build_calendar = build
+        calendar_queue.build_calendar = build
+        _seed(args.jobs)
+        elapsed, rounds, commits = _drain(batch_size, concurrency, use_batch)
+        print(
+            f"{batch_size:>5} {concurrency:>5} {'sí' if use_batch else 'no':>6} {rounds:>8} {commits:>8} "
+            f"{elapsed:>8.2f} {args.jobs / elapsed:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark de arranque en frío: preparación del esquema con una BD ya al día.
+
+Cada proceso nuevo llama a `create_db_and_tables()` al arrancar. El script
+crea una BD SQLite temporal con `--rows` reservas, la inicializa una vez y
+después lanza `--runs` procesos nuevos que solo importan `app.db` y los modelos y llaman a
+`create_db_and_tables()`. Para cada proceso mide el tiempo de esa llamada y
+las sentencias SQL que llegan a SQLite, y muestra la mediana.
+
+Uso:
+    python scripts/bench_cold_start.py [--runs 7] [--rows 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_CHILD = """
+import json, time
+from sqlalchemy import event
+from app.db import create_db_and_tables, engine
+import app.models  # registra las tablas, como al arrancar la app
+statements = []
+# A nivel de sqlite3: cuenta también lo que SQLAlchemy ejecuta al inspeccionar tablas.
+event.listen(engine, "connect", lambda dbapi_connection, _record: dbapi_connection.set_trace_callback(statements.append))
+t0 = time.perf_counter()
+create_db_and_tables()
+elapsed = time.perf_counter() - t0
+print(json.dumps({"ms": elapsed * 1000, "sql": len(statements)}))
+"""
+
+_SEED = """
+import sys
+from datetime import datetime, timedelta
+from sqlmodel import Session
+from app.db import create_db_and_tables, engine
+from app.models import ReservationDB
+create_db_and_tables()
+base = datetime(2030, 1, 7, 9, 0)
+with Session(engine) as session:
+    for idx in range(int(sys.argv[1])):
+        start = base + timedelta(days=idx // 16, minutes=30 * (idx % 16))
+        session.add(ReservationDB(id=f"bench-{idx:06d}", service_id="corte_cabello", professional_id="deinis", start=start, end=start + timedelta(minutes=30)))
+    session.commit()
+"""
+
+
+def _run(code: str, env: dict, *args: str) -> str:
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=20000, help="Reservas en la BD de partida")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="pelubot-bench-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_dir}/bench.db",
+        "PELUBOT_FAKE_GCAL": "1",
+        "PELUBOT_DISABLE_GCAL_WORKER": "1",
+        "LOG_LEVEL": "WARNING",
+    }
+    _run(_SEED, env, str(args.rows))
+    results = [json.loads(_run(_CHILD, env)) for _ in range(args.runs)]
+    ms = statistics.median(r["ms"] for r in results)
+    sql = statistics.median(r["sql"] for r in results)
+    print(f"Procesos: {args.runs} | reservas: {args.rows} | BD: {tmp_dir}/bench.db")
+    print(f"create_db_and_tables(): mediana {ms:.2f} ms, {sql:.0f} sentencias SQL por arranque")
+
+
+if __name__ == "__main__":
+    main()
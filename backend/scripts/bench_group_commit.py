@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Benchmark de escrituras concurrentes: un commit por petición frente al escritor único.
+
+Con SQLite solo escribe una conexión a la vez. Si cada petición abre su
+transacción (`BEGIN IMMEDIATE` ... `COMMIT`), las demás esperan el bloqueo y
+cada commit paga su propio fsync. `DBWriter` (app/db.py) pasa todas las
+transacciones por un hilo y confirma juntas las que llegan mientras corre el
+lote anterior. El script lanza `--clients` hilos que crean `--bookings`
+reservas en total (reserva + trabajo de sincronización, como el outbox) con
+cada estrategia sobre una BD temporal en disco, y muestra commits, tamaño
+medio de lote, reservas/s y latencia por reserva.
+
+Uso:
+    python scripts/bench_group_commit.py [--bookings 2000] [--clients 32] [--synchronous FULL|NORMAL]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ["PELUBOT_FAKE_GCAL"] = "1"
+os.environ["PELUBOT_DISABLE_GCAL_WORKER"] = "1"
+
+from sqlalchemy import delete, event, text
+from sqlmodel import Session
+
+from app.db import DBWriter, create_db_and_tables, engine
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services.calendar_queue import stage_calendar_job
+
+CALENDAR_ID = "bench@group.calendar.google.com"
+BASE = datetime.combine(date.today() + timedelta(days=14), datetime.min.time()).replace(hour=9)
+
+
+def _booking(idx: int) -> Callable[[Session], None]:
+    def _fn(session: Session) -> None:
+        start = BASE + timedelta(minutes=30 * idx)
+        row = ReservationDB(
+            id=f"bench-{idx:06d}",
+            service_id="corte_cabello",
+            professional_id="deinis",
+            start=start,
+            end=start + timedelta(minutes=30),
+            google_calendar_id=CALENDAR_ID,
+            customer_name="Bench",
+            customer_phone="+34600000000",
+        )
+        session.add(row)
+        stage_calendar_job(session, reservation_id=row.id, action="create", payload={"calendar_id": CALENDAR_ID}, reservation=row)
+
+    return _fn
+
+
+def _per_request(idx: int) -> None:
+    """Flujo anterior: cada petición toma el bloqueo y hace su propio commit."""
+    with Session(engine) as session:
+        session.exec(text("BEGIN IMMEDIATE"))
+        _booking(idx)(session)
+        session.commit()
+
+
+def _reset() -> None:
+    with Session(engine) as session:
+        session.exec(delete(CalendarSyncJobDB))
+        session.exec(delete(ReservationDB))
+        session.commit()
+
+
+def _measure(args: argparse.Namespace, run: Callable[[int], None]) -> dict:
+    commits: list[int] = []
+
+    def _commit(_conn) -> None:
+        commits.append(1)
+
+    def _timed(idx: int) -> float:
+        t0 = time.perf_counter()
+        run(idx)
+        return time.perf_counter() - t0
+
+    _reset()
+    event.listen(engine, "commit", _commit)
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            latencies = sorted(pool.map(_timed, range(args.bookings)))
+    finally:
+        elapsed = time.perf_counter() - t0
+        event.remove(engine, "commit", _commit)
+    return {
+        "commits": len(commits),
+        "batch": args.bookings / max(1, len(commits)),
+        "rps": args.bookings / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32, help="Hilos que escriben a la vez")
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL"], help="PRAGMA synchronous de SQLite")
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    @event.listens_for(engine, "connect")
+    def _pragma(dbapi_connection, _record) -> None:
+        dbapi_connection.execute(f"PRAGMA synchronous={args.synchronous};")
+
+    create_db_and_tables()
+    writer = DBWriter(engine, max_batch=args.max_batch)
+    flows = [("petición", _per_request), ("escritor", lambda idx: writer.run(_booking(idx)))]
+
+    print(f"Reservas: {args.bookings} | clientes: {args.clients} | synchronous={args.synchronous} | BD: {_TMP_DIR}/bench.db")
+    print(f"{'flujo':>9} {'commits':>8} {'res/lote':>9} {'res/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    try:
+        for name, run in flows:
+            r = _measure(args, run)
+            print(f"{name:>9} {r['commits']:>8} {r['batch']:>9.1f} {r['rps']:>8.1f} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
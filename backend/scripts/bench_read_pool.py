@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Benchmark de pools: lecturas del panel compartiendo pool con escrituras frente al pool de lectura.
+
+Las consultas de los paneles del portal (agregados por servicio y día) se
+lanzaban con el mismo engine que las escrituras. Si las escrituras retienen
+conexiones (transacciones largas, espera del bloqueo de SQLite), el pool
+principal (5 + 10 de desborde por defecto) se agota y las lecturas esperan
+conexión aunque la BD pueda atenderlas. El script lanza `--writers` hilos que
+mantienen abierta una transacción de escritura `--hold-ms` milisegundos y
+`--readers` hilos que repiten una consulta de estadísticas durante
+`--seconds` segundos, primero con el engine principal y después con
+`get_read_engine()` (`mode=ro` + `query_only`), y muestra latencias de
+lectura, lecturas/s y la espera media por conexión del pool usado.
+
+Uso:
+    python scripts/bench_read_pool.py [--readers 16] [--writers 15] [--hold-ms 200] [--seconds 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ["PELUBOT_FAKE_GCAL"] = "1"
+os.environ["PELUBOT_DISABLE_GCAL_WORKER"] = "1"
+
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.core.metrics import DB_POOL_WAIT_SECONDS
+from app.db import create_db_and_tables, engine, get_read_engine
+from app.models import ReservationDB
+
+BASE = datetime(2030, 1, 7, 9, 0)
+
+
+def _seed(rows: int) -> None:
+    with Session(engine) as session:
+        for idx in range(rows):
+            start = BASE + timedelta(days=idx // 16, minutes=30 * (idx % 16))
+            session.add(ReservationDB(id=f"bench-{idx:06d}", service_id=("corte_cabello", "tinte", "barba")[idx % 3], professional_id="deinis", start=start, end=start + timedelta(minutes=30)))
+        session.commit()
+
+
+def _stats_query(session: Session) -> None:
+    """Agregado del estilo de `/pros/stats`: reservas por servicio y día en un mes."""
+    session.exec(
+        select(ReservationDB.service_id, func.date(ReservationDB.start), func.count())
+        .where(ReservationDB.professional_id == "deinis", ReservationDB.start >= BASE, ReservationDB.start < BASE + timedelta(days=31))
+        .group_by(ReservationDB.service_id, func.date(ReservationDB.start))
+    ).all()
+
+
+def _pool_wait(pool: str) -> tuple[float, float]:
+    samples = {s.name: s.value for m in DB_POOL_WAIT_SECONDS.collect() for s in m.samples if s.labels.get("pool") == pool}
+    return samples.get("pelubot_db_pool_wait_seconds_sum", 0.0), samples.get("pelubot_db_pool_wait_seconds_count", 0.0)
+
+
+def _run_mode(read_bind: Engine, pool: str, args: argparse.Namespace) -> dict:
+    deadline = time.perf_counter() + args.seconds
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def _writer() -> None:
+        while time.perf_counter() < deadline:
+            with Session(engine) as session:
+                # Transacción de escritura que retiene su conexión (p. ej. esperando el bloqueo).
+                session.exec(select(ReservationDB.id).limit(1)).first()
+                time.sleep(args.hold_ms / 1000)
+                session.rollback()
+
+    def _reader() -> None:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            with Session(read_bind) as session:
+                _stats_query(session)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    wait_sum, wait_count = _pool_wait(pool)
+    threads = [threading.Thread(target=_writer) for _ in range(args.writers)] + [threading.Thread(target=_reader) for _ in range(args.readers)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+    end_sum, end_count = _pool_wait(pool)
+    ordered = sorted(latencies) or [0.0]
+    return {
+        "reads": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(ordered) * 1000,
+        "p99": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000,
+        "wait": (end_sum - wait_sum) / max(1.0, end_count - wait_count) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=15, help="Hilos que retienen una conexión del pool principal")
+    parser.add_argument("--hold-ms", type=float, default=200)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=5000, help="Reservas de partida")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    _seed(args.seed)
+    modes = [("compartido", engine, "primary"), ("lectura", get_read_engine(), "read")]
+
+    print(f"Lectores: {args.readers} | escritores: {args.writers} (retienen {args.hold_ms:.0f} ms) | {args.seconds:.0f} s por modo | BD: {_TMP_DIR}/bench.db")
+    print(f"{'pool':>10} {'lecturas':>9} {'lect/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'espera ms':>10}")
+    for name, bind, pool in modes:
+        r = _run_mode(bind, pool, args)
+        print(f"{name:>10} {r['reads']:>9} {r['rps']:>8.1f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['wait']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Benchmark del cálculo de huecos (`find_available_slots`).
+
+Mide, para 1, 10 y 50 profesionales, el número de consultas SQL y la latencia
+por petición del motor actual frente al algoritmo anterior (una consulta por
+candidato y profesional). Usa una BD SQLite temporal y no toca Google Calendar.
+
+Uso:
+    python scripts/bench_slots.py [--pros 1 10 50] [--iterations 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pelubot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/bench.db"
+os.environ.setdefault("API_KEY", "bench-key")
+os.environ.setdefault("PELUBOT_FAKE_GCAL", "1")
+# Medimos el motor, no la caché de disponibilidad.
+os.environ["AVAILABILITY_CACHE_SIZE"] = "0"
+
+from sqlalchemy import delete, event
+from sqlmodel import Session, select
+
+from app.data import WEEKLY_SCHEDULE, get_service_by_id, invalidate_catalog_cache
+from app.db import create_db_and_tables, engine
+from app.models import ReservationDB, StylistDB
+from app.services.logic import find_available_slots
+
+SERVICE_ID = "corte_cabello"
+
+
+class QueryCounter:
+    """Cuenta sentencias ejecutadas contra el engine mientras está activo."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+def _legacy_find_available_slots(session: Session, service_id: str, on_date: date, pro_ids: list[str], step_min: int = 15) -> list[datetime]:
+    """Algoritmo previo: una consulta por candidato y profesional."""
+    service = get_service_by_id(service_id)
+    starts: list[datetime] = []
+    for start_t, end_t in WEEKLY_SCHEDULE.get(on_date.weekday(), []):
+        cursor = datetime.combine(on_date, start_t)
+        end_range = datetime.combine(on_date, end_t)
+        while cursor + timedelta(minutes=service.duration_min) <= end_range:
+            starts.append(cursor)
+            cursor += timedelta(minutes=step_min)
+
+    def overlaps_local(pro_id: str, start_dt: datetime, end_dt: datetime) -> bool:
+        day_start = datetime.combine(start_dt.date(), dt_time(0, 0))
+        day_end = datetime.combine(start_dt.date(), dt_time(23, 59, 59))
+        rows = session.exec(
+            select(ReservationDB).where(
+                ReservationDB.professional_id == pro_id,
+                ReservationDB.start < day_end,
+                ReservationDB.end > day_start,
+                ReservationDB.status != "cancelada",
+            )
+        )
+        return any(not (end_dt <= r.start or start_dt >= r.end) for r in rows)
+
+    free: list[datetime] = []
+    for start_dt in starts:
+        end_dt = start_dt + timedelta(minutes=service.duration_min)
+        for pro_id in pro_ids:
+            if overlaps_local(pro_id, start_dt, end_dt):
+                continue
+            free.append(start_dt)
+            break
+    return free
+
+
+def _target_day() -> date:
+    d = date.today() + timedelta(days=14)
+    while d.weekday() >= 5:
+        d += timedelta(days=1)
+    return d
+
+
+def _seed(n_pros: int, on_date: date) -> list[str]:
+    pro_ids = [f"bench-{i:02d}" for i in range(n_pros)]
+    with Session(engine) as session:
+        session.exec(delete(ReservationDB))
+        session.exec(delete(StylistDB))
+        for pid in pro_ids:
+            session.add(StylistDB(id=pid, name=pid, password_hash="x", services=[SERVICE_ID], is_active=True))
+        # Ocupa la mañana casi completa de cada profesional para forzar el recorrido de candidatos.
+        for idx, pid in enumerate(pro_ids):
+            cursor = datetime.combine(on_date, dt_time(9, 30))
+            slot = 0
+            while cursor < datetime.combine(on_date, dt_time(13, 0)):
+                session.add(
+                    ReservationDB(
+                        id=f"{pid}-{slot}",
+                        service_id=SERVICE_ID,
+                        professional_id=pid,
+                        start=cursor,
+                        end=cursor + timedelta(minutes=30),
+                    )
+                )
+                cursor += timedelta(minutes=30)
+                slot += 1
+        session.commit()
+    invalidate_catalog_cache()
+    return pro_ids
+
+
+def _measure(fn, iterations: int) -> tuple[float, float, int, int]:
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    timings: list[float] = []
+    result_len = 0
+    try:
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            result_len = len(fn())
+            timings.append((time.perf_counter() - t0) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    p50 = statistics.median(timings)
+    p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+    return p50, p95, counter.count // iterations, result_len
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pros", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    on_date = _target_day()
+    print(f"Fecha objetivo: {on_date.isoformat()} | iteraciones: {args.iterations}")
+    print(f"{'pros':>5} {'motor':>8} {'queries/req':>12} {'p50 ms':>9} {'p95 ms':>9} {'slots':>6}")
+    for n_pros in args.pros:
+        pro_ids = _seed(n_pros, on_date)
+        # Calentamos cachés de catálogo para no medir su carga inicial.
+        with Session(engine) as session:
+            find_available_slots(session, SERVICE_ID, on_date, use_gcal_busy_override=False)
+
+        def run_new():
+            with Session(engine) as session:
+                return find_available_slots(session, SERVICE_ID, on_date, use_gcal_busy_override=False)
+
+        def run_legacy():
+            with Session(engine) as session:
+                return _legacy_find_available_slots(session, SERVICE_ID, on_date, pro_ids)
+
+        for label, fn in (("legacy", run_legacy), ("sweep", run_new)):
+            p50, p95, queries, slots = _measure(fn, args.iterations)
+            print(f"{n_pros:>5} {label:>8} {queries:>12} {p50:>9.2f} {p95:>9.2f} {slots:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Migraciones del esquema de la BD (Alembic) fuera del arranque de la app.
+
+La app solo comprueba al arrancar que `alembic_version` está en
+`app.db.SCHEMA_HEAD` (una consulta) y migra si no lo está. Con tablas grandes
+conviene migrar antes, con este comando, y arrancar con
+`PELUBOT_AUTO_MIGRATE=0`:
+
+- `status`: revisión aplicada y la esperada.
+- `upgrade [REV]`: aplica las revisiones pendientes (por defecto hasta la
+  última). En Postgres los índices se crean con `CREATE INDEX CONCURRENTLY`
+  y no bloquean las escrituras; en SQLite sí las bloquean mientras se crean.
+- `sql [RANGO]`: imprime el SQL sin conectarse (p. ej. `0001:0004`), para
+  revisarlo o aplicarlo a mano en una ventana de mantenimiento.
+
+Usa `DATABASE_URL` como la app.
+
+Uso:
+    python scripts/migrate.py status
+    python scripts/migrate.py upgrade [head]
+    python scripts/migrate.py sql [head] [--url postgresql://...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from alembic import command
+
+from app.db import SCHEMA_HEAD, alembic_config, current_schema_revision, upgrade_schema
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="Revisión aplicada y esperada")
+    up = sub.add_parser("upgrade", help="Aplica las migraciones pendientes")
+    up.add_argument("revision", nargs="?", default="head")
+    sql = sub.add_parser("sql", help="Imprime el SQL de las migraciones sin conectarse")
+    sql.add_argument("revision", nargs="?", default="head", help="Revisión o rango `desde:hasta`")
+    sql.add_argument("--url", help="URL cuyo dialecto usar (por defecto DATABASE_URL)")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        current = current_schema_revision()
+        state = "al día" if current == SCHEMA_HEAD else "pendiente de migrar"
+        print(f"Aplicada: {current or 'ninguna'} | esperada: {SCHEMA_HEAD} ({state})")
+    elif args.cmd == "upgrade":
+        upgrade_schema(revision=args.revision)
+        print(f"Esquema en {current_schema_revision()}")
+    else:
+        cfg = alembic_config()
+        if args.url:
+            cfg.cmd_opts = argparse.Namespace(x=[f"url={args.url}"])
+        command.upgrade(cfg, args.revision, sql=True)
+
+
+if __name__ == "__main__":
+    main()
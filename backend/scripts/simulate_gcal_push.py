@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Simulador local de notificaciones push de Google Calendar.
+
+Envía a `/gcal/notifications` las mismas cabeceras que Google manda por un
+canal `events.watch`: primero un mensaje `sync` y luego uno `exists` por cada
+cambio. Sirve para probar el webhook, el agrupado por calendario y la
+importación incremental sin exponer el backend a internet. Los tests usan
+`GooglePushSimulator` con el `TestClient`.
+
+Uso:
+    # canal vigente de un calendario, leído de la BD local
+    python scripts/simulate_gcal_push.py --calendar cal@group.calendar.google.com --count 5
+
+    # canal indicado a mano contra otro backend
+    python scripts/simulate_gcal_push.py --url http://localhost:8776/gcal/notifications \\
+        --channel-id <id> --token <token> --resource-id <resource> --count 3 --interval 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+root_str = str(ROOT)
+if root_str not in sys.path:
+    sys.path.insert(0, root_str)
+
+Poster = Callable[[Dict[str, str]], Any]
+
+
+class GooglePushSimulator:
+    """Imita a Google enviando los avisos de un canal, con `X-Goog-Message-Number` creciente."""
+
+    def __init__(self, post: Poster, channel_id: str, token: str, resource_id: Optional[str] = None, calendar_id: Optional[str] = None):
+        self._post = post
+        self.channel_id = channel_id
+        self.token = token
+        self.resource_id = resource_id or "simulated-resource"
+        self.calendar_id = calendar_id
+        self.message_number = 0
+
+    @classmethod
+    def for_channel(cls, post: Poster, channel: Any) -> "GooglePushSimulator":
+        """Simulador de un `CalendarWatchChannelDB` ya guardado."""
+        return cls(post, channel.id, channel.token, channel.resource_id, channel.calendar_id)
+
+    def headers(self, state: str) -> Dict[str, str]:
+        self.message_number += 1
+        headers = {
+            "X-Goog-Channel-ID": self.channel_id,
+            "X-Goog-Channel-Token": self.token,
+            "X-Goog-Resource-ID": self.resource_id,
+            "X-Goog-Resource-State": state,
+            "X-Goog-Message-Number": str(self.message_number),
+        }
+        if self.calendar_id:
+            headers["X-Goog-Resource-URI"] = (
+                f"https://www.googleapis.com/calendar/v3/calendars/{self.calendar_id}/events?alt=json"
+            )
+        return headers
+
+    def sync(self) -> Any:
+        """Mensaje inicial que Google envía al abrir el canal."""
+        return self._post(self.headers("sync"))
+
+    def change(self, count: int = 1, interval: float = 0.0) -> List[Any]:
+        """`count` avisos de cambio separados `interval` segundos."""
+        responses = []
+        for idx in range(count):
+            if idx and interval > 0:
+                time.sleep(interval)
+            responses.append(self._post(self.headers("exists")))
+        return responses
+
+
+def client_poster(client: Any, path: str = "/gcal/notifications") -> Poster:
+    """Envía los avisos con un cliente tipo `TestClient`/`httpx.Client`."""
+    return lambda headers: client.post(path, headers=headers)
+
+
+def http_poster(url: str, timeout: float = 10.0) -> Poster:
+    """Envía los avisos por HTTP a un backend en marcha; devuelve el código de estado."""
+
+    def _post(headers: Dict[str, str]) -> int:
+        request = urllib.request.Request(url, data=b"", headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+    return _post
+
+
+def _channel_from_db(calendar_id: str) -> Any:
+    from sqlmodel import Session, select
+
+    from app.db import engine
+    from app.models import CalendarWatchChannelDB
+
+    with Session(engine) as session:
+        channel = session.exec(
+            select(CalendarWatchChannelDB)
+            .where(CalendarWatchChannelDB.calendar_id == calendar_id, CalendarWatchChannelDB.stopped_at.is_(None))
+            .order_by(CalendarWatchChannelDB.created_at.desc())
+        ).first()
+    if channel is None:
+        raise SystemExit(f"No hay canal vigente para {calendar_id}; ábrelo con POST /admin/gcal/watch")
+    return channel
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8776/gcal/notifications")
+    parser.add_argument("--calendar", help="Calendario cuyo canal vigente se lee de la BD")
+    parser.add_argument("--channel-id")
+    parser.add_argument("--token")
+    parser.add_argument("--resource-id")
+    parser.add_argument("--count", type=int, default=1, help="Avisos de cambio a enviar")
+    parser.add_argument("--interval", type=float, default=0.0, help="Segundos entre avisos")
+    parser.add_argument("--no-sync", action="store_true", help="No enviar el mensaje inicial `sync`")
+    args = parser.parse_args()
+
+    post = http_poster(args.url)
+    if args.calendar:
+        simulator = GooglePushSimulator.for_channel(post, _channel_from_db(args.calendar))
+    elif args.channel_id and args.token:
+        simulator = GooglePushSimulator(post, args.channel_id, args.token, args.resource_id)
+    else:
+        parser.error("indica --calendar o --channel-id y --token")
+
+    if not args.no_sync:
+        print(f"sync -> {simulator.sync()}")
+    for idx, status in enumerate(simulator.change(args.count, args.interval), start=1):
+        print(f"exists #{idx} -> {status}")
+
+
+if __name__ == "__main__":
+    main()
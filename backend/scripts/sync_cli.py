@@ -11,6 +11,9 @@ Ejemplos de uso:
   # días hacia delante (sustituye END)
   DAYS=14 python -m backend.scripts.sync_cli
 
+  # solo cambios desde la última importación (syncToken por calendario)
+  INCREMENTAL=1 python -m backend.scripts.sync_cli
+
 Variables de entorno:
   - USE_GCAL_BUSY, GCAL_CALENDAR_ID, GOOGLE_OAUTH_JSON, GOOGLE_SERVICE_ACCOUNT_JSON
   - TZ (por defecto Europe/Madrid)
@@ -25,7 +28,7 @@ load_dotenv()
 from sqlmodel import Session, select
 
 from app.db import engine, create_db_and_tables
-from app.services.logic import sync_from_gcal_range, reconcile_db_to_gcal_range
+from app.services.logic import sync_from_gcal_incremental, sync_from_gcal_range, reconcile_db_to_gcal_range
 from app.models import ReservationDB
 
 
@@ -61,12 +64,22 @@ def main() -> None:
     default_service = os.getenv("DEFAULT_SERVICE_FOR_SYNC", "corte_cabello")
 
     mode = (os.getenv("MODE") or "import").lower()  # import | push | both
+    incremental = (os.getenv("INCREMENTAL", "false").lower() in ("1","true","yes","y","si","sí"))
     with Session(engine) as s:
         before = s.exec(select(ReservationDB)).all()
         print(f"Reservas antes: {len(before)}")
 
         results: dict[str, dict] = {}
-        if mode in ("import", "both"):
+        if mode in ("import", "both") and incremental:
+            results["import"] = sync_from_gcal_incremental(
+                s,
+                default_service=default_service,
+                by_professional=by_professional,
+                calendar_id=calendar_id,
+                professional_id=professional_id,
+                full_sync_from=start,
+            )
+        elif mode in ("import", "both"):
             results["import"] = sync_from_gcal_range(
                 s,
                 start,
@@ -1,14 +1,19 @@
 """Fixtures compartidas para los tests del backend."""
 
+import asyncio
 import importlib
 import os
 from pathlib import Path
 import sys
 
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 os.environ.setdefault("API_KEY", "test-api-key")
 os.environ.setdefault("ALLOW_LOCAL_NO_AUTH", "false")
@@ -27,35 +32,62 @@ def _import_app_and_deps():
     main = importlib.import_module("app.main")
     return models, db, routes, main
 
+def _clear_availability_cache():
+    importlib.import_module("app.services.availability_cache").clear_availability_cache()
+    importlib.import_module("app.services.freebusy_cache").clear_freebusy_cache()
+
 @pytest.fixture()
-def app_client(monkeypatch):
+def app_client(monkeypatch, tmp_path):
     models, db, routes, main = _import_app_and_deps()
 
-    # Engine de prueba: una sola conexión en memoria para todas las sesiones
-    engine = create_engine(
-        "sqlite://",  # equivalente a :memory: pero con StaticPool
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+    # BD de prueba en un fichero temporal: la comparten el engine síncrono, el de lectura y el async
+    db_path = tmp_path / "test.db"
+    url = f"sqlite:///{db_path}"
+    engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+    read_engine = create_engine(db.to_readonly_url(url), connect_args={"check_same_thread": False, "timeout": 30})
+    # Sin pool: TestClient abre un event loop por petición y una conexión aiosqlite
+    # no puede pasar de un loop a otro.
+    async_engine = create_async_engine(db.to_async_url(db.to_readonly_url(url)), connect_args={"timeout": 30}, poolclass=NullPool)
+
+    # Las lecturas van en modo solo lectura, como en la app; las escrituras, por el escritor único.
+    event.listen(read_engine, "connect", db.set_sqlite_query_only)
+    event.listen(async_engine.sync_engine, "connect", db.set_sqlite_query_only)
+    writer = db.DBWriter(engine, name="db-writer-test")
 
-    # Crear todas las tablas del modelo en esta conexión compartida
+    # Crear todas las tablas del modelo
     SQLModel.metadata.create_all(engine)
 
     # Dependency override para que la app use nuestra sesión de test
-    def get_test_session():
-        with Session(engine) as s:
+    def get_test_session(request: Request):
+        bind = read_engine if request.method in db.READ_METHODS else engine
+        with Session(bind) as s:
+            yield s
+
+    async def get_test_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as s:
             yield s
 
-    # En tus rutas usas Depends(get_session); aquí lo sobreescribimos
+    # En tus rutas usas Depends(get_session) / Depends(get_async_session); aquí los sobreescribimos
     main.app.dependency_overrides[routes.get_session] = get_test_session
+    main.app.dependency_overrides[db.get_async_session] = get_test_async_session
+    main.app.dependency_overrides[db.get_writer] = lambda: writer
 
     main.app.state.test_engine = engine
+    main.app.state.test_read_engine = read_engine
+    main.app.state.test_async_engine = async_engine
+    # Cada test usa una BD nueva: las cachés de disponibilidad no deben arrastrar resultados.
+    _clear_availability_cache()
     client = TestClient(main.app)
     try:
         yield client
     finally:
-        try:
-            del main.app.state.test_engine
-        except AttributeError:
-            pass
+        for attr in ("test_engine", "test_read_engine", "test_async_engine"):
+            try:
+                delattr(main.app.state, attr)
+            except AttributeError:
+                pass
         main.app.dependency_overrides.clear()
+        writer.close()
+        asyncio.run(async_engine.dispose())
+        read_engine.dispose()
+        engine.dispose()
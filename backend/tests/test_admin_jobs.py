@@ -0,0 +1,118 @@
+"""Pruebas de los trabajos de administración en segundo plano (/admin/jobs)."""
+
+from __future__ import annotations
+
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import ReservationDB
+from app.services import logic
+from tests.test_calendar_diff import CAL_A, CAL_B, TARGETS, MultiCalendar
+
+HEADERS = {"X-API-Key": "test-api-key"}
+
+
+@pytest.fixture()
+def calendars(app_client, monkeypatch):
+    gcal = MultiCalendar()
+    day = date.today() + timedelta(days=2)
+    at = lambda hour: datetime.combine(day, datetime.min.time()).replace(hour=hour)  # noqa: E731
+    gcal.add(CAL_A, "ev-a1", at(9))
+    gcal.add(CAL_A, "ev-a2", at(10))
+    gcal.add(CAL_A, "ev-a3", at(9) + timedelta(days=1))
+    gcal.add(CAL_B, "ev-b1", at(12))
+    monkeypatch.setattr(logic, "build_calendar", lambda: gcal)
+    monkeypatch.setattr(logic, "get_calendar_for_professional", lambda pro: TARGETS.get(pro, CAL_A))
+    monkeypatch.setattr(logic, "iter_professional_calendars", lambda: list(TARGETS.items()))
+    return day, gcal
+
+
+def _start(app_client, path: str, body: dict) -> str:
+    resp = app_client.post(path, json={**body, "background": True}, headers=HEADERS)
+    assert resp.status_code == 202, resp.text
+    return resp.json()["job_id"]
+
+
+def _ndjson(app_client, job_id: str) -> list[dict]:
+    with app_client.stream("GET", f"/admin/jobs/{job_id}/events", headers=HEADERS) as resp:
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in resp.iter_lines() if line]
+
+
+def test_background_sync_streams_per_calendar_progress(app_client, calendars):
+    day, _ = calendars
+    job_id = _start(app_client, "/admin/sync", {"mode": "import", "start": day.isoformat(), "days": 3})
+
+    lines = _ndjson(app_client, job_id)
+    progress = [line for line in lines if line["type"] == "progress"]
+    assert [(p["calendar"], p["done"], p["total"], p["inserted"]) for p in progress] == [(CAL_A, 1, 2, 3), (CAL_B, 2, 2, 1)]
+    assert progress[0]["events_by_day"] == {day.isoformat(): 2, (day + timedelta(days=1)).isoformat(): 1}
+    assert [line["seq"] for line in lines[:-1]] == list(range(1, len(lines)))
+    assert lines[-1]["type"] == "result"
+
+    job = app_client.get(f"/admin/jobs/{job_id}", headers=HEADERS).json()["job"]
+    assert job["status"] == "completed"
+    assert job["progress"]["import"] == {"done": 2, "total": 2, "listed": 4, "inserted": 4, "updated": 0}
+    assert job["result"]["results"]["import"]["inserted"] == 4
+    assert job_id in [j["id"] for j in app_client.get("/admin/jobs", headers=HEADERS).json()["jobs"]]
+
+
+def test_cancel_stops_after_the_calendar_in_flight(app_client, calendars):
+    _, gcal = calendars
+    listing = threading.Event()
+    release = threading.Event()
+    original = gcal.list
+
+    def _slow_list(calendarId, pageToken=None, **params):
+        if calendarId == CAL_A and pageToken is None:
+            listing.set()
+            release.wait(5)
+        return original(calendarId, pageToken=pageToken, **params)
+
+    gcal.list = _slow_list
+    job_id = _start(app_client, "/admin/sync", {"mode": "import", "days": 5})
+    assert listing.wait(5)
+    resp = app_client.post(f"/admin/jobs/{job_id}/cancel", headers=HEADERS)
+    assert resp.status_code == 200
+    assert resp.json()["job"]["cancel_requested"] is True
+    release.set()
+
+    lines = _ndjson(app_client, job_id)
+    assert lines[-1]["job"]["status"] == "cancelled"
+    assert [line["status"] for line in lines if line["type"] == "status"] == ["running", "cancelled"]
+    # El calendario en curso se confirma; el siguiente ya no se lista.
+    assert gcal.list_calls == [CAL_A]
+    with Session(app_client.app.state.test_engine) as session:
+        ids = set(session.exec(select(ReservationDB.id)).all())
+    assert ids == {"gcal:ev-a1", "gcal:ev-a2", "gcal:ev-a3"}
+    assert app_client.post(f"/admin/jobs/{job_id}/cancel", headers=HEADERS).status_code == 409
+
+
+def test_background_conflicts_over_sse(app_client, calendars):
+    day, _ = calendars
+    with Session(app_client.app.state.test_engine) as session:
+        start = datetime.combine(day, datetime.min.time()).replace(hour=17)
+        session.add(ReservationDB(id="res-sin-evento", service_id="corte_cabello", professional_id="deinis", start=start, end=start + timedelta(minutes=30)))
+        session.commit()
+    job_id = _start(app_client, "/admin/conflicts", {"start": day.isoformat(), "days": 1})
+
+    with app_client.stream("GET", f"/admin/jobs/{job_id}/events", headers={**HEADERS, "Accept": "text/event-stream"}) as resp:
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        blocks = [block for block in resp.read().decode().split("\n\n") if block]
+    events = [dict(line.split(": ", 1) for line in block.splitlines()) for block in blocks]
+    diff = [json.loads(ev["data"]) for ev in events if ev["event"] == "progress"]
+    assert [(d["calendar"], d["missing"]) for d in diff] == [(CAL_A, 1), (CAL_B, 0)]
+    assert diff[0]["missing_by_day"] == {day.isoformat(): 1}
+    assert events[-1]["event"] == "result"
+    assert json.loads(events[-1]["data"])["job"]["result"]["missing_in_gcal"] == 1
+
+    # Reanudar con Last-Event-ID solo devuelve lo que falta.
+    last = events[-2]["id"]
+    with app_client.stream("GET", f"/admin/jobs/{job_id}/events?format=sse", headers={**HEADERS, "Last-Event-ID": last}) as resp:
+        assert [b for b in resp.read().decode().split("\n\n") if b][0].startswith("event: result")
+
+    assert app_client.get("/admin/jobs/no-existe", headers=HEADERS).status_code == 404
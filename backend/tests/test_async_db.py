@@ -0,0 +1,74 @@
+"""Capa async de BD: URL del driver, rutas calientes `async def` y freeBusy fuera del event loop."""
+
+from __future__ import annotations
+
+import inspect
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.db import to_async_url
+from app.services import logic
+
+HOT_ROUTES = {
+    ("POST", "/slots"),
+    ("POST", "/slots/days"),
+    ("GET", "/reservations"),
+    ("POST", "/reservations"),
+    ("GET", "/pros/overview"),
+    ("GET", "/pros/reservations"),
+}
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("sqlite:///data/pelubot.db", "sqlite+aiosqlite:///data/pelubot.db"),
+        ("sqlite+pysqlite:////tmp/x.db", "sqlite+aiosqlite:////tmp/x.db"),
+        ("postgresql://u:p@db:5432/pelubot", "postgresql+asyncpg://u:p@db:5432/pelubot"),
+        ("postgresql+psycopg2://u@db/pelubot", "postgresql+asyncpg://u@db/pelubot"),
+        ("postgres://u@db/pelubot", "postgresql+asyncpg://u@db/pelubot"),
+        ("mysql://u@db/pelubot", "mysql://u@db/pelubot"),
+    ],
+)
+def test_to_async_url(url, expected):
+    assert to_async_url(url) == expected
+
+
+def test_hot_routes_are_async(app_client):
+    endpoints = {
+        (method, route.path): route.endpoint
+        for route in app_client.app.routes
+        for method in getattr(route, "methods", ()) or ()
+    }
+    assert {key for key in HOT_ROUTES if inspect.iscoroutinefunction(endpoints[key])} == HOT_ROUTES
+
+
+def test_days_prefetch_gcal_busy_with_the_async_client(app_client, monkeypatch):
+    import app.api.routes as routes
+
+    day = date.today() + timedelta(days=21)
+    while day.weekday() != 0:
+        day += timedelta(days=1)
+    calls: list[tuple] = []
+
+    async def _fake_collect(pro_ids, start_date, end_date, use_gcal_override=None, **_kw):
+        calls.append((tuple(pro_ids), start_date, end_date))
+        midnight = datetime.combine(day, datetime.min.time())
+        return {"deinis": {day: [(midnight, midnight + timedelta(days=1))]}}
+
+    def _unexpected(*_args, **_kw):
+        raise AssertionError("la ruta async no debe usar el freeBusy bloqueante")
+
+    monkeypatch.setattr(logic, "professionals_using_gcal", lambda **_kw: {"deinis": True})
+    monkeypatch.setattr(routes, "collect_gcal_busy_for_range_async", _fake_collect)
+    monkeypatch.setattr(logic, "collect_gcal_busy_for_range", _unexpected)
+
+    resp = app_client.post(
+        "/slots/days",
+        json={"service_id": "corte_cabello", "start": day.isoformat(), "end": (day + timedelta(days=1)).isoformat(), "professional_id": "deinis"},
+    )
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["available_days"] == [(day + timedelta(days=1)).isoformat()]
+    # Una sola consulta para todo el rango.
+    assert calls == [(("deinis",), day, day + timedelta(days=1))]
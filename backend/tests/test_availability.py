@@ -0,0 +1,267 @@
+"""Pruebas del motor de disponibilidad (`find_available_slots`)."""
+
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+import pytest
+
+import app.data as data
+from app.data import WEEKLY_SCHEDULE, get_schedule_ranges, get_slot_grid, invalidate_catalog_cache
+from app.models import ReservationDB, StylistDB, StylistScheduleDB, StylistScheduleExceptionDB
+from app.services.availability_cache import availability_cache, invalidate_availability
+from app.services.logic import _fits_in_schedule, find_available_days, find_available_slots
+
+
+def _next_weekday(days_ahead: int = 20) -> date:
+    d = date.today() + timedelta(days=days_ahead)
+    while d.weekday() >= 5:
+        d += timedelta(days=1)
+    return d
+
+
+def _add_reservation(engine, rid: str, start: datetime, minutes: int = 30, status: str = "confirmada") -> None:
+    with Session(engine) as session:
+        session.add(
+            ReservationDB(
+                id=rid,
+                service_id="corte_cabello",
+                professional_id="deinis",
+                start=start,
+                end=start + timedelta(minutes=minutes),
+                status=status,
+            )
+        )
+        session.commit()
+    # Escribimos sin pasar por la API: invalidamos como haría cualquier ruta de escritura.
+    invalidate_availability("deinis", start, start + timedelta(minutes=minutes))
+
+
+def test_slots_skip_busy_intervals_and_ignore_cancelled(app_client):
+    engine = app_client.app.state.test_engine
+    target = _next_weekday()
+    _add_reservation(engine, "busy-1", datetime.combine(target, time(10, 0)))
+    _add_reservation(engine, "busy-2", datetime.combine(target, time(10, 30)), minutes=45)
+    _add_reservation(engine, "cancelled-1", datetime.combine(target, time(17, 0)), status="cancelada")
+
+    with Session(engine) as session:
+        slots = find_available_slots(session, "corte_cabello", target, "deinis", use_gcal_busy_override=False)
+
+    hours = {dt.time() for dt in slots}
+    # [10:00, 11:15) ocupado: ningún corte de 30 min puede empezar entre 09:45 y 11:00.
+    for blocked in (time(9, 45), time(10, 0), time(10, 30), time(11, 0)):
+        assert blocked not in hours
+    assert time(9, 30) in hours
+    assert time(11, 15) in hours
+    assert time(17, 0) in hours
+
+
+def test_slots_issue_single_reservation_query(app_client):
+    engine = app_client.app.state.test_engine
+    target = _next_weekday()
+    _add_reservation(engine, "busy-q", datetime.combine(target, time(12, 0)))
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        with Session(engine) as session:
+            slots = find_available_slots(session, "corte_cabello", target, "deinis", use_gcal_busy_override=False)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert slots
+    reservation_queries = [s for s in statements if "FROM reservationdb" in s]
+    assert len(reservation_queries) == 1
+
+
+def test_days_availability_matches_per_day_slots(app_client):
+    engine = app_client.app.state.test_engine
+    start = _next_weekday(days_ahead=10)
+    end = start + timedelta(days=9)
+    # Llenamos el primer día por completo para que desaparezca del resultado.
+    with Session(engine) as session:
+        full_day = find_available_slots(session, "corte_cabello", start, "deinis", use_gcal_busy_override=False)
+    for idx, slot in enumerate(full_day):
+        if idx % 2 == 0:
+            _add_reservation(engine, f"fill-{idx}", slot)
+
+    with Session(engine) as session:
+        expected = [
+            (start + timedelta(days=i)).isoformat()
+            for i in range((end - start).days + 1)
+            if find_available_slots(
+                session, "corte_cabello", start + timedelta(days=i), "deinis", use_gcal_busy_override=False
+            )
+        ]
+
+    resp = app_client.post(
+        "/slots/days",
+        json={"service_id": "corte_cabello", "start": start.isoformat(), "end": end.isoformat(), "professional_id": "deinis"},
+    )
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert start.isoformat() not in body["available_days"]
+    assert body["available_days"] == expected
+
+
+def test_slots_cache_hits_and_invalidates_on_writes(app_client):
+    engine = app_client.app.state.test_engine
+    target = _next_weekday(days_ahead=12)
+    body = {"service_id": "corte_cabello", "date_str": target.isoformat(), "professional_id": "deinis"}
+
+    first = app_client.post("/slots", json=body)
+    assert first.status_code == 200, first.text
+    assert len(availability_cache) > 0
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        second = app_client.post("/slots", json=body)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    assert second.json() == first.json()
+    assert not [s for s in statements if "FROM reservationdb" in s]
+
+    slot = first.json()["slots"][0]
+    created = app_client.post(
+        "/reservations",
+        headers={"X-API-Key": "test-api-key"},
+        json={
+            "service_id": "corte_cabello",
+            "professional_id": "deinis",
+            "start": slot,
+            "customer_name": "Cliente Caché",
+            "customer_phone": "+34600000000",
+        },
+    )
+    assert created.status_code == 200, created.text
+    after_create = app_client.post("/slots", json=body).json()["slots"]
+    assert slot not in after_create
+
+    rid = created.json()["reservation_id"]
+    cancelled = app_client.post(
+        "/cancel_reservation",
+        json={"reservation_id": rid},
+        headers={"X-API-Key": "test-api-key"},
+    )
+    assert cancelled.status_code == 200, cancelled.text
+    after_cancel = app_client.post("/slots", json=body).json()["slots"]
+    assert slot in after_cancel
+
+    metrics = app_client.get("/metrics").text
+    assert "pelubot_availability_cache_hits_total" in metrics
+    assert "pelubot_availability_cache_evictions_total" in metrics
+
+
+def test_slot_grid_matches_schedule_and_rebuilds_on_catalog_change():
+    for weekday, ranges in WEEKLY_SCHEDULE.items():
+        for duration in (15, 30, 45):
+            expected = []
+            for start_t, end_t in ranges:
+                cursor = start_t.hour * 60 + start_t.minute
+                while cursor + duration <= end_t.hour * 60 + end_t.minute:
+                    expected.append(cursor)
+                    cursor += 15
+            assert list(get_slot_grid(get_schedule_ranges(weekday), duration, 15)) == expected
+
+    grid = get_slot_grid(get_schedule_ranges(0), 30, 15)
+    assert get_slot_grid(get_schedule_ranges(0), 30, 15) is grid
+    invalidate_catalog_cache()
+    rebuilt = get_slot_grid(get_schedule_ranges(0), 30, 15)
+    assert rebuilt is not grid
+    assert list(rebuilt) == list(grid)
+
+
+@pytest.fixture()
+def catalog_engine(app_client, monkeypatch):
+    """Hace que el catálogo (estilistas y horarios) se lea de la BD del test."""
+    engine = app_client.app.state.test_engine
+    monkeypatch.setattr(data, "engine", engine)
+    invalidate_catalog_cache()
+    yield engine
+    invalidate_catalog_cache()
+
+
+def test_per_professional_schedule_and_exceptions(catalog_engine):
+    monday = _next_weekday(days_ahead=14)
+    while monday.weekday() != 0:
+        monday += timedelta(days=1)
+    holiday = monday + timedelta(days=7)
+    with Session(catalog_engine) as session:
+        session.add(StylistDB(id="ana", name="Ana", password_hash="x", services=["corte_cabello"]))
+        session.add(StylistDB(id="deinis", name="Deinis", password_hash="x", services=["corte_cabello"]))
+        session.add(StylistScheduleDB(professional_id="ana", weekday=0, start_time=time(10, 0), end_time=time(11, 0)))
+        session.add(StylistScheduleExceptionDB(professional_id="ana", on_date=holiday, note="Vacaciones"))
+        session.commit()
+    invalidate_catalog_cache()
+
+    with Session(catalog_engine) as session:
+        slots = find_available_slots(session, "corte_cabello", monday, "ana", use_gcal_busy_override=False)
+        assert [dt.time() for dt in slots] == [time(10, 0), time(10, 15), time(10, 30)]
+        # Ana no trabaja los martes ni el lunes festivo; Deinis mantiene el horario general.
+        assert find_available_slots(session, "corte_cabello", monday + timedelta(days=1), "ana", use_gcal_busy_override=False) == []
+        assert find_available_slots(session, "corte_cabello", holiday, "ana", use_gcal_busy_override=False) == []
+        assert time(17, 0) in {dt.time() for dt in find_available_slots(session, "corte_cabello", holiday, use_gcal_busy_override=False)}
+        days = find_available_days(session, "corte_cabello", monday, holiday, "ana", use_gcal_busy_override=False)
+        assert days == [monday]
+
+    # Con el catálogo en caché, el horario no añade consultas al cálculo de huecos.
+    availability_cache.clear()
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(catalog_engine, "before_cursor_execute", _record)
+    try:
+        with Session(catalog_engine) as session:
+            find_available_slots(session, "corte_cabello", monday, "ana", use_gcal_busy_override=False)
+    finally:
+        event.remove(catalog_engine, "before_cursor_execute", _record)
+    assert len(statements) == 1 and "FROM reservationdb" in statements[0]
+
+    assert _fits_in_schedule(datetime.combine(monday, time(10, 30)), 30, "ana")
+    assert not _fits_in_schedule(datetime.combine(monday, time(10, 45)), 30, "ana")
+    assert _fits_in_schedule(datetime.combine(monday, time(10, 45)), 30, "deinis")
+
+
+def test_slots_cache_key_tracks_who_works_each_range(catalog_engine):
+    monday = _next_weekday(days_ahead=15)
+    while monday.weekday() != 0:
+        monday += timedelta(days=1)
+    with Session(catalog_engine) as session:
+        for pid in ("ana", "bea", "carla"):
+            session.add(StylistDB(id=pid, name=pid.title(), password_hash="x", services=["corte_cabello"]))
+        session.add(StylistScheduleDB(professional_id="ana", weekday=0, start_time=time(10, 0), end_time=time(11, 0)))
+        session.add(StylistScheduleDB(professional_id="bea", weekday=0, start_time=time(10, 0), end_time=time(11, 0)))
+        session.add(StylistScheduleDB(professional_id="carla", weekday=0, start_time=time(16, 0), end_time=time(17, 0)))
+        start = datetime.combine(monday, time(10, 0))
+        session.add(ReservationDB(id="ana-10", service_id="corte_cabello", professional_id="ana", start=start, end=start + timedelta(minutes=30)))
+        session.commit()
+    invalidate_catalog_cache()
+
+    with Session(catalog_engine) as session:
+        before = find_available_slots(session, "corte_cabello", monday, use_gcal_busy_override=False)
+    assert time(10, 0) in {dt.time() for dt in before}
+
+    # Bea pasa a la tarde: los rangos del día son los mismos, pero a las 10:00 solo queda Ana (ocupada).
+    with Session(catalog_engine) as session:
+        row = session.exec(select(StylistScheduleDB).where(StylistScheduleDB.professional_id == "bea")).one()
+        row.start_time, row.end_time = time(16, 0), time(17, 0)
+        session.add(row)
+        session.commit()
+    # El catálogo se recarga al caducar su TTL, sin vaciar la caché de disponibilidad.
+    data._catalog_state["expires_at"] = 0.0
+
+    with Session(catalog_engine) as session:
+        after = find_available_slots(session, "corte_cabello", monday, use_gcal_busy_override=False)
+    assert time(10, 0) not in {dt.time() for dt in after}
@@ -0,0 +1,208 @@
+"""Pruebas del motor de diferencias BD ↔ Google Calendar (reconciliación y conflictos)."""
+
+from __future__ import annotations
+
+import random
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from app.models import ReservationDB
+from app.services import logic
+from app.services.calendar_diff import _overlapping_rows, compute_calendar_diff
+
+CAL_A = "cal-a@group.calendar.google.com"
+CAL_B = "cal-b@group.calendar.google.com"
+TARGETS = {"deinis": CAL_A, "otro": CAL_B}
+
+
+class _Op:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class MultiCalendar:
+    """Calendarios falsos con eventos por calendario; registra las llamadas a `list`."""
+
+    page_size = 2
+
+    def __init__(self, barrier: threading.Barrier | None = None):
+        self.calendars: dict[str, dict[str, dict]] = {CAL_A: {}, CAL_B: {}}
+        self.list_calls: list[str] = []
+        self.barrier = barrier
+        self._next = 0
+
+    def add(self, cal: str, event_id: str, start: datetime, minutes: int = 30, rid: str | None = None) -> None:
+        event = {
+            "id": event_id,
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+        }
+        if rid:
+            event["extendedProperties"] = {"private": {"reservation_id": rid}}
+        self.calendars[cal][event_id] = event
+
+    def events(self):
+        return self
+
+    def list(self, calendarId, pageToken=None, **_params):
+        def _run():
+            if pageToken is None:
+                self.list_calls.append(calendarId)
+                if self.barrier is not None:
+                    # Solo pasa si los dos calendarios se piden a la vez.
+                    self.barrier.wait()
+            items = list(self.calendars[calendarId].values())
+            offset = int(pageToken or 0)
+            page = {"items": items[offset:offset + self.page_size]}
+            if offset + self.page_size < len(items):
+                page["nextPageToken"] = str(offset + self.page_size)
+            return page
+
+        return _Op(_run)
+
+    def insert(self, calendarId, body):
+        def _run():
+            self._next += 1
+            event_id = f"new-{self._next}"
+            self.calendars[calendarId][event_id] = {**body, "id": event_id}
+            return {"id": event_id}
+
+        return _Op(_run)
+
+    def patch(self, calendarId, eventId, body):
+        def _run():
+            self.calendars[calendarId][eventId].update(body)
+            return {"id": eventId}
+
+        return _Op(_run)
+
+    def delete(self, calendarId, eventId):
+        return _Op(lambda: self.calendars[calendarId].pop(eventId, None) and {})
+
+
+def _row(rid: str, pro: str, start: datetime, event_id: str | None = None, cal: str | None = None) -> ReservationDB:
+    return ReservationDB(
+        id=rid,
+        service_id="corte_cabello",
+        professional_id=pro,
+        start=start,
+        end=start + timedelta(minutes=30),
+        google_event_id=event_id,
+        google_calendar_id=cal,
+    )
+
+
+@pytest.fixture()
+def scenario(app_client):
+    day = date.today() + timedelta(days=3)
+    at = lambda hour: datetime.combine(day, datetime.min.time()).replace(hour=hour)  # noqa: E731
+    gcal = MultiCalendar()
+    gcal.add(CAL_A, "ev-ok", at(9), rid="res-ok")
+    gcal.add(CAL_A, "ev-moved-time", at(11), rid="res-moved-time")
+    gcal.add(CAL_B, "ev-wrong-cal", at(13), rid="res-wrong-cal")
+    gcal.add(CAL_B, "ev-ghost", at(15), rid="res-borrada")
+    gcal.add(CAL_B, "ev-external", at(16), minutes=60)
+    gcal.add(CAL_B, "ev-external-free", at(19))
+    gcal.add(CAL_B, "ev-busy", at(16) + timedelta(minutes=30), rid="res-busy")
+    with Session(app_client.app.state.test_engine) as session:
+        session.add(_row("res-ok", "deinis", at(9), "ev-ok", CAL_A))
+        session.add(_row("res-moved-time", "deinis", at(10), "ev-moved-time", CAL_A))
+        session.add(_row("res-no-event", "deinis", at(12)))
+        session.add(_row("res-wrong-cal", "deinis", at(13), "ev-wrong-cal", CAL_B))
+        session.add(_row("res-busy", "otro", at(16) + timedelta(minutes=30), "ev-busy", CAL_B))
+        session.commit()
+    return day, gcal
+
+
+def test_diff_classifies_both_sides_with_one_listing_per_calendar(app_client, scenario):
+    day, gcal = scenario
+    gcal.barrier = threading.Barrier(2, timeout=5)
+    with Session(app_client.app.state.test_engine) as session:
+        diff = compute_calendar_diff(
+            session,
+            [(CAL_A, "deinis"), (CAL_B, "otro")],
+            day,
+            day + timedelta(days=6),
+            build=lambda: gcal,
+            target_calendar=TARGETS.get,
+            tz="UTC",
+            max_workers=2,
+        )
+
+    assert diff.errors == {}
+    assert sorted(gcal.list_calls) == [CAL_A, CAL_B]
+    assert {(m.row.id, m.target_calendar, m.previous_calendar) for m in diff.missing} == {
+        ("res-no-event", CAL_A, None),
+        ("res-wrong-cal", CAL_A, CAL_B),
+    }
+    assert [(row.id, item["id"]) for row, item in diff.mismatched] == [("res-moved-time", "ev-moved-time")]
+    assert diff.orphaned == [("ev-ghost", "res-borrada", CAL_B)]
+    assert diff.overlaps == [("ev-external", "res-busy", CAL_B)]
+
+
+def test_failed_calendar_is_reported_and_its_rows_are_left_alone(app_client, scenario, monkeypatch):
+    day, gcal = scenario
+    original = gcal.list
+
+    def _list(calendarId, **params):
+        if calendarId == CAL_A:
+            raise RuntimeError("HttpError 500")
+        return original(calendarId, **params)
+
+    monkeypatch.setattr(gcal, "list", _list)
+    with Session(app_client.app.state.test_engine) as session:
+        diff = compute_calendar_diff(
+            session, [(CAL_A, "deinis"), (CAL_B, "otro")], day, day, build=lambda: gcal, target_calendar=TARGETS.get, tz="UTC"
+        )
+    assert set(diff.errors) == {CAL_A}
+    assert diff.missing == [] and diff.mismatched == []
+
+
+def test_reconcile_and_conflicts_use_the_shared_diff(app_client, scenario, monkeypatch):
+    day, gcal = scenario
+    monkeypatch.setattr(logic, "build_calendar", lambda: gcal)
+    monkeypatch.setattr(logic, "get_calendar_for_professional", lambda pro: TARGETS.get(pro, CAL_A))
+    monkeypatch.setattr(logic, "iter_professional_calendars", lambda: list(TARGETS.items()))
+
+    with Session(app_client.app.state.test_engine) as session:
+        conflicts = logic.detect_conflicts_range(session, day, day, tz="UTC")
+        assert (conflicts["missing_in_gcal"], conflicts["time_mismatch"], conflicts["orphaned_in_gcal"], conflicts["overlaps_external"]) == (2, 1, 1, 1)
+
+        result = logic.reconcile_db_to_gcal_range(session, day, day, tz="UTC")
+        assert (result["created"], result["patched"]) == (2, 1)
+        assert "ev-wrong-cal" not in gcal.calendars[CAL_B]
+        session.expire_all()
+        assert session.get(ReservationDB, "res-wrong-cal").google_calendar_id == CAL_A
+
+        after = logic.detect_conflicts_range(session, day, day, tz="UTC")
+        assert (after["missing_in_gcal"], after["time_mismatch"]) == (0, 0)
+        assert logic.reconcile_db_to_gcal_range(session, day, day, tz="UTC")["created"] == 0
+
+
+def test_sweep_matches_pairwise_overlap_check():
+    rng = random.Random(7)
+    base = datetime(2030, 1, 7, 9)
+    rows = []
+    for idx in range(60):
+        start = base + timedelta(minutes=rng.randrange(0, 600, 5))
+        row = ReservationDB(id=f"r{idx}", service_id="s", professional_id="p", start=start, end=start + timedelta(minutes=rng.choice([15, 30, 90])), google_event_id=f"e{idx}" if idx % 4 == 0 else None)
+        rows.append((row.start, row.end, row))
+    events = []
+    for idx in range(80):
+        start = base + timedelta(minutes=rng.randrange(0, 600, 5))
+        events.append((start, start + timedelta(minutes=rng.choice([10, 45, 120])), f"e{idx}"))
+
+    found = _overlapping_rows(events, rows)
+
+    for ev_start, ev_end, ev_id in events:
+        expected = any(r.google_event_id != ev_id and not (ev_end <= s or ev_start >= e) for s, e, r in rows)
+        assert (ev_id in found) is expected
+        if expected:
+            row = found[ev_id]
+            assert row.google_event_id != ev_id and row.start < ev_end and row.end > ev_start
@@ -0,0 +1,134 @@
+"""Pruebas del worker de Google Calendar en modo lote concurrente."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import CalendarSyncWorker
+
+CAL = "cal-batch@group.calendar.google.com"
+
+
+def _seed(engine, count: int) -> list[str]:
+    start = datetime.now(timezone.utc) + timedelta(days=3)
+    ids = [f"res-batch-{i}" for i in range(count)]
+    with Session(engine) as session:
+        for idx, rid in enumerate(ids):
+            session.add(
+                ReservationDB(
+                    id=rid,
+                    service_id="corte_cabello",
+                    professional_id="deinis",
+                    start=start + timedelta(hours=idx),
+                    end=start + timedelta(hours=idx, minutes=30),
+                )
+            )
+        session.commit()
+        for rid in ids:
+            _add_job(session, rid, "create")
+        session.commit()
+    return ids
+
+
+def _add_job(session: Session, reservation_id: str, action: str) -> None:
+    # Insertamos directamente: `enqueue_calendar_job` refresca métricas con el engine global.
+    session.add(CalendarSyncJobDB(reservation_id=reservation_id, action=action, payload={"calendar_id": CAL}))
+
+
+def _worker(engine, **kwargs) -> CalendarSyncWorker:
+    worker = CalendarSyncWorker(poll_interval=0.1, **kwargs)
+    worker._engine = engine
+    worker.worker_id = "test-batch"
+    return worker
+
+
+def test_batch_claims_runs_concurrently_and_commits_once(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    ids = _seed(engine, 6)
+    with Session(engine) as session:
+        # create + update de la misma reserva en un lote: se fusionan en una sola llamada.
+        _add_job(session, ids[0], "update")
+        session.commit()
+
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    calls: list[tuple[str, str]] = []
+
+    async def _slow_create(reservation, calendar_id=None, tz="Europe/Madrid"):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            calls.append(("create", reservation.id))
+        await asyncio.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return {"id": f"evt-{reservation.id}"}
+
+    async def _patch(event_id, start, end, calendar_id, tz="Europe/Madrid"):
+        calls.append(("patch", event_id))
+        return {"id": event_id}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _slow_create)
+    monkeypatch.setattr(calendar_queue, "patch_gcal_reservation_async", _patch)
+
+    commits: list[int] = []
+
+    def _record_commit(conn):
+        commits.append(1)
+
+    event.listen(engine, "commit", _record_commit)
+    try:
+        worker = _worker(engine, batch_size=10, concurrency=4)
+        assert worker._process_once() is True
+    finally:
+        event.remove(engine, "commit", _record_commit)
+    worker.stop()
+
+    assert active["max"] > 1
+    assert calls.count(("create", ids[0])) == 1
+    assert not [c for c in calls if c[0] == "patch"]
+    # Una transacción para reclamar y otra para guardar resultados.
+    assert len(commits) == 2
+
+    with Session(engine) as session:
+        jobs = session.exec(select(CalendarSyncJobDB).order_by(CalendarSyncJobDB.id)).all()
+        assert [job.status for job in jobs] == ["coalesced"] + ["completed"] * 6
+        assert all(job.attempts == 1 and job.locked_by is None for job in jobs)
+        for rid in ids:
+            row = session.get(ReservationDB, rid)
+            assert row.google_event_id == f"evt-{rid}"
+            assert row.google_calendar_id == CAL
+            assert row.sync_status == "synced"
+    assert worker._process_once() is False
+
+
+def test_batch_failures_are_rescheduled_individually(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    ids = _seed(engine, 3)
+
+    async def _create(reservation, calendar_id=None, tz="Europe/Madrid"):
+        if reservation.id == ids[1]:
+            raise RuntimeError("Error creando evento: 503")
+        return {"id": f"evt-{reservation.id}"}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _create)
+    worker = _worker(engine, batch_size=10, concurrency=2)
+    assert worker._process_once() is True
+    worker.stop()
+
+    with Session(engine) as session:
+        jobs = {job.reservation_id: job for job in session.exec(select(CalendarSyncJobDB)).all()}
+        assert jobs[ids[0]].status == "completed"
+        assert jobs[ids[2]].status == "completed"
+        failed = jobs[ids[1]]
+        assert failed.status == "pending" and failed.attempts == 1
+        assert "503" in (failed.last_error or "")
+        row = session.get(ReservationDB, ids[1])
+        assert row.sync_status == "queued" and row.google_event_id is None
@@ -0,0 +1,118 @@
+"""Pruebas de la fusión de trabajos pendientes por reserva en la cola de Google Calendar."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import CalendarSyncWorker, enqueue_calendar_job
+
+CAL = "cal-coalesce@group.calendar.google.com"
+
+
+@pytest.fixture()
+def queue_engine(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    # `enqueue_calendar_job` refresca las métricas con el engine del módulo.
+    monkeypatch.setattr(calendar_queue, "engine", engine)
+    with Session(engine) as session:
+        start = datetime.now(timezone.utc) + timedelta(days=2)
+        session.add(
+            ReservationDB(
+                id="res-co",
+                service_id="corte_cabello",
+                professional_id="deinis",
+                start=start,
+                end=start + timedelta(minutes=30),
+            )
+        )
+        session.commit()
+    return engine
+
+
+def _coalesced_total(stage: str) -> float:
+    return calendar_queue.QUEUE_JOB_COALESCED.labels(stage=stage)._value.get()
+
+
+def _jobs(engine) -> list[CalendarSyncJobDB]:
+    with Session(engine) as session:
+        return session.exec(select(CalendarSyncJobDB).order_by(CalendarSyncJobDB.id)).all()
+
+
+def test_updates_merge_into_pending_create(queue_engine):
+    before = _coalesced_total("enqueue")
+    with Session(queue_engine) as session:
+        created = enqueue_calendar_job(session, reservation_id="res-co", action="create", payload={"calendar_id": CAL})
+        first = enqueue_calendar_job(session, reservation_id="res-co", action="update", payload={"event_id": None})
+        second = enqueue_calendar_job(
+            session, reservation_id="res-co", action="update", payload={"calendar_id": "otro@calendar"}
+        )
+
+    assert created.id == first.id == second.id
+    [job] = _jobs(queue_engine)
+    assert job.action == "create" and job.status == "pending"
+    assert job.payload["calendar_id"] == "otro@calendar"
+    assert _coalesced_total("enqueue") - before == 2
+
+
+def test_delete_cancels_pending_create_without_api_calls(queue_engine, monkeypatch):
+    calls: list[str] = []
+
+    def _record(name):
+        async def _call(*args, **kwargs):
+            calls.append(name)
+
+        return _call
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _record("create"))
+    monkeypatch.setattr(calendar_queue, "patch_gcal_reservation_async", _record("patch"))
+    monkeypatch.setattr(calendar_queue, "delete_gcal_reservation_async", _record("delete"))
+
+    with Session(queue_engine) as session:
+        enqueue_calendar_job(session, reservation_id="res-co", action="create", payload={"calendar_id": CAL})
+        enqueue_calendar_job(session, reservation_id="res-co", action="update", payload={"calendar_id": CAL})
+        delete_job = enqueue_calendar_job(
+            session, reservation_id="res-co", action="delete", payload={"drop_calendar": False}
+        )
+        again = enqueue_calendar_job(session, reservation_id="res-co", action="delete", payload={"drop_calendar": True})
+    assert again.id == delete_job.id
+    assert [(job.action, job.status) for job in _jobs(queue_engine)] == [("create", "coalesced"), ("delete", "pending")]
+
+    worker = CalendarSyncWorker(poll_interval=0.1)
+    worker._engine = queue_engine
+    assert worker._process_once() is True
+    assert calls == []
+    assert [job.status for job in _jobs(queue_engine)] == ["coalesced", "completed"]
+
+
+def test_claim_coalesces_updates_inserted_directly(queue_engine, monkeypatch):
+    patched: list[str] = []
+
+    async def _patch(event_id, *args, **kwargs):
+        patched.append(event_id)
+
+    monkeypatch.setattr(calendar_queue, "patch_gcal_reservation_async", _patch)
+    with Session(queue_engine) as session:
+        reservation = session.get(ReservationDB, "res-co")
+        reservation.google_event_id = "evt-co"
+        reservation.google_calendar_id = CAL
+        session.add(reservation)
+        # Filas insertadas sin pasar por `enqueue_calendar_job` (p. ej. otro proceso o SQL manual).
+        for _ in range(3):
+            session.add(CalendarSyncJobDB(reservation_id="res-co", action="update", payload={}))
+        session.commit()
+
+    before = _coalesced_total("claim")
+    worker = CalendarSyncWorker(poll_interval=0.1, batch_size=10)
+    worker._engine = queue_engine
+    assert worker._process_once() is True
+
+    assert patched == ["evt-co"]
+    assert [job.status for job in _jobs(queue_engine)] == ["coalesced", "coalesced", "completed"]
+    assert _coalesced_total("claim") - before == 2
+    with Session(queue_engine) as session:
+        assert session.get(ReservationDB, "res-co").sync_status == "synced"
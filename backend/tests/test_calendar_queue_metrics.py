@@ -0,0 +1,123 @@
+"""Pruebas de las métricas incrementales y la retención de la cola de Google Calendar."""
+
+from __future__ import annotations
+
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import CalendarSyncJobArchiveDB, CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import (
+    CalendarSyncWorker,
+    archive_calendar_jobs,
+    enqueue_calendar_job,
+    refresh_queue_metrics,
+)
+
+
+@pytest.fixture()
+def queue_engine(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    monkeypatch.setattr(calendar_queue, "engine", engine)
+    with Session(engine) as session:
+        start = datetime.now(timezone.utc) + timedelta(days=3)
+        for idx in range(3):
+            session.add(
+                ReservationDB(
+                    id=f"res-m{idx}",
+                    service_id="corte_cabello",
+                    professional_id="deinis",
+                    start=start + timedelta(hours=idx),
+                    end=start + timedelta(hours=idx, minutes=30),
+                )
+            )
+        session.commit()
+    refresh_queue_metrics(engine, force=True)
+    return engine
+
+
+def _gauges() -> tuple[float, float]:
+    return (
+        calendar_queue.QUEUE_PENDING_GAUGE._value.get(),
+        calendar_queue.QUEUE_PROCESSING_GAUGE._value.get(),
+    )
+
+
+def test_transitions_update_gauges_without_count_queries(queue_engine, monkeypatch):
+    event_ids = itertools.count(1)
+
+    async def _create(*args, **kwargs):
+        return {"id": f"evt-m{next(event_ids)}"}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _create)
+    statements: list[str] = []
+
+    def _capture(conn, cursor, statement, *args):
+        statements.append(statement.lower())
+
+    event.listen(queue_engine, "before_cursor_execute", _capture)
+    try:
+        with Session(queue_engine) as session:
+            for idx in range(3):
+                enqueue_calendar_job(
+                    session, reservation_id=f"res-m{idx}", action="create", payload={"calendar_id": "cal@m"}
+                )
+        assert _gauges() == (3, 0)
+        assert refresh_queue_metrics() == (3, 0)
+
+        worker = CalendarSyncWorker(poll_interval=0.1, batch_size=2)
+        worker._engine = queue_engine
+        assert worker._process_once() is True
+        assert _gauges() == (1, 0)
+        assert worker._process_once() is True
+        assert worker._process_once() is False
+        assert _gauges() == (0, 0)
+    finally:
+        event.remove(queue_engine, "before_cursor_execute", _capture)
+
+    assert not [stmt for stmt in statements if "count(" in stmt]
+
+
+def test_reconciliation_picks_up_rows_from_other_processes(queue_engine):
+    with Session(queue_engine) as session:
+        session.add(CalendarSyncJobDB(reservation_id="res-m0", action="update", payload={}))
+        session.add(CalendarSyncJobDB(reservation_id="res-m1", action="update", status="processing", payload={}))
+        session.commit()
+
+    assert refresh_queue_metrics(queue_engine) == (0, 0)
+    assert refresh_queue_metrics(queue_engine, force=True) == (1, 1)
+    assert _gauges() == (1, 1)
+
+
+def test_archive_moves_only_old_finished_jobs(queue_engine):
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=40)
+    with Session(queue_engine) as session:
+        for idx in range(5):
+            session.add(
+                CalendarSyncJobDB(
+                    reservation_id="res-m0",
+                    action="create",
+                    status="completed" if idx < 4 else "coalesced",
+                    payload={"calendar_id": "cal@m", "n": idx},
+                    completed_at=old,
+                )
+            )
+        session.add(CalendarSyncJobDB(reservation_id="res-m1", action="create", status="completed", completed_at=now))
+        session.add(CalendarSyncJobDB(reservation_id="res-m2", action="create", status="failed", updated_at=old))
+        session.add(CalendarSyncJobDB(reservation_id="res-m2", action="update", status="pending"))
+        session.commit()
+
+    assert archive_calendar_jobs(queue_engine, older_than_days=30, batch_size=2, now=now) == 5
+
+    with Session(queue_engine) as session:
+        remaining = session.exec(select(CalendarSyncJobDB.status).order_by(CalendarSyncJobDB.id)).all()
+        archived = session.exec(select(CalendarSyncJobArchiveDB).order_by(CalendarSyncJobArchiveDB.id)).all()
+    assert remaining == ["completed", "failed", "pending"]
+    assert [job.payload["n"] for job in archived] == [0, 1, 2, 3, 4]
+    assert all(job.archived_at is not None for job in archived)
+    assert archive_calendar_jobs(queue_engine, older_than_days=30, now=now) == 0
@@ -0,0 +1,157 @@
+"""Pruebas de reclamo atómico y leases de la cola de Google Calendar con varios procesos."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import update
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import CalendarSyncWorker
+
+CAL = "cal-mp@group.calendar.google.com"
+
+
+def _file_engine(db_path: Path):
+    return create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+
+
+def _seed(engine, n_jobs: int) -> list[str]:
+    start = datetime.now(timezone.utc) + timedelta(days=4)
+    ids = [f"res-mp-{idx:04d}" for idx in range(n_jobs)]
+    with Session(engine) as session:
+        for idx, rid in enumerate(ids):
+            session.add(
+                ReservationDB(
+                    id=rid,
+                    service_id="corte_cabello",
+                    professional_id="deinis",
+                    start=start + timedelta(minutes=30 * idx),
+                    end=start + timedelta(minutes=30 * idx + 30),
+                )
+            )
+            session.add(CalendarSyncJobDB(reservation_id=rid, action="create", payload={"calendar_id": CAL}))
+        session.commit()
+    return ids
+
+
+@pytest.fixture()
+def file_engine(tmp_path):
+    engine = _file_engine(tmp_path / "queue.db")
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL;")
+    yield engine
+    engine.dispose()
+
+
+def _drain_in_process(db_path: str, log_path: str, ready, go) -> None:
+    """Proceso hijo: un worker independiente drena la cola compartida y anota cada llamada a Google."""
+    engine = _file_engine(Path(db_path))
+
+    async def _create(reservation, calendar_id=None, tz=None):
+        with open(log_path, "a", encoding="utf-8") as fh:
+            fh.write(f"{reservation.id}\n")
+        await asyncio.sleep(0.002)
+        return {"id": f"evt-{reservation.id}"}
+
+    calendar_queue.create_gcal_reservation_async = _create
+    worker = CalendarSyncWorker(poll_interval=0.05, batch_size=7, concurrency=2)
+    worker._engine = engine
+    ready.set()
+    go.wait(30)
+    idle = 0
+    while idle < 5:
+        if worker._process_once():
+            idle = 0
+        else:
+            idle += 1
+            time.sleep(0.05)
+    worker.stop()
+
+
+def test_concurrent_processes_never_run_a_job_twice(file_engine, tmp_path):
+    ids = _seed(file_engine, 240)
+    ctx = multiprocessing.get_context("spawn")
+    go = ctx.Event()
+    procs, readies, logs = [], [], []
+    for idx in range(4):
+        ready = ctx.Event()
+        log_path = tmp_path / f"worker-{idx}.log"
+        proc = ctx.Process(
+            target=_drain_in_process,
+            args=(str(tmp_path / "queue.db"), str(log_path), ready, go),
+        )
+        proc.start()
+        procs.append(proc)
+        readies.append(ready)
+        logs.append(log_path)
+    for ready in readies:
+        assert ready.wait(60)
+    go.set()
+    for proc in procs:
+        proc.join(120)
+        assert proc.exitcode == 0
+
+    per_worker = [log.read_text().split() if log.exists() else [] for log in logs]
+    calls = Counter(rid for lines in per_worker for rid in lines)
+    assert sorted(calls) == ids
+    assert max(calls.values()) == 1
+    assert sum(1 for lines in per_worker if lines) >= 2
+
+    with Session(file_engine) as session:
+        statuses = Counter(session.exec(select(CalendarSyncJobDB.status)).all())
+        assert statuses == {"completed": len(ids)}
+        owners = set(session.exec(select(CalendarSyncJobDB.locked_by)).all())
+        assert owners == {None}
+
+
+def test_heartbeat_renews_lease_during_long_calls(file_engine, monkeypatch):
+    _seed(file_engine, 1)
+    seen: list[datetime] = []
+
+    async def _slow_create(reservation, calendar_id=None, tz=None):
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            with Session(file_engine) as session:
+                seen.append(session.exec(select(CalendarSyncJobDB.heartbeat_at)).one())
+        return {"id": "evt-slow"}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _slow_create)
+    worker = CalendarSyncWorker(poll_interval=0.1)
+    worker._engine = file_engine
+    worker._heartbeat_seconds = 0.05
+    assert worker._process_once() is True
+
+    assert len(set(seen)) >= 2
+    with Session(file_engine) as session:
+        assert session.exec(select(CalendarSyncJobDB.status)).one() == "completed"
+
+
+def test_result_is_dropped_when_lease_was_taken_over(file_engine, monkeypatch):
+    [rid] = _seed(file_engine, 1)
+
+    async def _create_while_recovered(reservation, calendar_id=None, tz=None):
+        # Otro nodo da el lease por caducado y vuelve a reclamar el trabajo mientras tanto.
+        with Session(file_engine) as session:
+            session.execute(update(CalendarSyncJobDB).values(locked_by="otro-nodo:1:abcd"))
+            session.commit()
+        return {"id": "evt-late"}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _create_while_recovered)
+    worker = CalendarSyncWorker(poll_interval=0.1)
+    worker._engine = file_engine
+    assert worker._process_once() is True
+
+    with Session(file_engine) as session:
+        job = session.exec(select(CalendarSyncJobDB)).one()
+        assert job.status == "processing" and job.locked_by == "otro-nodo:1:abcd"
+        assert session.get(ReservationDB, rid).google_event_id is None
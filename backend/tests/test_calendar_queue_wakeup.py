@@ -0,0 +1,135 @@
+"""Pruebas del despertar por eventos del worker de Google Calendar."""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import CalendarSyncWorker, enqueue_calendar_job, notify_queue
+
+
+@pytest.fixture()
+def idle_worker(app_client, monkeypatch):
+    """Worker en marcha con sondeo de 30 s: solo un aviso o un deadline lo despiertan a tiempo."""
+    engine = app_client.app.state.test_engine
+    monkeypatch.setattr(calendar_queue, "engine", engine)
+
+    async def _create(*args, **kwargs):
+        return {"id": "evt-wake"}
+
+    monkeypatch.setattr(calendar_queue, "create_gcal_reservation_async", _create)
+    with Session(engine) as session:
+        start = datetime.now(timezone.utc) + timedelta(days=1)
+        session.add(
+            ReservationDB(
+                id="res-wake",
+                service_id="corte_cabello",
+                professional_id="deinis",
+                start=start,
+                end=start + timedelta(minutes=30),
+            )
+        )
+        session.commit()
+    worker = CalendarSyncWorker(poll_interval=30)
+    worker._engine = engine
+    worker.start()
+    # Dejamos que complete la primera vuelta y se quede dormido.
+    time.sleep(0.2)
+    yield engine
+    worker.stop()
+
+
+def _wait_for_status(engine, job_id: int, status: str, timeout: float = 3.0) -> float:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        with Session(engine) as session:
+            job = session.get(CalendarSyncJobDB, job_id)
+            if job is not None and job.status == status:
+                return time.perf_counter() - t0
+        time.sleep(0.02)
+    raise AssertionError(f"El trabajo {job_id} no llegó a {status} en {timeout} s")
+
+
+def test_enqueue_wakes_idle_worker(idle_worker):
+    before = calendar_queue.QUEUE_JOB_START_LATENCY._sum.get()
+    with Session(idle_worker) as session:
+        job = enqueue_calendar_job(
+            session, reservation_id="res-wake", action="create", payload={"calendar_id": "cal@wake"}
+        )
+    elapsed = _wait_for_status(idle_worker, job.id, "completed")
+    assert elapsed < 1.5
+    assert calendar_queue.QUEUE_JOB_START_LATENCY._sum.get() >= before
+
+
+def test_worker_sleeps_until_next_available_at(idle_worker):
+    with Session(idle_worker) as session:
+        job = CalendarSyncJobDB(
+            reservation_id="res-wake",
+            action="create",
+            payload={"calendar_id": "cal@wake"},
+            available_at=datetime.now(timezone.utc) + timedelta(seconds=0.5),
+        )
+        session.add(job)
+        session.commit()
+        job_id = job.id
+    # Un solo aviso: el worker no encuentra nada vencido y duerme hasta el deadline.
+    notify_queue()
+    elapsed = _wait_for_status(idle_worker, job_id, "completed")
+    assert 0.3 <= elapsed < 2.0
+
+
+def test_idle_worker_backs_off_without_claiming(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    writes: list[str] = []
+
+    def _track(_conn, _cursor, statement, *_args):
+        if statement.lstrip().upper().startswith(("UPDATE", "INSERT", "DELETE")):
+            writes.append(statement)
+
+    worker = CalendarSyncWorker(poll_interval=0.05, max_idle_interval=0.2)
+    worker._engine = engine
+    # Sin mantenimiento ni recuperación de leases: solo el bucle de reclamo.
+    monkeypatch.setattr(worker, "_run_periodic", lambda: None)
+    timeouts: list[float] = []
+    idle_timeout = worker._idle_timeout
+    monkeypatch.setattr(worker, "_idle_timeout", lambda: timeouts.append(idle_timeout()) or timeouts[-1])
+    event.listen(engine, "before_cursor_execute", _track)
+    worker.start()
+    try:
+        time.sleep(0.8)
+    finally:
+        worker.stop()
+        event.remove(engine, "before_cursor_execute", _track)
+    # Cola vacía: solo lecturas, y el sondeo se espacia hasta el máximo.
+    assert writes == []
+    assert timeouts[:3] == pytest.approx([0.05, 0.1, 0.2])
+    assert max(timeouts) == pytest.approx(0.2)
+
+
+def test_first_attempt_latency_counts_from_enqueue(app_client):
+    engine = app_client.app.state.test_engine
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        session.add(
+            CalendarSyncJobDB(
+                reservation_id="res-lat",
+                action="create",
+                payload={},
+                created_at=now - timedelta(seconds=10),
+                available_at=now,
+            )
+        )
+        session.commit()
+    worker = CalendarSyncWorker(poll_interval=30)
+    worker._engine = engine
+    before = calendar_queue.QUEUE_JOB_START_LATENCY._sum.get()
+    with Session(engine) as session:
+        [job] = worker._claim_jobs(session, now + timedelta(seconds=1))
+    assert job.attempts == 1
+    assert calendar_queue.QUEUE_JOB_START_LATENCY._sum.get() - before >= 10
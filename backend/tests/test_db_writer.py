@@ -0,0 +1,140 @@
+"""Escritor único de SQLite: group commit, aislamiento de fallos y métricas."""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.core.metrics import DB_WRITE_BATCH_SIZE
+from app.db import DBWriter, run_after_commit, set_sqlite_query_only
+from app.models import ReservationDB
+
+START = datetime(2030, 1, 7, 9, 0)
+
+
+@pytest.fixture()
+def writer_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _insert(idx: int, fail: bool = False, after_commit=None):
+    def _fn(session: Session) -> str:
+        start = START + timedelta(minutes=30 * idx)
+        session.add(ReservationDB(id=f"w-{idx}", service_id="corte_cabello", professional_id="deinis", start=start, end=start + timedelta(minutes=30)))
+        if after_commit is not None:
+            run_after_commit(session, lambda: after_commit.append(idx))
+        session.flush()
+        if fail:
+            raise ValueError(f"fallo {idx}")
+        return f"w-{idx}"
+
+    return _fn
+
+
+def _batch_count() -> float:
+    return next(s.value for m in DB_WRITE_BATCH_SIZE.collect() for s in m.samples if s.name.endswith("_count"))
+
+
+def _stuck_writer(engine):
+    """Escritor con un primer lote bloqueado: lo que se encole mientras tanto va en el siguiente lote."""
+    writer = DBWriter(engine)
+    entered, release = threading.Event(), threading.Event()
+
+    def _block(_session: Session) -> None:
+        entered.set()
+        release.wait(5)
+
+    first = writer.submit(_block)
+    assert entered.wait(5)
+    return writer, first, release
+
+
+def test_concurrent_writes_share_one_commit(writer_engine):
+    commits: list[int] = []
+    event.listen(writer_engine, "commit", lambda _conn: commits.append(1))
+    writer, first, release = _stuck_writer(writer_engine)
+    batches_before = _batch_count()
+    try:
+        futures = [writer.submit(_insert(idx)) for idx in range(10)]
+        release.set()
+        assert [f.result(5) for f in futures] == [f"w-{idx}" for idx in range(10)]
+        first.result(5)
+    finally:
+        writer.close()
+    # Un commit para el lote bloqueado y otro para las diez reservas.
+    assert len(commits) == 2
+    assert _batch_count() - batches_before == 2
+    with Session(writer_engine) as session:
+        assert len(session.exec(select(ReservationDB)).all()) == 10
+
+
+def test_failed_write_only_rolls_back_itself(writer_engine):
+    writer, first, release = _stuck_writer(writer_engine)
+    ran: list[int] = []
+    try:
+        futures = [writer.submit(_insert(idx, fail=idx % 3 == 0, after_commit=ran)) for idx in range(6)]
+        release.set()
+        for idx, future in enumerate(futures):
+            if idx % 3 == 0:
+                with pytest.raises(ValueError, match=f"fallo {idx}"):
+                    future.result(5)
+            else:
+                assert future.result(5) == f"w-{idx}"
+        first.result(5)
+    finally:
+        writer.close()
+    with Session(writer_engine) as session:
+        assert sorted(session.exec(select(ReservationDB.id)).all()) == ["w-1", "w-2", "w-4", "w-5"]
+    # Las acciones post-commit de las transacciones descartadas no se ejecutan.
+    assert sorted(ran) == [1, 2, 4, 5]
+
+
+def test_failed_group_commit_retries_each_write_on_its_own(writer_engine):
+    def _reject_bad_row(session: Session) -> None:
+        # Solo el COMMIT del lote, no el RELEASE de cada SAVEPOINT.
+        if not session.in_nested_transaction() and session.get(ReservationDB, "w-2") is not None:
+            raise RuntimeError("commit rechazado")
+
+    writer, first, release = _stuck_writer(writer_engine)
+    event.listen(Session, "before_commit", _reject_bad_row)
+    try:
+        futures = [writer.submit(_insert(idx)) for idx in range(5)]
+        release.set()
+        first.result(5)
+        for idx, future in enumerate(futures):
+            if idx == 2:
+                with pytest.raises(RuntimeError, match="commit rechazado"):
+                    future.result(5)
+            else:
+                # Cada escritura recibe su propio resultado, no el error de la mala.
+                assert future.result(5) == f"w-{idx}"
+    finally:
+        event.remove(Session, "before_commit", _reject_bad_row)
+        writer.close()
+    with Session(writer_engine) as session:
+        assert sorted(session.exec(select(ReservationDB.id)).all()) == ["w-0", "w-1", "w-3", "w-4"]
+
+
+def test_read_pool_is_query_only(writer_engine, tmp_path):
+    reader = create_engine(f"sqlite:///{tmp_path / 'writer.db'}", connect_args={"check_same_thread": False})
+    event.listen(reader, "connect", set_sqlite_query_only)
+    writer = DBWriter(writer_engine)
+    try:
+        assert writer.run(_insert(1)) == "w-1"
+        with Session(reader) as session:
+            assert session.exec(select(ReservationDB.id)).all() == ["w-1"]
+            session.add(ReservationDB(id="ro", service_id="corte_cabello", professional_id="deinis", start=START, end=START))
+            with pytest.raises(Exception, match="readonly"):
+                session.commit()
+    finally:
+        writer.close()
+        reader.dispose()
@@ -0,0 +1,173 @@
+"""Pruebas de la caché compartida de free/busy de Google Calendar."""
+
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from app.integrations.google_calendar_async import AsyncCalendarClient, FakeCalendarBackend
+from app.services import freebusy_cache as fb
+from app.services import logic
+
+
+class CountingFreeBusyService:
+    """Servicio falso que devuelve siempre los mismos huecos ocupados y cuenta llamadas."""
+
+    def __init__(self, busy_by_calendar):
+        self.busy_by_calendar = busy_by_calendar
+        self.queries = []
+
+    def freebusy(self):
+        return self
+
+    def query(self, body):
+        self.queries.append(body)
+        self._body = body
+        return self
+
+    def execute(self):
+        items = [it["id"] for it in self._body.get("items", [])]
+        return {"calendars": {cid: {"busy": self.busy_by_calendar.get(cid, [])} for cid in items}}
+
+
+def _busy(day: date, start: time, end: time) -> dict:
+    return {
+        "start": datetime.combine(day, start).isoformat() + "+00:00",
+        "end": datetime.combine(day, end).isoformat() + "+00:00",
+    }
+
+
+def test_window_is_prefetched_once_and_sliced_per_day():
+    day = date(2030, 3, 4)
+    svc = CountingFreeBusyService({"cal-a": [_busy(day, time(9), time(10)), _busy(day + timedelta(days=3), time(9), time(10))]})
+    cache = fb.FreeBusyCache(window_days=14, ttl_seconds=60)
+
+    first = cache.busy_for(svc, ["cal-a"], day, day, tz="UTC")
+    later = cache.busy_for(svc, ["cal-a"], day + timedelta(days=3), day + timedelta(days=3), tz="UTC")
+    empty = cache.busy_for(svc, ["cal-a"], day + timedelta(days=1), day + timedelta(days=2), tz="UTC")
+
+    assert len(svc.queries) == 1
+    assert first["cal-a"] == [(datetime.combine(day, time(9)), datetime.combine(day, time(10)))]
+    assert later["cal-a"][0][0].date() == day + timedelta(days=3)
+    assert empty["cal-a"] == []
+
+    # Fuera de la ventana precargada hay que volver a preguntar.
+    cache.busy_for(svc, ["cal-a"], day + timedelta(days=20), day + timedelta(days=20), tz="UTC")
+    assert len(svc.queries) == 2
+
+
+class GatedFreeBusyService(CountingFreeBusyService):
+    """Las consultas de `slow_calendar` esperan a `release` (una respuesta lenta de Google)."""
+
+    def __init__(self, slow_calendar):
+        super().__init__({})
+        self.slow_calendar = slow_calendar
+        self.release = threading.Event()
+        self.slow_started = threading.Event()
+        self._local = threading.local()
+
+    def query(self, body):
+        self.queries.append(body)
+        self._local.body = body
+        return self
+
+    def execute(self):
+        body = self._local.body
+        items = [it["id"] for it in body.get("items", [])]
+        if self.slow_calendar in items:
+            self.slow_started.set()
+            assert self.release.wait(5)
+        return {"calendars": {cid: {"busy": []} for cid in items}}
+
+
+def test_slow_fetch_only_blocks_its_own_calendar():
+    day = date(2030, 3, 4)
+    svc = GatedFreeBusyService("cal-slow")
+    cache = fb.FreeBusyCache(window_days=7, ttl_seconds=60)
+    results = {}
+
+    def _slow(key):
+        results[key] = cache.busy_for(svc, ["cal-slow"], day, day, tz="UTC")
+
+    first = threading.Thread(target=_slow, args=("first",))
+    first.start()
+    assert svc.slow_started.wait(5)
+    # Otro calendario no espera a la descarga lenta.
+    assert cache.busy_for(svc, ["cal-fast"], day, day, tz="UTC") == {"cal-fast": []}
+    # El mismo calendario se suma a la descarga en curso en vez de repetirla.
+    second = threading.Thread(target=_slow, args=("second",))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()
+    svc.release.set()
+    first.join(5)
+    second.join(5)
+    assert results == {"first": {"cal-slow": []}, "second": {"cal-slow": []}}
+    slow_queries = [q for q in svc.queries if q["items"] == [{"id": "cal-slow"}]]
+    assert len(slow_queries) == 1
+
+
+def test_invalidation_and_ttl_force_refetch(monkeypatch):
+    day = date(2030, 3, 4)
+    svc = CountingFreeBusyService({})
+    cache = fb.FreeBusyCache(window_days=7, ttl_seconds=30)
+    clock = [1000.0]
+    monkeypatch.setattr(fb.time, "monotonic", lambda: clock[0])
+
+    cache.busy_for(svc, ["cal-a", "cal-b"], day, day, tz="UTC")
+    assert len(svc.queries) == 1
+
+    cache.invalidate("cal-a")
+    cache.busy_for(svc, ["cal-a", "cal-b"], day, day, tz="UTC")
+    assert len(svc.queries) == 2
+    assert [it["id"] for it in svc.queries[-1]["items"]] == ["cal-a"]
+
+    clock[0] += 31
+    cache.busy_for(svc, ["cal-a", "cal-b"], day, day, tz="UTC")
+    assert len(svc.queries) == 3
+
+
+def test_slots_use_shared_cache_and_worker_writes_invalidate(app_client, monkeypatch):
+    day = date.today() + timedelta(days=10)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    cal_id = logic.get_calendar_for_professional("deinis")
+    svc = CountingFreeBusyService({cal_id: [_busy(day, time(10), time(11))]})
+    monkeypatch.setattr(logic, "build_calendar", lambda: svc)
+    monkeypatch.setattr(logic, "TZ", "UTC")
+    monkeypatch.setattr(logic, "delete_event", lambda *args, **kwargs: None)
+
+    engine = app_client.app.state.test_engine
+    with Session(engine) as session:
+        slots = logic.find_available_slots(session, "corte_cabello", day, "deinis", use_gcal_busy_override=True)
+        logic.find_available_slots(session, "corte_cabello", day + timedelta(days=1), "deinis", use_gcal_busy_override=True)
+    hours = {dt.time() for dt in slots}
+    assert time(10, 0) not in hours and time(10, 30) not in hours
+    assert time(11, 0) in hours
+    assert len(svc.queries) == 1
+
+    logic.delete_gcal_reservation("evt-1", cal_id)
+    with Session(engine) as session:
+        logic.find_available_slots(session, "corte_cabello", day, "deinis", use_gcal_busy_override=True)
+    assert len(svc.queries) == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_fills_the_same_window():
+    day = date(2030, 3, 4)
+    backend = FakeCalendarBackend()
+    cache = fb.FreeBusyCache(window_days=14, ttl_seconds=60)
+    async with AsyncCalendarClient(transport=backend.transport(), retry_wait=0) as client:
+        await client.create_event("cal-a", datetime.combine(day, time(9)), datetime.combine(day, time(10)), "Cita", tz="UTC")
+        first = await cache.busy_for_async(client, ["cal-a"], day, day, tz="UTC")
+        later = await cache.busy_for_async(client, ["cal-a"], day + timedelta(days=2), day + timedelta(days=2), tz="UTC")
+
+    # La ventana descargada por el camino async sirve también al síncrono.
+    svc = CountingFreeBusyService({})
+    again = cache.busy_for(svc, ["cal-a"], day, day, tz="UTC")
+
+    assert first["cal-a"] == [(datetime.combine(day, time(9)), datetime.combine(day, time(10)))]
+    assert later["cal-a"] == []
+    assert again == first and svc.queries == []
+    assert [r.url.path for r in backend.requests].count("/calendar/v3/freeBusy") == 1
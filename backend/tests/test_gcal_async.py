@@ -0,0 +1,89 @@
+"""Pruebas del cliente asíncrono de Google Calendar contra el backend falso."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.integrations.google_calendar_async import (
+    AsyncCalendarClient,
+    AsyncCalendarError,
+    FakeCalendarBackend,
+)
+
+CAL = "peluqueria@group.calendar.google.com"
+
+
+def _client(backend: FakeCalendarBackend, **kwargs) -> AsyncCalendarClient:
+    return AsyncCalendarClient(transport=backend.transport(), retry_wait=0, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_crud_and_paginated_listing():
+    backend = FakeCalendarBackend()
+    start = datetime(2030, 5, 6, 9, 0)
+    async with _client(backend) as client:
+        created = [
+            await client.create_event(CAL, start + timedelta(hours=i), start + timedelta(hours=i, minutes=30), f"Cita {i}", tz="UTC")
+            for i in range(5)
+        ]
+        await client.patch_event(CAL, created[0]["id"], start, start + timedelta(minutes=45), tz="UTC")
+        await client.delete_event(CAL, created[4]["id"])
+        items = await client.list_events(CAL, start, start + timedelta(days=1), tz="UTC", page_size=2)
+
+        with pytest.raises(AsyncCalendarError) as excinfo:
+            await client.delete_event(CAL, created[4]["id"])
+        assert excinfo.value.status_code == 404
+
+    assert [ev["summary"] for ev in items] == ["Cita 0", "Cita 1", "Cita 2", "Cita 3"]
+    assert items[0]["end"]["dateTime"].startswith("2030-05-06T09:45")
+    list_requests = [r for r in backend.requests if r.method == "GET"]
+    assert len(list_requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_freebusy_reports_busy_per_calendar():
+    backend = FakeCalendarBackend()
+    start = datetime(2030, 5, 6, 10, 0)
+    async with _client(backend) as client:
+        await client.create_event(CAL, start, start + timedelta(minutes=30), "Cita", tz="UTC")
+        busy = await client.freebusy([CAL, "otro"], "2030-05-06T00:00:00", "2030-05-07T00:00:00", tz="UTC")
+    assert len(busy[CAL]) == 1 and busy[CAL][0]["start"].startswith("2030-05-06T10:00")
+    assert busy["otro"] == []
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_and_sends_token():
+    backend = FakeCalendarBackend()
+    backend.fail_next(503, times=2)
+
+    async def _token():
+        return "tok"
+
+    async with _client(backend, token_provider=_token, retries=2) as client:
+        await client.freebusy([CAL], "2030-05-06T00:00:00", "2030-05-07T00:00:00", tz="UTC")
+    assert len(backend.requests) == 3
+    assert all(r.headers["Authorization"] == "Bearer tok" for r in backend.requests)
+
+    backend.fail_next(400)
+    async with _client(backend, retries=3) as client:
+        with pytest.raises(AsyncCalendarError) as excinfo:
+            await client.freebusy([CAL], "2030-05-06T00:00:00", "2030-05-07T00:00:00", tz="UTC")
+    assert excinfo.value.status_code == 400
+    assert len(backend.requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_overlap():
+    backend = FakeCalendarBackend(latency=0.05)
+    start = datetime(2030, 5, 6, 9, 0)
+    async with _client(backend) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(client.create_event(CAL, start + timedelta(hours=i), start + timedelta(hours=i, minutes=30), "Cita", tz="UTC") for i in range(10))
+        )
+        elapsed = time.perf_counter() - t0
+    # En serie serían ~0.5 s; con el pool las peticiones se solapan.
+    assert elapsed < 0.3
+    assert len(backend.events[CAL]) == 10
@@ -0,0 +1,154 @@
+"""Pruebas de las peticiones batch de Google Calendar y su uso en la cola."""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session, select
+
+from app.integrations.google_calendar import delete_event_request, execute_batch, insert_event_request
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+from app.services.calendar_queue import CalendarSyncWorker
+
+CAL = "cal-batch@group.calendar.google.com"
+
+
+class _Op:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, backend: "BatchingBackend", callback):
+        self._backend = backend
+        self._callback = callback
+        self._ops: list[tuple[str, _Op]] = []
+
+    def add(self, request, request_id=None):
+        self._ops.append((request_id, request))
+
+    def execute(self):
+        with self._backend.lock:
+            self._backend.batches.append(len(self._ops))
+        for request_id, op in self._ops:
+            try:
+                self._callback(request_id, op.execute(), None)
+            except Exception as exc:  # noqa: BLE001 - igual que googleapiclient
+                self._callback(request_id, None, exc)
+
+
+class BatchingBackend:
+    """Servicio falso con soporte de `new_batch_http_request`, compartido entre hilos."""
+
+    def __init__(self, fail_reservations=()):
+        self.fail_reservations = set(fail_reservations)
+        self.stored: dict[str, dict] = {}
+        self.patched: list[str] = []
+        self.batches: list[int] = []
+        self.lock = threading.Lock()
+
+    def service(self):
+        return self
+
+    def events(self):
+        return self
+
+    def insert(self, calendarId, body):
+        def _run():
+            rid = body["extendedProperties"]["private"].get("reservation_id")
+            if rid in self.fail_reservations:
+                raise RuntimeError("HttpError 503 backendError")
+            event_id = f"evt-{rid}"
+            self.stored[event_id] = body
+            return {"id": event_id}
+
+        return _Op(_run)
+
+    def patch(self, calendarId, eventId, body):
+        return _Op(lambda: self.patched.append(eventId) or {"id": eventId})
+
+    def delete(self, calendarId, eventId):
+        def _run():
+            if eventId not in self.stored:
+                raise RuntimeError("HttpError 404 notFound")
+            self.stored.pop(eventId)
+            return {}
+
+        return _Op(_run)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+def test_execute_batch_chunks_and_maps_errors():
+    backend = BatchingBackend()
+    backend.stored = {f"e{i}": {} for i in range(120) if i != 7}
+    results = execute_batch(backend, [delete_event_request(backend, CAL, f"e{i}") for i in range(120)])
+
+    assert backend.batches == [50, 50, 20]
+    assert [idx for idx, (_, exc) in enumerate(results) if exc is not None] == [7]
+    assert "404" in str(results[7][1])
+    assert not backend.stored
+
+
+def test_execute_batch_without_batch_support_runs_sequentially():
+    from app.integrations.google_calendar import FakeCalendarService
+
+    svc = FakeCalendarService()
+    results = execute_batch(svc, [insert_event_request(svc, CAL, {"summary": "x"}) for _ in range(3)])
+    assert [res["id"] for res, exc in results] == ["fake-1", "fake-2", "fake-3"]
+
+
+def test_worker_sends_jobs_in_batches_with_per_job_results(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    start = datetime.now(timezone.utc) + timedelta(days=5)
+    ids = [f"res-gb-{i:03d}" for i in range(60)]
+    with Session(engine) as session:
+        for idx, rid in enumerate(ids):
+            session.add(
+                ReservationDB(
+                    id=rid,
+                    service_id="corte_cabello",
+                    professional_id="deinis",
+                    start=start + timedelta(minutes=30 * idx),
+                    end=start + timedelta(minutes=30 * idx + 30),
+                )
+            )
+        session.commit()
+        for rid in ids:
+            session.add(CalendarSyncJobDB(reservation_id=rid, action="create", payload={"calendar_id": CAL}))
+        session.commit()
+        # create→delete se anulan (el delete no tiene evento que borrar); el create posterior va en otra oleada.
+        session.add(CalendarSyncJobDB(reservation_id=ids[0], action="delete", payload={"calendar_id": CAL}))
+        session.add(CalendarSyncJobDB(reservation_id=ids[0], action="create", payload={"calendar_id": CAL}))
+        session.commit()
+
+    backend = BatchingBackend(fail_reservations={ids[5]})
+    monkeypatch.setattr(calendar_queue, "build_calendar", backend.service)
+
+    worker = CalendarSyncWorker(poll_interval=0.1, batch_size=100, concurrency=2, use_batch=True)
+    worker._engine = engine
+    worker.worker_id = "test-gcal-batch"
+    assert worker._process_once() is True
+    worker.stop()
+
+    assert sorted(backend.batches) == [1, 9, 50]
+
+    with Session(engine) as session:
+        jobs = session.exec(select(CalendarSyncJobDB)).all()
+        by_status: dict[str, list[CalendarSyncJobDB]] = {}
+        for job in jobs:
+            by_status.setdefault(job.status, []).append(job)
+        assert len(by_status["completed"]) == 60
+        assert len(by_status["coalesced"]) == 1
+        [failed] = by_status["pending"]
+        assert failed.reservation_id == ids[5] and failed.attempts == 1
+        assert "503" in (failed.last_error or "")
+        assert session.get(ReservationDB, ids[5]).sync_status == "queued"
+        ok = session.get(ReservationDB, ids[1])
+        assert ok.google_event_id == f"evt-{ids[1]}" and ok.sync_status == "synced"
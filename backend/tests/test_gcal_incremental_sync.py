@@ -0,0 +1,168 @@
+"""Pruebas de la importación incremental desde Google Calendar con syncToken."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import CalendarSyncStateDB, ReservationDB
+from app.services import logic
+
+CAL = "cal-inc@group.calendar.google.com"
+
+
+class _Op:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class _Resp:
+    status = 410
+
+
+class GoneError(Exception):
+    def __init__(self):
+        super().__init__("<HttpError 410 \"fullSyncRequired\">")
+        self.resp = _Resp()
+
+
+class SyncingCalendar:
+    """Calendario falso con historial de cambios: cada syncToken es la versión del último cambio visto."""
+
+    page_size = 2
+
+    def __init__(self):
+        self.stored: dict[str, dict] = {}
+        self.changed: dict[str, int] = {}
+        self.version = 0
+        self.expired: set[str] = set()
+        self.calls: list[dict] = []
+
+    def put(self, event_id: str, start: datetime, minutes: int = 30, summary: str = "Corte") -> None:
+        self.version += 1
+        self.stored[event_id] = {
+            "id": event_id,
+            "status": "confirmed",
+            "summary": summary,
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": (start + timedelta(minutes=minutes)).isoformat()},
+        }
+        self.changed[event_id] = self.version
+
+    def cancel(self, event_id: str) -> None:
+        self.version += 1
+        self.stored[event_id] = {"id": event_id, "status": "cancelled"}
+        self.changed[event_id] = self.version
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.calls.append(dict(params))
+        token = params.get("syncToken")
+        if token in self.expired:
+            raise GoneError()
+        if token is not None:
+            items = [self.stored[eid] for eid, version in self.changed.items() if version > int(token)]
+        else:
+            items = [ev for ev in self.stored.values() if ev["status"] != "cancelled"]
+        offset = int(params.get("pageToken") or 0)
+        page = items[offset:offset + self.page_size]
+        if offset + self.page_size < len(items):
+            return _Op({"items": page, "nextPageToken": str(offset + self.page_size)})
+        return _Op({"items": page, "nextSyncToken": str(self.version)})
+
+
+@pytest.fixture()
+def gcal(monkeypatch):
+    calendar = SyncingCalendar()
+    monkeypatch.setattr(logic, "build_calendar", lambda: calendar)
+    return calendar
+
+
+def _sync(session: Session) -> dict:
+    return logic.sync_from_gcal_incremental(
+        session,
+        by_professional=False,
+        calendar_id=CAL,
+        professional_id="deinis",
+        tz="Europe/Madrid",
+    )
+
+
+def _token(session: Session) -> str | None:
+    session.expire_all()
+    state = session.get(CalendarSyncStateDB, CAL)
+    return state.sync_token if state else None
+
+
+def test_full_import_then_only_changes(app_client, gcal):
+    base = datetime.combine(date.today() + timedelta(days=3), datetime.min.time()).replace(hour=10)
+    for idx in range(3):
+        gcal.put(f"ev{idx}", base + timedelta(hours=idx))
+
+    with Session(app_client.app.state.test_engine) as session:
+        first = _sync(session)
+        assert first == {"ok": True, "inserted": 3, "updated": 0, "deleted": 0, "calendars": 1, "full_syncs": 1}
+        assert "syncToken" not in gcal.calls[0] and "timeMin" in gcal.calls[0]
+        assert _token(session) == "3"
+
+        gcal.calls.clear()
+        gcal.put("ev1", base + timedelta(hours=5))
+        gcal.put("ev9", base + timedelta(hours=7))
+        gcal.cancel("ev0")
+        second = _sync(session)
+        assert second == {"ok": True, "inserted": 1, "updated": 1, "deleted": 1, "calendars": 1, "full_syncs": 0}
+        assert all(call["syncToken"] == "3" and "timeMin" not in call for call in gcal.calls)
+        assert _token(session) == "6"
+
+        ids = set(session.exec(select(ReservationDB.id)).all())
+        assert ids == {"gcal:ev1", "gcal:ev2", "gcal:ev9"}
+        moved = session.get(ReservationDB, "gcal:ev1")
+        assert moved.start.replace(tzinfo=None) == (base + timedelta(hours=5)).replace(tzinfo=None)
+
+        gcal.calls.clear()
+        assert _sync(session)["inserted"] == 0
+        assert len(gcal.calls) == 1
+
+
+def test_expired_token_falls_back_to_full_resync(app_client, gcal):
+    base = datetime.combine(date.today() + timedelta(days=4), datetime.min.time()).replace(hour=9)
+    gcal.put("ev-a", base)
+    with Session(app_client.app.state.test_engine) as session:
+        _sync(session)
+        gcal.expired.add(_token(session))
+        gcal.put("ev-b", base + timedelta(hours=1))
+
+        result = _sync(session)
+        assert result["full_syncs"] == 1
+        assert result["inserted"] == 1 and result["updated"] == 0
+        assert _token(session) == str(gcal.version)
+        state = session.get(CalendarSyncStateDB, CAL)
+        assert state.full_sync_at is not None and state.synced_at is not None
+
+
+def test_reservations_created_by_pelubot_survive_cancelled_events(app_client, gcal):
+    base = datetime.combine(date.today() + timedelta(days=5), datetime.min.time()).replace(hour=11)
+    with Session(app_client.app.state.test_engine) as session:
+        session.add(
+            ReservationDB(
+                id="res-own",
+                service_id="corte_cabello",
+                professional_id="deinis",
+                start=base,
+                end=base + timedelta(minutes=30),
+                google_event_id="ev-own",
+                google_calendar_id=CAL,
+            )
+        )
+        session.commit()
+        _sync(session)
+        gcal.cancel("ev-own")
+        assert _sync(session)["deleted"] == 0
+        assert session.get(ReservationDB, "res-own") is not None
@@ -0,0 +1,222 @@
+"""Pruebas del limitador de llamadas a Google Calendar (token buckets y concurrencia AIMD)."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from app.integrations import google_calendar
+from app.integrations.google_calendar_limits import (
+    AdaptiveConcurrency,
+    GoogleRateLimiter,
+    TokenBucket,
+    is_rate_limited,
+)
+
+
+class _Resp:
+    def __init__(self, status: int):
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status: int, reason: str = ""):
+        super().__init__(f"<HttpError {status} returned \"{reason}\">")
+        self.resp = _Resp(status)
+
+
+def _limiter(**overrides) -> GoogleRateLimiter:
+    params = dict(
+        global_rate=0,
+        global_burst=1,
+        calendar_rate=0,
+        calendar_burst=1,
+        concurrency=AdaptiveConcurrency(initial=4, minimum=1, maximum=8, cooldown=0.0),
+    )
+    params.update(overrides)
+    return GoogleRateLimiter(**params)
+
+
+@pytest.fixture()
+def live_limiter(monkeypatch):
+    """Activa el limitador (en pytest está desactivado) con uno nuevo por test."""
+
+    def _install(limiter: GoogleRateLimiter) -> GoogleRateLimiter:
+        # pytest vuelve a fijar PYTEST_CURRENT_TEST al empezar la fase de llamada.
+        monkeypatch.delenv("PYTEST_CURRENT_TEST", raising=False)
+        monkeypatch.delenv("PELUBOT_FAKE_GCAL", raising=False)
+        monkeypatch.setattr(google_calendar, "GCAL_LIMITER", limiter)
+        return limiter
+
+    return _install
+
+
+def test_is_rate_limited_classification():
+    assert is_rate_limited(FakeHttpError(429))
+    assert is_rate_limited(FakeHttpError(503, "backendError"))
+    assert is_rate_limited(FakeHttpError(403, "rateLimitExceeded"))
+    assert is_rate_limited(FakeHttpError(403, "userRateLimitExceeded"))
+    assert not is_rate_limited(FakeHttpError(403, "forbidden"))
+    assert not is_rate_limited(FakeHttpError(404, "notFound"))
+    assert is_rate_limited(RuntimeError("HttpError 500 internal"))
+    assert is_rate_limited(OSError("[SSL: DECRYPTION_FAILED_OR_BAD_RECORD_MAC] record layer failure"))
+    assert not is_rate_limited(ValueError("bad body"))
+
+
+def test_token_bucket_reserves_beyond_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.02, abs=0.01)
+    # Un lote más caro que la ráfaga deja saldo negativo en vez de bloquearse.
+    assert bucket.reserve(10) == pytest.approx(0.22, abs=0.02)
+    assert TokenBucket(rate=0, burst=1).reserve(1000) == 0
+
+
+def test_aimd_halves_on_throttle_and_ramps_up_on_success():
+    aimd = AdaptiveConcurrency(initial=8, minimum=1, maximum=8, cooldown=60)
+    aimd.acquire()
+    aimd.release(throttled=True)
+    assert aimd.limit == 4
+    aimd.acquire()
+    aimd.release(throttled=True)
+    assert aimd.limit == 4  # dentro del cooldown: misma ráfaga de errores
+    for _ in range(4):
+        aimd.acquire()
+        aimd.release()
+    assert 4.8 < aimd.limit < 5.1
+    for _ in range(200):
+        aimd.acquire()
+        aimd.release()
+    assert aimd.limit == 8
+
+
+def test_aimd_blocks_callers_above_the_limit():
+    aimd = AdaptiveConcurrency(initial=2, minimum=1, maximum=2)
+    peak = [0]
+    lock = threading.Lock()
+
+    def _call():
+        aimd.acquire()
+        with lock:
+            peak[0] = max(peak[0], aimd.inflight)
+        time.sleep(0.02)
+        aimd.release()
+
+    threads = [threading.Thread(target=_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2 and aimd.inflight == 0
+
+
+def test_per_calendar_bucket_does_not_delay_other_calendars(live_limiter):
+    limiter = live_limiter(_limiter(calendar_rate=20, calendar_burst=1))
+    t0 = time.perf_counter()
+    for _ in range(3):
+        with limiter.slot(["cal-a"]):
+            pass
+    busy = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with limiter.slot(["cal-b"]):
+        pass
+    other = time.perf_counter() - t0
+    assert busy >= 0.08
+    assert other < 0.05
+
+
+def test_call_with_retry_backs_off_on_rate_limit(live_limiter, monkeypatch):
+    limiter = live_limiter(_limiter())
+    monkeypatch.setattr(google_calendar, "GCAL_HTTP_RETRY_WAIT", 0.001)
+    calls = []
+
+    def _op():
+        calls.append(limiter.concurrency.inflight)
+        if len(calls) == 1:
+            raise FakeHttpError(429, "rateLimitExceeded")
+        return {"id": "ok"}
+
+    assert google_calendar._call_with_retry(_op, "creando evento", ("cal-a",)) == {"id": "ok"}
+    assert calls == [1, 1]
+    assert 2 <= limiter.concurrency.limit < 2.6
+    assert limiter.concurrency.inflight == 0
+
+
+class _Request:
+    def __init__(self, calendar_id: str, fail: bool = False):
+        self.uri = f"https://www.googleapis.com/calendar/v3/calendars/{calendar_id.replace('@', '%40')}/events?alt=json"
+        self.fail = fail
+
+
+class _Batch:
+    def __init__(self, callback):
+        self._callback = callback
+        self._ops = []
+
+    def add(self, request, request_id=None):
+        self._ops.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self._ops:
+            if request.fail:
+                self._callback(request_id, None, FakeHttpError(403, "rateLimitExceeded"))
+            else:
+                self._callback(request_id, {"id": request_id}, None)
+
+
+class _BatchService:
+    def new_batch_http_request(self, callback=None):
+        return _Batch(callback)
+
+
+def test_batch_costs_one_token_per_operation_and_penalizes_rejections(live_limiter):
+    limiter = live_limiter(_limiter(calendar_rate=1000, calendar_burst=100))
+    requests = [_Request("a@group.calendar.google.com") for _ in range(3)] + [_Request("b@x", fail=True)]
+
+    results = google_calendar.execute_batch(_BatchService(), requests)
+
+    assert [exc is None for _, exc in results] == [True, True, True, False]
+    buckets = limiter._calendars
+    assert set(buckets) == {"a@group.calendar.google.com", "b@x"}
+    assert buckets["a@group.calendar.google.com"]._tokens == pytest.approx(97, abs=0.5)
+    assert 2 <= limiter.concurrency.limit < 2.2
+
+
+class _PagedEvents:
+    """`events().list()` con tres páginas; cuenta cuántas llamadas llegan a ejecutarse."""
+
+    def __init__(self):
+        self.executed = 0
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        page = int(params.get("pageToken") or 0)
+        outer = self
+
+        class _Op:
+            def execute(self):
+                outer.executed += 1
+                if page < 2:
+                    return {"items": [{"id": f"ev-{page}"}], "nextPageToken": str(page + 1)}
+                return {"items": [{"id": "ev-2"}], "nextSyncToken": "tok"}
+
+        return _Op()
+
+
+@pytest.mark.parametrize("listing", ["allpages", "changes"])
+def test_event_listing_pages_go_through_the_limiter(live_limiter, listing):
+    limiter = live_limiter(_limiter(calendar_rate=1000, calendar_burst=100))
+    service = _PagedEvents()
+    if listing == "allpages":
+        items = google_calendar.list_events_allpages(service, "cal-a")
+    else:
+        items, token = google_calendar.list_event_changes(service, "cal-a", sync_token="old")
+        assert token == "tok"
+    assert [ev["id"] for ev in items] == ["ev-0", "ev-1", "ev-2"]
+    assert service.executed == 3
+    assert limiter._calendars["cal-a"]._tokens == pytest.approx(97, abs=0.5)
@@ -0,0 +1,82 @@
+"""Pruebas de la importación por rango desde Google Calendar (listado por calendario y upsert masivo)."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import ReservationDB
+from app.services import logic
+from tests.test_gcal_incremental_sync import SyncingCalendar
+
+CAL = "cal-range@group.calendar.google.com"
+
+
+@pytest.fixture()
+def gcal(monkeypatch):
+    calendar = SyncingCalendar()
+    monkeypatch.setattr(logic, "build_calendar", lambda: calendar)
+    return calendar
+
+
+@pytest.fixture()
+def statements(app_client):
+    engine = app_client.app.state.test_engine
+    seen: list[tuple[str, bool]] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        seen.append((statement.split()[0].upper(), executemany))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", _record)
+
+
+def _sync(session: Session, start: date, days: int) -> dict:
+    return logic.sync_from_gcal_range(
+        session,
+        start,
+        start + timedelta(days=days - 1),
+        by_professional=False,
+        calendar_id=CAL,
+        professional_id="deinis",
+    )
+
+
+def test_range_is_listed_once_and_written_in_bulk(app_client, gcal, statements):
+    start = date.today() + timedelta(days=2)
+    base = datetime.combine(start, datetime.min.time()).replace(hour=10)
+    for idx in range(5):
+        gcal.put(f"ev{idx}", base + timedelta(days=idx % 3, hours=idx))
+
+    with Session(app_client.app.state.test_engine) as session:
+        result = _sync(session, start, 7)
+        assert result["inserted"] == 5 and result["updated"] == 0 and result["listed"] == 5
+        assert set(result["timings"]) == {"list", "prefetch", "write", "commit"}
+        # Una consulta paginada por calendario para los 7 días (páginas de 2 eventos).
+        assert len(gcal.calls) == 3
+        assert all("syncToken" not in call for call in gcal.calls)
+        assert statements.count(("SELECT", False)) == 1
+        assert ("INSERT", True) in statements
+        assert statements.count(("INSERT", True)) + statements.count(("INSERT", False)) == 1
+
+        statements.clear()
+        gcal.put("ev1", base + timedelta(days=1, hours=8))
+        again = _sync(session, start, 7)
+        # Solo cambia el evento movido: los demás coinciden aunque SQLite devuelva fechas sin zona.
+        assert again["inserted"] == 0 and again["updated"] == 1
+        assert not any(kind == "INSERT" for kind, _ in statements)
+
+        moved = session.get(ReservationDB, "gcal:ev1")
+        assert moved.start.replace(tzinfo=None) == (base + timedelta(days=1, hours=8)).replace(tzinfo=None)
+        assert len(session.exec(select(ReservationDB)).all()) == 5
+
+
+def test_listing_failure_is_reported_per_calendar(app_client, gcal):
+    gcal.expired.add(None)
+    with Session(app_client.app.state.test_engine) as session:
+        result = _sync(session, date.today(), 3)
+    assert result["ok"] is True and result["errors"] == 1 and result["inserted"] == 0
@@ -0,0 +1,154 @@
+"""Pruebas del webhook de notificaciones push de Google Calendar (events.watch)."""
+
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import CalendarWatchChannelDB, ReservationDB
+from app.services import calendar_watch, logic
+from app.services.calendar_watch import CalendarChangeDebouncer, ensure_watch_channels, next_renewal_at
+from scripts.simulate_gcal_push import GooglePushSimulator, client_poster
+from tests.test_gcal_incremental_sync import SyncingCalendar
+
+CAL = "pelubot.test@gmail.com"
+ADDRESS = "https://pelubot.example.com/gcal/notifications"
+HEADERS = {"X-API-Key": "test-api-key"}
+
+
+@pytest.fixture()
+def push(app_client, monkeypatch):
+    """Calendario falso con historial, debouncer corto y la BD de test en los hilos de importación."""
+    calendar = SyncingCalendar()
+    monkeypatch.setattr(logic, "build_calendar", lambda: calendar)
+    monkeypatch.setattr(calendar_watch, "engine", app_client.app.state.test_engine)
+    pulls: list[str] = []
+
+    def _pull(calendar_id: str) -> None:
+        pulls.append(calendar_id)
+        calendar_watch.pull_calendar_changes(calendar_id)
+
+    debouncer = CalendarChangeDebouncer(_pull, delay=0.3)
+    monkeypatch.setattr(calendar_watch, "_debouncer", debouncer)
+    yield calendar, debouncer, pulls
+    debouncer.close()
+
+
+def _open_channel(app_client) -> CalendarWatchChannelDB:
+    resp = app_client.post("/admin/gcal/watch", json={"address": ADDRESS, "calendar_ids": [CAL]}, headers=HEADERS)
+    assert resp.status_code == 200
+    assert resp.json()["started"] == 1
+    with Session(app_client.app.state.test_engine) as session:
+        return session.exec(select(CalendarWatchChannelDB)).one()
+
+
+def test_burst_of_notifications_triggers_one_incremental_pull(app_client, push):
+    calendar, debouncer, pulls = push
+    channel = _open_channel(app_client)
+    # El canal recién abierto dispara una importación completa para ponerse al día.
+    assert debouncer.wait_idle(5)
+    assert pulls == [CAL]
+
+    simulator = GooglePushSimulator.for_channel(client_poster(app_client), channel)
+    assert simulator.sync().json()["result"] == "sync"
+
+    base = datetime.combine(date.today() + timedelta(days=2), datetime.min.time()).replace(hour=10)
+    calendar.put("ev-push-1", base)
+    calendar.put("ev-push-2", base + timedelta(hours=1))
+    calendar.calls.clear()
+    results = [resp.json()["result"] for resp in simulator.change(5)]
+    assert results == ["scheduled"] + ["coalesced"] * 4
+    assert debouncer.wait_idle(5)
+
+    assert pulls == [CAL, CAL]
+    assert all("syncToken" in call for call in calendar.calls)
+    with Session(app_client.app.state.test_engine) as session:
+        ids = set(session.exec(select(ReservationDB.id)).all())
+    assert ids == {"gcal:ev-push-1", "gcal:ev-push-2"}
+
+
+def test_notifications_with_unknown_channel_or_bad_token_are_rejected(app_client, push):
+    _, debouncer, pulls = push
+    channel = _open_channel(app_client)
+    debouncer.wait_idle(5)
+    poster = client_poster(app_client)
+
+    forged = GooglePushSimulator(poster, channel.id, "otro-token", channel.resource_id)
+    assert forged.change()[0].status_code == 403
+    unknown = GooglePushSimulator(poster, "canal-inexistente", channel.token, channel.resource_id)
+    assert unknown.change()[0].status_code == 403
+
+    app_client.delete("/admin/gcal/watch", headers=HEADERS)
+    stopped = GooglePushSimulator.for_channel(poster, channel)
+    assert stopped.change()[0].status_code == 403
+    assert debouncer.wait_idle(5)
+    assert pulls == [CAL]
+
+
+def test_change_during_pull_schedules_another_pull():
+    started = threading.Event()
+    release = threading.Event()
+    pulls: list[str] = []
+
+    def _pull(calendar_id: str) -> None:
+        pulls.append(calendar_id)
+        if len(pulls) == 1:
+            started.set()
+            release.wait(5)
+
+    debouncer = CalendarChangeDebouncer(_pull, delay=0.01)
+    assert debouncer.notify("cal-a") is True
+    assert started.wait(5)
+    # La importación en curso pudo leer antes de este cambio: hay que repetirla.
+    assert debouncer.notify("cal-a") is False
+    assert debouncer.notify("cal-a") is False
+    assert debouncer.notify("cal-b") is True
+    release.set()
+    assert debouncer.wait_idle(5)
+    assert sorted(pulls) == ["cal-a", "cal-a", "cal-b"]
+
+
+def test_channels_are_renewed_before_expiring(app_client, push):
+    _, debouncer, _ = push
+    engine = app_client.app.state.test_engine
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        first = ensure_watch_channels(session, ADDRESS, calendars=[CAL, "otro@group.calendar.google.com"], ttl_seconds=3600, catch_up=False)
+        assert first == {"ok": True, "started": 2, "renewed": 0, "stopped": 0, "calendars": 2}
+        assert ensure_watch_channels(session, ADDRESS, calendars=[CAL, "otro@group.calendar.google.com"], ttl_seconds=3600, catch_up=False)["started"] == 0
+
+        due = next_renewal_at(session, timedelta(minutes=30))
+        assert now + timedelta(minutes=29) < due < now + timedelta(minutes=31)
+
+        # A 20 minutos de caducar se renueva; el calendario que ya no se usa se cierra.
+        later = now + timedelta(minutes=40)
+        second = ensure_watch_channels(session, ADDRESS, calendars=[CAL], ttl_seconds=3600, renew_before=timedelta(minutes=30), now=later, catch_up=False)
+        assert second == {"ok": True, "started": 0, "renewed": 1, "stopped": 2, "calendars": 1}
+
+        active = session.exec(select(CalendarWatchChannelDB).where(CalendarWatchChannelDB.stopped_at.is_(None))).all()
+        assert [ch.calendar_id for ch in active] == [CAL]
+        assert active[0].id not in {ch.id for ch in session.exec(select(CalendarWatchChannelDB).where(CalendarWatchChannelDB.stopped_at.is_not(None)))}
+
+    listed = app_client.get("/admin/gcal/watch", headers=HEADERS).json()["channels"]
+    assert [ch["id"] for ch in listed] == [active[0].id]
+    assert "token" not in listed[0]
+    assert debouncer.pending() == set()
+
+
+def test_debouncer_accepts_notifications_after_a_restart(monkeypatch):
+    monkeypatch.setattr(calendar_watch, "_debouncer", None)
+    monkeypatch.setenv("GCAL_WATCH_DEBOUNCE_SECONDS", "60")
+    first = calendar_watch.get_change_debouncer()
+    calendar_watch.stop_watch_manager()
+    assert not first.notify(CAL)
+
+    # Tras parar y volver a arrancar (lifespan, tests) los avisos no se pierden.
+    again = calendar_watch.get_change_debouncer()
+    try:
+        assert again is not first
+        assert again.notify(CAL)
+    finally:
+        again.close()
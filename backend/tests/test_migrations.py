@@ -0,0 +1,67 @@
+"""Migraciones (Alembic): cabeza conocida, BD nueva, BD heredada y arranque con una consulta."""
+
+from __future__ import annotations
+
+import pytest
+from alembic.script import ScriptDirectory
+from sqlalchemy import event, inspect
+from sqlmodel import Session, create_engine, select
+
+from app import db
+from app.models import ReservationDB
+
+
+@pytest.fixture()
+def file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}")
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def test_schema_head_matches_migrations():
+    assert ScriptDirectory.from_config(db.alembic_config()).get_current_head() == db.SCHEMA_HEAD
+
+
+def test_new_database_is_migrated_to_head(file_engine):
+    db.create_db_and_tables(file_engine)
+    assert db.current_schema_revision(file_engine) == db.SCHEMA_HEAD
+    names = {idx["name"] for idx in inspect(file_engine).get_indexes("reservationdb")}
+    assert {"ix_res_prof_start_end", "ix_res_service_start", "ux_res_prof_start"} <= names
+    with file_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalar() == "trg_reservationdb_updated"
+
+
+def test_current_schema_costs_one_query(file_engine):
+    db.create_db_and_tables(file_engine)
+    statements = []
+    event.listen(file_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db.create_db_and_tables(file_engine)
+    assert statements == ["SELECT version_num FROM alembic_version"]
+
+
+def test_legacy_database_is_adopted(file_engine):
+    # Esquema de antes de las columnas de cliente/sincronización, sin `alembic_version`.
+    with file_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE reservationdb (id VARCHAR PRIMARY KEY, service_id VARCHAR NOT NULL, professional_id VARCHAR NOT NULL, "
+            "start DATETIME NOT NULL, \"end\" DATETIME NOT NULL, status VARCHAR NOT NULL, google_event_id VARCHAR, "
+            "google_calendar_id VARCHAR, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO reservationdb VALUES ('r1', 'corte_cabello', 'deinis', '2030-01-07 09:00:00', "
+            "'2030-01-07 09:30:00', 'confirmada', NULL, NULL, '2030-01-01 00:00:00', '2030-01-01 00:00:00')"
+        )
+    db.create_db_and_tables(file_engine)
+    assert db.current_schema_revision(file_engine) == db.SCHEMA_HEAD
+    assert {"customer_name", "sync_status", "sync_job_id"} <= {c["name"] for c in inspect(file_engine).get_columns("reservationdb")}
+    assert "calendar_sync_jobs" in inspect(file_engine).get_table_names()
+    with Session(file_engine) as session:
+        assert session.exec(select(ReservationDB.id)).all() == ["r1"]
+
+
+def test_without_auto_migrate_an_outdated_schema_fails(file_engine, monkeypatch):
+    monkeypatch.setattr(db, "AUTO_MIGRATE", False)
+    with pytest.raises(RuntimeError, match="scripts/migrate.py upgrade"):
+        db.create_db_and_tables(file_engine)
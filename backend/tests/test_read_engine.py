@@ -0,0 +1,101 @@
+"""Motor de lectura: URL de solo lectura, enrutado por método HTTP y métricas del pool."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app import db
+from app.core.metrics import DB_POOL_TIMEOUTS, DB_POOL_WAIT_SECONDS
+from app.models import ReservationDB
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("sqlite:////srv/data/pelubot.db", "sqlite:///file:/srv/data/pelubot.db?mode=ro&uri=true"),
+        ("sqlite:///data/mi bd.db", "sqlite:///file:data/mi%20bd.db?mode=ro&uri=true"),
+        ("sqlite://", "sqlite://"),
+        ("sqlite:///:memory:", "sqlite:///:memory:"),
+        ("sqlite:///file:x.db?mode=ro&uri=true", "sqlite:///file:x.db?mode=ro&uri=true"),
+        ("postgresql://u@db/pelubot", "postgresql://u@db/pelubot"),
+    ],
+)
+def test_to_readonly_url(url, expected):
+    assert db.to_readonly_url(url) == expected
+
+
+class _FakeRequest:
+    def __init__(self, method: str):
+        self.method = method
+
+
+@pytest.mark.parametrize("method, read", [("GET", True), ("HEAD", True), ("POST", False), ("DELETE", False)])
+def test_get_session_routes_reads_to_the_read_engine(method, read):
+    gen = db.get_session(_FakeRequest(method))
+    session = next(gen)
+    try:
+        assert (session.bind is db.get_read_engine()) is read
+        assert (session.bind is db.engine) is not read
+    finally:
+        gen.close()
+
+
+def test_readonly_engine_rejects_writes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'ro.db'}"
+    writer = create_engine(url)
+    SQLModel.metadata.create_all(writer)
+    reader = create_engine(db.to_readonly_url(url))
+    try:
+        with Session(reader) as session:
+            assert session.exec(select(ReservationDB)).all() == []
+            with pytest.raises(Exception, match="readonly"):
+                session.exec(delete(ReservationDB))
+    finally:
+        reader.dispose()
+        writer.dispose()
+
+
+def _sample(metric, suffix: str, pool: str) -> float:
+    return next(
+        (s.value for m in metric.collect() for s in m.samples if s.name.endswith(suffix) and s.labels.get("pool") == pool),
+        0.0,
+    )
+
+
+def test_pool_wait_and_timeouts_are_measured(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        connect_args={"check_same_thread": False},
+        poolclass=db.timed_pool_class(QueuePool, "test"),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.2,
+    )
+    try:
+        waited_before = _sample(DB_POOL_WAIT_SECONDS, "_sum", "test")
+        held = engine.connect()
+        threading.Timer(0.1, held.close).start()
+        with engine.connect():
+            pass
+        assert _sample(DB_POOL_WAIT_SECONDS, "_sum", "test") - waited_before >= 0.09
+
+        held = engine.connect()
+        timeouts_before = _sample(DB_POOL_TIMEOUTS, "_total", "test")
+        started = time.perf_counter()
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+        assert time.perf_counter() - started < 1
+        assert _sample(DB_POOL_TIMEOUTS, "_total", "test") == timeouts_before + 1
+        held.close()
+        # `dispose()` recrea el pool con la misma clase: sigue midiendo.
+        engine.dispose()
+        assert type(engine.pool).__name__ == "TimedQueuePool"
+    finally:
+        engine.dispose()
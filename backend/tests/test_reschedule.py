@@ -41,3 +41,13 @@ def test_reschedule_flow(app_client, monkeypatch):
     assert r2.status_code == 200
     assert r2.json()["ok"] is True
     assert "Reprogramada" in r2.json()["message"]
+
+
+def test_reschedule_unknown_reservation_is_reported_by_the_writer(app_client):
+    target = date.today() + timedelta(days=33)
+    while target.weekday() == 6:
+        target += timedelta(days=1)
+    payload = {"reservation_id": "no-existe", "new_start": f"{target.isoformat()}T10:00:00"}
+    r = app_client.post("/reservations/reschedule", headers={"X-API-Key": API_KEY}, json=payload)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "La reserva no existe."
@@ -0,0 +1,95 @@
+"""Outbox de reservas: la escritura, su trabajo de sincronización y `sync_status` van en un commit."""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.api.routes import API_KEY
+from app.models import CalendarSyncJobDB, ReservationDB
+from app.services import calendar_queue
+
+HEADERS = {"X-API-Key": API_KEY}
+CUSTOMER = {"customer_name": "Cliente Outbox", "customer_phone": "+34600000000"}
+
+
+def _target_day() -> date:
+    d = date.today() + timedelta(days=30)
+    while d.weekday() == 6:
+        d += timedelta(days=1)
+    return d
+
+
+@contextmanager
+def _count_commits(engine):
+    commits: list[int] = []
+    listener = lambda _conn: commits.append(1)  # noqa: E731
+    event.listen(engine, "commit", listener)
+    try:
+        yield commits
+    finally:
+        event.remove(engine, "commit", listener)
+
+
+def _book(app_client) -> dict:
+    slots = app_client.post(
+        "/slots",
+        json={"service_id": "corte_cabello", "date_str": _target_day().isoformat(), "professional_id": "deinis"},
+    ).json()["slots"]
+    payload = {"service_id": "corte_cabello", "professional_id": "deinis", "start": slots[0], **CUSTOMER}
+    return app_client.post("/reservations", headers=HEADERS, json=payload)
+
+
+def test_booking_and_cancel_commit_once_each(app_client, monkeypatch):
+    engine = app_client.app.state.test_engine
+    wakeups: list[int] = []
+    monkeypatch.setattr(calendar_queue, "_active_workers", [type("W", (), {"wake": lambda self: wakeups.append(1)})()])
+
+    # Las escrituras van por el escritor único, que usa el engine síncrono.
+    with _count_commits(engine) as commits:
+        resp = _book(app_client)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert len(commits) == 1
+    assert wakeups == [1]
+    assert body["sync_status"] == "queued"
+
+    with Session(engine) as session:
+        row = session.get(ReservationDB, body["reservation_id"])
+        job = session.get(CalendarSyncJobDB, body["sync_job_id"])
+        assert (row.sync_status, row.sync_job_id) == ("queued", job.id)
+        assert (job.action, job.status) == ("create", "pending")
+
+    with _count_commits(engine) as commits:
+        resp = app_client.delete(f"/reservations/{body['reservation_id']}", headers=HEADERS)
+    assert resp.status_code == 200, resp.text
+    assert len(commits) == 1
+    with Session(engine) as session:
+        row = session.get(ReservationDB, body["reservation_id"])
+        jobs = session.exec(select(CalendarSyncJobDB).order_by(CalendarSyncJobDB.id)).all()
+        # El delete deja sin efecto el create pendiente en la misma transacción.
+        assert [(j.action, j.status) for j in jobs] == [("create", "coalesced"), ("delete", "pending")]
+        assert (row.status, row.sync_job_id) == ("cancelada", jobs[-1].id)
+
+
+def test_failed_enqueue_rolls_back_the_booking(app_client, monkeypatch):
+    import app.api.routes as routes
+
+    wakeups: list[int] = []
+    monkeypatch.setattr(calendar_queue, "_active_workers", [type("W", (), {"wake": lambda self: wakeups.append(1)})()])
+
+    def _broken_stage(session, **kwargs):
+        calendar_queue.run_after_commit(session, lambda: wakeups.append(1))
+        raise RuntimeError("disco lleno")
+
+    monkeypatch.setattr(routes, "stage_calendar_job", _broken_stage)
+    resp = _book(app_client)
+    assert resp.status_code == 500
+    with Session(app_client.app.state.test_engine) as session:
+        assert session.exec(select(ReservationDB)).all() == []
+        assert session.exec(select(CalendarSyncJobDB)).all() == []
+    # Las acciones posteriores al commit de una transacción descartada no se ejecutan.
+    assert wakeups == []